@@ -0,0 +1,110 @@
+# Benchmark do enriquecimento das requisições (src/backend/enriquecimento.py)
+#
+# Mede a carga dos índices na inicialização e o custo por ponto de 'tipo_via_num' (grade + busca exata nas
+# células mistas, contra só a busca exata na STRtree) e de 'Chuva' (busca da última leitura), em pontos
+# avulsos (caminho do /calcular_risco) e em lote (caminho do /calcular_risco_lote). Confere que a grade
+# devolve o mesmo tipo de via que a busca exata em todos os pontos.
+#
+# Os pontos são os locais reais de sinistros de frontend/public/coordenadas.json (onde as requisições se
+# concentram) e pontos uniformes no retângulo das ruas. A chuva vem de uma série horária sintética de 4 anos
+# (a série do INMET fica no Git LFS), gravada num CSV temporário no mesmo formato.
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.bench_enriquecimento
+#   python -m benchmarks.bench_enriquecimento --construir    # também mede a construção da grade
+import argparse
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from src.backend.enriquecimento import (Enriquecimento, FonteChuva, IndiceTipoVia, caminho_grade_tipo_via,
+                                        construir_grade)
+
+
+# Função para gravar uma série horária sintética (uma estação, ~10% das horas com chuva)
+def serie_sintetica(caminho, anos=4, semente=3):
+    rng = np.random.default_rng(semente)
+    tempos = pd.date_range("2022-01-01", periods=anos * 365 * 24, freq="h")
+    chuva = np.where(rng.random(len(tempos)) < 0.1, rng.exponential(3, len(tempos)).round(1), 0.0)
+    pd.DataFrame({"estacao": "A705", "datetime_brt": tempos, "precipitacao_mm": chuva}).to_csv(
+        caminho, sep=";", index=False, encoding="utf-8-sig")
+    return tempos
+
+
+# Função para a latência (µs) de cada chamada de 'funcao' sobre cada item de 'entradas'
+def latencias(funcao, entradas):
+    tempos = []
+    for entrada in entradas:
+        inicio = time.perf_counter()
+        funcao(*entrada)
+        tempos.append((time.perf_counter() - inicio) * 1e6)
+    return np.array(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do enriquecimento de tipo de via e chuva")
+    parser.add_argument("--coordenadas", default="frontend/public/coordenadas.json")
+    parser.add_argument("--grade", default=str(caminho_grade_tipo_via))
+    parser.add_argument("--construir", action="store_true", help="Reconstrói a grade antes de medir")
+    parser.add_argument("--pontos", type=int, default=20_000)
+    args = parser.parse_args()
+
+    if args.construir or not Path(args.grade).exists():
+        inicio = time.perf_counter()
+        construir_grade(destino=args.grade)
+        print(f"Construção da grade: {time.perf_counter() - inicio:.1f} s")
+
+    inicio = time.perf_counter()
+    indice = IndiceTipoVia.carregar(caminho_grade=args.grade)
+    print(f"Carga do índice de tipo de via: {time.perf_counter() - inicio:.2f} s "
+          f"({indice.estado()['celulas_mistas']:.1%} das células mistas)")
+    exato = IndiceTipoVia(indice.arvore.geometries, indice.tipo_via)
+
+    rng = np.random.default_rng(0)
+    coordenadas = pd.read_json(args.coordenadas)
+    amostra = rng.integers(0, len(coordenadas), args.pontos)
+    conjuntos = {
+        "sinistros": (coordenadas["latitude"].to_numpy()[amostra], coordenadas["longitude"].to_numpy()[amostra]),
+        "uniformes": (rng.uniform(-22.46, -22.05, args.pontos), rng.uniform(-49.30, -48.93, args.pontos)),
+    }
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_serie = Path(pasta) / "serie.csv"
+        tempos = serie_sintetica(caminho_serie)
+        inicio = time.perf_counter()
+        chuva = FonteChuva([caminho_serie])
+        print(f"Carga da chuva ({len(tempos)} leituras): {time.perf_counter() - inicio:.2f} s")
+        enriquecimento = Enriquecimento(indice, chuva)
+
+        print(f"\n{'pontos':<10} | {'consulta':<34} | {'p50 (µs)':>9} | {'p99 (µs)':>9} | {'em rodovia':>10} | conferência")
+        for nome, (latitudes, longitudes) in conjuntos.items():
+            momentos = rng.choice(tempos.to_numpy(), args.pontos) + rng.integers(0, 3600, args.pontos).astype("timedelta64[s]")
+            referencia = exato.consultar(latitudes, longitudes)
+            divergencias = int((indice.consultar(latitudes, longitudes) != referencia).sum())
+            pontos = list(zip(latitudes.tolist(), longitudes.tolist()))
+            com_momento = [(lat, lon, m) for (lat, lon), m in zip(pontos, pd.DatetimeIndex(momentos).to_pydatetime())]
+
+            for consulta, funcao, entradas in [
+                ("tipo_via, busca exata (antes)", exato.consultar_ponto, pontos[:5_000]),
+                ("tipo_via, grade", indice.consultar_ponto, pontos),
+                ("Chuva", chuva.consultar_ponto, com_momento),
+                ("tipo_via + Chuva (por requisição)", enriquecimento.ponto, com_momento),
+            ]:
+                tempos_us = latencias(funcao, entradas)
+                print(f"{nome:<10} | {consulta:<34} | {np.percentile(tempos_us, 50):>9.1f} | "
+                      f"{np.percentile(tempos_us, 99):>9.1f} | {referencia.mean():>10.1%} | "
+                      f"{'ok' if divergencias == 0 else f'{divergencias} DIVERGÊNCIAS'}")
+
+            for tamanho in (256, 100_000):
+                idx = rng.integers(0, args.pontos, tamanho)
+                inicio = time.perf_counter()
+                enriquecimento.colunas(latitudes[idx], longitudes[idx], momentos[idx])
+                total = time.perf_counter() - inicio
+                print(f"{nome:<10} | {f'lote de {tamanho}, por ponto':<34} | {total / tamanho * 1e6:>9.2f} | "
+                      f"{'':>9} | {'':>10} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Benchmark do avaliador compilado (src/backend/floresta_compilada.py) contra o predict_proba original
+#
+# Mede a latência p50/p99 por requisição (1 linha, como em /calcular_risco, e lotes pequenos) e confere
+# que as probabilidades batem com o Scikit-learn/XGBoost dentro da tolerância de ponto flutuante.
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.bench_floresta --modelo src/model/modelo_risco_viario_3.pkl src/model/modelo_risco_viario_RF.pkl
+import argparse
+import time
+import warnings
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.backend.features import extrair_model_features
+from src.backend.floresta_compilada import compilar_modelo
+
+TOLERANCIA = 1e-6
+TAMANHOS_LOTE = [1, 16, 256]
+
+
+# Função para carregar amostras reais do dataset de treino, alinhadas às features do modelo
+def carregar_amostras(caminho, model_features, n, seed=8):
+    df = pd.read_csv(caminho, decimal=",")
+    return df.sample(n, random_state=seed).reindex(columns=model_features, fill_value=0).astype(float)
+
+
+# Função para medir a latência de cada chamada (em ms)
+def medir(funcao, lotes):
+    tempos = []
+    for lote in lotes:
+        inicio = time.perf_counter()
+        funcao(lote)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return np.percentile(tempos, 50), np.percentile(tempos, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do avaliador compilado de florestas")
+    parser.add_argument("--modelo", nargs="+", required=True, help="Artefatos .pkl a comparar")
+    parser.add_argument("--dados", default="dataset_final_para_modelo.csv", help="CSV usado como entrada")
+    parser.add_argument("--repeticoes", type=int, default=300)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    for caminho in args.modelo:
+        model = joblib.load(caminho)
+        model_features = extrair_model_features(model)
+        compilado = compilar_modelo(model)
+        if compilado is None:
+            print(f"{caminho}: tipo de modelo não suportado pelo avaliador compilado")
+            continue
+
+        amostras = carregar_amostras(args.dados, model_features, 2000)
+        diferenca = np.abs(compilado.prever_proba(amostras.to_numpy()) - model.predict_proba(amostras)[:, 1]).max()
+        print(f"\n{caminho} ({compilado.n_arvores} árvores, profundidade {compilado.profundidade})")
+        print(f"  diferença máxima vs predict_proba: {diferenca:.2e} ({'ok' if diferenca <= TOLERANCIA else 'FALHOU'})")
+
+        print(f"  {'linhas':>6} | {'original p50/p99 (ms)':>22} | {'compilado p50/p99 (ms)':>23} | {'ganho p50':>9}")
+        for tamanho in TAMANHOS_LOTE:
+            inicios = np.random.default_rng(tamanho).integers(0, len(amostras) - tamanho, args.repeticoes)
+            lotes_df = [amostras.iloc[i:i + tamanho] for i in inicios]
+            lotes_np = [lote.to_numpy() for lote in lotes_df]
+
+            original = medir(lambda lote: model.predict_proba(lote)[:, 1], lotes_df)
+            rapido = medir(compilado.prever_proba, lotes_np)
+            print(f"  {tamanho:>6} | {original[0]:>10.3f} / {original[1]:>9.3f} | "
+                  f"{rapido[0]:>10.3f} / {rapido[1]:>10.3f} | {original[0] / rapido[0]:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Benchmark dos hotspots de sinistros (src/backend/hotspots.py)
+#
+# Mede a construção completa e a incremental (um mês novo), a carga no servidor e a latência p50/p99 da
+# consulta de um ponto (STRtree + resumo com a faixa de hora e o veículo), comparada ao teste do ponto
+# contra todos os polígonos. Confere que as duas consultas devolvem os mesmos hotspots.
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.bench_hotspots
+#   python -m benchmarks.bench_hotspots --copias 100    # pontos de Bauru replicados pelo estado de SP
+import argparse
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import shapely
+
+from benchmarks.bench_indice_sinistros import sinistros_sinteticos
+from src.backend.hotspots import Hotspots, construir_hotspots
+
+
+# Função para medir a latência de cada chamada (em µs)
+def medir(funcao, pontos):
+    tempos = []
+    for latitude, longitude in pontos:
+        inicio = time.perf_counter()
+        funcao(latitude, longitude)
+        tempos.append((time.perf_counter() - inicio) * 1e6)
+    return np.percentile(tempos, 50), np.percentile(tempos, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos hotspots de sinistros")
+    parser.add_argument("--coordenadas", default="frontend/public/coordenadas.json")
+    parser.add_argument("--copias", type=int, default=1, help="Cópias dos pontos espalhadas pelo estado")
+    parser.add_argument("--repeticoes", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(8)
+    sinistros = sinistros_sinteticos(args.coordenadas, args.copias)
+    sinistros["hora_sinistro"] = rng.integers(0, 24, len(sinistros))
+    with tempfile.TemporaryDirectory() as destino:
+        inicio = time.perf_counter()
+        metadados = construir_hotspots(sinistros, destino)
+        print(f"{len(sinistros)} sinistros -> {metadados['celulas']} células, {metadados['hotspots']} hotspots: "
+              f"construção em {time.perf_counter() - inicio:.2f} s (somas por mês {metadados['tempo_meses_s']:.2f} s)")
+
+        novos = sinistros.sample(min(3000, len(sinistros)), random_state=1).assign(data_sinistro="2030-01-15")
+        inicio = time.perf_counter()
+        metadados = construir_hotspots(pd.concat([sinistros, novos], ignore_index=True), destino)
+        print(f"Construção incremental (um mês novo, {metadados['meses_regravados']} mês somado): "
+              f"{time.perf_counter() - inicio:.2f} s")
+
+        inicio = time.perf_counter()
+        indice = Hotspots(destino).obter()
+        print(f"Carga no servidor: {time.perf_counter() - inicio:.3f} s ({len(indice)} polígonos)")
+
+    # Metade dos pontos de consulta cai em sinistros (muitos dentro de hotspots), metade é sorteada na área
+    amostra = rng.integers(0, len(sinistros), args.repeticoes // 2)
+    lat_min, lat_max = sinistros["latitude"].min(), sinistros["latitude"].max()
+    lon_min, lon_max = sinistros["longitude"].min(), sinistros["longitude"].max()
+    pontos = list(zip(sinistros["latitude"].to_numpy()[amostra].tolist(), sinistros["longitude"].to_numpy()[amostra].tolist()))
+    pontos += list(zip(rng.uniform(lat_min, lat_max, args.repeticoes // 2).tolist(),
+                       rng.uniform(lon_min, lon_max, args.repeticoes // 2).tolist()))
+
+    def varredura(latitude, longitude):
+        return np.flatnonzero(shapely.contains_xy(indice.poligonos, longitude, latitude))
+
+    erros = sum(set(indice.no_ponto(lat, lon).tolist()) != set(varredura(lat, lon).tolist()) for lat, lon in pontos)
+    dentro = sum(len(indice.no_ponto(lat, lon)) > 0 for lat, lon in pontos)
+    print(f"Conferência com o teste contra todos os polígonos ({len(pontos)} pontos, {dentro} dentro de hotspots): "
+          f"{'ok' if erros == 0 else f'{erros} FALHAS'}")
+
+    consultas = [
+        ("STRtree", indice.no_ponto),
+        ("STRtree + resumo (hora e veículo)",
+         lambda lat, lon: [indice.resumo(p, 14, "tp_veiculo_motocicleta") for p in indice.no_ponto(lat, lon)]),
+        ("todos os polígonos", varredura),
+    ]
+    print(f"\n{'consulta':<36} | {'p50 (µs)':>9} | {'p99 (µs)':>9}")
+    for nome, funcao in consultas:
+        p50, p99 = medir(funcao, pontos)
+        print(f"{nome:<36} | {p50:>9.1f} | {p99:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
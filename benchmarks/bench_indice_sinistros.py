@@ -0,0 +1,116 @@
+# Benchmark do índice espacial de sinistros (src/backend/indice_sinistros.py)
+#
+# Mede a latência p50/p99 das consultas por raio, dos k mais próximos e da contagem por célula, e confere
+# as consultas por raio e k-NN contra uma busca exaustiva (haversine sobre todos os pontos).
+#
+# Sem --sinistros, usa os pontos reais de frontend/public/coordenadas.json (Bauru). --copias replica esses
+# pontos deslocados para centros aleatórios dentro do estado de SP, para simular o índice com todos os
+# municípios carregados.
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.bench_indice_sinistros
+#   python -m benchmarks.bench_indice_sinistros --copias 100
+#   python -m benchmarks.bench_indice_sinistros --sinistros data/Acidentes/sinistros_com_chuva_2022-2025.csv
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from src.backend.indice_sinistros import RAIO_TERRA_M, IndiceSinistros
+
+# Retângulo aproximado do estado de SP (lat_min, lon_min, lat_max, lon_max)
+RETANGULO_SP = (-25.0, -53.0, -20.0, -44.5)
+VEICULOS = ["automovel", "motocicleta", "caminhao", "onibus", "bicicleta"]
+GRAVIDADES = ["gravidade_fatal", "gravidade_grave", "gravidade_leve", "gravidade_ileso"]
+
+
+# Função para montar sinistros a partir de coordenadas.json, com veículos e gravidades sorteados
+def sinistros_sinteticos(caminho, copias, seed=8):
+    rng = np.random.default_rng(seed)
+    base = pd.read_json(caminho)
+    partes = [base]
+    lat_centro, lon_centro = base["latitude"].median(), base["longitude"].median()
+    for _ in range(copias - 1):
+        lat_min, lon_min, lat_max, lon_max = RETANGULO_SP
+        partes.append(base.assign(latitude=base["latitude"] - lat_centro + rng.uniform(lat_min, lat_max),
+                                  longitude=base["longitude"] - lon_centro + rng.uniform(lon_min, lon_max)))
+    sinistros = pd.concat(partes, ignore_index=True)
+    sinistros["id_sinistro"] = np.arange(len(sinistros))
+    for col in VEICULOS:
+        sinistros[f"tp_veiculo_{col}"] = (rng.random(len(sinistros)) < 0.4).astype(int)
+    gravidade = rng.integers(0, len(GRAVIDADES), len(sinistros))
+    for k, col in enumerate(GRAVIDADES):
+        sinistros[col] = (gravidade == k).astype(int)
+    return sinistros
+
+
+# Função para a distância haversine (em metros) de um ponto a todos os pontos do índice
+def haversine(indice, latitude, longitude):
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(indice.latitudes), np.radians(indice.longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_M * np.arcsin(np.sqrt(a))
+
+
+# Função para medir a latência de cada chamada (em ms)
+def medir(funcao, centros):
+    tempos = []
+    for latitude, longitude in centros:
+        inicio = time.perf_counter()
+        funcao(latitude, longitude)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return np.percentile(tempos, 50), np.percentile(tempos, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do índice espacial de sinistros")
+    parser.add_argument("--sinistros", nargs="+", help="Arquivos de sinistros limpos (padrão: coordenadas.json)")
+    parser.add_argument("--coordenadas", default="frontend/public/coordenadas.json")
+    parser.add_argument("--copias", type=int, default=1, help="Cópias dos pontos espalhadas pelo estado")
+    parser.add_argument("--repeticoes", type=int, default=2000)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    if args.sinistros:
+        indice = IndiceSinistros.carregar(args.sinistros)
+    else:
+        indice = IndiceSinistros.de_sinistros(sinistros_sinteticos(args.coordenadas, args.copias))
+    print(f"Índice com {len(indice)} sinistros montado em {time.perf_counter() - inicio:.2f} s")
+
+    # Centros das consultas: pontos de sinistros, levemente deslocados
+    rng = np.random.default_rng(0)
+    amostra = rng.integers(0, len(indice), args.repeticoes)
+    centros = list(zip((indice.latitudes[amostra] + rng.normal(0, 0.002, args.repeticoes)).tolist(),
+                       (indice.longitudes[amostra] + rng.normal(0, 0.002, args.repeticoes)).tolist()))
+
+    # Conferência contra a busca exaustiva
+    erros = 0
+    for latitude, longitude in centros[:50]:
+        distancias = haversine(indice, latitude, longitude)
+        posicoes, _, total = indice.no_raio(latitude, longitude, 500)
+        erros += total != int((distancias <= 500).sum()) or set(posicoes.tolist()) != set(np.flatnonzero(distancias <= 500).tolist())
+        _, proximos = indice.mais_proximos(latitude, longitude, 10)
+        erros += not np.allclose(proximos, np.sort(distancias)[:10], atol=0.01)
+    print(f"Conferência com a busca exaustiva (raio 500 m e k=10, 50 pontos): {'ok' if erros == 0 else f'{erros} FALHAS'}")
+
+    dia = str(indice.dias[len(indice) // 2])
+    consultas = [
+        ("raio 300 m", lambda lat, lon: indice.no_raio(lat, lon, 300)),
+        ("raio 1 km", lambda lat, lon: indice.no_raio(lat, lon, 1000, limite=500)),
+        ("raio 1 km + filtros", lambda lat, lon: indice.no_raio(lat, lon, 1000, limite=500, data_inicio=dia,
+                                                              veiculos=[indice.nomes_veiculos[0]], gravidades=["GRAVE"])),
+        ("k=10", lambda lat, lon: indice.mais_proximos(lat, lon, 10)),
+        ("k=10 + filtros", lambda lat, lon: indice.mais_proximos(lat, lon, 10, data_inicio=dia, gravidades=["FATAL"])),
+        ("células 0,005° em 0,1° x 0,1°", lambda lat, lon: indice.contar_celulas(0.005, (lat - 0.05, lon - 0.05,
+                                                                                         lat + 0.05, lon + 0.05))),
+        ("células 0,01° (tudo)", lambda lat, lon: indice.contar_celulas(0.01)),
+    ]
+    print(f"\n{'consulta':<32} | {'p50 (ms)':>9} | {'p99 (ms)':>9}")
+    for nome, funcao in consultas:
+        repeticoes = centros if "tudo" not in nome else centros[:100]
+        p50, p99 = medir(funcao, repeticoes)
+        print(f"{nome:<32} | {p50:>9.3f} | {p99:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
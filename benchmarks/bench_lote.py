@@ -0,0 +1,82 @@
+# Benchmark do endpoint /calcular_risco_lote (vazão para 1, 100, 10k e 100k itens)
+# Antes das medidas, confere que o lote vazio responde 200 com a lista vazia.
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.bench_lote
+#   python -m benchmarks.bench_lote --servidor src.backend.server_random_forest
+import argparse
+import importlib
+import time
+import numpy as np
+from fastapi.testclient import TestClient
+
+from src.backend.features import COLUNAS_VEICULOS
+
+TAMANHOS_LOTE = [1, 100, 10_000, 100_000]
+
+# Limites aproximados da área urbana de Bauru
+LAT_MIN, LAT_MAX = -22.40, -22.26
+LON_MIN, LON_MAX = -49.16, -48.98
+
+
+# Função para gerar itens aleatórios dentro de Bauru
+def gerar_itens(n, rng):
+    latitudes = rng.uniform(LAT_MIN, LAT_MAX, n)
+    longitudes = rng.uniform(LON_MIN, LON_MAX, n)
+    veiculos = rng.choice(COLUNAS_VEICULOS, n)
+    return [
+        {"latitude": lat, "longitude": lon, "tp_veiculo_selecionado": veiculo}
+        for lat, lon, veiculo in zip(latitudes.tolist(), longitudes.tolist(), veiculos.tolist())
+    ]
+
+
+# Função para medir o tempo médio de uma chamada em lote
+def medir_lote(cliente, itens, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resposta = cliente.post("/calcular_risco_lote", json={"itens": itens})
+        tempos.append(time.perf_counter() - inicio)
+        resposta.raise_for_status()
+    return float(np.median(tempos))
+
+
+# Função para medir o mesmo volume enviado ponto a ponto em /calcular_risco
+def medir_unitario(cliente, itens):
+    inicio = time.perf_counter()
+    for item in itens:
+        cliente.post("/calcular_risco", json=item).raise_for_status()
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do endpoint de risco em lote")
+    parser.add_argument("--servidor", default="src.backend.server", help="Módulo do servidor FastAPI")
+    parser.add_argument("--unitario-max", type=int, default=1_000, help="Maior lote também medido ponto a ponto")
+    args = parser.parse_args()
+
+    servidor = importlib.import_module(args.servidor)
+    cliente = TestClient(servidor.app)
+    rng = np.random.default_rng(8)
+
+    # Um lote vazio responde 200 com a lista vazia (não passa pela separação por município)
+    resposta = cliente.post("/calcular_risco_lote", json={"itens": []})
+    vazio_ok = resposta.status_code == 200 and resposta.json()["resultados"] == [] and resposta.json()["quantidade"] == 0
+    print(f"Conferência do lote vazio: {'ok' if vazio_ok else f'FALHA ({resposta.status_code}: {resposta.text})'}\n")
+    if not vazio_ok:
+        raise SystemExit(1)
+
+    print(f"{'itens':>8} | {'lote (s)':>9} | {'itens/s (lote)':>14} | {'itens/s (unitário)':>18}")
+    for n in TAMANHOS_LOTE:
+        itens = gerar_itens(n, rng)
+        tempo_lote = medir_lote(cliente, itens, repeticoes=5 if n <= 10_000 else 2)
+
+        vazao_unitaria = "-"
+        if n <= args.unitario_max:
+            vazao_unitaria = f"{n / medir_unitario(cliente, itens):,.0f}"
+
+        print(f"{n:>8,} | {tempo_lote:>9.4f} | {n / tempo_lote:>14,.0f} | {vazao_unitaria:>18}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Benchmark dos clusters do mapa por zoom (src/backend/clusters_mapa.py)
+#
+# Mede a construção completa e a incremental (um mês novo), a carga no servidor, a latência p50/p99 de um
+# tile em vários zooms e o tamanho (gzip) dos tiles de uma vista do mapa, comparado ao coordenadas.json.
+# Confere que a soma dos clusters de cada tile é o número de sinistros dentro dele.
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.bench_mapa
+#   python -m benchmarks.bench_mapa --copias 100    # pontos de Bauru replicados pelo estado de SP
+import argparse
+import gzip
+import json
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_indice_sinistros import sinistros_sinteticos
+from src.backend.clusters_mapa import MapaAcidentes, celulas_mercator, construir_mapa
+
+ZOOMS = [6, 9, 12, 15]
+
+
+# Função para o tamanho (bytes, gzip) das respostas dos tiles de uma vista de 4 x 3 tiles
+def bytes_vista(clusters, z, x, y):
+    total = 0
+    for dx in range(4):
+        for dy in range(3):
+            latitudes, longitudes, totais = clusters.tile(z, x + dx, y + dy)
+            corpo = json.dumps({"z": z, "x": x + dx, "y": y + dy, "clusters": [
+                [lat, lon, n] for lat, lon, n in zip(latitudes.round(6).tolist(), longitudes.round(6).tolist(),
+                                                     totais.tolist())]}, separators=(",", ":"))
+            total += len(gzip.compress(corpo.encode()))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos clusters do mapa por zoom")
+    parser.add_argument("--coordenadas", default="frontend/public/coordenadas.json")
+    parser.add_argument("--copias", type=int, default=1, help="Cópias dos pontos espalhadas pelo estado")
+    parser.add_argument("--repeticoes", type=int, default=500)
+    args = parser.parse_args()
+
+    sinistros = sinistros_sinteticos(args.coordenadas, args.copias)[["data_sinistro", "latitude", "longitude"]]
+    with tempfile.TemporaryDirectory() as destino:
+        inicio = time.perf_counter()
+        metadados = construir_mapa(sinistros, destino)
+        print(f"{len(sinistros)} sinistros -> {sum(metadados['linhas'].values())} linhas em "
+              f"{len(metadados['particoes'])} meses: construção em {time.perf_counter() - inicio:.2f} s")
+
+        novos = sinistros.sample(min(3000, len(sinistros)), random_state=1).assign(data_sinistro="2030-01-15")
+        inicio = time.perf_counter()
+        construir_mapa(pd.concat([sinistros, novos], ignore_index=True), destino)
+        print(f"Construção incremental (um mês novo): {time.perf_counter() - inicio:.2f} s")
+        tamanho = sum(arquivo.stat().st_size for arquivo in Path(destino).rglob("*.parquet"))
+        print(f"Partições em disco: {tamanho / 1e6:.1f} MB")
+
+        inicio = time.perf_counter()
+        clusters = MapaAcidentes(destino).obter()
+        print(f"Carga no servidor: {time.perf_counter() - inicio:.2f} s")
+
+        rng = np.random.default_rng(0)
+        latitudes, longitudes = sinistros["latitude"].to_numpy(), sinistros["longitude"].to_numpy()
+        meses = pd.to_datetime(sinistros["data_sinistro"]).to_numpy().astype("datetime64[M]").astype(str)
+        print(f"\n{'zoom':>4} | {'tile p50 (ms)':>13} | {'tile p99 (ms)':>13} | {'vista 4x3 (KB gzip)':>19} | conferência")
+        for z in ZOOMS:
+            amostra = rng.integers(0, len(sinistros), args.repeticoes)
+            xs, ys = celulas_mercator(latitudes[amostra], longitudes[amostra], z)
+            tempos = []
+            for x, y in zip(xs.tolist(), ys.tolist()):
+                inicio = time.perf_counter()
+                clusters.tile(z, x, y, "2023-01", "2024-12")
+                tempos.append((time.perf_counter() - inicio) * 1000)
+
+            cx, cy = celulas_mercator(latitudes, longitudes, z)
+            no_periodo = (meses >= "2023-01") & (meses <= "2024-12")
+            erros = sum(int(clusters.tile(z, x, y, "2023-01", "2024-12")[2].sum())
+                        != int(((cx == x) & (cy == y) & no_periodo).sum()) for x, y in zip(xs[:50].tolist(), ys[:50].tolist()))
+            print(f"{z:>4} | {np.percentile(tempos, 50):>13.3f} | {np.percentile(tempos, 99):>13.3f} | "
+                  f"{bytes_vista(clusters, z, int(xs[0]) - 1, int(ys[0]) - 1) / 1024:>19.1f} | "
+                  f"{'ok' if erros == 0 else f'{erros} FALHAS'}")
+
+    bruto = Path(args.coordenadas).read_bytes()
+    print(f"\ncoordenadas.json: {len(bruto) / 1024:.0f} KB ({len(gzip.compress(bruto)) / 1024:.0f} KB gzip) "
+          f"com {args.copias} cópia(s) -> {args.copias * len(gzip.compress(bruto)) / 1024:.0f} KB gzip")
+
+
+if __name__ == "__main__":
+    main()
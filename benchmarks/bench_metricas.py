@@ -0,0 +1,136 @@
+# Benchmark do custo da instrumentação (src/backend/metricas.py)
+#
+# Mede, em microssegundos por chamada:
+# - as operações usadas no caminho da requisição (observar um histograma, incrementar um contador, marcar
+#   o início/fim do handler)
+# - o MiddlewareMetricas: a mesma aplicação ASGI mínima chamada com e sem o middleware
+# - o total por requisição do /calcular_risco (middleware + marcas + contadores + etapas do modelo)
+# - o log da predição: a linha antiga (escrita síncrona em arquivo a cada requisição), a mesma linha
+#   passando pelo QueueHandler, e a amostragem de 1%
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.bench_metricas
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+from logging.handlers import QueueListener
+import queue
+
+from src.backend.metricas import (AmostragemLog, MiddlewareMetricas, QueueHandlerLocal, RegistroMetricas,
+                                  marcar_fim_handler, marcar_inicio_handler)
+
+# Linha de features de um pedido, como a logada em /calcular_risco
+FEATURES = {"latitude": -22.3246, "longitude": -49.0871, "dia_semana": 3, "mes": 10, "is_weekend": 0, "hora": 18,
+            "Chuva": 0.0, "tipo_via_num": 0.0, "tp_veiculo_bicicleta": 0.0, "tp_veiculo_caminhao": 0.0,
+            "tp_veiculo_motocicleta": 1.0, "tp_veiculo_nao_disponivel": 0.0, "tp_veiculo_onibus": 0.0,
+            "tp_veiculo_outros": 0.0, "tp_veiculo_automovel": 0.0}
+
+
+# Função para o custo médio (µs) de uma chamada, na melhor de 'rodadas' rodadas
+def medir(funcao, repeticoes, rodadas=5):
+    tempos = []
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            funcao()
+        tempos.append((time.perf_counter() - inicio) / repeticoes * 1e6)
+    return min(tempos)
+
+
+# Aplicação ASGI mínima: uma rota fixa e uma resposta vazia
+class Rota:
+    path = "/calcular_risco"
+
+
+async def aplicacao(scope, receive, send):
+    scope["route"] = Rota
+    marcar_inicio_handler()
+    marcar_fim_handler()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receber():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def enviar(mensagem):
+    pass
+
+
+# Função para o custo médio (µs) de uma requisição passando pela aplicação
+async def medir_asgi(app, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        await app({"type": "http", "path": "/calcular_risco"}, receber, enviar)
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+# Função para um logger que escreve num arquivo: direto (síncrono) ou por uma fila com thread de fundo
+def criar_logger(nome, arquivo, em_fila):
+    logger = logging.getLogger(nome)
+    logger.propagate = False
+    handler = logging.StreamHandler(arquivo)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    if not em_fila:
+        logger.addHandler(handler)
+        return logger, None
+    fila = queue.SimpleQueue()
+    listener = QueueListener(fila, handler)
+    listener.start()
+    logger.addHandler(QueueHandlerLocal(fila))
+    return logger, listener
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do custo da instrumentação")
+    parser.add_argument("--repeticoes", type=int, default=200_000)
+    args = parser.parse_args()
+    n = args.repeticoes
+
+    metricas = RegistroMetricas()
+    duracao = metricas.histograma("duracao", "", ["rota", "status"])
+    etapas = metricas.histograma("etapas", "", ["rota", "etapa"])
+    contador = metricas.contador("avaliacoes", "", ["modelo", "interpretacao", "tp_veiculo"])
+
+    observar = medir(lambda: etapas.observar(0.0012, "xgboost", "features"), n)
+    incrementar = medir(lambda: contador.incrementar("xgboost", "ALTO", "tp_veiculo_motocicleta"), n)
+    print(f"{'operação':<52} | {'µs/chamada':>10}")
+    print(f"{'Histograma.observar':<52} | {observar:>10.3f}")
+    print(f"{'Contador.incrementar':<52} | {incrementar:>10.3f}")
+    print(f"{'marcar_inicio_handler (fora do middleware)':<52} | {medir(marcar_inicio_handler, n):>10.3f}")
+
+    app_metricas = MiddlewareMetricas(aplicacao, duracao, etapas)
+    sem = min(asyncio.run(medir_asgi(aplicacao, n)) for _ in range(5))
+    com = min(asyncio.run(medir_asgi(app_metricas, n)) for _ in range(5))
+    print(f"{'aplicação ASGI mínima, sem middleware':<52} | {sem:>10.3f}")
+    print(f"{'aplicação ASGI mínima, com MiddlewareMetricas':<52} | {com:>10.3f}")
+
+    # Além do middleware, o /calcular_risco faz 2 incrementos (origem; interpretação e veículo) e 2 observações
+    # (features e inferência, por micro-lote; no pior caso um lote por pedido)
+    por_requisicao = (com - sem) + 2 * incrementar + 2 * observar
+    print(f"{'total por requisição do /calcular_risco':<52} | {por_requisicao:>10.3f}")
+
+    with tempfile.TemporaryFile("w") as arquivo:
+        sincrono, _ = criar_logger("bench.sincrono", arquivo, em_fila=False)
+        em_fila, listener = criar_logger("bench.fila", arquivo, em_fila=True)
+        amostragem = AmostragemLog(0.01)
+
+        def log_amostrado():
+            if amostragem.deve_registrar():
+                em_fila.info(f"Dados para predição: {dict(FEATURES)}")
+
+        repeticoes_log = n // 20
+        print(f"\n{'log da predição':<52} | {'µs/chamada':>10}")
+        print(f"{'antes: escrita síncrona a cada requisição':<52} | "
+              f"{medir(lambda: sincrono.info(f'Dados para predição: {dict(FEATURES)}'), repeticoes_log):>10.3f}")
+        print(f"{'QueueHandler a cada requisição':<52} | "
+              f"{medir(lambda: em_fila.info(f'Dados para predição: {dict(FEATURES)}'), repeticoes_log):>10.3f}")
+        print(f"{'QueueHandler com amostragem de 1%':<52} | {medir(log_amostrado, repeticoes_log):>10.3f}")
+        listener.stop()
+
+
+if __name__ == "__main__":
+    main()
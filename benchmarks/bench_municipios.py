@@ -0,0 +1,209 @@
+# Benchmark do roteamento por município e da carga preguiçosa dos artefatos (src/backend/municipios.py)
+#
+# Os municípios são sintéticos: cópias de Bauru (limite = envoltória das ruas, grade de tipo de via com as
+# geometrias) deslocadas numa malha de 0,5° sobre o estado, todas com o mesmo modelos.json (modelo estadual).
+# Para cada quantidade de municípios, em um processo novo (o RSS medido é só o do caso):
+# - a montagem do roteador e a latência de localizar um ponto (grade + teste no polígono só na borda), contra
+#   a consulta direta na STRtree dos limites
+# - o caminho de uma requisição (localizar + obter o município + tipo de via + chuva + modelo compilado) com
+#   tráfego Zipf entre os municípios: latência, municípios carregados e RSS ao final, com e sem o limite de
+#   municípios carregados (LRU)
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.bench_municipios
+#   python -m benchmarks.bench_municipios --cidades 1 10 50 100 --max-carregados 8 0
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+from src.backend.enriquecimento import caminho_grade_tipo_via
+from src.backend.features import features_temporais, montar_matriz_features
+from src.backend.municipios import RegistroMunicipios, caminhos_municipio, construir_limite
+
+# Distância entre os municípios sintéticos, em graus, e municípios por linha da malha
+PASSO_GRAUS = 0.5
+COLUNAS = 10
+
+
+# Função para o RSS atual do processo (MB)
+def rss_mb():
+    with open("/proc/self/status") as file:
+        for linha in file:
+            if linha.startswith("VmRSS:"):
+                return int(linha.split()[1]) / 1024
+    return float("nan")
+
+
+# Função para gravar os artefatos de 'n' municípios sintéticos em 'pasta' e devolver o municipios.json
+def montar_municipios(pasta, n):
+    import shapely
+
+    pasta = Path(pasta)
+    limite = pasta / "limite_bauru.geojson"
+    if not limite.exists():
+        construir_limite(caminhos_municipio("BAURU")["ruas"], limite, "BAURU")
+    base = shapely.from_geojson(limite.read_text(encoding="utf-8"))
+    with np.load(caminho_grade_tipo_via) as arquivo:
+        grade = dict(arquivo)
+    bloco, fins = grade["wkb"].tobytes(), grade["fim_wkb"].tolist()
+    geometrias = shapely.from_wkb(np.array([bloco[a:b] for a, b in zip([0] + fins[:-1], fins)], dtype=object))
+
+    config = {"padrao": "CIDADE 0", "fora_dos_limites": "recusar", "municipios": {}}
+    for k in range(n):
+        nome = f"CIDADE {k}"
+        deslocamento = np.array([(k % COLUNAS) * PASSO_GRAUS, -(k // COLUNAS) * PASSO_GRAUS])  # (lon, lat)
+        destino = pasta / f"cidade_{k}"
+        if not destino.exists():
+            destino.mkdir()
+            movidas = shapely.transform(geometrias, lambda xy: xy + deslocamento)
+            wkb = shapely.to_wkb(movidas)
+            np.savez(destino / "tipo_via.npz", **{**grade, "origem": grade["origem"] + deslocamento[::-1],
+                                                  "wkb": np.frombuffer(b"".join(wkb), dtype=np.uint8),
+                                                  "fim_wkb": np.cumsum([len(g) for g in wkb])})
+            (destino / "limite.geojson").write_text(
+                shapely.to_geojson(shapely.transform(base, lambda xy: xy + deslocamento)), encoding="utf-8")
+        config["municipios"][nome] = {"grade_tipo_via": str(destino / "tipo_via.npz"),
+                                      "limite": str(destino / "limite.geojson"),
+                                      "ruas": str(destino / "sem_ruas.gpkg")}
+    caminho = pasta / f"municipios_{n}.json"
+    caminho.write_text(json.dumps(config, ensure_ascii=False), encoding="utf-8")
+    return caminho
+
+
+# Função para pontos dentro dos municípios: locais reais de Bauru deslocados para o município sorteado
+def pontos_municipios(n_cidades, quantidade, zipf, rng):
+    import pandas as pd
+
+    coordenadas = pd.read_json("frontend/public/coordenadas.json")
+    pesos = 1 / np.arange(1, n_cidades + 1) ** zipf
+    cidades = rng.choice(n_cidades, quantidade, p=pesos / pesos.sum())
+    amostra = rng.integers(0, len(coordenadas), quantidade)
+    latitudes = coordenadas["latitude"].to_numpy()[amostra] - (cidades // COLUNAS) * PASSO_GRAUS
+    longitudes = coordenadas["longitude"].to_numpy()[amostra] + (cidades % COLUNAS) * PASSO_GRAUS
+    return latitudes, longitudes, cidades
+
+
+# Função para medir um caso (n municípios, limite de carregados) no processo atual
+def medir_caso(pasta, n, max_carregados, requisicoes, zipf):
+    import shapely
+
+    rng = np.random.default_rng(0)
+    caminho = montar_municipios(pasta, n)
+    rss_inicio = rss_mb()
+    inicio = time.perf_counter()
+    municipios = RegistroMunicipios(caminho, max_carregados=max_carregados or n, chuva=None)
+    montagem_s = time.perf_counter() - inicio
+
+    latitudes, longitudes, cidades = pontos_municipios(n, requisicoes, zipf, rng)
+    pontos = list(zip(latitudes.tolist(), longitudes.tolist()))
+    tempos = []
+    for latitude, longitude in pontos[:20_000]:
+        t = time.perf_counter()
+        municipios.localizar(latitude, longitude)
+        tempos.append(time.perf_counter() - t)
+    roteamento_us = np.percentile(tempos, [50, 99]) * 1e6
+
+    # Referência: a consulta direta na STRtree dos limites, ponto a ponto
+    arvore = shapely.STRtree(municipios.roteador.limites)
+    tempos = []
+    for latitude, longitude in pontos[:5_000]:
+        t = time.perf_counter()
+        arvore.query(shapely.Point(longitude, latitude), predicate="within")
+        tempos.append(time.perf_counter() - t)
+    strtree_us = np.percentile(tempos, [50, 99]) * 1e6
+
+    # Conferência: o município de cada ponto pela grade contra o polígono que o contém (busca exata)
+    esperado = np.full(len(latitudes), -1)
+    idx_pontos, idx_limites = arvore.query(shapely.points(longitudes, latitudes), predicate="within")
+    esperado[idx_pontos] = idx_limites
+    divergencias = int((municipios.roteador.localizar_lote(latitudes, longitudes) != esperado).sum())
+    t = time.perf_counter()
+    municipios.agrupar(latitudes, longitudes)
+    lote_us = (time.perf_counter() - t) / len(latitudes) * 1e6
+
+    # Caminho da requisição: localizar, obter o município (carregando se preciso), enriquecer e prever
+    temporais = features_temporais([None])
+    tempos, cargas = [], []
+    for latitude, longitude in pontos:
+        t = time.perf_counter()
+        nome = municipios.localizar(latitude, longitude)
+        if nome is None:
+            continue
+        carregado = nome in municipios.carregados
+        municipio = municipios.obter(nome)
+        modelo = municipio.registro.obter()
+        chuva, tipo_via = municipio.enriquecimento.ponto(latitude, longitude, None)
+        matriz = montar_matriz_features([latitude], [longitude], ["tp_veiculo_automovel"],
+                                        {**temporais, "Chuva": [chuva], "tipo_via_num": [tipo_via]},
+                                        modelo.model_features, modelo.veiculo_padrao)
+        modelo.prever_riscos(matriz)
+        tempo = time.perf_counter() - t
+        (tempos if carregado else cargas).append(tempo)
+
+    return {
+        "cidades": n,
+        "max_carregados": max_carregados,
+        "montagem_s": montagem_s,
+        "celulas_borda": municipios.roteador.celulas_borda,
+        "roteamento_p50_us": roteamento_us[0], "roteamento_p99_us": roteamento_us[1],
+        "strtree_p50_us": strtree_us[0], "strtree_p99_us": strtree_us[1],
+        "lote_us": lote_us,
+        "divergencias": divergencias,
+        "requisicao_p50_us": float(np.percentile(tempos, 50) * 1e6) if tempos else None,
+        "requisicao_p99_us": float(np.percentile(tempos, 99) * 1e6) if tempos else None,
+        "cargas": len(cargas),
+        "carga_media_s": float(np.mean(cargas)) if cargas else None,
+        "carregados": len(municipios.carregados),
+        "rss_mb": rss_mb() - rss_inicio,
+        "descartes": municipios.descartes,
+        "cidades_distintas": int(len(np.unique(cidades))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do roteamento por município")
+    parser.add_argument("--cidades", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--max-carregados", type=int, nargs="+", default=[8, 0],
+                        help="Limites de municípios carregados (0 = sem limite)")
+    parser.add_argument("--requisicoes", type=int, default=5_000)
+    parser.add_argument("--zipf", type=float, default=1.5, help="Expoente do tráfego entre os municípios")
+    parser.add_argument("--sem-limite-ate", type=int, default=50,
+                        help="Maior quantidade de municípios medida sem limite (cada um ocupa ~25 MB)")
+    parser.add_argument("--pasta", help="Pasta dos municípios sintéticos (padrão: temporária)")
+    parser.add_argument("--caso", type=int, nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.caso:
+        print(json.dumps(medir_caso(args.pasta, args.caso[0], args.caso[1], args.requisicoes, args.zipf)))
+        return
+
+    with tempfile.TemporaryDirectory() as temporaria:
+        pasta = args.pasta or temporaria
+        print(f"{'municípios':>10} | {'máx':>4} | {'montagem':>8} | {'rotear p50/p99 (µs)':>19} | "
+              f"{'STRtree p50/p99':>15} | {'lote µs/pt':>10} | {'requisição p50/p99 (µs)':>23} | "
+              f"{'cargas':>6} | {'carga (s)':>9} | {'carregados':>10} | {'RSS (MB)':>8}")
+        for n in args.cidades:
+            for max_carregados in args.max_carregados:
+                # Com o limite acima da quantidade de municípios, o caso é o mesmo que sem limite
+                if (max_carregados == 0 and n > args.sem_limite_ate) or max_carregados >= n:
+                    continue
+                saida = subprocess.run([sys.executable, "-m", "benchmarks.bench_municipios", "--pasta", pasta,
+                                        "--caso", str(n), str(max_carregados), "--requisicoes", str(args.requisicoes),
+                                        "--zipf", str(args.zipf)], capture_output=True, text=True, check=True)
+                r = json.loads(saida.stdout.strip().splitlines()[-1])
+                carga = f"{r['carga_media_s']:.3f}" if r["carga_media_s"] is not None else "-"
+                print(f"{n:>10} | {max_carregados or '-':>4} | {r['montagem_s']:>6.2f} s | "
+                      f"{r['roteamento_p50_us']:>8.1f} / {r['roteamento_p99_us']:>8.1f} | "
+                      f"{r['strtree_p50_us']:>6.1f} / {r['strtree_p99_us']:>6.1f} | {r['lote_us']:>10.2f} | "
+                      f"{r['requisicao_p50_us']:>10.1f} / {r['requisicao_p99_us']:>10.1f} | {r['cargas']:>6} | "
+                      f"{carga:>9} | {r['carregados']:>10} | {r['rss_mb']:>8.0f}"
+                      + ("" if r["divergencias"] == 0 else f"  ({r['divergencias']} DIVERGÊNCIAS)"))
+
+
+if __name__ == "__main__":
+    main()
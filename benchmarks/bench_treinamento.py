@@ -0,0 +1,105 @@
+# Benchmark do treinamento com orçamento (src/treinamento/treinar.py) contra o GridSearchCV dos notebooks
+#
+# Mede, para a Random Forest:
+# - a leitura do dataset: CSV/Parquet pela camada de armazenamento contra o cache em arrays (mmap)
+# - a busca por halving sucessivo com orçamento e o ajuste final: CPU, tempo e PR-AUC do vencedor no teste
+# - o GridSearchCV de random_forest.ipynb (81 configurações × 3 dobras). Com --grade-completa, ele roda de
+#   verdade; sem, o custo é estimado pela CPU por árvore de cada configuração medida na primeira rodada da
+#   busca × as árvores que a grade ajusta (200 + 300 + 400 por configuração e dobra)
+# - o PR-AUC no teste do modelo final do notebook (400 árvores, max_depth=None, min_samples_leaf=2,
+#   min_samples_split=5), para comparar a qualidade
+# Tudo com um processo por vez (n_jobs=1), para o tempo de CPU ser comparável.
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.bench_treinamento --dados dataset_final_para_modelo_1_100.parquet
+#   python -m benchmarks.bench_treinamento --dados dataset_final_para_modelo_1_4.csv --grade-completa
+import argparse
+import tempfile
+import time
+import numpy as np
+
+from src.pre_processamento.armazenamento import carregar
+from src.treinamento.dados import carregar_dados
+from src.treinamento.treinar import BuscaHalving, ajustar_final, criar_estimador
+
+# Grade de random_forest.ipynb, com n_estimators
+GRADE_NOTEBOOK = {"n_estimators": [200, 300, 400], "max_depth": [10, 20, None], "min_samples_leaf": [2, 4, 6],
+                  "min_samples_split": [5, 10, 15]}
+FINAL_NOTEBOOK = {"max_depth": None, "min_samples_leaf": 2, "min_samples_split": 5}
+
+
+# Função para o PR-AUC no teste de um estimador ajustado no treino inteiro
+def pr_auc_teste(estimador, dados):
+    from sklearn.metrics import average_precision_score
+
+    return average_precision_score(dados.y[dados.teste], estimador.predict_proba(dados.X[dados.teste])[:, 1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do treinamento com orçamento")
+    parser.add_argument("--dados", default="dataset_final_para_modelo_1_100.parquet")
+    parser.add_argument("--orcamento-cpu-s", type=float, default=1800)
+    parser.add_argument("--grade-completa", action="store_true", help="Roda o GridSearchCV do notebook de verdade")
+    parser.add_argument("--sem-final-notebook", action="store_true", help="Não ajusta o modelo final do notebook")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    carregar(args.dados)
+    leitura_s = time.perf_counter() - inicio
+
+    with tempfile.TemporaryDirectory() as cache:
+        inicio = time.perf_counter()
+        carregar_dados(args.dados, cache)
+        construcao_s = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        dados = carregar_dados(args.dados, cache)
+        X = np.asarray(dados.X[dados.treino])
+        cache_s = time.perf_counter() - inicio
+        print(f"Dataset: {dados.metadados['linhas']} linhas ({dados.metadados['positivos']} positivos)")
+        print(f"Leitura pela camada de armazenamento: {leitura_s:.2f} s | cache em arrays: construção "
+              f"{construcao_s:.2f} s, abertura + treino em memória {cache_s:.3f} s")
+
+        inicio = time.perf_counter()
+        busca = BuscaHalving(dados, "random_forest", orcamento_cpu_s=args.orcamento_cpu_s)
+        vencedor = busca.executar()
+        estado = busca.estado[vencedor]
+        estimador, metricas, _, cpu_final = ajustar_final(dados, "random_forest", busca.configs[vencedor],
+                                                          estado["arvores_melhor"], busca.proporcao_negativos, n_jobs=1)
+        tempo_busca_s = time.perf_counter() - inicio
+        cpu_busca = busca.cpu_s + cpu_final
+
+        # Estimativa do GridSearchCV: CPU por árvore (soma das dobras) da primeira rodada × árvores da grade
+        arvores_grade = sum(GRADE_NOTEBOOK["n_estimators"])
+        cpu_grade = sum(busca.cpu_por_arvore(i) for i in range(len(busca.configs))) * arvores_grade
+        pr_auc_grade = None
+        if args.grade_completa:
+            from sklearn.ensemble import RandomForestClassifier
+            from sklearn.model_selection import GridSearchCV
+
+            inicio_cpu = time.process_time()
+            grade = GridSearchCV(RandomForestClassifier(random_state=8, class_weight="balanced", n_jobs=1),
+                                 GRADE_NOTEBOOK, scoring="average_precision", cv=3)
+            grade.fit(X, dados.y[dados.treino])
+            cpu_grade = time.process_time() - inicio_cpu
+            pr_auc_grade = pr_auc_teste(grade.best_estimator_, dados)
+            print(f"GridSearchCV: melhor {grade.best_params_} (PR-AUC na validação {grade.best_score_:.4f})")
+
+        if not args.sem_final_notebook and pr_auc_grade is None:
+            final = criar_estimador("random_forest", {**FINAL_NOTEBOOK, "n_estimators": 400, "warm_start": False}, None)
+            final.fit(X, dados.y[dados.treino])
+            pr_auc_grade = pr_auc_teste(final, dados)
+
+    print(f"\n{'treinamento':<44} | {'CPU':>9} | {'PR-AUC teste':>12}")
+    print(f"{'GridSearchCV do notebook' + ('' if args.grade_completa else ' (estimado)'):<44} | "
+          f"{cpu_grade / 60:>7.1f} m | {pr_auc_grade if pr_auc_grade is not None else float('nan'):>12.4f}")
+    print(f"{f'halving sucessivo, orçamento {args.orcamento_cpu_s / 60:.0f} min':<44} | {cpu_busca / 60:>7.1f} m | "
+          f"{metricas['pr_auc']:>12.4f}")
+    print(f"\nVencedor: {busca.configs[vencedor]} com {estado['arvores_melhor']} árvores; tempo total {tempo_busca_s:.0f} s"
+          f"{' (busca interrompida pelo orçamento)' if busca.interrompida else ''}")
+    for linha in busca.historico[1:]:
+        print(f"  rodada {linha['rodada']}: {linha['configuracoes']} configurações, {linha['arvores']} árvores, "
+              f"{linha['cpu_s']:.0f} s de CPU, melhor PR-AUC {linha['melhor_pr_auc']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
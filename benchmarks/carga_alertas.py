@@ -0,0 +1,128 @@
+# Teste de carga do canal de alertas (/ws/alertas) com muitos motoristas simultâneos
+#
+# Sobe o servidor com uvicorn (1 processo) e abre N conexões WebSocket. Cada motorista parte de um
+# ponto aleatório de Bauru e anda em linha reta a 'velocidade' m/s, enviando uma posição GPS a cada
+# 'intervalo' segundos. As conexões são abertas ao longo de 'rampa' segundos. Depois da rampa, uma sonda
+# chama /readiness para medir se o event loop continua respondendo com todas as conexões abertas.
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.carga_alertas
+#   python -m benchmarks.carga_alertas --motoristas 100 1000 5000 --duracao 30
+import argparse
+import asyncio
+import json
+import time
+import httpx
+import numpy as np
+from websockets.asyncio.client import connect
+
+from benchmarks.bench_lote import LAT_MIN, LAT_MAX, LON_MIN, LON_MAX
+from benchmarks.carga_concorrente import subir_servidor
+
+# Metros por grau de latitude (aproximação suficiente para simular o deslocamento)
+METROS_POR_GRAU = 111_320
+
+
+# Função para simular um motorista: conecta, envia posições e conta os alertas recebidos
+async def motorista(url, rng, rampa, duracao, intervalo, velocidade, resultado):
+    # As conexões são abertas ao longo da rampa, como motoristas chegando aos poucos
+    await asyncio.sleep(rng.uniform(0, rampa))
+    lat, lon = rng.uniform(LAT_MIN, LAT_MAX), rng.uniform(LON_MIN, LON_MAX)
+    rumo = rng.uniform(0, 2 * np.pi)
+    passo = velocidade * intervalo / METROS_POR_GRAU
+    d_lat, d_lon = passo * np.cos(rumo), passo * np.sin(rumo) / np.cos(np.radians(lat))
+
+    inicio = time.perf_counter()
+    try:
+        async with connect(url, open_timeout=60, ping_interval=None) as ws:
+            resultado["conectados"] += 1
+            resultado["tempos_conexao"].append(time.perf_counter() - inicio)
+
+            async def receber():
+                async for mensagem in ws:
+                    resultado["alertas" if json.loads(mensagem)["tipo"] == "alerta" else "erros"] += 1
+
+            receptor = asyncio.create_task(receber())
+            # Espalha o início dos motoristas dentro do primeiro intervalo
+            await asyncio.sleep(rng.uniform(0, intervalo))
+            fim = time.perf_counter() + duracao
+            while time.perf_counter() < fim:
+                await ws.send(json.dumps({"latitude": lat, "longitude": lon}))
+                resultado["posicoes"] += 1
+                lat, lon = lat + d_lat, lon + d_lon
+                await asyncio.sleep(intervalo)
+            await asyncio.sleep(1.0)  # alertas ainda em trânsito
+            receptor.cancel()
+    except Exception:
+        resultado["falhas_conexao"] += 1
+
+
+# Função para medir a latência do servidor durante a carga
+async def sonda(url, fim, latencias):
+    async with httpx.AsyncClient(base_url=url, timeout=30.0) as cliente:
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            try:
+                await cliente.get("/readiness")
+            except httpx.HTTPError:
+                pass  # conta como a latência até o timeout
+            latencias.append(time.perf_counter() - inicio)
+            await asyncio.sleep(0.1)
+
+
+async def rodar(porta, n_motoristas, rampa, duracao, intervalo, velocidade, veiculo):
+    url = f"ws://127.0.0.1:{porta}/ws/alertas?tp_veiculo_selecionado={veiculo}"
+    resultado = {"conectados": 0, "falhas_conexao": 0, "posicoes": 0, "alertas": 0, "erros": 0, "tempos_conexao": []}
+    latencias = []
+    rng = np.random.default_rng(n_motoristas)
+
+    inicio = time.perf_counter()
+    tarefas = [
+        asyncio.create_task(motorista(url, np.random.default_rng(rng.integers(1 << 32)), rampa, duracao, intervalo,
+                                      velocidade, resultado))
+        for _ in range(n_motoristas)
+    ]
+    # A sonda mede a fase estável: depois da rampa, com todas as conexões abertas
+    await asyncio.sleep(rampa + intervalo)
+    await sonda(f"http://127.0.0.1:{porta}", time.perf_counter() + duracao - rampa - intervalo, latencias)
+    await asyncio.gather(*tarefas)
+
+    resultado["tempo_total_s"] = time.perf_counter() - inicio
+    resultado["readiness_ms"] = np.array(latencias) * 1000
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do canal de alertas por WebSocket")
+    parser.add_argument("--motoristas", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--duracao", type=float, default=30.0, help="Segundos enviando posições (por motorista)")
+    parser.add_argument("--rampa", type=float, default=10.0, help="Segundos ao longo dos quais as conexões são abertas")
+    parser.add_argument("--intervalo", type=float, default=1.0, help="Segundos entre posições de um motorista")
+    parser.add_argument("--velocidade", type=float, default=12.0, help="Velocidade dos motoristas (m/s)")
+    parser.add_argument("--veiculo", default="tp_veiculo_automovel")
+    parser.add_argument("--porta", type=int, default=8766)
+    args = parser.parse_args()
+
+    print(f"{'motoristas':>10} | {'conectados':>10} | {'posições/s':>10} | {'avaliadas':>9} | {'alertas':>7} | "
+          f"{'conexão p99 (ms)':>16} | {'readiness p50/p99 (ms)':>22}")
+    for n_motoristas in args.motoristas:
+        processo = subir_servidor(args.porta, {})
+        try:
+            r = asyncio.run(rodar(args.porta, n_motoristas, args.rampa, args.duracao, args.intervalo, args.velocidade,
+                                  args.veiculo))
+            servidor = httpx.get(f"http://127.0.0.1:{args.porta}/healthcheck").json()["alertas"]
+        finally:
+            processo.terminate()
+            processo.wait()
+
+        conexao_p99 = np.percentile(r["tempos_conexao"], 99) * 1000 if r["tempos_conexao"] else float("nan")
+        readiness = r["readiness_ms"]
+        print(f"{n_motoristas:>10,} | {r['conectados']:>10,} | {r['posicoes'] / args.duracao:>10,.0f} | "
+              f"{servidor['avaliadas'] / max(servidor['posicoes'], 1):>9.0%} | {r['alertas']:>7,} | "
+              f"{conexao_p99:>16.0f} | {np.percentile(readiness, 50):>10.1f} / {np.percentile(readiness, 99):>9.1f}")
+        if r["falhas_conexao"] or r["erros"]:
+            print(f"{'':>10}   falhas de conexão: {r['falhas_conexao']}, erros: {r['erros']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# Teste de carga do /calcular_risco com clientes concorrentes (1, 50 e 500)
+#
+# Sobe o servidor com uvicorn em um subprocesso, uma vez com o executor de micro-lotes e outra rodando
+# o modelo direto no event loop, e mede a vazão e a latência com N clientes HTTP simultâneos.
+# O cubo e o cache ficam desativados para que toda requisição passe pelo modelo.
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.carga_concorrente
+#   python -m benchmarks.carga_concorrente --clientes 1 50 500 --duracao 15 --modelo random_forest
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import httpx
+import numpy as np
+
+from benchmarks.bench_lote import gerar_itens
+
+MODOS = {
+    "micro-lotes": {"RISCO_MICRO_LOTES": "1"},
+    "event loop": {"RISCO_MICRO_LOTES": "0"},
+}
+
+# Sem cubo e sem cache: toda requisição passa pelo modelo
+SEM_CUBO_E_CACHE = {"RISCO_USAR_CUBO": "0", "RISCO_CACHE_TAMANHO": "0"}
+
+
+# Função para subir o servidor e esperar o /readiness responder 200
+def subir_servidor(porta, env_extra, workers=1):
+    env = {**os.environ, **env_extra}
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.backend.server:app", "--port", str(porta),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    limite = time.time() + 60
+    while time.time() < limite:
+        try:
+            if httpx.get(f"http://127.0.0.1:{porta}/readiness").status_code == 200:
+                return processo
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    processo.kill()
+    raise RuntimeError("Servidor não ficou pronto em 60 s.")
+
+
+# Função para montar a requisição HTTP/1.1 já codificada (keep-alive)
+def montar_requisicao(porta, item):
+    corpo = json.dumps(item).encode()
+    cabecalho = (
+        f"POST /calcular_risco HTTP/1.1\r\nHost: 127.0.0.1:{porta}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(corpo)}\r\n\r\n"
+    ).encode()
+    return cabecalho + corpo
+
+
+# Função para montar um GET HTTP/1.1 já codificado (keep-alive)
+def montar_get(porta, caminho):
+    return f"GET {caminho} HTTP/1.1\r\nHost: 127.0.0.1:{porta}\r\n\r\n".encode()
+
+
+# Função para ler uma resposta HTTP/1.1 e devolver o status
+async def ler_resposta(leitor):
+    cabecalho = await leitor.readuntil(b"\r\n\r\n")
+    linhas = cabecalho.decode("latin-1").split("\r\n")
+    tamanho = next(int(l.split(":", 1)[1]) for l in linhas if l.lower().startswith("content-length:"))
+    await leitor.readexactly(tamanho)
+    return int(linhas[0].split(" ", 2)[1])
+
+
+# Função para rodar 'n_clientes' clientes em paralelo durante 'duracao' segundos
+# O cliente HTTP é mínimo (uma conexão keep-alive por cliente, requisições pré-codificadas): com o
+# cliente e o servidor na mesma máquina, um cliente completo como o httpx vira o gargalo da medição.
+async def rodar_carga(porta, n_clientes, duracao, requisicoes):
+    latencias, erros = [], 0
+    fim = time.perf_counter() + duracao
+
+    async def cliente_individual(k):
+        nonlocal erros
+        leitor, escritor = await asyncio.open_connection("127.0.0.1", porta)
+        i = k
+        try:
+            while time.perf_counter() < fim:
+                inicio = time.perf_counter()
+                escritor.write(requisicoes[i % len(requisicoes)])
+                try:
+                    ok = await ler_resposta(leitor) == 200
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    erros += 1
+                    return
+                if ok:
+                    latencias.append(time.perf_counter() - inicio)
+                else:
+                    erros += 1
+                i += n_clientes
+        finally:
+            escritor.close()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente_individual(k) for k in range(n_clientes)))
+    tempo_total = time.perf_counter() - inicio
+
+    latencias = np.array(latencias) * 1000
+    return {
+        "req_s": len(latencias) / tempo_total,
+        "p50_ms": float(np.percentile(latencias, 50)) if len(latencias) else float("nan"),
+        "p95_ms": float(np.percentile(latencias, 95)) if len(latencias) else float("nan"),
+        "p99_ms": float(np.percentile(latencias, 99)) if len(latencias) else float("nan"),
+        "erros": erros,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do /calcular_risco com clientes concorrentes")
+    parser.add_argument("--clientes", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--duracao", type=float, default=10.0, help="Segundos de carga por medição")
+    parser.add_argument("--modelo", default=None, help="Nome do modelo em modelos.json (padrão: o do servidor)")
+    parser.add_argument("--porta", type=int, default=8765)
+    args = parser.parse_args()
+
+    itens = gerar_itens(5_000, np.random.default_rng(8))
+    if args.modelo:
+        itens = [dict(item, modelo=args.modelo) for item in itens]
+    requisicoes = [montar_requisicao(args.porta, item) for item in itens]
+    print(f"{'modo':>12} | {'clientes':>8} | {'req/s':>8} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | {'erros':>5}")
+    for modo, env_extra in MODOS.items():
+        processo = subir_servidor(args.porta, {**SEM_CUBO_E_CACHE, **env_extra})
+        try:
+            for n_clientes in args.clientes:
+                r = asyncio.run(rodar_carga(args.porta, n_clientes, args.duracao, requisicoes))
+                print(f"{modo:>12} | {n_clientes:>8} | {r['req_s']:>8,.0f} | {r['p50_ms']:>9.1f} | "
+                      f"{r['p99_ms']:>9.1f} | {r['erros']:>5}")
+            executor = httpx.get(f"http://127.0.0.1:{args.porta}/healthcheck").json()["executor"]
+            if executor:
+                print(f"{'':>12}   lotes: {executor['lotes']:,}, tamanho médio {executor['tamanho_medio_lote']}, "
+                      f"maior {executor['maior_lote']}")
+        finally:
+            processo.terminate()
+            processo.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+# Suíte de benchmarks e testes de carga da API de risco, com baseline de regressão
+#
+# Roda tudo offline, na própria máquina:
+# 1. Micro-benchmarks, para cada modelo de modelos.json: montagem da matriz de features, predict_proba do
+#    artefato original e prever_riscos (o caminho usado pelo servidor, com o avaliador compilado)
+# 2. Para cada modelo, sobe o uvicorn com ele como padrão (cubo e cache desativados) e mede:
+#    - partida a frio: do processo novo até o /readiness responder 200 (e o tempo informado pelo servidor)
+#    - carga HTTP em /calcular_risco e /healthcheck com vários níveis de concorrência (req/s, p50/p95/p99)
+#    - memória de cada worker (RSS e pico de RSS) depois da carga
+# 3. Compara as métricas com benchmarks/baseline.json e termina com código 1 se alguma piorou além da
+#    tolerância. Métricas ausentes de um dos lados (ex: artefato que não existe nesta máquina) só geram aviso.
+#
+# O baseline vale para a máquina em que foi gravado: ao trocar de máquina, grave um novo com --gravar-baseline.
+#
+# Uso (na raiz do projeto):
+#   python -m benchmarks.suite
+#   python -m benchmarks.suite --clientes 1 16 64 --duracao 5 --saida resultado.json
+#   python -m benchmarks.suite --gravar-baseline
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import warnings
+from pathlib import Path
+import httpx
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_lote import gerar_itens
+from benchmarks.carga_concorrente import SEM_CUBO_E_CACHE, montar_get, montar_requisicao, rodar_carga, subir_servidor
+from src.backend.features import features_temporais, montar_matriz_features
+from src.backend.registro_modelos import RegistroModelos
+
+CAMINHO_BASELINE = Path(__file__).parent / "baseline.json"
+CAMINHO_MODELOS = Path("src/model/modelos.json")
+TAMANHOS_LOTE = [1, 256]
+
+# Tolerância relativa por sufixo da métrica e folga absoluta (abaixo dela a diferença é ruído de medição)
+# req_s: maior é melhor; o resto: menor é melhor
+TOLERANCIAS = {
+    "_req_s": (0.30, 0.0),
+    "_p50_ms": (0.50, 0.02),
+    "_p95_ms": (0.75, 0.05),
+    "_p99_ms": (2.00, 1.00),
+    "_rss_mb": (0.20, 10.0),
+    "_s": (0.50, 0.25),
+}
+
+
+# Função para medir a latência de cada chamada (em ms) -> p50, p95, p99
+# A primeira chamada fica de fora (desserialização preguiçosa do artefato, caches do numpy/pandas). Cada
+# percentil é o menor entre 'rodadas' passagens pelas entradas, para que outro processo disputando a CPU
+# durante uma passagem não vire uma falsa regressão.
+def medir(funcao, entradas, rodadas):
+    funcao(entradas[0])
+    percentis = []
+    for _ in range(rodadas):
+        tempos = []
+        for entrada in entradas:
+            inicio = time.perf_counter()
+            funcao(entrada)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        percentis.append(np.percentile(tempos, [50, 95, 99]))
+    return {f"p{p}_ms": float(valor) for p, valor in zip((50, 95, 99), np.min(percentis, axis=0))}
+
+
+# Função para os micro-benchmarks de um modelo (sem HTTP)
+def micro_benchmarks(modelo, itens, repeticoes, rodadas):
+    metricas = {}
+    temporais_por_tamanho = {tamanho: features_temporais([None] * tamanho) for tamanho in TAMANHOS_LOTE}
+    for tamanho in TAMANHOS_LOTE:
+        inicios = np.random.default_rng(tamanho).integers(0, len(itens) - tamanho, repeticoes)
+        lotes = [itens[i:i + tamanho] for i in inicios]
+
+        def montar(lote):
+            return montar_matriz_features([item["latitude"] for item in lote], [item["longitude"] for item in lote],
+                                          [item["tp_veiculo_selecionado"] for item in lote],
+                                          temporais_por_tamanho[tamanho], modelo.model_features, modelo.veiculo_padrao)
+
+        matrizes = [montar(lote) for lote in lotes]
+        quadros = [pd.DataFrame(matriz, columns=modelo.model_features) for matriz in matrizes]
+        medicoes = {
+            "features": medir(montar, lotes, rodadas),
+            "predict_proba": medir(lambda quadro: modelo.model.predict_proba(quadro)[:, 1], quadros, rodadas),
+            "prever_riscos": medir(modelo.prever_riscos, matrizes, rodadas),
+        }
+        for etapa, percentis in medicoes.items():
+            for nome, valor in percentis.items():
+                metricas[f"micro.{modelo.nome}.{etapa}.{tamanho}_{nome}"] = valor
+    return metricas
+
+
+# Função para os PIDs dos workers do uvicorn: com --workers 1 o próprio processo atende as requisições
+def pids_workers(pid):
+    workers = []
+    for entrada in Path("/proc").iterdir():
+        if not entrada.name.isdigit():
+            continue
+        try:
+            estado = (entrada / "stat").read_text()
+            linha_comando = (entrada / "cmdline").read_bytes()
+        except OSError:
+            continue
+        # O ppid é o 2º campo depois do nome do processo (que pode ter espaços); o supervisor também tem um
+        # filho que só rastreia semáforos, sem o app carregado, por isso só contam os de spawn_main
+        if int(estado.rsplit(")", 1)[1].split()[1]) == pid and b"spawn_main" in linha_comando:
+            workers.append(int(entrada.name))
+    return sorted(workers) or [pid]
+
+
+# Função para o RSS atual e o pico de RSS (MB) de um processo, lidos de /proc/<pid>/status
+def memoria_processo(pid):
+    campos = {}
+    for linha in (Path("/proc") / str(pid) / "status").read_text().splitlines():
+        chave, _, valor = linha.partition(":")
+        if chave in ("VmRSS", "VmHWM"):
+            campos[chave] = int(valor.split()[0]) / 1024
+    return campos.get("VmRSS", float("nan")), campos.get("VmHWM", float("nan"))
+
+
+# Função para os testes via HTTP de um modelo: partida a frio, carga e memória por worker
+def testes_http(nome, args, itens):
+    metricas = {}
+    inicio = time.perf_counter()
+    processo = subir_servidor(args.porta, {**SEM_CUBO_E_CACHE, "RISCO_MODELO_PADRAO": nome}, args.workers)
+    metricas[f"http.{nome}.partida_a_frio_s"] = time.perf_counter() - inicio
+    try:
+        prontidao = httpx.get(f"http://127.0.0.1:{args.porta}/readiness").json()
+        metricas[f"http.{nome}.inicializacao_servidor_s"] = prontidao["tempo_inicializacao_s"]
+
+        endpoints = {
+            "calcular_risco": [montar_requisicao(args.porta, item) for item in itens],
+            "healthcheck": [montar_get(args.porta, "/healthcheck")],
+        }
+        for endpoint, requisicoes in endpoints.items():
+            for n_clientes in args.clientes:
+                r = asyncio.run(rodar_carga(args.porta, n_clientes, args.duracao, requisicoes))
+                if r["erros"]:
+                    print(f"  aviso: {r['erros']} erros em {endpoint} com {n_clientes} clientes")
+                for chave in ("req_s", "p50_ms", "p95_ms", "p99_ms"):
+                    metricas[f"http.{nome}.{endpoint}.c{n_clientes}_{chave}"] = r[chave]
+
+        for k, pid in enumerate(pids_workers(processo.pid)):
+            rss, pico = memoria_processo(pid)
+            metricas[f"http.{nome}.worker{k}.atual_rss_mb"] = rss
+            metricas[f"http.{nome}.worker{k}.pico_rss_mb"] = pico
+    finally:
+        processo.terminate()
+        processo.wait()
+    return metricas
+
+
+# Função para decidir se uma métrica piorou em relação ao baseline
+def piorou(nome, base, atual, tolerancias):
+    sufixo = next((s for s in tolerancias if nome.endswith(s)), None)
+    if sufixo is None:
+        return False
+    relativa, absoluta = tolerancias[sufixo]
+    if sufixo == "_req_s":
+        return atual < base * (1 - relativa) and base - atual > absoluta
+    return atual > base * (1 + relativa) and atual - base > absoluta
+
+
+# Função para comparar as métricas com o baseline -> lista de (nome, base, atual, piorou)
+def comparar(metricas, baseline):
+    tolerancias = {**TOLERANCIAS, **{s: tuple(t) for s, t in baseline.get("tolerancias", {}).items()}}
+    comparacoes = []
+    for nome in sorted(set(metricas) | set(baseline["metricas"])):
+        base, atual = baseline["metricas"].get(nome), metricas.get(nome)
+        comparacoes.append((nome, base, atual, base is not None and atual is not None
+                            and piorou(nome, base, atual, tolerancias)))
+    return comparacoes
+
+
+def descrever_maquina():
+    return {"python": platform.python_version(), "sistema": platform.platform(), "cpus": os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suíte de benchmarks e testes de carga da API de risco")
+    parser.add_argument("--modelos", nargs="+", help="Modelos de modelos.json (padrão: todos com artefato em disco)")
+    parser.add_argument("--clientes", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--duracao", type=float, default=5.0, help="Segundos de carga por medição")
+    parser.add_argument("--repeticoes", type=int, default=100, help="Chamadas por rodada de micro-benchmark")
+    parser.add_argument("--rodadas", type=int, default=3, help="Rodadas de micro-benchmark (vale a melhor)")
+    parser.add_argument("--workers", type=int, default=1, help="Workers do uvicorn")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--sem-http", action="store_true", help="Só os micro-benchmarks")
+    parser.add_argument("--baseline", default=str(CAMINHO_BASELINE))
+    parser.add_argument("--gravar-baseline", action="store_true", help="Grava as métricas desta execução como baseline")
+    parser.add_argument("--saida", help="Arquivo JSON para as métricas desta execução")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    registro = RegistroModelos(CAMINHO_MODELOS)
+    nomes = args.modelos or [nome for nome, config in registro.configs.items()
+                             if (CAMINHO_MODELOS.parent / config["arquivo"]).exists()]
+    itens = gerar_itens(5_000, np.random.default_rng(8))
+    configuracao = {"clientes": args.clientes, "duracao": args.duracao, "repeticoes": args.repeticoes,
+                    "rodadas": args.rodadas, "workers": args.workers, "sem_http": args.sem_http}
+
+    metricas = {}
+    for nome in nomes:
+        print(f"Modelo '{nome}': micro-benchmarks...")
+        metricas.update(micro_benchmarks(registro.obter(nome), itens, args.repeticoes, args.rodadas))
+        if not args.sem_http:
+            print(f"Modelo '{nome}': partida a frio e carga HTTP...")
+            metricas.update(testes_http(nome, args, [dict(item, modelo=nome) for item in itens]))
+
+    if args.saida:
+        Path(args.saida).write_text(json.dumps({"maquina": descrever_maquina(), "configuracao": configuracao,
+                                                "metricas": metricas}, indent=2))
+
+    caminho_baseline = Path(args.baseline)
+    if args.gravar_baseline:
+        caminho_baseline.write_text(json.dumps({
+            "gravado_em": time.strftime("%Y-%m-%d"), "maquina": descrever_maquina(), "configuracao": configuracao,
+            "tolerancias": {s: list(t) for s, t in TOLERANCIAS.items()}, "metricas": metricas,
+        }, indent=2, ensure_ascii=False) + "\n")
+        print(f"\nBaseline gravado em {caminho_baseline} ({len(metricas)} métricas).")
+        return
+
+    if not caminho_baseline.exists():
+        for nome, valor in sorted(metricas.items()):
+            print(f"{nome:<58} | {valor:>10.3f}")
+        print(f"\nSem baseline em {caminho_baseline}: nada a comparar (grave um com --gravar-baseline).")
+        return
+
+    with open(caminho_baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    if baseline.get("configuracao") != configuracao or baseline.get("maquina") != descrever_maquina():
+        print("aviso: configuração ou máquina diferente da do baseline; as comparações podem não valer.")
+
+    comparacoes = comparar(metricas, baseline)
+    print(f"\n{'métrica':<58} | {'baseline':>10} | {'atual':>10} | {'variação':>8} |")
+    for nome, base, atual, regressao in comparacoes:
+        if base is not None and atual is not None:
+            variacao = f"{(atual / base - 1) * 100:+.0f}%" if base else ""
+            print(f"{nome:<58} | {base:>10.3f} | {atual:>10.3f} | {variacao:>8} | {'PIOROU' if regressao else 'ok'}")
+    ausentes = [nome for nome, _, atual, _ in comparacoes if atual is None]
+    novas = [nome for nome, base, _, _ in comparacoes if base is None]
+    if ausentes:
+        print(f"\naviso: {len(ausentes)} métrica(s) do baseline não medida(s) nesta execução (ex: {ausentes[0]})")
+    if novas:
+        print(f"aviso: {len(novas)} métrica(s) sem baseline (ex: {novas[0]})")
+
+    regressoes = [nome for nome, _, _, regressao in comparacoes if regressao]
+    if regressoes:
+        print(f"\n{len(regressoes)} métrica(s) piorou(aram) além da tolerância.")
+        sys.exit(1)
+    print("\nNenhuma regressão em relação ao baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+# Avaliação offline dos modelos registrados (substitui a comparação em analise_pr_auc.ipynb, xgboost*.ipynb,
+# svm.ipynb e mlp.ipynb)
+#
+# Cada notebook relê o dataset, refaz a previsão e recalcula as curvas por conta própria, e os limiares do
+# servidor (0.5 / 0.2 em server.py, 0.5 / 0.3 em server_random_forest.py) foram escolhidos à mão. Aqui:
+# - O teste é o da divisão em cache de src/treinamento/dados.py (a mesma 70/30 dos notebooks), igual para todos
+# - Cada artefato (os de modelos.json e os passados em --artefato) é carregado pelo registro do servidor e
+#   avaliado uma única vez: a previsão fica em data/avaliacao/<dataset>/previsoes/<sha256 do artefato>.npy,
+#   uma coluna por artefato, junto com o custo de inferência medido na mesma passada. Nas execuções seguintes
+#   só os artefatos novos (ou alterados) são carregados; o cache inteiro é descartado se o dataset mudar
+# - As métricas saem de uma ordenação por modelo: PR-AUC (average precision, como o average_precision_score)
+#   e ROC-AUC das contagens acumuladas, calibração em faixas de 0.1 (Brier e ECE) e a varredura completa dos
+#   pares de limiares MÉDIO < ALTO (de 0.01 em 0.01, mais os limiares configurados) com searchsorted nas
+#   probabilidades ordenadas dos positivos e dos negativos
+# - Os limiares sugeridos: ALTO no F1 máximo e MÉDIO no maior limiar que ainda cobre --cobertura dos sinistros
+#   com ALTO + MÉDIO. A precisão depende da proporção de negativos do dataset (1:100, 1:4...), não da real
+# - Recortes por hora, tipo de veículo e tipo de via, com PR-AUC, ROC-AUC e os níveis nos limiares configurados
+# - Custo por modelo: carga pelo registro, desserialização do .pkl, µs/linha no lote e p50/p99 de uma linha
+#
+# Uso (na raiz do projeto):
+#   python -m src.avaliacao.avaliar --dados dataset_final_para_modelo_1_100.parquet
+#   python -m src.avaliacao.avaliar --artefato src/model/modelo_risco_viario_RF_<versao>.pkl
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from src.backend.cubo_risco import hash_arquivo
+from src.backend.features import COLUNAS_VEICULOS
+from src.backend.registro_modelos import ModeloRegistrado
+from src.treinamento.dados import carregar_dados
+from src.treinamento.treinar import FAMILIAS, caminho_manifesto, caminho_modelos, raiz_projeto
+
+caminho_avaliacao = raiz_projeto / "data" / "avaliacao"
+
+# Limiares da varredura (os configurados em modelos.json entram também)
+LIMIARES = np.round(np.arange(0.01, 1.0, 0.01), 2)
+FAIXAS_CALIBRACAO = 10
+COBERTURA_PADRAO = 0.9
+
+# Linhas usadas na latência de uma linha (caminho compilado do servidor)
+LINHAS_LATENCIA = 1_000
+
+
+# Função para as contagens acumuladas de positivos e negativos a cada probabilidade distinta (da maior para a menor)
+def curva(y, p):
+    ordem = np.argsort(p, kind="stable")[::-1]
+    p, y = p[ordem], y[ordem]
+    fim = np.r_[np.flatnonzero(np.diff(p)), len(p) - 1]
+    tp = np.cumsum(y, dtype=np.int64)[fim]
+    fp = fim + 1 - tp
+    return p[fim], tp, fp
+
+
+# Função para o PR-AUC (average precision) e o ROC-AUC a partir das contagens acumuladas
+def aucs(tp, fp):
+    if len(tp) == 0 or tp[-1] == 0 or fp[-1] == 0:
+        return float("nan"), float("nan")
+    recall = tp / tp[-1]
+    pr_auc = np.sum(np.diff(recall, prepend=0) * tp / (tp + fp))
+    roc_auc = np.trapezoid(np.r_[0, recall], np.r_[0, fp / fp[-1]])
+    return float(pr_auc), float(roc_auc)
+
+
+# Função para a calibração em faixas iguais de probabilidade
+def calibracao(y, p, faixas=FAIXAS_CALIBRACAO):
+    faixa = np.minimum((p * faixas).astype(int), faixas - 1)
+    linhas = np.bincount(faixa, minlength=faixas)
+    soma_p = np.bincount(faixa, weights=p, minlength=faixas)
+    positivos = np.bincount(faixa, weights=y, minlength=faixas)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media_p, taxa = soma_p / linhas, positivos / linhas
+    ece = np.nansum(linhas / len(p) * np.abs(media_p - taxa))
+    return {
+        "brier": float(np.mean((p - y) ** 2)),
+        "ece": float(ece),
+        "faixas": [{"de": i / faixas, "ate": (i + 1) / faixas, "linhas": int(linhas[i]),
+                    "media_prevista": None if linhas[i] == 0 else round(float(media_p[i]), 4),
+                    "taxa_observada": None if linhas[i] == 0 else round(float(taxa[i]), 4)}
+                   for i in range(faixas)],
+    }
+
+
+# Função para os positivos e negativos com probabilidade >= cada limiar
+def acima(y, p, limiares):
+    positivos, negativos = np.sort(p[y == 1]), np.sort(p[y == 0])
+    tp = len(positivos) - np.searchsorted(positivos, limiares, side="left")
+    fp = len(negativos) - np.searchsorted(negativos, limiares, side="left")
+    return tp, fp
+
+
+# Função para a varredura de todos os pares MÉDIO < ALTO: fração de linhas, taxa de sinistros e recall por nível
+def varredura(y, p, limiares):
+    tp, fp = acima(y, p, limiares)
+    n_pos, n = int(y.sum()), len(y)
+    i, j = np.triu_indices(len(limiares), 1)  # i: MÉDIO, j: ALTO
+    linhas_alto, linhas_medio = tp[j] + fp[j], tp[i] + fp[i] - tp[j] - fp[j]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame({
+            "limiar_medio": limiares[i],
+            "limiar_alto": limiares[j],
+            "fracao_alto": linhas_alto / n,
+            "fracao_medio": linhas_medio / n,
+            "precisao_alto": tp[j] / linhas_alto,
+            "precisao_medio": (tp[i] - tp[j]) / linhas_medio,
+            "precisao_baixo": (n_pos - tp[i]) / (n - tp[i] - fp[i]),
+            "recall_alto": tp[j] / n_pos,
+            "recall_alto_medio": tp[i] / n_pos,
+            "f1_alto": 2 * tp[j] / (n_pos + linhas_alto),
+        })
+
+
+# Função para os limiares sugeridos: ALTO no F1 máximo e MÉDIO no maior limiar abaixo dele com a cobertura pedida
+def sugerir_limiares(y, p, limiares, cobertura):
+    tp, fp = acima(y, p, limiares)
+    f1 = 2 * tp / (y.sum() + tp + fp)
+    j = max(int(np.argmax(f1)), 1)
+    candidatos = np.flatnonzero((tp[:j] / y.sum()) >= cobertura)
+    i = int(candidatos[-1]) if len(candidatos) else 0
+    return float(limiares[j]), float(limiares[i])
+
+
+# Função para os recortes (hora, veículo, tipo de via) do teste: lista de (dimensão, grupo, máscara)
+def recortes_teste(X, features):
+    recortes = []
+    if "hora" in features:
+        hora = X[:, features.index("hora")]
+        for valor in np.unique(hora[~np.isnan(hora)]):
+            recortes.append(("hora", "sem hora" if valor < 0 else f"{int(valor):02d}h", hora == valor))
+    veiculos = [col for col in COLUNAS_VEICULOS if col in features]
+    if veiculos:
+        # Uma linha com mais de um veículo entra no recorte de cada um
+        matriz = X[:, [features.index(col) for col in veiculos]] > 0
+        for k, col in enumerate(veiculos):
+            recortes.append(("veiculo", col.removeprefix("tp_veiculo_"), matriz[:, k]))
+        recortes.append(("veiculo", "nenhum", ~matriz.any(axis=1)))
+    if "tipo_via_num" in features:
+        tipo_via = X[:, features.index("tipo_via_num")]
+        for valor in np.unique(tipo_via[~np.isnan(tipo_via)]):
+            recortes.append(("tipo_via", str(int(valor)), tipo_via == valor))
+        recortes.append(("tipo_via", "sem tipo", np.isnan(tipo_via)))
+    return [(dimensao, grupo, mascara) for dimensao, grupo, mascara in recortes if mascara.any()]
+
+
+# Função para as métricas de um modelo em cada recorte, com os níveis nos limiares configurados
+def metricas_recortes(y, p, recortes, limiar_alto, limiar_medio):
+    nivel = np.where(p >= limiar_alto, 0, np.where(p >= limiar_medio, 1, 2))
+    linhas = []
+    for dimensao, grupo, mascara in recortes:
+        y_grupo, nivel_grupo = y[mascara], nivel[mascara]
+        pr_auc, roc_auc = aucs(*curva(y_grupo, p[mascara])[1:])
+        por_nivel = np.bincount(nivel_grupo, minlength=3)
+        positivos = np.bincount(nivel_grupo, weights=y_grupo, minlength=3)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            linhas.append({
+                "dimensao": dimensao, "grupo": grupo, "linhas": int(mascara.sum()), "positivos": int(y_grupo.sum()),
+                "pr_auc": pr_auc, "roc_auc": roc_auc,
+                "fracao_alto": por_nivel[0] / len(y_grupo), "fracao_medio": por_nivel[1] / len(y_grupo),
+                "precisao_alto": positivos[0] / por_nivel[0],
+                "recall_alto_medio": (positivos[0] + positivos[1]) / y_grupo.sum(),
+            })
+    return linhas
+
+
+# Função para uma linha da varredura num par de limiares exato
+def par_limiares(tabela, limiar_alto, limiar_medio):
+    linha = tabela[np.isclose(tabela["limiar_alto"], limiar_alto) & np.isclose(tabela["limiar_medio"], limiar_medio)]
+    return {chave: round(float(valor), 4) for chave, valor in linha.iloc[0].items()}
+
+
+# Função para a matriz de teste na ordem das features do modelo (features ausentes ficam com 0, como no servidor)
+def alinhar_teste(X, features, model_features):
+    matriz = np.zeros((len(X), len(model_features)), dtype=X.dtype)
+    for j, col in enumerate(model_features):
+        if col in features:
+            matriz[:, j] = X[:, features.index(col)]
+    return matriz
+
+
+# Função para prever o teste inteiro com um modelo do registro e medir o custo de inferência
+def prever_teste(modelo, X, features, linhas_latencia=LINHAS_LATENCIA):
+    matriz = alinhar_teste(X, features, modelo.model_features)
+
+    inicio = time.perf_counter()
+    riscos = np.asarray(modelo.prever_riscos(matriz), dtype=np.float64)
+    lote_s = time.perf_counter() - inicio
+
+    tempos = []
+    for i in np.linspace(0, len(matriz) - 1, min(linhas_latencia, len(matriz))).astype(int):
+        inicio = time.perf_counter()
+        modelo.prever_riscos(matriz[i:i + 1])
+        tempos.append((time.perf_counter() - inicio) * 1e6)
+
+    custo = {
+        "carga_s": round(modelo.tempo_carga_s, 4),
+        "desserializacao_s": None if modelo.tempo_desserializacao_s is None else round(modelo.tempo_desserializacao_s, 4),
+        "tamanho_mb": round(modelo.caminho.stat().st_size / 2**20, 2),
+        "lote_us_linha": round(lote_s / len(matriz) * 1e6, 2),
+        "uma_linha_p50_us": round(float(np.percentile(tempos, 50)), 1),
+        "uma_linha_p99_us": round(float(np.percentile(tempos, 99)), 1),
+        "compilado": modelo.compilado is not None,
+    }
+    return riscos, custo
+
+
+# Função para o tipo do estimador de um artefato já avaliado (define os limiares padrão de --artefato)
+def familia_artefato(caminho, tipo):
+    manifesto = caminho_manifesto(caminho)
+    if manifesto.exists():
+        with open(manifesto, encoding="utf-8") as file:
+            familia = json.load(file).get("familia")
+        if familia in FAMILIAS:
+            return familia
+    return "xgboost" if tipo.startswith("XGB") else "random_forest"
+
+
+class PrevisoesEmCache:
+    def __init__(self, dados, destino=caminho_avaliacao):
+        self.dados = dados
+        self.diretorio = Path(destino) / dados.diretorio.name
+        self.caminho_metadados = self.diretorio / "metadados.json"
+        self.metadados = {"dados_sha256": dados.metadados["origem_sha256"], "linhas_teste": int(len(dados.teste)),
+                          "previsoes": {}}
+        if self.caminho_metadados.exists():
+            with open(self.caminho_metadados, encoding="utf-8") as file:
+                metadados = json.load(file)
+            if metadados["dados_sha256"] == self.metadados["dados_sha256"]:
+                self.metadados = metadados
+            else:
+                logging.info("O dataset mudou: as previsões em cache foram descartadas.")
+                for arquivo in (self.diretorio / "previsoes").glob("*.npy"):
+                    arquivo.unlink()
+
+    def caminho(self, sha256):
+        return self.diretorio / "previsoes" / f"{sha256}.npy"
+
+    def obter(self, sha256):
+        if sha256 in self.metadados["previsoes"] and self.caminho(sha256).exists():
+            return np.load(self.caminho(sha256)), self.metadados["previsoes"][sha256]
+        return None, None
+
+    def gravar(self, sha256, riscos, informacoes):
+        self.caminho(sha256).parent.mkdir(parents=True, exist_ok=True)
+        np.save(self.caminho(sha256), riscos)
+        self.metadados["previsoes"][sha256] = informacoes
+        temporario = self.caminho_metadados.with_suffix(".tmp")
+        with open(temporario, "w", encoding="utf-8") as file:
+            json.dump(self.metadados, file, ensure_ascii=False, indent=2)
+        temporario.replace(self.caminho_metadados)
+
+
+class Avaliacao:
+    def __init__(self, dados, destino=caminho_avaliacao, cobertura=COBERTURA_PADRAO, refazer=False):
+        self.dados = dados
+        self.cache = PrevisoesEmCache(dados, destino)
+        self.cobertura = cobertura
+        self.refazer = refazer
+        self.X = np.asarray(dados.X[dados.teste])
+        self.y = np.asarray(dados.y[dados.teste], dtype=np.int64)
+        self.modelos = {}
+        self.previsoes = {}
+
+    # Registra um artefato para a avaliação; prevê o teste só se ele não estiver no cache
+    def adicionar(self, nome, caminho, limiar_alto=None, limiar_medio=None, veiculo_padrao=None):
+        caminho = Path(caminho)
+        sha256 = hash_arquivo(caminho)
+        riscos, informacoes = (None, None) if self.refazer else self.cache.obter(sha256)
+        if riscos is None:
+            modelo = ModeloRegistrado(nome, caminho, limiar_alto, limiar_medio, veiculo_padrao)
+            try:
+                modelo.carregar()
+            except Exception as e:
+                logging.warning(f"Modelo '{nome}' ({caminho.name}) ignorado: {e}")
+                return
+            inicio = time.perf_counter()
+            riscos, custo = prever_teste(modelo, self.X, self.dados.features)
+            informacoes = {"arquivo": caminho.name, "tipo": type(modelo.model).__name__, "custo": custo,
+                           "avaliado_em": time.strftime("%Y-%m-%d %H:%M:%S")}
+            self.cache.gravar(sha256, riscos, informacoes)
+            logging.info(f"Modelo '{nome}' avaliado em {time.perf_counter() - inicio:.1f} s.")
+        else:
+            logging.info(f"Modelo '{nome}': previsões do cache ({sha256[:12]}).")
+
+        if limiar_alto is None:
+            familia = FAMILIAS[familia_artefato(caminho, informacoes["tipo"])]
+            limiar_alto, limiar_medio = familia["limiar_alto"], familia["limiar_medio"]
+        self.modelos[nome] = {"arquivo": caminho.name, "sha256": sha256, "tipo": informacoes["tipo"],
+                              "limiar_alto": limiar_alto, "limiar_medio": limiar_medio, "custo": informacoes["custo"]}
+        self.previsoes[nome] = riscos
+
+    # Métricas, varredura e recortes de todos os modelos adicionados
+    def executar(self):
+        configurados = [valor for modelo in self.modelos.values() for valor in (modelo["limiar_alto"], modelo["limiar_medio"])]
+        limiares = np.union1d(LIMIARES, np.round(configurados, 4))
+        recortes = recortes_teste(self.X, self.dados.features)
+
+        resumo, varreduras, linhas_recortes = {}, [], []
+        for nome, modelo in self.modelos.items():
+            p = self.previsoes[nome]
+            pr_auc, roc_auc = aucs(*curva(self.y, p)[1:])
+            tabela = varredura(self.y, p, limiares)
+            alto, medio = sugerir_limiares(self.y, p, limiares, self.cobertura)
+            resumo[nome] = {
+                **modelo,
+                "pr_auc": round(pr_auc, 4),
+                "roc_auc": round(roc_auc, 4),
+                "calibracao": calibracao(self.y, p),
+                "limiares_configurados": par_limiares(tabela, modelo["limiar_alto"], modelo["limiar_medio"]),
+                "limiares_sugeridos": par_limiares(tabela, alto, medio),
+            }
+            varreduras.append(tabela.assign(modelo=nome))
+            linhas_recortes += [{"modelo": nome, **linha} for linha in
+                                metricas_recortes(self.y, p, recortes, modelo["limiar_alto"], modelo["limiar_medio"])]
+
+        self.resumo = resumo
+        self.varredura = pd.concat(varreduras, ignore_index=True)
+        self.recortes = pd.DataFrame(linhas_recortes)
+        return self
+
+    # Grava o relatório (JSON), a varredura e os recortes (Parquet) ao lado do cache
+    def salvar(self):
+        relatorio = {
+            "dados": {chave: self.dados.metadados[chave] for chave in ("origem", "origem_sha256", "linhas", "positivos")},
+            "teste": {"linhas": int(len(self.y)), "positivos": int(self.y.sum())},
+            "cobertura": self.cobertura,
+            "modelos": self.resumo,
+        }
+        with open(self.cache.diretorio / "relatorio.json", "w", encoding="utf-8") as file:
+            json.dump(relatorio, file, ensure_ascii=False, indent=2)
+        self.varredura.to_parquet(self.cache.diretorio / "varredura.parquet", index=False)
+        self.recortes.to_parquet(self.cache.diretorio / "recortes.parquet", index=False)
+        return self.cache.diretorio
+
+
+# Função para a lista de modelos de um modelos.json (nome -> caminho, limiares e veículo padrão)
+def modelos_config(caminho_config):
+    caminho_config = Path(caminho_config)
+    with open(caminho_config, encoding="utf-8") as file:
+        config = json.load(file)
+    return [(nome, caminho_config.parent / modelo["arquivo"], modelo["limiar_alto"], modelo["limiar_medio"],
+             modelo.get("veiculo_padrao")) for nome, modelo in config["modelos"].items()]
+
+
+def formatar_niveis(niveis):
+    return (f"{niveis['limiar_alto']:.2f}/{niveis['limiar_medio']:.2f} | {niveis['fracao_alto']:>6.1%} "
+            f"{niveis['precisao_alto']:>6.1%} {niveis['recall_alto']:>6.1%} | {niveis['fracao_medio']:>6.1%} "
+            f"{niveis['recall_alto_medio']:>6.1%}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Avaliação offline dos modelos registrados")
+    parser.add_argument("--dados", default=str(raiz_projeto / "dataset_final_para_modelo_1_100.parquet"))
+    parser.add_argument("--config", action="append", help="modelos.json avaliados (padrão: src/model/modelos.json)")
+    parser.add_argument("--artefato", action="append", default=[], metavar="[NOME=]CAMINHO",
+                        help="Artefato avulso (ex: um candidato recém-treinado), com os limiares da família")
+    parser.add_argument("--cobertura", type=float, default=COBERTURA_PADRAO,
+                        help="Fração dos sinistros que ALTO + MÉDIO devem cobrir no limiar MÉDIO sugerido")
+    parser.add_argument("--destino", default=str(caminho_avaliacao))
+    parser.add_argument("--refazer", action="store_true", help="Ignora as previsões em cache")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    avaliacao = Avaliacao(carregar_dados(args.dados), args.destino, args.cobertura, args.refazer)
+    for caminho_config in args.config or [caminho_modelos / "modelos.json"]:
+        for nome, caminho, limiar_alto, limiar_medio, veiculo_padrao in modelos_config(caminho_config):
+            avaliacao.adicionar(nome, caminho, limiar_alto, limiar_medio, veiculo_padrao)
+    for artefato in args.artefato:
+        nome, _, caminho = artefato.rpartition("=")
+        avaliacao.adicionar(nome or Path(caminho).stem, caminho)
+    if not avaliacao.modelos:
+        raise SystemExit("Nenhum modelo pôde ser avaliado.")
+    destino = avaliacao.executar().salvar()
+
+    print(f"\nTeste: {len(avaliacao.y)} linhas, {avaliacao.y.sum()} sinistros "
+          f"({avaliacao.y.mean():.2%}; a precisão vale para esta proporção de negativos)")
+    largura = max(24, *map(len, avaliacao.resumo))
+    print(f"\n{'modelo':<{largura}} | {'PR-AUC':>6} | {'ROC-AUC':>7} | {'Brier':>6} | {'ECE':>6} | {'carga':>7} | "
+          f"{'.pkl (MB)':>9} | {'lote µs/linha':>13} | {'1 linha p50/p99 (µs)':>20}")
+    for nome, modelo in avaliacao.resumo.items():
+        custo = modelo["custo"]
+        print(f"{nome:<{largura}} | {modelo['pr_auc']:>6.4f} | {modelo['roc_auc']:>7.4f} | "
+              f"{modelo['calibracao']['brier']:>6.4f} | {modelo['calibracao']['ece']:>6.4f} | "
+              f"{custo['carga_s']:>5.2f} s | {custo['tamanho_mb']:>9.1f} | {custo['lote_us_linha']:>13.1f} | "
+              f"{custo['uma_linha_p50_us']:>9.0f} / {custo['uma_linha_p99_us']:>8.0f}")
+
+    print(f"\n{'modelo':<{largura}} | {'limiares':<12} | {'ALTO: linhas  prec. recall':<26} | {'MÉDIO: linhas  recall A+M'}")
+    for nome, modelo in avaliacao.resumo.items():
+        print(f"{nome:<{largura}} | configurados {formatar_niveis(modelo['limiares_configurados'])}")
+        print(f"{'':<{largura}} | sugeridos    {formatar_niveis(modelo['limiares_sugeridos'])}")
+
+    for dimensao, tabela in avaliacao.recortes.groupby("dimensao", sort=False):
+        pivo = tabela.pivot_table(index="grupo", columns="modelo", values="pr_auc", sort=False)
+        linhas = tabela.drop_duplicates("grupo").set_index("grupo")[["linhas", "positivos"]]
+        print(f"\nPR-AUC por {dimensao}:")
+        print(linhas.join(pivo[list(avaliacao.resumo)]).to_string(float_format=lambda valor: f"{valor:.4f}"))
+
+    print(f"\nRelatório, varredura e recortes em {destino} (total {time.perf_counter() - inicio:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
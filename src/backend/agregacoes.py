@@ -0,0 +1,381 @@
+# Cubos de agregação dos gráficos do frontend (sinistros e vítimas de Bauru)
+#
+# O frontend baixava dados_grafico_acidentes.json (3,4 MB) e dados_grafico_vitimas.json (1,6 MB) inteiros
+# e agregava no navegador. Aqui os dados limpos são agregados offline em dois cubos, gravados em Parquet
+# (uma partição por mês, em data/agregacoes/):
+# - acidentes: data x hora x chuva x tipo_via x veiculo x gravidade (a mais grave do sinistro) -> nº de sinistros
+#   Um sinistro com moto e carro entra uma vez em "motocicleta", uma em "automovel" e uma em "todos"
+# - vitimas: data x chuva x faixa_etaria x gravidade -> nº de vítimas
+# Mês, ano, ano_mes e dia da semana saem da data na carga. O servidor responde só a fatia pedida por um
+# gráfico (filtros + agrupamento), somando as linhas do cubo com np.bincount.
+#
+# A reconstrução é incremental: cada partição mensal tem um hash do seu conteúdo, e só os meses que mudaram
+# são regravados. O ETag de uma consulta depende só dos meses dentro do intervalo de datas pedido, então
+# um mês novo não invalida o cache dos gráficos de períodos anteriores.
+#
+# Construção (na raiz do projeto):
+#   python -m src.backend.agregacoes
+#   python -m src.backend.agregacoes --de-json frontend/public   # a partir dos JSONs exportados pelo insights.ipynb
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# brotli é opcional: sem ele, as respostas saem em gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+src_path = Path(__file__).parent.parent
+raiz_projeto = src_path.parent
+caminho_agregacoes = raiz_projeto / "data" / "agregacoes"
+caminho_sinistros = raiz_projeto / "data" / "Acidentes" / "sinistros_com_chuva_2022-2025.csv"
+caminho_pessoas = raiz_projeto / "data" / "Acidentes" / "pessoas_2022-2025_bauru.csv"
+
+# Dimensões gravadas em cada cubo; ano, mes, ano_mes e dia_semana saem da data na carga
+DIMENSOES = {
+    "acidentes": ["data", "hora", "chuva", "tipo_via", "veiculo", "gravidade"],
+    "vitimas": ["data", "chuva", "faixa_etaria", "gravidade"],
+}
+
+# Valor reservado do eixo de veículos que conta cada sinistro uma única vez
+TODOS_VEICULOS = "todos"
+
+# Ordem de gravidade de um sinistro (a primeira coluna com vítimas define a gravidade)
+GRAVIDADES_SINISTRO = [("gravidade_fatal", "FATAL"), ("gravidade_grave", "GRAVE"),
+                       ("gravidade_leve", "LEVE"), ("gravidade_ileso", "ILESO")]
+
+NAO_DISPONIVEL = "NAO DISPONIVEL"
+
+# Respostas já serializadas e comprimidas mantidas em memória (por ETag)
+MAX_RESPOSTAS = 512
+
+
+# Função para converter datas ISO (AAAA-MM-DD) ou brasileiras (DD/MM/AAAA)
+def converter_datas(datas):
+    datas = datas.astype(str)
+    formato = "%d/%m/%Y" if datas.str.contains("/", regex=False).any() else "%Y-%m-%d"
+    return pd.to_datetime(datas.str.slice(0, 10), format=formato, errors="coerce")
+
+
+# Função para converter a hora (inteiro ou "HH:MM"; "99:99" e vazio viram -1)
+def converter_horas(horas):
+    if pd.api.types.is_numeric_dtype(horas):
+        return horas.fillna(-1).astype(int)
+    return pd.to_numeric(horas.astype(str).str.slice(0, 2), errors="coerce").where(lambda h: h <= 23).fillna(-1).astype(int)
+
+
+# Função para montar as linhas do cubo de acidentes (uma por sinistro e tipo de veículo, mais "todos")
+def linhas_acidentes(sinistros):
+    sinistros = sinistros.reset_index(drop=True)
+    colunas_veiculos = [col for col in sinistros.columns if col.startswith("tp_veiculo_")]
+    base = pd.DataFrame({
+        "id_sinistro": sinistros["id_sinistro"].to_numpy(),
+        "data": converter_datas(sinistros["data_sinistro"]),
+        "hora": converter_horas(sinistros["hora_sinistro"]),
+        "chuva": sinistros["Chuva"].fillna("Sem chuva").astype(str),
+        "tipo_via": sinistros["tipo_via"].fillna(NAO_DISPONIVEL).astype(str),
+    })
+    gravidades = [(col, rotulo) for col, rotulo in GRAVIDADES_SINISTRO if col in sinistros.columns]
+    base["gravidade"] = np.select([sinistros[col].fillna(0).to_numpy() > 0 for col, _ in gravidades],
+                                  [rotulo for _, rotulo in gravidades], default=NAO_DISPONIVEL)
+    base = base.dropna(subset=["data"])
+
+    # Sinistro x veículo envolvido (em formato longo), mais uma linha "todos" por sinistro
+    envolvidos = sinistros.loc[base.index, colunas_veiculos].fillna(0).to_numpy() > 0
+    linhas, colunas = np.nonzero(envolvidos)
+    nomes = np.array([col.removeprefix("tp_veiculo_") for col in colunas_veiculos] + [TODOS_VEICULOS])
+    por_veiculo = base.iloc[linhas].assign(veiculo=nomes[colunas])
+    todos = base.assign(veiculo=TODOS_VEICULOS)
+    return pd.concat([todos, por_veiculo], ignore_index=True)
+
+
+# Função para montar as linhas do cubo de vítimas (uma por pessoa, com a data e a chuva do sinistro)
+# Se 'pessoas' já trouxer data_sinistro e Chuva (JSON do frontend), a junção com os sinistros é dispensada
+def linhas_vitimas(sinistros, pessoas):
+    if {"data_sinistro", "Chuva"} <= set(pessoas.columns):
+        vitimas = pessoas
+    else:
+        vitimas = pessoas.merge(sinistros[["id_sinistro", "data_sinistro", "Chuva"]], on="id_sinistro")
+    return pd.DataFrame({
+        "data": converter_datas(vitimas["data_sinistro"]),
+        "chuva": vitimas["Chuva"].fillna("Sem chuva").astype(str),
+        "faixa_etaria": vitimas["faixa_etaria_demografica"].fillna(NAO_DISPONIVEL).astype(str),
+        "gravidade": vitimas["gravidade_lesao"].fillna(NAO_DISPONIVEL).astype(str),
+    }).dropna(subset=["data"])
+
+
+# Função para agregar as linhas de um cubo: uma linha por combinação de dimensões presente, com o total
+def agregar(linhas, dimensoes):
+    tabela = linhas.groupby(dimensoes, observed=True).size().rename("total").reset_index()
+    tabela["total"] = tabela["total"].astype(np.int32)
+    return tabela.sort_values(dimensoes, ignore_index=True)
+
+
+# Função para gravar os cubos, regravando só os meses que mudaram desde a última construção
+def construir_cubos(sinistros, pessoas, destino=caminho_agregacoes):
+    from src.pre_processamento.armazenamento import atualizar_particoes, gravar_metadados, ler_metadados
+
+    destino = Path(destino)
+    anterior = ler_metadados(destino).get("cubos", {})
+
+    inicio = time.perf_counter()
+    linhas = {"acidentes": linhas_acidentes(sinistros), "vitimas": linhas_vitimas(sinistros, pessoas)}
+    metadados = {"cubos": {}}
+    for nome, dimensoes in DIMENSOES.items():
+        tabela = agregar(linhas[nome], dimensoes)
+        meses = ((ano_mes, particao.reset_index(drop=True))
+                 for ano_mes, particao in tabela.groupby(tabela["data"].dt.strftime("%Y-%m"), sort=True))
+        particoes, regravadas = atualizar_particoes(
+            destino / nome, meses, anterior.get(nome, {}).get("particoes", {}),
+            lambda ano_mes, particao, arquivo: particao.to_parquet(arquivo, index=False))
+
+        metadados["cubos"][nome] = {"dimensoes": dimensoes, "linhas": len(tabela), "particoes": particoes}
+        logging.info(f"Cubo '{nome}': {len(tabela)} linhas em {len(particoes)} meses "
+                     f"({len(regravadas)} regravados).")
+
+    metadados["tempo_construcao_s"] = round(time.perf_counter() - inicio, 3)
+    gravar_metadados(destino, metadados)
+    return metadados
+
+
+# Função para carregar as fontes limpas (sinistros com chuva e pessoas)
+def carregar_fontes_csv(caminho_sinistros=caminho_sinistros, caminho_pessoas=caminho_pessoas):
+    sinistros = pd.read_csv(caminho_sinistros, sep=";", encoding="utf-8-sig", low_memory=False)
+    pessoas = pd.read_csv(caminho_pessoas, sep=";", encoding="utf-8-sig", low_memory=False,
+                          usecols=["id_sinistro", "faixa_etaria_demografica", "gravidade_lesao"])
+    return sinistros, pessoas
+
+
+# Função para carregar as fontes a partir dos JSONs exportados pelo insights.ipynb para o frontend
+# (o JSON de vítimas já vem com a data e a chuva do sinistro)
+def carregar_fontes_json(diretorio):
+    diretorio = Path(diretorio)
+    return (pd.read_json(diretorio / "dados_grafico_acidentes.json"),
+            pd.read_json(diretorio / "dados_grafico_vitimas.json"))
+
+
+class CuboAgregado:
+    # Cubo em memória: cada dimensão vira um vetor de códigos inteiros (posição no vetor de rótulos ordenados)
+    def __init__(self, nome, tabela, particoes):
+        self.nome = nome
+        self.particoes = particoes
+        self.total = tabela["total"].to_numpy(np.int64)
+        datas = pd.to_datetime(tabela["data"])
+        self.dias = datas.to_numpy().astype("datetime64[D]")
+
+        valores = {dim: tabela[dim].to_numpy() for dim in tabela.columns if dim not in ("data", "total")}
+        valores["data"] = self.dias.astype(str)
+        valores["ano"] = datas.dt.year.to_numpy()
+        valores["mes"] = datas.dt.month.to_numpy()
+        valores["ano_mes"] = datas.dt.strftime("%Y-%m").to_numpy()
+        valores["dia_semana"] = datas.dt.dayofweek.to_numpy()
+
+        self.codigos, self.rotulos, self.posicoes = {}, {}, {}
+        for dim, valores_dim in valores.items():
+            rotulos, codigos = np.unique(valores_dim, return_inverse=True)
+            self.rotulos[dim] = rotulos.tolist()
+            self.codigos[dim] = codigos.astype(np.int64)
+            # Os filtros chegam como texto da query string
+            self.posicoes[dim] = {str(rotulo): k for k, rotulo in enumerate(self.rotulos[dim])}
+
+    # Função para os valores possíveis de cada dimensão (para montar filtros e eixos no frontend)
+    def dominio(self):
+        dominio = {dim: [r for r in rotulos if r != TODOS_VEICULOS] for dim, rotulos in self.rotulos.items()
+                   if dim != "data"}
+        dominio["data"] = {"min": str(self.dias.min()), "max": str(self.dias.max())} if len(self.dias) else None
+        return dominio
+
+    # Função para os meses (partições) que uma consulta lê: o ETag só depende deles
+    def particoes_no_intervalo(self, data_inicio=None, data_fim=None):
+        inicio = str(data_inicio)[:7] if data_inicio else ""
+        fim = str(data_fim)[:7] if data_fim else "9999-99"
+        return {mes: h for mes, h in self.particoes.items() if inicio <= mes <= fim}
+
+    # Função para responder a uma consulta
+    # por: dimensões do agrupamento; filtros: {dimensão: [valores aceitos]}; datas em ISO (inclusivas)
+    def consultar(self, por=(), filtros=None, data_inicio=None, data_fim=None):
+        filtros = filtros or {}
+        desconhecidas = (set(por) | set(filtros)) - set(self.codigos)
+        if desconhecidas:
+            raise ValueError(f"Dimensões inexistentes no cubo '{self.nome}': {', '.join(sorted(desconhecidas))}")
+
+        mascara = np.ones(len(self.total), dtype=bool)
+        if data_inicio:
+            mascara &= self.dias >= np.datetime64(data_inicio, "D")
+        if data_fim:
+            mascara &= self.dias <= np.datetime64(data_fim, "D")
+        # Sem agrupar/filtrar por veículo, cada sinistro conta uma vez (linhas "todos")
+        if "veiculo" in self.codigos:
+            todos = self.posicoes["veiculo"].get(TODOS_VEICULOS, -1)
+            if "veiculo" in por or "veiculo" in filtros:
+                mascara &= self.codigos["veiculo"] != todos
+            else:
+                mascara &= self.codigos["veiculo"] == todos
+        for dim, valores in filtros.items():
+            aceitos = [self.posicoes[dim][v] for v in valores if v in self.posicoes[dim]]
+            mascara &= np.isin(self.codigos[dim], aceitos)
+
+        # Chave única de cada combinação das dimensões pedidas; a soma é um bincount sobre as chaves
+        chave = np.zeros(int(mascara.sum()), dtype=np.int64)
+        for dim in por:
+            chave = chave * len(self.rotulos[dim]) + self.codigos[dim][mascara]
+        chaves, grupos = np.unique(chave, return_inverse=True)
+        totais = np.bincount(grupos.ravel(), weights=self.total[mascara], minlength=len(chaves)).astype(np.int64)
+
+        dados = {}
+        for dim in reversed(por):
+            tamanho = len(self.rotulos[dim])
+            dados[dim] = [self.rotulos[dim][k] for k in (chaves % tamanho).tolist()]
+            chaves = chaves // tamanho
+        dados = {dim: dados[dim] for dim in por}
+        dados["total"] = totais.tolist() if por or len(totais) else [0]
+        return {"cubo": self.nome, "por": list(por), "dados": dados}
+
+
+class CacheRespostas:
+    # Respostas já serializadas (e comprimidas, sob demanda) por ETag, com remoção LRU
+    def __init__(self, max_respostas=MAX_RESPOSTAS):
+        self.lock = threading.Lock()
+        self.respostas = OrderedDict()
+        self.max_respostas = max_respostas
+
+    # Função para a resposta em cache de um ETag (gerada com 'gerar' na primeira vez)
+    def obter(self, etag, gerar):
+        with self.lock:
+            if etag in self.respostas:
+                self.respostas.move_to_end(etag)
+                return self.respostas[etag]
+        corpo = json.dumps(gerar(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        resposta = {"identity": corpo}
+        with self.lock:
+            self.respostas[etag] = resposta
+            if len(self.respostas) > self.max_respostas:
+                self.respostas.popitem(last=False)
+        return resposta
+
+
+class DiretorioMonitorado:
+    # Conteúdo montado por 'montar(metadados)' a partir de um diretório de partições; remontado quando o
+    # metadados.json muda em disco (mtime e tamanho). Antes da primeira construção, 'obter' devolve 'vazio'
+    def __init__(self, diretorio, montar, vazio=None):
+        self.diretorio = Path(diretorio)
+        self.montar = montar
+        self.vazio = vazio
+        self.lock = threading.Lock()
+        self.conteudo = vazio
+        self.marca = None
+
+    # Função para obter o conteúdo atual, remontando se o metadados.json mudou
+    def obter(self):
+        caminho = self.diretorio / "metadados.json"
+        try:
+            info = os.stat(caminho)
+        except FileNotFoundError:
+            return self.vazio
+        marca = (info.st_mtime_ns, info.st_size)
+        if marca != self.marca:
+            with self.lock:
+                if marca != self.marca:
+                    with open(caminho, encoding="utf-8") as file:
+                        self.conteudo = self.montar(json.load(file))
+                    self.marca = marca
+        return self.conteudo
+
+
+class Agregacoes:
+    # Cubos carregados de data/agregacoes/; recarregados quando o metadados.json muda em disco
+    def __init__(self, diretorio=caminho_agregacoes, max_respostas=MAX_RESPOSTAS):
+        self.diretorio = Path(diretorio)
+        self.cubos = DiretorioMonitorado(self.diretorio, self.montar, vazio={})
+        self.respostas = CacheRespostas(max_respostas)
+
+    # Função para montar os cubos a partir das partições listadas no metadados.json
+    def montar(self, metadados):
+        cubos = {}
+        for nome, meta in metadados["cubos"].items():
+            arquivos = [self.diretorio / nome / f"{mes}.parquet" for mes in sorted(meta["particoes"])]
+            tabela = (pd.concat([pd.read_parquet(arquivo) for arquivo in arquivos], ignore_index=True)
+                      if arquivos else pd.DataFrame(columns=meta["dimensoes"] + ["total"]))
+            cubos[nome] = CuboAgregado(nome, tabela, meta["particoes"])
+        logging.info(f"Cubos de agregação carregados: {', '.join(cubos) or 'nenhum'}.")
+        return cubos
+
+    # Função para obter os cubos atuais, recarregando se o metadados.json mudou
+    def obter(self):
+        return self.cubos.obter()
+
+
+# Função para o ETag (fraco) de uma consulta: a consulta normalizada e os hashes dos meses que ela lê
+def etag_consulta(cubo, por, filtros, data_inicio, data_fim):
+    conteudo = json.dumps([cubo.nome, list(por), {k: sorted(v) for k, v in sorted(filtros.items())},
+                           data_inicio, data_fim, cubo.particoes_no_intervalo(data_inicio, data_fim)])
+    return f'W/"{hashlib.sha1(conteudo.encode()).hexdigest()[:20]}"'
+
+
+# Função para o ETag (fraco) do conjunto de cubos: muda quando qualquer partição muda
+def etag_cubos(cubos):
+    conteudo = json.dumps({nome: cubo.particoes for nome, cubo in sorted(cubos.items())})
+    return f'W/"{hashlib.sha1(conteudo.encode()).hexdigest()[:20]}"'
+
+
+# Função para escolher a codificação da resposta pelo Accept-Encoding (brotli se disponível, senão gzip)
+def escolher_codificacao(accept_encoding):
+    aceitas = {}
+    for parte in (accept_encoding or "").split(","):
+        nome, _, parametros = parte.strip().partition(";")
+        q = 1.0
+        if parametros.strip().startswith("q="):
+            try:
+                q = float(parametros.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if nome:
+            aceitas[nome.lower()] = q
+    if aceitas.get("br", 0) > 0 and brotli is not None:
+        return "br"
+    if aceitas.get("gzip", 0) > 0:
+        return "gzip"
+    return "identity"
+
+
+# Função para comprimir (uma vez por ETag e codificação) o corpo de uma resposta em cache
+def comprimir(resposta, codificacao):
+    if codificacao not in resposta:
+        corpo = resposta["identity"]
+        if codificacao == "br":
+            resposta["br"] = brotli.compress(corpo, quality=5)
+        elif codificacao == "gzip":
+            resposta["gzip"] = gzip.compress(corpo, compresslevel=6)
+    return resposta[codificacao]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Constrói os cubos de agregação dos gráficos")
+    parser.add_argument("--sinistros", default=str(caminho_sinistros), help="CSV de sinistros com chuva")
+    parser.add_argument("--pessoas", default=str(caminho_pessoas), help="CSV de pessoas limpo")
+    parser.add_argument("--de-json", help="Pasta com dados_grafico_acidentes.json e dados_grafico_vitimas.json")
+    parser.add_argument("--destino", default=str(caminho_agregacoes))
+    args = parser.parse_args()
+
+    if args.de_json:
+        sinistros, pessoas = carregar_fontes_json(args.de_json)
+    else:
+        sinistros, pessoas = carregar_fontes_csv(args.sinistros, args.pessoas)
+    metadados = construir_cubos(sinistros, pessoas, args.destino)
+    logging.info(f"Cubos gravados em {args.destino} ({metadados['tempo_construcao_s']} s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# Cache de resultados do /calcular_risco
+#
+# A saída do modelo só depende de latitude/longitude, das features temporais (hora, dia da semana, mês)
+# e do veículo. Pedidos repetidos no mesmo cruzamento, na mesma hora, são respondidos pelo cache.
+#
+# - Chave: latitude/longitude quantizadas em passos de 'precisao' graus + mes, dia_semana, hora, veículo, modelo,
+#   chuva e tipo de via (os dois últimos vêm do enriquecimento e podem mudar dentro da mesma célula e hora)
+# - Remoção LRU quando o cache passa de 'tamanho_maximo' entradas
+# - Tudo é descartado quando a hora muda (as features temporais mudam junto)
+# - Opcional: backend SQLite compartilhado entre os workers do uvicorn (mesmo arquivo para todos)
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+
+# Função para identificar a janela horária atual (o cache expira quando ela muda)
+def janela_atual():
+    agora = datetime.now()
+    return agora.year * 1_000_000 + agora.month * 10_000 + agora.day * 100 + agora.hour
+
+
+class BackendSQLite:
+    # Substituto local de um cache distribuído (ex: Redis): um arquivo SQLite em modo WAL,
+    # que vários processos podem ler e escrever ao mesmo tempo.
+    def __init__(self, caminho, tamanho_maximo):
+        self.caminho = str(caminho)
+        self.tamanho_maximo = tamanho_maximo
+        self.local = threading.local()
+        conexao = self.conexao()
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute(
+            "CREATE TABLE IF NOT EXISTS cache_risco ("
+            "chave TEXT PRIMARY KEY, janela INTEGER NOT NULL, risco REAL NOT NULL)"
+        )
+        conexao.commit()
+
+    # Uma conexão por thread (sqlite3 não compartilha conexões entre threads)
+    def conexao(self):
+        if not hasattr(self.local, "conexao"):
+            self.local.conexao = sqlite3.connect(self.caminho, timeout=1.0)
+            self.local.conexao.execute("PRAGMA synchronous=OFF")
+        return self.local.conexao
+
+    def obter(self, chave, janela):
+        linha = self.conexao().execute(
+            "SELECT risco FROM cache_risco WHERE chave = ? AND janela = ?", (repr(chave), janela)
+        ).fetchone()
+        return None if linha is None else linha[0]
+
+    def guardar(self, chave, janela, risco):
+        conexao = self.conexao()
+        conexao.execute(
+            "INSERT OR REPLACE INTO cache_risco (chave, janela, risco) VALUES (?, ?, ?)",
+            (repr(chave), janela, risco),
+        )
+        conexao.commit()
+
+    # Remove as entradas de janelas antigas e, se ainda passar do limite, as mais antigas inseridas
+    def expirar(self, janela):
+        conexao = self.conexao()
+        conexao.execute("DELETE FROM cache_risco WHERE janela <> ?", (janela,))
+        conexao.execute(
+            "DELETE FROM cache_risco WHERE rowid IN ("
+            "SELECT rowid FROM cache_risco ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+            (self.tamanho_maximo,),
+        )
+        conexao.commit()
+
+
+class CacheRisco:
+    def __init__(self, tamanho_maximo=100_000, precisao=0.0005, compartilhado=None):
+        self.tamanho_maximo = tamanho_maximo
+        self.precisao = precisao
+        self.compartilhado = compartilhado
+        self.entradas = OrderedDict()
+        self.janela = janela_atual()
+        self.lock = threading.Lock()
+        self.acertos = 0
+        self.acertos_compartilhado = 0
+        self.falhas = 0
+        self.expiracoes = 0
+
+    # Função para montar a chave quantizada de um pedido
+    # 'modelo' identifica a versão do modelo (ex: hash do artefato), para não misturar resultados
+    def chave(self, latitude, longitude, mes, dia_semana, hora, veiculo, modelo=None, chuva=0, tipo_via=0):
+        return (
+            round(latitude / self.precisao),
+            round(longitude / self.precisao),
+            mes, dia_semana, hora, veiculo, modelo, chuva, tipo_via,
+        )
+
+    # Descarta tudo quando a hora muda
+    def verificar_janela(self):
+        janela = janela_atual()
+        if janela != self.janela:
+            self.entradas.clear()
+            self.janela = janela
+            self.expiracoes += 1
+            if self.compartilhado is not None:
+                self.compartilhado.expirar(janela)
+        return janela
+
+    def obter(self, chave):
+        with self.lock:
+            janela = self.verificar_janela()
+            risco = self.entradas.get(chave)
+            if risco is not None:
+                self.entradas.move_to_end(chave)
+                self.acertos += 1
+                return risco
+
+        if self.compartilhado is not None:
+            risco = self.compartilhado.obter(chave, janela)
+            if risco is not None:
+                with self.lock:
+                    self.acertos_compartilhado += 1
+                    self.inserir(chave, risco)
+                return risco
+
+        with self.lock:
+            self.falhas += 1
+        return None
+
+    def guardar(self, chave, risco):
+        with self.lock:
+            self.inserir(chave, risco)
+            janela = self.janela
+        if self.compartilhado is not None:
+            self.compartilhado.guardar(chave, janela, risco)
+
+    # Inserção LRU (chamar com o lock adquirido)
+    def inserir(self, chave, risco):
+        self.entradas[chave] = risco
+        self.entradas.move_to_end(chave)
+        if len(self.entradas) > self.tamanho_maximo:
+            self.entradas.popitem(last=False)
+
+    def estatisticas(self):
+        total = self.acertos + self.acertos_compartilhado + self.falhas
+        return {
+            "entradas": len(self.entradas),
+            "tamanho_maximo": self.tamanho_maximo,
+            "precisao_graus": self.precisao,
+            "acertos": self.acertos,
+            "acertos_compartilhado": self.acertos_compartilhado,
+            "falhas": self.falhas,
+            "taxa_acerto": round((self.acertos + self.acertos_compartilhado) / total, 4) if total else 0.0,
+            "expiracoes": self.expiracoes,
+            "compartilhado": self.compartilhado is not None,
+        }
@@ -0,0 +1,83 @@
+# Canal de alertas por WebSocket para veículos em movimento (/ws/alertas)
+#
+# O cliente abre uma conexão e envia as posições GPS à medida que se move. O servidor só responde
+# quando o nível de risco (ALTO / MÉDIO / BAIXO) muda, em vez de uma resposta HTTP por posição.
+#
+# Estado por conexão:
+# - Posições na mesma célula (latitude/longitude quantizadas em 'precisao' graus) e na mesma hora
+#   da última posição avaliada não são avaliadas de novo
+# - O último nível enviado, para só avisar quando ele muda
+#
+# Mensagens do cliente:  {"latitude": -22.32, "longitude": -49.07}
+#                        {"latitude": ..., "longitude": ..., "tp_veiculo_selecionado": "..."}  (troca de veículo)
+# Mensagens do servidor: {"tipo": "alerta", "nivel": "ALTO", "nivel_anterior": "MÉDIO", "risco_estimado": ..., ...}
+#                        {"tipo": "erro", "detalhe": "..."}
+import threading
+
+from src.backend.cache_risco import janela_atual
+
+
+class SessaoAlertas:
+    def __init__(self, veiculo, precisao=0.0005):
+        self.veiculo = veiculo
+        self.precisao = precisao
+        self.ultima_chave = None
+        self.ultimo_nivel = None
+
+    # Função para decidir se a posição precisa ser avaliada (célula, hora ou veículo mudaram)
+    def precisa_avaliar(self, latitude, longitude, veiculo=None):
+        if veiculo is not None and veiculo != self.veiculo:
+            self.veiculo = veiculo
+            self.ultima_chave = None
+
+        chave = (round(latitude / self.precisao), round(longitude / self.precisao), janela_atual())
+        if chave == self.ultima_chave:
+            return False
+        self.ultima_chave = chave
+        return True
+
+    # Função para guardar o nível avaliado; retorna o nível anterior (None na primeira avaliação)
+    def atualizar_nivel(self, nivel):
+        anterior, self.ultimo_nivel = self.ultimo_nivel, nivel
+        return anterior
+
+
+class EstatisticasAlertas:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conexoes_ativas = 0
+        self.maximo_conexoes = 0
+        self.conexoes_total = 0
+        self.posicoes = 0
+        self.avaliadas = 0
+        self.alertas = 0
+        self.erros = 0
+
+    def conectar(self):
+        with self.lock:
+            self.conexoes_ativas += 1
+            self.conexoes_total += 1
+            self.maximo_conexoes = max(self.maximo_conexoes, self.conexoes_ativas)
+
+    def desconectar(self):
+        with self.lock:
+            self.conexoes_ativas -= 1
+
+    def registrar(self, avaliada, alerta=False, erro=False):
+        with self.lock:
+            self.posicoes += 1
+            self.avaliadas += int(avaliada)
+            self.alertas += int(alerta)
+            self.erros += int(erro)
+
+    def estatisticas(self):
+        return {
+            "conexoes_ativas": self.conexoes_ativas,
+            "maximo_conexoes": self.maximo_conexoes,
+            "conexoes_total": self.conexoes_total,
+            "posicoes": self.posicoes,
+            "avaliadas": self.avaliadas,
+            "suprimidas": self.posicoes - self.avaliadas - self.erros,
+            "alertas": self.alertas,
+            "erros": self.erros,
+        }
@@ -0,0 +1,319 @@
+# Clusters do mapa por nível de zoom, servidos em tiles (z/x/y) só para a área visível
+#
+# O mapa do frontend baixava coordenadas.json inteiro e montava os clusters no navegador (Supercluster),
+# e o mapa_acidentes_ otimizado.html embute todos os marcadores. Aqui os clusters são pré-calculados
+# para cada zoom de 0 a ZOOM_MAX, em uma grade hierárquica sobre a projeção Web Mercator (a mesma dos
+# tiles do OpenStreetMap):
+# - Cada tile de 256 px é dividido em 8 x 8 células de 32 px; os pontos de uma célula formam um cluster,
+#   desenhado no centroide dos pontos. A célula de um zoom é a célula do zoom seguinte dividida por 2,
+#   então todas saem das coordenadas da grade mais fina com um deslocamento de bits
+# - Camada de acidentes: contagem e soma das coordenadas por (mês, zoom, célula), em Parquet com uma
+#   partição por mês (data/mapa/acidentes/<AAAA-MM>.parquet). Um período é a soma dos meses pedidos, e só
+#   os meses que mudaram são regravados quando entram sinistros novos
+# - Camada de risco previsto: as células de rua do cubo de risco (src/backend/cubo_risco.py), agrupadas do
+#   mesmo jeito; o risco médio e o máximo de cada cluster saem do cubo no momento da consulta
+#
+# Em cada zoom, as linhas ficam ordenadas pela chave do tile: um tile é uma fatia contígua (np.searchsorted)
+# e os clusters do tile saem de um np.bincount sobre as 64 células.
+#
+# Construção (na raiz do projeto):
+#   python -m src.backend.clusters_mapa
+#   python -m src.backend.clusters_mapa --de-json frontend/public/coordenadas.json
+import argparse
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from src.backend.agregacoes import DiretorioMonitorado, converter_datas
+from src.backend.cubo_risco import ESCALA_RISCO
+
+src_path = Path(__file__).parent.parent
+raiz_projeto = src_path.parent
+caminho_mapa = raiz_projeto / "data" / "mapa"
+caminho_sinistros = raiz_projeto / "data" / "Acidentes" / "sinistros_com_chuva_2022-2025.csv"
+
+# Zoom mais detalhado com clusters próprios; acima dele, o tile é recortado dos clusters de ZOOM_MAX
+ZOOM_MAX = 16
+
+# Células por lado de um tile = 2^BITS_CELULAS (8 x 8 células de 32 px)
+BITS_CELULAS = 3
+CELULAS_TILE = 1 << BITS_CELULAS
+
+# Tiles já serializados mantidos em memória pelo servidor (por ETag)
+MAX_TILES_EM_CACHE = 4096
+
+# Limite de latitude da projeção Web Mercator
+LATITUDE_MAXIMA = 85.05112878
+
+
+# Função para as coordenadas (x, y) na grade Web Mercator de 2^nivel células por lado
+def celulas_mercator(latitudes, longitudes, nivel=ZOOM_MAX + BITS_CELULAS):
+    lado = 1 << nivel
+    lat = np.radians(np.clip(np.asarray(latitudes, dtype=float), -LATITUDE_MAXIMA, LATITUDE_MAXIMA))
+    x = np.floor((np.asarray(longitudes, dtype=float) + 180) / 360 * lado)
+    y = np.floor((1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2 * lado)
+    return np.clip(x, 0, lado - 1).astype(np.int64), np.clip(y, 0, lado - 1).astype(np.int64)
+
+
+# Função para os limites (lat_min, lon_min, lat_max, lon_max) de um tile
+def limites_tile(z, x, y):
+    lado = 1 << z
+    lon_min, lon_max = x / lado * 360 - 180, (x + 1) / lado * 360 - 180
+    lat_max = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y / lado))))
+    lat_min = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + 1) / lado))))
+    return float(lat_min), float(lon_min), float(lat_max), float(lon_max)
+
+
+class IndiceTiles:
+    # Para cada zoom, a ordem das linhas pela chave do tile e a célula (0 a 63) de cada linha dentro do tile
+    # celulas: {zoom: (cx, cy)} com as coordenadas na grade de 2^(zoom + BITS_CELULAS) células por lado
+    def __init__(self, celulas):
+        self.niveis = {}
+        mascara = CELULAS_TILE - 1
+        for z, (cx, cy) in celulas.items():
+            chaves = ((cx >> BITS_CELULAS) << z) | (cy >> BITS_CELULAS)
+            ordem = np.argsort(chaves, kind="stable")
+            locais = ((cx & mascara) << BITS_CELULAS) | (cy & mascara)
+            self.niveis[z] = (chaves[ordem], ordem, locais[ordem])
+
+    # Função para as linhas de um tile (posições nos vetores originais) e a célula de cada uma no tile
+    def linhas(self, z, x, y):
+        chaves, ordem, locais = self.niveis[z]
+        chave = (x << z) | y
+        inicio, fim = np.searchsorted(chaves, chave, "left"), np.searchsorted(chaves, chave, "right")
+        return ordem[inicio:fim], locais[inicio:fim]
+
+
+# Função para o tile de ZOOM_MAX que contém um tile mais detalhado
+def tile_base(z, x, y):
+    if z <= ZOOM_MAX:
+        return z, x, y
+    return ZOOM_MAX, x >> (z - ZOOM_MAX), y >> (z - ZOOM_MAX)
+
+
+# Função para manter só os clusters com centroide dentro do tile pedido (zoom acima de ZOOM_MAX)
+def recortar(z, x, y, latitudes, longitudes, *colunas):
+    if z <= ZOOM_MAX:
+        return (latitudes, longitudes) + colunas
+    lat_min, lon_min, lat_max, lon_max = limites_tile(z, x, y)
+    dentro = (latitudes >= lat_min) & (latitudes < lat_max) & (longitudes >= lon_min) & (longitudes < lon_max)
+    return tuple(coluna[dentro] for coluna in (latitudes, longitudes) + colunas)
+
+
+# CAMADA DE ACIDENTES
+
+# Função para os pontos válidos do mapa: latitude, longitude e mês ('AAAA-MM') de cada sinistro
+# Sentinela -9999 (ou nulo) e datas inválidas ficam de fora
+def pontos_mapa(sinistros):
+    latitudes = sinistros["latitude"].astype(float).to_numpy()
+    longitudes = sinistros["longitude"].astype(float).to_numpy()
+    datas = converter_datas(sinistros["data_sinistro"])
+    validos = (np.isfinite(latitudes) & np.isfinite(longitudes) & (np.abs(latitudes) <= 90)
+               & (np.abs(longitudes) <= 180) & datas.notna().to_numpy())
+    return pd.DataFrame({"ano_mes": datas[validos].to_numpy().astype("datetime64[M]").astype(str),
+                         "latitude": latitudes[validos], "longitude": longitudes[validos]})
+
+
+# Função para agrupar pontos em clusters: uma linha por (zoom, célula) com pontos
+def agrupar_pontos(latitudes, longitudes):
+    cx, cy = celulas_mercator(latitudes, longitudes)
+    partes = []
+    for z in range(ZOOM_MAX + 1):
+        deslocamento = ZOOM_MAX - z
+        celulas, grupos = np.unique(((cx >> deslocamento) << 32) | (cy >> deslocamento), return_inverse=True)
+        partes.append(pd.DataFrame({
+            "z": np.full(len(celulas), z, dtype=np.int8),
+            "cx": (celulas >> 32).astype(np.int32),
+            "cy": (celulas & 0xFFFFFFFF).astype(np.int32),
+            "total": np.bincount(grupos).astype(np.int32),
+            "soma_lat": np.bincount(grupos, weights=latitudes),
+            "soma_lon": np.bincount(grupos, weights=longitudes),
+        }))
+    return pd.concat(partes, ignore_index=True)
+
+
+# Função para gravar a camada de acidentes, reagrupando só os meses cujos pontos mudaram desde a última
+# construção (o hash dos pontos de cada mês fica em metadados.json, em "fontes")
+def construir_mapa(sinistros, destino=caminho_mapa):
+    from src.pre_processamento.armazenamento import atualizar_particoes, gravar_metadados, hash_particao, ler_metadados
+
+    destino = Path(destino)
+    anterior = ler_metadados(destino)
+
+    inicio = time.perf_counter()
+    pontos = pontos_mapa(sinistros)
+    particoes, linhas = {}, {}
+
+    # Função para agrupar e gravar um mês novo ou alterado, guardando o hash e as linhas da partição
+    def gravar(ano_mes, pontos_mes, arquivo):
+        particao = agrupar_pontos(pontos_mes["latitude"].to_numpy(), pontos_mes["longitude"].to_numpy())
+        particao.to_parquet(arquivo, index=False)
+        particoes[ano_mes], linhas[ano_mes] = hash_particao(particao), len(particao)
+
+    meses = ((ano_mes, pontos_mes.sort_values(["latitude", "longitude"], ignore_index=True))
+             for ano_mes, pontos_mes in pontos.groupby("ano_mes", sort=True))
+    fontes, regravadas = atualizar_particoes(destino / "acidentes", meses, anterior.get("fontes", {}), gravar)
+    # Os meses que não mudaram mantêm o hash e as linhas da construção anterior
+    particoes = {ano_mes: particoes[ano_mes] if ano_mes in particoes else anterior["particoes"][ano_mes]
+                 for ano_mes in fontes}
+    linhas = {ano_mes: linhas[ano_mes] if ano_mes in linhas else anterior["linhas"][ano_mes] for ano_mes in fontes}
+
+    metadados = {
+        "zoom_max": ZOOM_MAX,
+        "celulas_tile": CELULAS_TILE,
+        "pontos": len(pontos),
+        "particoes": particoes,
+        "fontes": fontes,
+        "linhas": linhas,
+        "tempo_construcao_s": round(time.perf_counter() - inicio, 3),
+    }
+    gravar_metadados(destino, metadados)
+    logging.info(f"Mapa de acidentes: {len(pontos)} pontos, {sum(linhas.values())} linhas em {len(particoes)} meses "
+                 f"({len(regravadas)} regravados).")
+    return metadados
+
+
+class ClustersAcidentes:
+    # Linhas de todas as partições em memória, indexadas por tile em cada zoom
+    def __init__(self, tabela, particoes):
+        self.particoes = particoes
+        self.meses = sorted(particoes)
+        self.total = tabela["total"].to_numpy(np.int64)
+        self.soma_lat = tabela["soma_lat"].to_numpy(float)
+        self.soma_lon = tabela["soma_lon"].to_numpy(float)
+        self.codigo_mes = np.searchsorted(self.meses, tabela["ano_mes"].to_numpy().astype(str)).astype(np.int16)
+
+        z = tabela["z"].to_numpy()
+        cx, cy = tabela["cx"].to_numpy(np.int64), tabela["cy"].to_numpy(np.int64)
+        self.linhas_zoom = {nivel: np.flatnonzero(z == nivel) for nivel in range(ZOOM_MAX + 1)}
+        self.indice = IndiceTiles({nivel: (cx[linhas], cy[linhas]) for nivel, linhas in self.linhas_zoom.items()})
+
+    # Função para os meses (partições) de um período 'AAAA-MM' (inclusivo): o ETag de um tile só depende deles
+    def particoes_no_intervalo(self, mes_inicio=None, mes_fim=None):
+        return {mes: h for mes, h in self.particoes.items()
+                if (mes_inicio or "") <= mes <= (mes_fim or "9999-99")}
+
+    # Função para os clusters de um tile no período pedido
+    # Retorna latitude e longitude do centroide e o número de sinistros de cada cluster
+    def tile(self, z, x, y, mes_inicio=None, mes_fim=None):
+        z_base, x_base, y_base = tile_base(z, x, y)
+        posicoes, locais = self.indice.linhas(z_base, x_base, y_base)
+        linhas = self.linhas_zoom[z_base][posicoes]
+        codigo_inicio = np.searchsorted(self.meses, mes_inicio, "left") if mes_inicio else 0
+        codigo_fim = np.searchsorted(self.meses, mes_fim, "right") if mes_fim else len(self.meses)
+        no_periodo = (self.codigo_mes[linhas] >= codigo_inicio) & (self.codigo_mes[linhas] < codigo_fim)
+        linhas, locais = linhas[no_periodo], locais[no_periodo]
+
+        # Soma dos meses de cada uma das 64 células do tile
+        n = CELULAS_TILE * CELULAS_TILE
+        totais = np.bincount(locais, weights=self.total[linhas], minlength=n)
+        ocupadas = np.flatnonzero(totais)
+        totais = totais[ocupadas]
+        latitudes = np.bincount(locais, weights=self.soma_lat[linhas], minlength=n)[ocupadas] / totais
+        longitudes = np.bincount(locais, weights=self.soma_lon[linhas], minlength=n)[ocupadas] / totais
+        return recortar(z, x, y, latitudes, longitudes, totais.astype(np.int64))
+
+
+class MapaAcidentes:
+    # Camada de acidentes carregada de data/mapa/; recarregada quando o metadados.json muda em disco
+    def __init__(self, diretorio=caminho_mapa):
+        self.diretorio = Path(diretorio)
+        self.clusters = DiretorioMonitorado(self.diretorio, self.montar)
+
+    # Função para montar os clusters a partir das partições listadas no metadados.json
+    def montar(self, metadados):
+        partes = [pd.read_parquet(self.diretorio / "acidentes" / f"{mes}.parquet").assign(ano_mes=mes)
+                  for mes in sorted(metadados["particoes"])]
+        tabela = (pd.concat(partes, ignore_index=True) if partes else
+                  pd.DataFrame(columns=["ano_mes", "z", "cx", "cy", "total", "soma_lat", "soma_lon"]))
+        logging.info(f"Mapa de acidentes carregado: {len(tabela)} linhas, {len(partes)} meses.")
+        return ClustersAcidentes(tabela, metadados["particoes"])
+
+    # Função para obter a camada atual (None se ainda não foi construída)
+    def obter(self):
+        return self.clusters.obter()
+
+
+# CAMADA DE RISCO PREVISTO
+
+class ClustersRisco:
+    # Células de rua do cubo de risco, agrupadas por tile em cada zoom (a posição das células não muda)
+    def __init__(self, cubo):
+        self.cubo = cubo
+        ocupadas = np.flatnonzero(cubo.grade.ravel() >= 0)
+        i, j = np.divmod(ocupadas, cubo.grade.shape[1])
+        self.celulas = cubo.grade.ravel()[ocupadas].astype(np.int64)
+        # Centro geométrico de cada célula da grade do cubo
+        self.latitudes = cubo.lat_origem + (i + 0.5) * cubo.tamanho_celula
+        self.longitudes = cubo.lon_origem + (j + 0.5) * cubo.tamanho_celula
+
+        cx, cy = celulas_mercator(self.latitudes, self.longitudes)
+        self.indice = IndiceTiles({z: (cx >> (ZOOM_MAX - z), cy >> (ZOOM_MAX - z)) for z in range(ZOOM_MAX + 1)})
+
+    # Função para os clusters de risco de um tile em um momento (mês, dia da semana, hora) e veículo
+    # Retorna latitude, longitude, número de células, risco médio e risco máximo de cada cluster
+    # (None se o mês não estiver no cubo)
+    def tile(self, z, x, y, mes, dia_semana, hora, veiculo):
+        pos_mes = self.cubo.pos_mes[mes]
+        if pos_mes < 0:
+            return None
+        pos_veiculo = self.cubo.pos_veiculo.get(veiculo, self.cubo.pos_veiculo_padrao)
+
+        posicoes, locais = self.indice.linhas(*tile_base(z, x, y))
+        ordem = np.argsort(self.celulas[posicoes])
+        posicoes, locais = posicoes[ordem], locais[ordem]
+        riscos = self.cubo.risco[self.celulas[posicoes], pos_mes, dia_semana, hora, pos_veiculo] / ESCALA_RISCO
+
+        n = CELULAS_TILE * CELULAS_TILE
+        contagens = np.bincount(locais, minlength=n)
+        maximos = np.zeros(n)
+        np.maximum.at(maximos, locais, riscos)
+        ocupadas = np.flatnonzero(contagens)
+        contagens_ocupadas = contagens[ocupadas]
+        return recortar(
+            z, x, y,
+            np.bincount(locais, weights=self.latitudes[posicoes], minlength=n)[ocupadas] / contagens_ocupadas,
+            np.bincount(locais, weights=self.longitudes[posicoes], minlength=n)[ocupadas] / contagens_ocupadas,
+            contagens_ocupadas,
+            np.bincount(locais, weights=riscos, minlength=n)[ocupadas] / contagens_ocupadas,
+            maximos[ocupadas],
+        )
+
+
+# Função para o ETag (fraco) de um tile: a consulta e o estado dos dados que ela lê
+def etag_tile(*partes):
+    return f'W/"{hashlib.sha1(json.dumps(partes).encode()).hexdigest()[:20]}"'
+
+
+# Função para carregar os sinistros de coordenadas.json (data e coordenadas, exportado pelo insights.ipynb)
+def carregar_coordenadas_json(caminho):
+    return pd.read_json(caminho)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Constrói os clusters do mapa de acidentes por zoom")
+    parser.add_argument("--sinistros", nargs="+", default=[str(caminho_sinistros)],
+                        help="Arquivos de sinistros limpos (CSV ou Parquet)")
+    parser.add_argument("--de-json", help="coordenadas.json do frontend (data_sinistro, latitude, longitude)")
+    parser.add_argument("--destino", default=str(caminho_mapa))
+    args = parser.parse_args()
+
+    if args.de_json:
+        sinistros = carregar_coordenadas_json(args.de_json)
+    else:
+        from src.pre_processamento.armazenamento import carregar
+
+        sinistros = pd.concat([carregar(caminho, colunas=["data_sinistro", "latitude", "longitude"])
+                               for caminho in args.sinistros], ignore_index=True)
+    metadados = construir_mapa(sinistros, args.destino)
+    logging.info(f"Clusters gravados em {args.destino} ({metadados['tempo_construcao_s']} s).")
+
+
+if __name__ == "__main__":
+    main()
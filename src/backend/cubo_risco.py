@@ -0,0 +1,241 @@
+# Cubo de risco pré-calculado sobre a malha viária de Bauru
+#
+# O risco é calculado offline para toda combinação (célula de rua x mês x dia da semana x hora x veículo)
+# e salvo como um array NumPy em disco. Os servidores abrem o cubo com mmap, então todos os workers do
+# uvicorn compartilham a mesma cópia (page cache do sistema) e cada consulta é só um acesso a índice.
+#
+# Construção (na raiz do projeto):
+#   python -m src.backend.cubo_risco --modelo src/model/modelo_risco_viario_3.pkl
+#   python -m src.backend.cubo_risco --modelo src/model/modelo_risco_viario_RF.pkl --veiculo-padrao tp_veiculo_nao_disponivel
+import argparse
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from src.backend.features import COLUNAS_VEICULOS, alinhar_colunas, extrair_model_features
+
+src_path = Path(__file__).parent.parent
+raiz_projeto = src_path.parent
+caminho_ruas = raiz_projeto / "ruas_de_bauru.gpkg"
+caminho_cubos = src_path / "model" / "cubos"
+
+# Eixo de veículos do cubo: as 7 colunas tp_veiculo_* e, por último, "nenhum veículo ativado"
+VEICULOS_CUBO = COLUNAS_VEICULOS + [None]
+
+# Risco gravado como uint16 (0 a 65535), resolução de ~1.5e-5 na probabilidade
+ESCALA_RISCO = 65535
+
+# CRS métrico (SIRGAS 2000 / UTM 22S) usado para amostrar as ruas em metros
+CRS_METRICO = "EPSG:31982"
+
+
+# Função para calcular o hash do artefato do modelo (o cubo só vale para o modelo que o gerou)
+def hash_arquivo(caminho):
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as file:
+        for bloco in iter(lambda: file.read(1 << 20), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+# Função para obter o diretório do cubo de um modelo
+def diretorio_cubo(model_path):
+    return caminho_cubos / Path(model_path).stem
+
+
+# Função para amostrar pontos ao longo das ruas, a cada 'espacamento_m' metros
+def amostrar_ruas(caminho, espacamento_m):
+    import geopandas as gpd
+    import shapely
+
+    ruas = gpd.read_file(caminho)
+    ruas = ruas[ruas.geometry.geom_type.isin(["LineString", "MultiLineString"])].to_crs(CRS_METRICO)
+
+    pontos = []
+    for geometria in ruas.geometry:
+        distancias = np.arange(0, geometria.length + 1e-9, espacamento_m)
+        pontos.append(shapely.get_coordinates(shapely.line_interpolate_point(geometria, distancias)))
+
+    pontos = np.vstack(pontos)
+    pontos_ll = gpd.GeoSeries(gpd.points_from_xy(pontos[:, 0], pontos[:, 1]), crs=CRS_METRICO).to_crs("EPSG:4326")
+    return pontos_ll.y.to_numpy(), pontos_ll.x.to_numpy()
+
+
+# Função para agrupar os pontos amostrados em células regulares de 'tamanho_celula' graus
+# Cada célula é representada pelo centroide dos pontos de rua que caem nela
+def montar_celulas(latitudes, longitudes, tamanho_celula):
+    lat_origem = np.floor(latitudes.min() / tamanho_celula) * tamanho_celula
+    lon_origem = np.floor(longitudes.min() / tamanho_celula) * tamanho_celula
+
+    i = np.floor((latitudes - lat_origem) / tamanho_celula).astype(np.int64)
+    j = np.floor((longitudes - lon_origem) / tamanho_celula).astype(np.int64)
+
+    grade = np.full((i.max() + 1, j.max() + 1), -1, dtype=np.int32)
+    chaves, celula_de_cada_ponto = np.unique(i * grade.shape[1] + j, return_inverse=True)
+    grade.flat[chaves] = np.arange(len(chaves), dtype=np.int32)
+
+    contagem = np.bincount(celula_de_cada_ponto)
+    centro_lat = np.bincount(celula_de_cada_ponto, weights=latitudes) / contagem
+    centro_lon = np.bincount(celula_de_cada_ponto, weights=longitudes) / contagem
+
+    return grade, (float(lat_origem), float(lon_origem)), centro_lat, centro_lon
+
+
+# Função para montar a matriz de features de um bloco de células com todas as combinações temporais
+def matriz_bloco(centro_lat, centro_lon, meses, model_features):
+    n_celulas, n_meses = len(centro_lat), len(meses)
+    forma = (n_celulas, n_meses, 7, 24, len(VEICULOS_CUBO))
+    celula, mes, dia_semana, hora, veiculo = [eixo.ravel() for eixo in np.indices(forma)]
+
+    colunas = {
+        "latitude": centro_lat[celula],
+        "longitude": centro_lon[celula],
+        "dia_semana": dia_semana,
+        "mes": np.asarray(meses)[mes],
+        "is_weekend": (dia_semana >= 5).astype(int),
+        "hora": hora,
+    }
+    for k, col in enumerate(COLUNAS_VEICULOS):
+        colunas[col] = (veiculo == k).astype(int)
+
+    return alinhar_colunas(colunas, model_features, celula.size)
+
+
+# Função para construir o cubo de risco de um modelo e salvá-lo em disco
+def construir_cubo(model_path, destino=None, tamanho_celula=0.002, espacamento_m=50.0,
+                   meses=range(1, 13), veiculo_padrao=None, celulas_por_bloco=16):
+    import joblib
+
+    model = joblib.load(model_path)
+    model_features = extrair_model_features(model)
+    destino = Path(destino) if destino else diretorio_cubo(model_path)
+    destino.mkdir(parents=True, exist_ok=True)
+    meses = [int(m) for m in meses]
+
+    inicio = time.perf_counter()
+    latitudes, longitudes = amostrar_ruas(caminho_ruas, espacamento_m)
+    grade, origem, centro_lat, centro_lon = montar_celulas(latitudes, longitudes, tamanho_celula)
+    n_celulas = len(centro_lat)
+    logging.info(f"{len(latitudes)} pontos de rua agrupados em {n_celulas} células de {tamanho_celula}°.")
+
+    # O cubo é escrito direto no arquivo, bloco a bloco, sem precisar caber na memória
+    forma = (n_celulas, len(meses), 7, 24, len(VEICULOS_CUBO))
+    risco = np.lib.format.open_memmap(destino / "risco.npy", mode="w+", dtype=np.uint16, shape=forma)
+    for bloco in range(0, n_celulas, celulas_por_bloco):
+        fim = min(bloco + celulas_por_bloco, n_celulas)
+        matriz = matriz_bloco(centro_lat[bloco:fim], centro_lon[bloco:fim], meses, model_features)
+        prob = model.predict_proba(pd.DataFrame(matriz, columns=model_features))[:, 1]
+        risco[bloco:fim] = np.rint(prob * ESCALA_RISCO).astype(np.uint16).reshape((fim - bloco,) + forma[1:])
+        logging.info(f"Células {fim}/{n_celulas} calculadas.")
+    risco.flush()
+    del risco
+
+    np.save(destino / "grade.npy", grade)
+    metadados = {
+        "modelo": Path(model_path).name,
+        "modelo_sha256": hash_arquivo(model_path),
+        "model_features": model_features,
+        "origem": origem,
+        "tamanho_celula": tamanho_celula,
+        "espacamento_m": espacamento_m,
+        "meses": meses,
+        "veiculos": VEICULOS_CUBO,
+        "veiculo_padrao": veiculo_padrao,
+        "forma": list(forma),
+        "tempo_construcao_s": round(time.perf_counter() - inicio, 1),
+    }
+    with open(destino / "metadados.json", "w", encoding="utf-8") as file:
+        json.dump(metadados, file, ensure_ascii=False, indent=2)
+
+    logging.info(f"Cubo salvo em {destino} ({metadados['tempo_construcao_s']} s).")
+    return destino
+
+
+class CuboRisco:
+    def __init__(self, risco, grade, metadados):
+        self.risco = risco
+        self.grade = grade
+        self.metadados = metadados
+        self.lat_origem, self.lon_origem = metadados["origem"]
+        self.tamanho_celula = metadados["tamanho_celula"]
+
+        # Tabelas de tradução valor -> posição no eixo (-1 = fora do cubo)
+        self.pos_mes = np.full(13, -1, dtype=np.int64)
+        self.pos_mes[metadados["meses"]] = np.arange(len(metadados["meses"]))
+        self.pos_veiculo = {veiculo: k for k, veiculo in enumerate(metadados["veiculos"])}
+        self.pos_veiculo_padrao = self.pos_veiculo[metadados.get("veiculo_padrao")]
+
+    # Abre o cubo de um diretório; retorna None se não existir ou se foi gerado por outro modelo
+    @classmethod
+    def carregar(cls, diretorio, modelo_sha256=None):
+        diretorio = Path(diretorio)
+        if not (diretorio / "metadados.json").exists():
+            return None
+
+        with open(diretorio / "metadados.json", encoding="utf-8") as file:
+            metadados = json.load(file)
+
+        if modelo_sha256 is not None and metadados["modelo_sha256"] != modelo_sha256:
+            logging.warning(f"Cubo em {diretorio} foi gerado por outra versão do modelo; ignorando.")
+            return None
+
+        risco = np.load(diretorio / "risco.npy", mmap_mode="r")
+        grade = np.load(diretorio / "grade.npy")
+        return cls(risco, grade, metadados)
+
+    # Consulta O(1) de um ponto; retorna None se o ponto/mês estiver fora do cubo
+    def consultar(self, latitude, longitude, mes, dia_semana, hora, veiculo):
+        i = int((latitude - self.lat_origem) // self.tamanho_celula)
+        j = int((longitude - self.lon_origem) // self.tamanho_celula)
+        if not (0 <= i < self.grade.shape[0] and 0 <= j < self.grade.shape[1]):
+            return None
+
+        celula = self.grade[i, j]
+        pos_mes = self.pos_mes[mes]
+        if celula < 0 or pos_mes < 0:
+            return None
+
+        pos_veiculo = self.pos_veiculo.get(veiculo, self.pos_veiculo_padrao)
+        return int(self.risco[celula, pos_mes, dia_semana, hora, pos_veiculo]) / ESCALA_RISCO
+
+    # Consulta vetorizada; pontos fora do cubo voltam como NaN
+    def consultar_lote(self, latitudes, longitudes, meses, dias_semana, horas, veiculos):
+        i = np.floor((np.asarray(latitudes) - self.lat_origem) / self.tamanho_celula).astype(np.int64)
+        j = np.floor((np.asarray(longitudes) - self.lon_origem) / self.tamanho_celula).astype(np.int64)
+        dentro = (i >= 0) & (i < self.grade.shape[0]) & (j >= 0) & (j < self.grade.shape[1])
+
+        celula = np.full(len(i), -1, dtype=np.int64)
+        celula[dentro] = self.grade[i[dentro], j[dentro]]
+        pos_mes = self.pos_mes[np.asarray(meses)]
+        encontrado = (celula >= 0) & (pos_mes >= 0)
+
+        pos_veiculo = np.array([self.pos_veiculo.get(v, self.pos_veiculo_padrao) for v in veiculos], dtype=np.int64)
+        riscos = np.full(len(i), np.nan)
+        riscos[encontrado] = self.risco[
+            celula[encontrado], pos_mes[encontrado],
+            np.asarray(dias_semana)[encontrado], np.asarray(horas)[encontrado], pos_veiculo[encontrado],
+        ] / ESCALA_RISCO
+        return riscos
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Constrói o cubo de risco pré-calculado de um modelo")
+    parser.add_argument("--modelo", required=True, help="Caminho do artefato .pkl")
+    parser.add_argument("--destino", help="Diretório de saída (padrão: src/model/cubos/<modelo>)")
+    parser.add_argument("--tamanho-celula", type=float, default=0.002, help="Lado da célula em graus")
+    parser.add_argument("--espacamento", type=float, default=50.0, help="Espaçamento da amostragem das ruas (m)")
+    parser.add_argument("--meses", type=int, nargs="+", default=list(range(1, 13)), help="Meses incluídos no cubo")
+    parser.add_argument("--veiculo-padrao", default=None, help="Coluna usada para veículos desconhecidos")
+    args = parser.parse_args()
+
+    construir_cubo(args.modelo, args.destino, args.tamanho_celula, args.espacamento, args.meses, args.veiculo_padrao)
+
+
+if __name__ == "__main__":
+    main()
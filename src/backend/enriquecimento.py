@@ -0,0 +1,465 @@
+# Enriquecimento das features 'tipo_via_num' e 'Chuva' no momento da requisição
+#
+# Os modelos foram treinados com o tipo de via e a chuva de cada ponto, mas o cliente só envia coordenadas,
+# veículo e (no lote) o momento. Antes os dois campos iam sempre com 0. Dois índices, carregados uma vez,
+# preenchem esses campos sem ida e volta extra ao cliente. No servidor os dois são carregados numa thread de
+# fundo (em_segundo_plano=True), para não atrasar a inicialização; uma consulta que chegue antes espera a carga
+# terminar, então nenhum ponto é respondido com a feature zerada por engano:
+#
+# - IndiceTipoVia: tipo de via da geometria mais próxima de ruas_de_bauru.gpkg, com o mesmo mapeamento
+#   (RODOVIAS_OSM) e a mesma busca (todas as geometrias, distância em graus) da amostragem negativa.
+#   Uma grade pré-calculada guarda, para cada célula, se o resultado é o mesmo em qualquer ponto dela
+#   (0 ou 1); só os pontos em células "mistas" (perto de uma rodovia e de uma via municipal ao mesmo
+#   tempo) vão para a busca exata na STRtree. A grade é exata: uma célula só é marcada como pura quando
+#   a diferença entre as distâncias ao centro até a rodovia e até a via municipal mais próximas supera a
+#   diagonal da célula. O arquivo da grade também guarda as geometrias (WKB) e o tipo de cada uma, então o
+#   servidor não precisa do GeoPandas nem de ler o GeoPackage na inicialização
+# - FonteChuva: série horária do INMET (serie_inmet_horaria.csv) e, opcionalmente, um CSV local com as
+#   leituras recentes no mesmo formato (estacao;datetime_brt;precipitacao_mm), relido quando muda.
+#   Cada ponto recebe a última leitura da sua estação em até 'tolerancia_min' minutos antes do momento,
+#   como na junção dos sinistros (juncao_chuva.juntar_chuva); Chuva = 1 se choveu (precipitação > 0)
+#
+# Construção da grade (na raiz do projeto):
+#   python -m src.backend.enriquecimento
+#   python -m src.backend.enriquecimento --lado 0.001
+import argparse
+import logging
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from functools import partial
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from src.backend.cubo_risco import caminho_ruas, hash_arquivo
+from src.pre_processamento.Amostragem.amostragem_negativa import RODOVIAS_OSM
+from src.pre_processamento.Chuva.juncao_chuva import TOLERANCIA_PADRAO_MIN, caminho_serie, consolidar
+
+raiz_projeto = Path(__file__).parent.parent.parent
+caminho_grade_tipo_via = raiz_projeto / "data" / "enriquecimento" / "tipo_via.npz"
+
+# Valor da grade para células em que o tipo de via muda dentro da célula (busca exata na STRtree)
+CELULA_MISTA = 2
+
+# Lado padrão das células da grade, em graus (~55 m): ~97% das células de Bauru ficam puras
+LADO_GRADE_GRAUS = 0.0005
+
+EPOCA = datetime(1970, 1, 1)
+
+
+# Função para carregar as geometrias de ruas_de_bauru.gpkg como na amostragem negativa: linhas quebradas em
+# segmentos de 2 vértices, demais geometrias inteiras, e o tipo de via (0/1) de cada uma
+def geometrias_tipo_via(caminho=caminho_ruas):
+    import geopandas as gpd
+    import shapely
+
+    ruas = gpd.read_file(caminho, columns=["highway"])
+    geometrias = ruas.geometry.to_numpy()
+    tipo_via = ruas["highway"].isin(RODOVIAS_OSM).astype(np.uint8).to_numpy()
+
+    linhas = shapely.get_type_id(geometrias) == 1
+    coordenadas, rua = shapely.get_coordinates(geometrias[linhas], return_index=True)
+    mesma_rua = rua[1:] == rua[:-1]
+    segmentos = shapely.linestrings(np.stack([coordenadas[:-1][mesma_rua], coordenadas[1:][mesma_rua]], axis=1))
+    return (np.concatenate([segmentos, geometrias[~linhas]]),
+            np.concatenate([tipo_via[linhas][rua[:-1][mesma_rua]], tipo_via[~linhas]]),
+            ruas.total_bounds)
+
+
+# Função para calcular a grade de tipo de via: 0 ou 1 nas células puras, CELULA_MISTA nas demais
+def calcular_grade(geometrias, tipo_via, limites, lado=LADO_GRADE_GRAUS):
+    import shapely
+
+    min_lon, min_lat, max_lon, max_lat = limites
+    linhas = int(np.ceil((max_lat - min_lat) / lado))
+    colunas = int(np.ceil((max_lon - min_lon) / lado))
+    i, j = np.divmod(np.arange(linhas * colunas), colunas)
+    centros = shapely.points(min_lon + (j + 0.5) * lado, min_lat + (i + 0.5) * lado)
+
+    # Distância do centro até a rodovia e até a via municipal mais próximas. Em qualquer ponto da célula,
+    # cada distância muda no máximo meia diagonal, então a ordem entre elas só é garantida com essa folga
+    distancias = []
+    for valor in (0, 1):
+        arvore = shapely.STRtree(geometrias[tipo_via == valor])
+        if len(arvore) == 0:
+            distancias.append(np.full(len(centros), np.inf))
+            continue
+        (idx_centros, _), distancia = arvore.query_nearest(centros, return_distance=True, all_matches=False)
+        distancias.append(np.full(len(centros), np.inf))
+        distancias[-1][idx_centros] = distancia
+    municipal, rodovia = distancias
+
+    meia_diagonal = lado * np.sqrt(2) / 2
+    grade = np.full(linhas * colunas, CELULA_MISTA, dtype=np.uint8)
+    grade[rodovia - meia_diagonal > municipal + meia_diagonal] = 0
+    grade[municipal - meia_diagonal > rodovia + meia_diagonal] = 1
+    return grade.reshape(linhas, colunas)
+
+
+# Função para construir e salvar a grade de tipo de via, com as geometrias usadas na busca exata e o hash
+# do GeoPackage que a gerou
+def construir_grade(caminho_gpkg=caminho_ruas, destino=caminho_grade_tipo_via, lado=LADO_GRADE_GRAUS):
+    import shapely
+
+    inicio = time.perf_counter()
+    geometrias, tipo_via, limites = geometrias_tipo_via(caminho_gpkg)
+    grade = calcular_grade(geometrias, tipo_via, limites, lado)
+
+    # As geometrias vão como um único bloco de WKB e o fim de cada uma dentro dele
+    wkb = shapely.to_wkb(geometrias)
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    temporario = destino.with_suffix(".tmp.npz")
+    np.savez(temporario, grade=grade, origem=np.array([limites[1], limites[0]]), lado=np.array(lado),
+             wkb=np.frombuffer(b"".join(wkb), dtype=np.uint8), fim_wkb=np.cumsum([len(g) for g in wkb]),
+             tipo_via=tipo_via, sha256_ruas=np.array(hash_arquivo(caminho_gpkg)))
+    os.replace(temporario, destino)
+
+    contagens = np.bincount(grade.ravel(), minlength=3)
+    logging.info(f"Grade de tipo de via {grade.shape[0]} x {grade.shape[1]} (lado {lado}°) construída em "
+                 f"{time.perf_counter() - inicio:.1f} s: {contagens[0]} células municipais, {contagens[1]} de "
+                 f"rodovia e {contagens[2]} mistas ({contagens[2] / grade.size:.1%}) -> {destino}")
+    return grade
+
+
+# Função para ler as geometrias (WKB) guardadas no arquivo da grade
+def ler_geometrias(caminho_grade):
+    import shapely
+
+    with np.load(caminho_grade) as arquivo:
+        bloco, fins = arquivo["wkb"].tobytes(), arquivo["fim_wkb"].tolist()
+    return shapely.from_wkb(np.array([bloco[a:b] for a, b in zip([0] + fins[:-1], fins)], dtype=object))
+
+
+class IndiceTipoVia:
+    # geometrias/tipo_via: saída de geometrias_tipo_via; grade/origem/lado: grade pré-calculada (None = só
+    # a busca exata). 'geometrias' também pode ser uma função que as devolve: a STRtree só é montada na
+    # primeira busca exata (com a grade, a maior parte dos pontos nunca precisa dela)
+    def __init__(self, geometrias, tipo_via, grade=None, origem=(0.0, 0.0), lado=LADO_GRADE_GRAUS):
+        self.tipo_via = tipo_via
+        self.geometrias = geometrias
+        self.arvore_geometrias = None
+        self.lock = threading.Lock()
+        self.grade = grade
+        self.lat_origem, self.lon_origem = float(origem[0]), float(origem[1])
+        self.lado = float(lado)
+        self.celulas_mistas = float((grade == CELULA_MISTA).mean()) if grade is not None else None
+        self.buscas_exatas = 0
+
+    # Função para carregar o índice do arquivo da grade; sem ele, as geometrias vêm do GeoPackage e todo ponto
+    # usa a busca exata
+    # 'preparar': monta a STRtree já na carga (sem ele, as geometrias só são lidas na primeira busca exata)
+    @classmethod
+    def carregar(cls, caminho_grade=caminho_grade_tipo_via, caminho_gpkg=caminho_ruas, preparar=True):
+        inicio = time.perf_counter()
+        if caminho_grade is not None and Path(caminho_grade).exists():
+            with np.load(caminho_grade) as arquivo:
+                indice = cls(partial(ler_geometrias, caminho_grade), arquivo["tipo_via"], arquivo["grade"],
+                             arquivo["origem"], float(arquivo["lado"]))
+                sha256_ruas = str(arquivo["sha256_ruas"])
+            if Path(caminho_gpkg).exists() and hash_arquivo(caminho_gpkg) != sha256_ruas:
+                logging.warning(f"Grade de tipo de via {caminho_grade} foi gerada de outra versão de "
+                                f"{Path(caminho_gpkg).name} (reconstrua com python -m src.backend.enriquecimento).")
+        else:
+            logging.warning(f"Grade de tipo de via {caminho_grade} não encontrada; usando só a busca exata.")
+            geometrias, tipo_via, _ = geometrias_tipo_via(caminho_gpkg)
+            indice = cls(geometrias, tipo_via)
+        if preparar:
+            indice.arvore
+
+        logging.info(f"Índice de tipo de via com {len(indice.tipo_via)} geometrias "
+                     f"({'com' if indice.grade is not None else 'sem'} grade) carregado em "
+                     f"{time.perf_counter() - inicio:.2f} s.")
+        return indice
+
+    # STRtree das geometrias, montada na primeira vez em que é usada
+    @property
+    def arvore(self):
+        import shapely
+
+        if self.arvore_geometrias is None:
+            with self.lock:
+                if self.arvore_geometrias is None:
+                    geometrias = self.geometrias() if callable(self.geometrias) else self.geometrias
+                    self.arvore_geometrias = shapely.STRtree(geometrias)
+                    self.geometrias = None
+        return self.arvore_geometrias
+
+    # Função para o tipo de via exato (geometria mais próxima) de vários pontos
+    def buscar(self, latitudes, longitudes):
+        import shapely
+
+        self.buscas_exatas += len(latitudes)
+        (idx_pontos, idx_geometrias) = self.arvore.query_nearest(shapely.points(longitudes, latitudes),
+                                                                 all_matches=False)
+        tipos = np.zeros(len(latitudes), dtype=np.uint8)
+        tipos[idx_pontos] = self.tipo_via[idx_geometrias]
+        return tipos
+
+    # Função para o tipo de via de vários pontos: grade e, para as células mistas ou fora dela, a busca exata
+    def consultar(self, latitudes, longitudes):
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        if self.grade is None:
+            return self.buscar(latitudes, longitudes)
+
+        i = np.floor((latitudes - self.lat_origem) / self.lado).astype(np.int64)
+        j = np.floor((longitudes - self.lon_origem) / self.lado).astype(np.int64)
+        dentro = (i >= 0) & (i < self.grade.shape[0]) & (j >= 0) & (j < self.grade.shape[1])
+        tipos = np.full(len(latitudes), CELULA_MISTA, dtype=np.uint8)
+        tipos[dentro] = self.grade[i[dentro], j[dentro]]
+
+        exatos = tipos == CELULA_MISTA
+        if exatos.any():
+            tipos[exatos] = self.buscar(latitudes[exatos], longitudes[exatos])
+        return tipos
+
+    # Função para o tipo de via de um único ponto (caminho do /calcular_risco, sem arrays)
+    def consultar_ponto(self, latitude, longitude):
+        if self.grade is not None:
+            i = int((latitude - self.lat_origem) // self.lado)
+            j = int((longitude - self.lon_origem) // self.lado)
+            if 0 <= i < self.grade.shape[0] and 0 <= j < self.grade.shape[1]:
+                tipo = int(self.grade[i, j])
+                if tipo != CELULA_MISTA:
+                    return tipo
+        return int(self.buscar([latitude], [longitude])[0])
+
+    def estado(self):
+        return {
+            "geometrias": len(self.tipo_via),
+            "grade": list(self.grade.shape) if self.grade is not None else None,
+            "lado_grade": self.lado if self.grade is not None else None,
+            "celulas_mistas": round(self.celulas_mistas, 4) if self.grade is not None else None,
+            "arvore_montada": self.arvore_geometrias is not None,
+            "buscas_exatas": self.buscas_exatas,
+        }
+
+
+class FonteChuva:
+    # caminhos: CSVs estacao;datetime_brt;precipitacao_mm (a série do INMET e o feed local); nas leituras
+    # repetidas vale a do último arquivo. estacoes: CSV codigo;latitude;longitude, obrigatório com mais de
+    # uma estação. intervalo_s: de quanto em quanto tempo, no máximo, os arquivos são conferidos
+    def __init__(self, caminhos, estacoes=None, tolerancia_min=TOLERANCIA_PADRAO_MIN, intervalo_s=60.0,
+                 em_segundo_plano=False):
+        self.caminhos = [Path(caminho) for caminho in caminhos]
+        self.caminho_estacoes = estacoes
+        self.tolerancia = np.int64(tolerancia_min * 60 * 10**9)
+        self.intervalo_s = intervalo_s
+        self.lock = threading.Lock()
+        self.proxima_conferencia = 0.0
+        self.versao = None
+        self.recargas = 0
+        # (códigos das estações, KD-tree das estações ou None, [(tempos em ns, choveu, tempos em lista)] por
+        # estação); a lista serve à busca de um único ponto (bisect numa lista é bem mais barato que no NumPy)
+        self.dados = ((), None, [])
+        self.pronta = threading.Event()
+        if em_segundo_plano:
+            threading.Thread(target=self.carregar_inicial, name="carga-chuva", daemon=True).start()
+        else:
+            self.carregar_inicial()
+
+    # Primeira leitura dos arquivos; as consultas esperam por ela
+    def carregar_inicial(self):
+        try:
+            self.atualizar(forcar=True)
+        finally:
+            self.pronta.set()
+
+    # Função para identificar o conteúdo atual dos arquivos (tamanho e data de modificação)
+    def versao_arquivos(self):
+        versao = []
+        for caminho in self.caminhos:
+            try:
+                info = caminho.stat()
+                versao.append((str(caminho), info.st_size, info.st_mtime_ns))
+            except FileNotFoundError:
+                versao.append((str(caminho), None, None))
+        return tuple(versao)
+
+    # Função para reler os arquivos se mudaram (conferidos no máximo a cada 'intervalo_s')
+    def atualizar(self, forcar=False):
+        agora = time.monotonic()
+        if not forcar and agora < self.proxima_conferencia:
+            return
+        with self.lock:
+            if not forcar and agora < self.proxima_conferencia:
+                return
+            self.proxima_conferencia = agora + self.intervalo_s
+            versao = self.versao_arquivos()
+            if versao == self.versao:
+                return
+            try:
+                self.dados = self.montar()
+                self.versao = versao
+                self.recargas += 1
+            except Exception as e:
+                logging.error(f"Falha ao carregar a chuva ({', '.join(map(str, self.caminhos))}): {e}")
+
+    # Função para montar, por estação, os tempos das leituras (ordenados) e se choveu em cada uma
+    def montar(self):
+        inicio = time.perf_counter()
+        series = [pd.read_csv(caminho, sep=";", encoding="utf-8-sig", usecols=["estacao", "datetime_brt", "precipitacao_mm"],
+                              parse_dates=["datetime_brt"], dtype={"estacao": str})
+                  for caminho in self.caminhos if caminho.exists()]
+        if not series:
+            logging.warning(f"Nenhuma leitura de chuva encontrada ({', '.join(map(str, self.caminhos))}); Chuva = 0.")
+            return (), None, []
+
+        serie = consolidar(series)
+        codigos = serie["estacao"].unique().tolist()
+        arvore = None
+        if self.caminho_estacoes is not None:
+            from scipy.spatial import cKDTree
+
+            estacoes = pd.read_csv(self.caminho_estacoes, sep=";", dtype={"codigo": str}).set_index("codigo")
+            codigos = [codigo for codigo in codigos if codigo in estacoes.index]
+            arvore = cKDTree(estacoes.loc[codigos, ["latitude", "longitude"]].to_numpy(dtype=float))
+        elif len(codigos) > 1:
+            raise ValueError("As leituras têm mais de uma estação: informe o CSV de estações.")
+
+        leituras = []
+        for codigo in codigos:
+            da_estacao = serie[serie["estacao"] == codigo]
+            # Leitura ausente conta como sem chuva, como em juncao_chuva.classificar_chuva
+            tempos = da_estacao["datetime_brt"].to_numpy().astype("datetime64[ns]").view(np.int64)
+            leituras.append((tempos, da_estacao["precipitacao_mm"].fillna(0).to_numpy() > 0, tempos.tolist()))
+        logging.info(f"Chuva: {len(serie)} leituras de {len(codigos)} estação(ões) carregadas em "
+                     f"{time.perf_counter() - inicio:.2f} s (até {serie['datetime_brt'].max()}).")
+        return tuple(codigos), arvore, leituras
+
+    # Função para a chuva (0/1) de vários pontos; momentos: datetime64 no horário de Brasília
+    def consultar(self, latitudes, longitudes, momentos):
+        if not self.pronta.is_set():
+            self.pronta.wait()
+        self.atualizar()
+        codigos, arvore, leituras = self.dados
+        n_itens = len(latitudes)
+        chuva = np.zeros(n_itens, dtype=np.uint8)
+        if not leituras:
+            return chuva
+
+        tempos = np.broadcast_to(np.asarray(momentos, dtype="datetime64[ns]").view(np.int64), (n_itens,))
+        if arvore is None:
+            estacao = np.zeros(n_itens, dtype=np.int64)
+        else:
+            # Distância em graus sem correção da longitude (as estações ficam a dezenas de km umas das outras)
+            _, estacao = arvore.query(np.column_stack([latitudes, longitudes]))
+
+        for k, (tempos_estacao, choveu, _) in enumerate(leituras):
+            itens = np.flatnonzero(estacao == k) if arvore is not None else slice(None)
+            if len(tempos_estacao) == 0:
+                continue
+            # Última leitura em ou antes do momento, aceita só dentro da tolerância
+            posicao = np.searchsorted(tempos_estacao, tempos[itens], side="right") - 1
+            valida = (posicao >= 0) & (tempos[itens] - tempos_estacao[np.maximum(posicao, 0)] <= self.tolerancia)
+            chuva[itens] = valida & choveu[np.maximum(posicao, 0)]
+        return chuva
+
+    # Função para a chuva (0/1) de um único ponto; momento: datetime sem timezone, no horário de Brasília
+    def consultar_ponto(self, latitude, longitude, momento):
+        if not self.pronta.is_set():
+            self.pronta.wait()
+        self.atualizar()
+        codigos, arvore, leituras = self.dados
+        if not leituras:
+            return 0
+        k = 0 if arvore is None else int(arvore.query([latitude, longitude])[1])
+        _, choveu, tempos_estacao = leituras[k]
+        tempo = (momento - EPOCA) // timedelta(microseconds=1) * 1000
+        posicao = bisect_right(tempos_estacao, tempo) - 1
+        if posicao < 0 or tempo - tempos_estacao[posicao] > self.tolerancia:
+            return 0
+        return int(choveu[posicao])
+
+    # Função para o momento da última leitura carregada (para alertar quando o feed para de chegar)
+    def ultima_leitura(self):
+        _, _, leituras = self.dados
+        ultimos = [tempos[-1] for tempos, _, _ in leituras if len(tempos)]
+        return pd.Timestamp(max(ultimos)) if ultimos else None
+
+    def estado(self):
+        codigos, _, leituras = self.dados
+        ultima = self.ultima_leitura()
+        return {
+            "arquivos": [str(caminho) for caminho in self.caminhos if caminho.exists()],
+            "estacoes": list(codigos),
+            "leituras": int(sum(len(tempos) for tempos, _, _ in leituras)),
+            "ultima_leitura": ultima.isoformat() if ultima is not None else None,
+            "tolerancia_min": int(self.tolerancia // (60 * 10**9)),
+            "recargas": self.recargas,
+            "carregando": not self.pronta.is_set(),
+        }
+
+
+class Enriquecimento:
+    # tipo_via: IndiceTipoVia ou None; chuva: FonteChuva ou None (None = a feature fica com 0)
+    # carregar_tipo_via: função que devolve o IndiceTipoVia, chamada numa thread de fundo (no lugar de tipo_via)
+    def __init__(self, tipo_via=None, chuva=None, carregar_tipo_via=None):
+        self.indice_tipo_via = tipo_via
+        self.chuva = chuva
+        self.tipo_via_pronto = threading.Event()
+        if carregar_tipo_via is None:
+            self.tipo_via_pronto.set()
+        else:
+            threading.Thread(target=self.carregar_tipo_via, args=(carregar_tipo_via,), name="carga-tipo-via",
+                             daemon=True).start()
+
+    # Carga do índice de tipo de via em segundo plano; se falhar, tipo_via_num fica com 0
+    def carregar_tipo_via(self, carregar):
+        try:
+            self.indice_tipo_via = carregar()
+        except Exception as e:
+            logging.error(f"Falha ao carregar o índice de tipo de via (tipo_via_num = 0): {e}")
+        finally:
+            self.tipo_via_pronto.set()
+
+    # Índice de tipo de via, esperando a carga em segundo plano se ela ainda não terminou
+    @property
+    def tipo_via(self):
+        if not self.tipo_via_pronto.is_set():
+            self.tipo_via_pronto.wait()
+        return self.indice_tipo_via
+
+    # Função para as colunas 'Chuva' e 'tipo_via_num' de vários pontos (mesmo formato de features_temporais)
+    def colunas(self, latitudes, longitudes, momentos):
+        n_itens = len(latitudes)
+        return {
+            "Chuva": (self.chuva.consultar(latitudes, longitudes, momentos) if self.chuva is not None
+                      else np.zeros(n_itens, dtype=np.uint8)),
+            "tipo_via_num": (self.tipo_via.consultar(latitudes, longitudes) if self.tipo_via is not None
+                             else np.zeros(n_itens, dtype=np.uint8)),
+        }
+
+    # Função para (chuva, tipo_via) de um único ponto
+    def ponto(self, latitude, longitude, momento):
+        chuva = self.chuva.consultar_ponto(latitude, longitude, momento) if self.chuva is not None else 0
+        tipo_via = self.tipo_via.consultar_ponto(latitude, longitude) if self.tipo_via is not None else 0
+        return chuva, tipo_via
+
+    def estado(self):
+        if not self.tipo_via_pronto.is_set():
+            return {"tipo_via": "carregando", "chuva": self.chuva.estado() if self.chuva is not None else None}
+        return {
+            "tipo_via": self.tipo_via.estado() if self.tipo_via is not None else None,
+            "chuva": self.chuva.estado() if self.chuva is not None else None,
+        }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Constrói a grade de tipo de via usada no enriquecimento das requisições")
+    parser.add_argument("--ruas", default=str(caminho_ruas), help="GeoPackage das ruas")
+    parser.add_argument("--destino", default=str(caminho_grade_tipo_via))
+    parser.add_argument("--lado", type=float, default=LADO_GRADE_GRAUS, help="Lado da célula em graus")
+    args = parser.parse_args()
+
+    construir_grade(args.ruas, args.destino, args.lado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Executor de inferência com micro-lotes dinâmicos
+#
+# O /calcular_risco é async: rodar o modelo direto nele bloqueia o event loop do uvicorn, e todas as
+# requisições concorrentes ficam esperando uma atrás da outra. O executor tira esse trabalho do loop:
+# - Cada requisição entra numa fila (asyncio.Queue) e espera por um Future
+# - Um coletor junta os pedidos que chegam dentro de 'janela_ms' (ou até 'tamanho_maximo_lote').
+#   Se o executor está ocioso, o pedido sai sozinho, sem esperar a janela (sem custo de latência sem carga)
+# - O lote vira uma única matriz de features e uma única predição, rodada em um pool de threads
+#   (NumPy, Scikit-learn e XGBoost liberam o GIL nas partes pesadas)
+# - Cada Future recebe o risco do seu item
+#
+# Fila cheia (mais de 'profundidade_maxima_fila' pedidos esperando) gera FilaCheia, para o servidor
+# responder 503 em vez de acumular latência sem limite.
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from src.backend.features import montar_matriz_features
+
+
+class FilaCheia(Exception):
+    pass
+
+
+class ExecutorInferencia:
+    # etapas: histograma opcional (modelo, etapa) com o tempo de montar as features e de rodar o modelo
+    def __init__(self, janela_ms=3.0, tamanho_maximo_lote=256, trabalhadores=2, profundidade_maxima_fila=10_000,
+                 etapas=None):
+        self.etapas = etapas
+        self.janela_s = janela_ms / 1000
+        self.tamanho_maximo_lote = tamanho_maximo_lote
+        self.trabalhadores = trabalhadores
+        self.profundidade_maxima_fila = profundidade_maxima_fila
+        self.pool = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="inferencia")
+        self.lock = threading.Lock()
+        self.fila = None
+        self.loop = None
+        self.coletor = None
+        self.lotes = 0
+        self.itens = 0
+        self.maior_lote = 0
+        self.rejeitados = 0
+        self.tempo_modelo_s = 0.0
+
+    # Cria a fila e o coletor no event loop em execução (o loop só existe depois que o servidor sobe)
+    def iniciar(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is loop and self.coletor is not None and not self.coletor.done():
+            return
+        self.loop = loop
+        self.fila = asyncio.Queue(maxsize=self.profundidade_maxima_fila)
+        # Limita os lotes em voo ao número de threads: o excedente espera na fila e entra no próximo lote
+        self.vagas = asyncio.Semaphore(self.trabalhadores)
+        self.em_voo = 0
+        self.coletor = loop.create_task(self.coletar())
+
+    # Função para pedir o risco de um item; 'modelo' é um ModeloRegistrado
+    # chuva e tipo_via: features do enriquecimento (0 quando desativado)
+    async def prever(self, modelo, latitude, longitude, veiculo, mes, dia_semana, hora, chuva=0, tipo_via=0):
+        self.iniciar()
+        futuro = self.loop.create_future()
+        try:
+            self.fila.put_nowait((modelo, latitude, longitude, veiculo, mes, dia_semana, hora, chuva, tipo_via, futuro))
+        except asyncio.QueueFull:
+            self.rejeitados += 1
+            raise FilaCheia(f"Fila de inferência cheia ({self.profundidade_maxima_fila} pedidos).")
+        return await futuro
+
+    # Laço do coletor: espera o primeiro pedido e junta os que chegarem dentro da janela
+    async def coletar(self):
+        while True:
+            pedidos = [await self.fila.get()]
+            # Sem carga (nenhum lote em voo e fila vazia) não há com quem agrupar: despacha na hora
+            ocioso = self.em_voo == 0 and self.fila.empty()
+            limite = self.loop.time() + (0 if ocioso else self.janela_s)
+            while len(pedidos) < self.tamanho_maximo_lote:
+                restante = limite - self.loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    pedidos.append(await asyncio.wait_for(self.fila.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+            # O que já estiver na fila também entra, sem esperar
+            while len(pedidos) < self.tamanho_maximo_lote and not self.fila.empty():
+                pedidos.append(self.fila.get_nowait())
+
+            await self.vagas.acquire()
+            self.em_voo += 1
+            self.loop.create_task(self.despachar(pedidos))
+
+    # Roda o lote no pool de threads e entrega o resultado de cada pedido
+    async def despachar(self, pedidos):
+        try:
+            # Um lote pode misturar modelos (ex: campo 'modelo' diferente, ou uma recarga no meio do caminho)
+            grupos = {}
+            for pedido in pedidos:
+                grupos.setdefault(id(pedido[0]), []).append(pedido)
+
+            for grupo in grupos.values():
+                try:
+                    riscos = await self.loop.run_in_executor(self.pool, self.prever_lote, grupo)
+                except Exception as e:
+                    logging.error(f"Erro na predição do micro-lote: {e}")
+                    for pedido in grupo:
+                        if not pedido[-1].done():
+                            pedido[-1].set_exception(e)
+                    continue
+
+                for pedido, risco in zip(grupo, riscos.tolist()):
+                    if not pedido[-1].done():  # o cliente pode ter desistido
+                        pedido[-1].set_result(risco)
+        finally:
+            self.em_voo -= 1
+            self.vagas.release()
+
+    # Monta a matriz do lote e roda o modelo (executado numa thread do pool)
+    def prever_lote(self, grupo):
+        inicio = time.perf_counter()
+        modelo = grupo[0][0]
+        _, latitudes, longitudes, veiculos, meses, dias_semana, horas, chuvas, tipos_via, _ = zip(*grupo)
+        dias_semana = np.array(dias_semana)
+        temporais = {
+            "dia_semana": dias_semana,
+            "mes": np.array(meses),
+            "is_weekend": (dias_semana >= 5).astype(int),
+            "hora": np.array(horas),
+            "Chuva": np.array(chuvas),
+            "tipo_via_num": np.array(tipos_via),
+        }
+        matriz = montar_matriz_features(latitudes, longitudes, veiculos, temporais,
+                                        modelo.model_features, modelo.veiculo_padrao)
+        inicio_modelo = time.perf_counter()
+        riscos = np.asarray(modelo.prever_riscos(matriz), dtype=float)
+        if self.etapas is not None:
+            fim = time.perf_counter()
+            self.etapas.observar(inicio_modelo - inicio, modelo.nome, "features")
+            self.etapas.observar(fim - inicio_modelo, modelo.nome, "inferencia")
+
+        with self.lock:
+            self.lotes += 1
+            self.itens += len(grupo)
+            self.maior_lote = max(self.maior_lote, len(grupo))
+            self.tempo_modelo_s += time.perf_counter() - inicio
+        return riscos
+
+    def estatisticas(self):
+        return {
+            "janela_ms": self.janela_s * 1000,
+            "tamanho_maximo_lote": self.tamanho_maximo_lote,
+            "trabalhadores": self.trabalhadores,
+            "profundidade_maxima_fila": self.profundidade_maxima_fila,
+            "fila_atual": self.fila.qsize() if self.fila is not None else 0,
+            "lotes_em_voo": self.em_voo if self.fila is not None else 0,
+            "lotes": self.lotes,
+            "itens": self.itens,
+            "tamanho_medio_lote": round(self.itens / self.lotes, 2) if self.lotes else 0.0,
+            "maior_lote": self.maior_lote,
+            "rejeitados": self.rejeitados,
+            "tempo_modelo_s": round(self.tempo_modelo_s, 3),
+        }
@@ -0,0 +1,115 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+
+# Colunas de veículo usadas no treino (mesma ordem do dataset_final_para_modelo*.csv)
+COLUNAS_VEICULOS = [
+    "tp_veiculo_bicicleta",
+    "tp_veiculo_caminhao",
+    "tp_veiculo_motocicleta",
+    "tp_veiculo_nao_disponivel",
+    "tp_veiculo_onibus",
+    "tp_veiculo_outros",
+    "tp_veiculo_automovel",
+]
+
+
+# Fuso usado para converter timestamps com timezone para o horário local de Bauru
+FUSO_BAURU = ZoneInfo("America/Sao_Paulo")
+
+
+# Função para converter uma lista de momentos (datetime ou None = agora) para o horário local de Bauru, sem timezone
+def momentos_locais(momentos):
+    agora = datetime.now()
+    if all(m is None for m in momentos):
+        return pd.DatetimeIndex(np.full(len(momentos), np.datetime64(agora, "ns")))
+    return pd.DatetimeIndex([
+        agora if m is None
+        else m.astimezone(FUSO_BAURU).replace(tzinfo=None) if m.tzinfo is not None
+        else m
+        for m in momentos
+    ])
+
+
+# Função para extrair as features temporais de uma lista de momentos (datetime ou None = agora)
+# Também aceita o DatetimeIndex já convertido por momentos_locais
+def features_temporais(momentos):
+    # Caso comum: nenhum item trouxe timestamp, todos usam o mesmo "agora"
+    if not isinstance(momentos, pd.DatetimeIndex) and all(m is None for m in momentos):
+        agora = datetime.now()
+        n_itens = len(momentos)
+        dia_semana = agora.weekday()
+        return {
+            "dia_semana": np.full(n_itens, dia_semana),
+            "mes": np.full(n_itens, agora.month),
+            "is_weekend": np.full(n_itens, 1 if dia_semana >= 5 else 0),
+            "hora": np.full(n_itens, agora.hour),
+        }
+
+    if not isinstance(momentos, pd.DatetimeIndex):
+        momentos = momentos_locais(momentos)
+    dia_semana = momentos.dayofweek.to_numpy()
+    return {
+        "dia_semana": dia_semana,
+        "mes": momentos.month.to_numpy(),
+        "is_weekend": (dia_semana >= 5).astype(int),
+        "hora": momentos.hour.to_numpy(),
+    }
+
+
+# Função para montar a matriz de features (n_itens x model_features) de uma só vez
+# temporais: dicionário devolvido por features_temporais
+# veiculo_padrao: coluna ativada quando o veículo enviado não é uma feature conhecida (None = nenhuma)
+def montar_matriz_features(latitudes, longitudes, veiculos, temporais, model_features, veiculo_padrao=None):
+    n_itens = len(latitudes)
+    colunas = {
+        "latitude": np.asarray(latitudes, dtype=float),
+        "longitude": np.asarray(longitudes, dtype=float),
+    }
+    colunas.update(temporais)
+
+    # One-hot dos veículos: cada item ativa no máximo uma coluna tp_veiculo_*
+    veiculos = np.asarray(veiculos, dtype=object)
+    conhecidos = np.isin(veiculos, COLUNAS_VEICULOS)
+    if veiculo_padrao is not None:
+        veiculos = np.where(conhecidos, veiculos, veiculo_padrao)
+    for col in COLUNAS_VEICULOS:
+        colunas[col] = (veiculos == col).astype(int)
+
+    return alinhar_colunas(colunas, model_features, n_itens)
+
+
+# Função para alinhar um dicionário de colunas à ordem exata de model_features
+# Colunas que o modelo espera mas não vieram do input ficam com 0 (ex: 'Chuva' e 'tipo_via_num' sem enriquecimento)
+def alinhar_colunas(colunas, model_features, n_itens):
+    matriz = np.zeros((n_itens, len(model_features)), dtype=float)
+    for j, col in enumerate(model_features):
+        if col in colunas:
+            matriz[:, j] = colunas[col]
+    return matriz
+
+
+# Função para traduzir probabilidades em níveis de risco (ALTO / MÉDIO / BAIXO)
+def interpretar_riscos(riscos, limiar_alto, limiar_medio):
+    # Um único risco (caso do /calcular_risco e do canal de alertas): comparação direta, sem np.select
+    if np.ndim(riscos) == 0:
+        return "ALTO" if riscos >= limiar_alto else "MÉDIO" if riscos >= limiar_medio else "BAIXO"
+
+    riscos = np.asarray(riscos, dtype=float)
+    return np.select(
+        [riscos >= limiar_alto, riscos >= limiar_medio],
+        ["ALTO", "MÉDIO"],
+        default="BAIXO",
+    )
+
+
+# Função para descobrir as features esperadas por um modelo (XGBoost ou Scikit-learn, puro ou em Pipeline)
+def extrair_model_features(model):
+    estimador = model.steps[-1][1] if hasattr(model, "named_steps") else model
+
+    if hasattr(estimador, "get_booster"):
+        return list(estimador.get_booster().feature_names or [])
+    if hasattr(estimador, "feature_names_in_"):
+        return list(estimador.feature_names_in_)
+    return []
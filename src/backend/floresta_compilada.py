@@ -0,0 +1,213 @@
+# Avaliador compilado de florestas de árvores (Random Forest do Scikit-learn e XGBoost)
+#
+# Converte o modelo treinado em tabelas de nós contíguas (feature, limiar, filho esquerdo, filho direito, valor)
+# com todas as árvores concatenadas. A predição percorre todas as árvores ao mesmo tempo com operações
+# vetorizadas do NumPy, sem a validação de entrada, conversão de DataFrame e despacho por árvore do
+# predict_proba genérico. Ideal para uma linha ou lotes pequenos (latência de requisição).
+import json
+import os
+from pathlib import Path
+import numpy as np
+
+# Arrays que formam as tabelas de nós (um .npy por array, para poderem ser abertos com mmap)
+ARRAYS_FLORESTA = ["feature", "limiar", "esquerda", "direita", "padrao_esquerda", "valor", "raizes"]
+
+
+class FlorestaCompilada:
+    # agregacao: "media" (Random Forest, média das probabilidades das folhas)
+    #            "logistica" (XGBoost, sigmoide da soma das margens das folhas + margem base)
+    # Folhas apontam para si mesmas, então percorrer 'profundidade' passos sempre termina numa folha.
+    def __init__(self, feature, limiar, esquerda, direita, padrao_esquerda, valor, raizes,
+                 profundidade, agregacao, margem_base=0.0, comparacao_estrita=False):
+        self.feature = feature
+        self.limiar = limiar
+        self.esquerda = esquerda
+        self.direita = direita
+        self.padrao_esquerda = padrao_esquerda
+        self.valor = valor
+        self.raizes = raizes
+        self.profundidade = int(profundidade)
+        self.agregacao = agregacao
+        self.margem_base = float(margem_base)
+        self.comparacao_estrita = bool(comparacao_estrita)
+
+    @property
+    def n_arvores(self):
+        return len(self.raizes)
+
+    # Função para encontrar a folha de cada (linha, árvore)
+    def folhas(self, X):
+        # Scikit-learn compara em float32; o XGBoost também trabalha com float32
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+
+        linhas = np.arange(X.shape[0])[:, None]
+        idx = np.broadcast_to(self.raizes, (X.shape[0], self.n_arvores)).copy()
+        for _ in range(self.profundidade):
+            valores = X[linhas, self.feature[idx]]
+            limiares = self.limiar[idx]
+            vai_esquerda = valores < limiares if self.comparacao_estrita else valores <= limiares
+            ausentes = np.isnan(valores)
+            if ausentes.any():
+                vai_esquerda = np.where(ausentes, self.padrao_esquerda[idx], vai_esquerda)
+            idx = np.where(vai_esquerda, self.esquerda[idx], self.direita[idx])
+        return idx
+
+    # Salva as tabelas em um diretório (um .npy por array + metadados.json com 'extras')
+    # Cada arquivo é escrito em um temporário e trocado com os.replace, e os metadados vão por último:
+    # vários workers podem compilar ao mesmo tempo sem que um leia arquivos pela metade do outro.
+    def salvar(self, diretorio, **extras):
+        diretorio = Path(diretorio)
+        diretorio.mkdir(parents=True, exist_ok=True)
+        sufixo = f".tmp{os.getpid()}"
+        for nome in ARRAYS_FLORESTA:
+            with open(diretorio / f"{nome}.npy{sufixo}", "wb") as file:
+                np.save(file, getattr(self, nome))
+            os.replace(diretorio / f"{nome}.npy{sufixo}", diretorio / f"{nome}.npy")
+
+        metadados = dict(extras, profundidade=self.profundidade, agregacao=self.agregacao,
+                         margem_base=self.margem_base, comparacao_estrita=self.comparacao_estrita)
+        with open(diretorio / f"metadados.json{sufixo}", "w", encoding="utf-8") as file:
+            json.dump(metadados, file, ensure_ascii=False, indent=2)
+        os.replace(diretorio / f"metadados.json{sufixo}", diretorio / "metadados.json")
+
+    # Abre as tabelas salvas; com mmap_mode="r" todos os processos compartilham as mesmas páginas
+    @classmethod
+    def carregar(cls, diretorio, mmap_mode="r"):
+        diretorio = Path(diretorio)
+        with open(diretorio / "metadados.json", encoding="utf-8") as file:
+            metadados = json.load(file)
+
+        arrays = {nome: np.load(diretorio / f"{nome}.npy", mmap_mode=mmap_mode) for nome in ARRAYS_FLORESTA}
+        floresta = cls(**arrays, profundidade=metadados["profundidade"], agregacao=metadados["agregacao"],
+                       margem_base=metadados["margem_base"], comparacao_estrita=metadados["comparacao_estrita"])
+        return floresta, metadados
+
+    # Função para prever a probabilidade da classe positiva (equivalente a predict_proba(X)[:, 1])
+    # A soma é sempre em float64, mesmo com os valores das folhas em precisão reduzida
+    def prever_proba(self, X):
+        folhas = self.valor[self.folhas(X)]
+        if self.agregacao == "media":
+            return folhas.mean(axis=1, dtype=np.float64)
+        return 1.0 / (1.0 + np.exp(-(folhas.sum(axis=1, dtype=np.float64) + self.margem_base)))
+
+    # Função para uma cópia com tabelas menores: feature em int8, limiares em float32 e valores das folhas em
+    # float16. O limiar é arredondado para baixo (para cima na comparação estrita), então a comparação com
+    # as entradas em float32 dá o mesmo lado que antes; só os valores das folhas perdem precisão (~0,05%).
+    def reduzir_precisao(self):
+        limiar = np.asarray(self.limiar, dtype=np.float32)
+        if self.limiar.dtype != np.float32:
+            direcao = np.inf if self.comparacao_estrita else -np.inf
+            passou = limiar < self.limiar if self.comparacao_estrita else limiar > self.limiar
+            limiar[passou] = np.nextafter(limiar[passou], np.float32(direcao))
+        feature = np.asarray(self.feature)
+        if feature.max(initial=0) < np.iinfo(np.int8).max:
+            feature = feature.astype(np.int8)
+        return FlorestaCompilada(feature, limiar, self.esquerda, self.direita, self.padrao_esquerda,
+                                 np.asarray(self.valor, dtype=np.float16), self.raizes, self.profundidade,
+                                 self.agregacao, self.margem_base, self.comparacao_estrita)
+
+    # Tamanho das tabelas em bytes
+    @property
+    def tamanho_bytes(self):
+        return sum(getattr(self, nome).nbytes for nome in ARRAYS_FLORESTA)
+
+
+# Função para concatenar as tabelas de várias árvores em arrays contíguos
+# Cada árvore vem como (feature, limiar, esquerda, direita, padrao_esquerda, valor), com índices locais e -1 nas folhas
+def concatenar_arvores(arvores, dtype_limiar):
+    tamanhos = np.array([len(arvore[0]) for arvore in arvores])
+    raizes = np.concatenate([[0], np.cumsum(tamanhos)[:-1]]).astype(np.int32)
+
+    feature, limiar, esquerda, direita, padrao_esquerda, valor = [], [], [], [], [], []
+    profundidade = 0
+    for raiz, (f, t, e, d, p, v) in zip(raizes, arvores):
+        folha = e < 0
+        locais = np.arange(len(f))
+        feature.append(np.where(folha, 0, f))
+        limiar.append(t)
+        esquerda.append(np.where(folha, locais, e) + raiz)
+        direita.append(np.where(folha, locais, d) + raiz)
+        padrao_esquerda.append(p)
+        valor.append(v)
+        profundidade = max(profundidade, profundidade_arvore(e, d))
+
+    return dict(
+        feature=np.concatenate(feature).astype(np.int32),
+        limiar=np.concatenate(limiar).astype(dtype_limiar),
+        esquerda=np.concatenate(esquerda).astype(np.int32),
+        direita=np.concatenate(direita).astype(np.int32),
+        padrao_esquerda=np.concatenate(padrao_esquerda).astype(bool),
+        valor=np.concatenate(valor).astype(np.float64),
+        raizes=raizes,
+        profundidade=profundidade,
+    )
+
+
+# Função para calcular a profundidade máxima de uma árvore (nó raiz = 0), descendo nível a nível
+def profundidade_arvore(esquerda, direita):
+    nivel = np.array([0])
+    profundidade = 0
+    while True:
+        internos = nivel[esquerda[nivel] >= 0]
+        if len(internos) == 0:
+            return profundidade
+        nivel = np.concatenate([esquerda[internos], direita[internos]])
+        profundidade += 1
+
+
+# Função para compilar um RandomForestClassifier do Scikit-learn
+def compilar_random_forest(model):
+    coluna_positiva = list(model.classes_).index(1)
+    arvores = []
+    for estimador in model.estimators_:
+        tree = estimador.tree_
+        # Probabilidade da classe positiva em cada nó (value pode vir em contagens ou frações)
+        valores = tree.value[:, 0, :]
+        prob = valores[:, coluna_positiva] / valores.sum(axis=1)
+        # Scikit-learn >= 1.3 aprende para que lado vão os valores ausentes (NaN)
+        ausentes_esquerda = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=bool))
+        arvores.append((
+            tree.feature, tree.threshold, tree.children_left, tree.children_right,
+            ausentes_esquerda, prob,
+        ))
+
+    return FlorestaCompilada(**concatenar_arvores(arvores, np.float64), agregacao="media")
+
+
+# Função para compilar um XGBClassifier (objetivo binary:logistic) a partir do JSON do booster
+def compilar_xgboost(model):
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+    if learner["objective"]["name"] != "binary:logistic":
+        return None
+
+    arvores = []
+    for arvore in learner["gradient_booster"]["model"]["trees"]:
+        esquerda = np.array(arvore["left_children"])
+        # Nas folhas, split_conditions guarda o valor (margem) da folha
+        condicoes = np.array(arvore["split_conditions"], dtype=np.float32)
+        arvores.append((
+            np.array(arvore["split_indices"]), condicoes, esquerda, np.array(arvore["right_children"]),
+            np.array(arvore["default_left"], dtype=bool), np.where(esquerda < 0, condicoes, 0.0),
+        ))
+
+    # base_score vem em probabilidade (ex: "5E-1" ou "[5E-1]"); a soma das árvores é em log-odds
+    base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+    margem_base = np.log(base_score / (1.0 - base_score))
+
+    return FlorestaCompilada(**concatenar_arvores(arvores, np.float32), agregacao="logistica",
+                             margem_base=margem_base, comparacao_estrita=True)
+
+
+# Função para compilar um modelo carregado; retorna None se o tipo não for suportado
+# (ex: Pipeline com pré-processamento, que precisa do predict_proba original)
+def compilar_modelo(model):
+    if hasattr(model, "named_steps"):
+        return None
+    if hasattr(model, "get_booster"):
+        return compilar_xgboost(model)
+    if hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_"):
+        return compilar_random_forest(model)
+    return None
@@ -0,0 +1,323 @@
+# Hotspots de sinistros: zonas perigosas pré-calculadas (geofences) com consulta de ponto em polígono
+#
+# As zonas perigosas que o insights.ipynb encontra olhando o mapa de calor são detectadas aqui, offline:
+# - Os sinistros limpos são somados em células de TAMANHO_CELULA graus (~50 m). Cada sinistro pesa pelas
+#   contagens gravidade_*, na escala da UPS (Unidade Padrão de Severidade): 13 por morto, 6 por ferido grave,
+#   4 por ferido leve e 1 por ileso; um sinistro sem vítimas contadas pesa 1
+# - As células são agrupadas por densidade (DBSCAN do Scikit-learn, distância sobre a esfera, com a UPS da célula
+#   como peso): um hotspot é um grupo de células a até --raio-m umas das outras em que a UPS da vizinhança
+#   passa de --ups-minima. Células isoladas ficam de fora
+# - O polígono de um hotspot é o fecho convexo dos cantos das suas células, e contém todos os sinistros dela
+# - Cada hotspot tem sinistros, UPS e vítimas por gravidade, no total, por faixa de hora e por tipo de veículo
+#
+# A atualização é incremental: a soma por célula é gravada por mês (data/hotspots/meses/<AAAA-MM>.parquet),
+# com o hash dos sinistros do mês em metadados.json, e só os meses novos ou alterados do INFOSIGA são somados
+# de novo. O agrupamento roda sobre as células (milhares de linhas), não sobre os sinistros.
+#
+# O servidor abre hotspots.geojson numa STRtree do Shapely: a consulta de um ponto desce a árvore em tempo
+# logarítmico e só testa os polígonos cujo retângulo contém o ponto.
+#
+# Construção (na raiz do projeto):
+#   python -m src.backend.hotspots
+#   python -m src.backend.hotspots --sinistros data/Acidentes/sinistros_com_chuva_2022-2025.csv --meses 24
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import shapely
+
+from src.backend.agregacoes import DiretorioMonitorado, converter_datas, converter_horas
+from src.backend.indice_sinistros import RAIO_TERRA_M, coordenadas_3d, corda
+
+src_path = Path(__file__).parent.parent
+raiz_projeto = src_path.parent
+caminho_hotspots = raiz_projeto / "data" / "hotspots"
+caminho_sinistros = raiz_projeto / "data" / "Acidentes" / "sinistros_com_chuva_2022-2025.csv"
+
+# Lado da célula em graus (~55 m na latitude de Bauru)
+TAMANHO_CELULA = 0.0005
+
+# Peso de cada vítima por gravidade (UPS); um sinistro sem vítimas contadas pesa UPS_SEM_VITIMAS
+PESOS_GRAVIDADE = {"gravidade_fatal": 13, "gravidade_grave": 6, "gravidade_leve": 4, "gravidade_ileso": 1}
+UPS_SEM_VITIMAS = 1
+
+# Faixas de hora (início inclusivo, fim exclusivo); hora desconhecida (99:99) vai para SEM_HORA
+FAIXAS_HORA = [("madrugada", 0, 6), ("manha", 6, 12), ("tarde", 12, 18), ("noite", 18, 24)]
+SEM_HORA = "sem_hora"
+
+# Estatísticas guardadas por célula para cada faixa de hora e cada tipo de veículo
+ESTATISTICAS = ["sinistros", "ups", "fatal", "grave"]
+
+# Parâmetros padrão do agrupamento
+RAIO_PADRAO_M = 75
+UPS_MINIMA_PADRAO = 100
+
+
+# Função para a faixa de hora de cada hora (-1 = desconhecida)
+def faixas_hora(horas):
+    faixas = np.full(len(horas), SEM_HORA, dtype=object)
+    for nome, inicio, fim in FAIXAS_HORA:
+        faixas[(horas >= inicio) & (horas < fim)] = nome
+    return faixas
+
+
+# Função para as linhas de um mês: uma por célula, com as somas dos sinistros da célula
+# Colunas: i, j, sinistros, ups, soma_lat, soma_lon, vítimas por gravidade e <hora|veiculo>_<nome>_<estatística>
+def somar_celulas(sinistros, veiculos):
+    latitudes = sinistros["latitude"].to_numpy(float)
+    longitudes = sinistros["longitude"].to_numpy(float)
+    vitimas = {col: sinistros[col].fillna(0).to_numpy(float) if col in sinistros.columns else np.zeros(len(sinistros))
+               for col in PESOS_GRAVIDADE}
+    ups = sum(peso * vitimas[col] for col, peso in PESOS_GRAVIDADE.items())
+    ups = np.where(ups > 0, ups, UPS_SEM_VITIMAS)
+
+    celulas, grupos = np.unique(np.column_stack([np.floor(latitudes / TAMANHO_CELULA),
+                                                 np.floor(longitudes / TAMANHO_CELULA)]).astype(np.int32),
+                                axis=0, return_inverse=True)
+    grupos = grupos.ravel()
+    n = len(celulas)
+    colunas = {
+        "i": celulas[:, 0], "j": celulas[:, 1],
+        "sinistros": np.bincount(grupos, minlength=n),
+        "ups": np.bincount(grupos, weights=ups, minlength=n),
+        "soma_lat": np.bincount(grupos, weights=latitudes, minlength=n),
+        "soma_lon": np.bincount(grupos, weights=longitudes, minlength=n),
+    }
+    for col in PESOS_GRAVIDADE:
+        colunas[col.removeprefix("gravidade_")] = np.bincount(grupos, weights=vitimas[col], minlength=n)
+
+    # Um sinistro entra na sua faixa de hora e em cada tipo de veículo envolvido
+    valores = {"sinistros": np.ones(len(sinistros)), "ups": ups,
+               "fatal": vitimas["gravidade_fatal"], "grave": vitimas["gravidade_grave"]}
+    grupos_estatistica = [("hora", nome, faixas_hora(sinistros["hora"].to_numpy()) == nome)
+                          for nome in [faixa for faixa, _, _ in FAIXAS_HORA] + [SEM_HORA]]
+    grupos_estatistica += [("veiculo", nome, sinistros[f"tp_veiculo_{nome}"].fillna(0).to_numpy() > 0)
+                           for nome in veiculos]
+    for eixo, nome, mascara in grupos_estatistica:
+        for estatistica in ESTATISTICAS:
+            colunas[f"{eixo}_{nome}_{estatistica}"] = np.bincount(grupos[mascara], weights=valores[estatistica][mascara],
+                                                                 minlength=n)
+    return pd.DataFrame(colunas)
+
+
+# Função para preparar os sinistros limpos: mês, hora e coordenadas válidas (sentinela -9999 e nulos fora)
+def preparar_sinistros(sinistros):
+    sinistros = sinistros.reset_index(drop=True)
+    latitudes = pd.to_numeric(sinistros["latitude"], errors="coerce").to_numpy(float)
+    longitudes = pd.to_numeric(sinistros["longitude"], errors="coerce").to_numpy(float)
+    datas = converter_datas(sinistros["data_sinistro"])
+    validos = (np.isfinite(latitudes) & np.isfinite(longitudes) & (np.abs(latitudes) <= 90)
+               & (np.abs(longitudes) <= 180) & datas.notna().to_numpy())
+    horas = (converter_horas(sinistros["hora_sinistro"]) if "hora_sinistro" in sinistros.columns
+             else pd.Series(-1, index=sinistros.index))
+    colunas = [col for col in sinistros.columns if col in PESOS_GRAVIDADE or col.startswith("tp_veiculo_")]
+    preparados = sinistros.loc[validos, colunas].assign(
+        ano_mes=datas[validos].to_numpy().astype("datetime64[M]").astype(str),
+        hora=horas[validos].to_numpy(), latitude=latitudes[validos], longitude=longitudes[validos])
+    # Ordem estável dentro do mês: o hash do mês só muda se os sinistros mudarem
+    return preparados.sort_values(["ano_mes", "latitude", "longitude", "hora"], ignore_index=True, kind="stable")
+
+
+# Função para somar as células de cada mês, regravando só os meses cujos sinistros mudaram
+def atualizar_meses(sinistros, destino, anterior):
+    from src.pre_processamento.armazenamento import atualizar_particoes
+
+    pontos = preparar_sinistros(sinistros)
+    veiculos = sorted(col.removeprefix("tp_veiculo_") for col in pontos.columns if col.startswith("tp_veiculo_"))
+    # Mudança nos tipos de veículo ou no tamanho da célula muda as linhas de todos os meses
+    mesmo_formato = anterior.get("veiculos") == veiculos and anterior.get("tamanho_celula") == TAMANHO_CELULA
+    meses = ((ano_mes, pontos_mes.drop(columns="ano_mes"))
+             for ano_mes, pontos_mes in pontos.groupby("ano_mes", sort=True))
+    fontes, regravados = atualizar_particoes(
+        destino / "meses", meses, anterior.get("fontes", {}),
+        lambda ano_mes, pontos_mes, arquivo: somar_celulas(pontos_mes, veiculos).to_parquet(arquivo, index=False),
+        forcar=not mesmo_formato)
+    return fontes, veiculos, len(regravados), len(pontos)
+
+
+# Função para os polígonos de vários grupos de células: fecho convexo dos quatro cantos das células de cada grupo
+# (grupos = número do grupo de cada célula, de 0 a n_grupos - 1)
+def poligonos_celulas(i, j, grupos, n_grupos):
+    ordem = np.argsort(np.tile(grupos, 4), kind="stable")
+    cantos_lat = np.concatenate([i, i, i + 1, i + 1])[ordem] * TAMANHO_CELULA
+    cantos_lon = np.concatenate([j, j + 1, j, j + 1])[ordem] * TAMANHO_CELULA
+    pontos = shapely.multipoints(np.column_stack([cantos_lon, cantos_lat]), indices=np.tile(grupos, 4)[ordem])
+    return shapely.convex_hull(pontos[:n_grupos])
+
+
+# Função para a área (m²) de polígonos em lon/lat, no plano tangente à latitude de cada um
+def areas_m2(poligonos, latitudes):
+    metros_grau = np.radians(1) * RAIO_TERRA_M
+    return shapely.area(poligonos) * metros_grau ** 2 * np.cos(np.radians(latitudes))
+
+
+# Função para as estatísticas de um eixo (hora ou veiculo) de um hotspot: {nome: {estatística: valor}}
+def estatisticas_eixo(somas, eixo, nomes):
+    return {nome: {estatistica: (round(float(somas[f"{eixo}_{nome}_{estatistica}"]), 1) if estatistica == "ups"
+                                 else int(somas[f"{eixo}_{nome}_{estatistica}"])) for estatistica in ESTATISTICAS}
+            for nome in nomes}
+
+
+# Função para agrupar as células em hotspots (DBSCAN ponderado pela UPS) e montar o GeoJSON
+def detectar_hotspots(celulas, veiculos, raio_m=RAIO_PADRAO_M, ups_minima=UPS_MINIMA_PADRAO):
+    from sklearn.cluster import DBSCAN
+
+    if celulas.empty:
+        return {"type": "FeatureCollection", "features": []}
+    # Centroides das células em 3D (como no índice de sinistros): a distância reta equivale à haversine
+    centros = coordenadas_3d(celulas["soma_lat"] / celulas["sinistros"], celulas["soma_lon"] / celulas["sinistros"])
+    rotulos = DBSCAN(eps=float(corda(raio_m)), min_samples=ups_minima, algorithm="kd_tree").fit(
+        centros, sample_weight=celulas["ups"].to_numpy()).labels_
+
+    # Somas e polígonos de todos os grupos de uma vez (células de ruído, rótulo -1, ficam de fora)
+    membros = rotulos >= 0
+    grupos = rotulos[membros]
+    n_grupos = int(grupos.max()) + 1 if len(grupos) else 0
+    somas = celulas[membros].drop(columns=["i", "j"]).groupby(grupos).sum()
+    latitudes = (somas["soma_lat"] / somas["sinistros"]).to_numpy()
+    longitudes = (somas["soma_lon"] / somas["sinistros"]).to_numpy()
+    poligonos = poligonos_celulas(celulas["i"].to_numpy(np.int64)[membros], celulas["j"].to_numpy(np.int64)[membros],
+                                  grupos, n_grupos)
+    areas = areas_m2(poligonos, latitudes)
+
+    hotspots = []
+    faixas = [faixa for faixa, _, _ in FAIXAS_HORA] + [SEM_HORA]
+    for k, soma in enumerate(somas.to_dict("records")):
+        hotspots.append({"type": "Feature", "geometry": shapely.geometry.mapping(poligonos[k]), "properties": {
+            "sinistros": int(soma["sinistros"]),
+            "ups": round(float(soma["ups"]), 1),
+            "area_m2": round(float(areas[k])),
+            "ups_por_km2": round(float(soma["ups"]) / max(float(areas[k]), 1.0) * 1e6, 1),
+            "centro": [round(float(latitudes[k]), 6), round(float(longitudes[k]), 6)],
+            "vitimas": {col.removeprefix("gravidade_"): int(soma[col.removeprefix("gravidade_")])
+                        for col in PESOS_GRAVIDADE},
+            "por_faixa_hora": estatisticas_eixo(soma, "hora", faixas),
+            "por_veiculo": estatisticas_eixo(soma, "veiculo", veiculos),
+        }})
+    # Do hotspot mais grave para o menos grave; o id é a posição nessa ordem
+    hotspots.sort(key=lambda hotspot: -hotspot["properties"]["ups"])
+    for k, hotspot in enumerate(hotspots, start=1):
+        hotspot["properties"] = {"id": k, **hotspot["properties"]}
+    return {"type": "FeatureCollection", "features": hotspots}
+
+
+# Função para construir (ou atualizar) os hotspots em 'destino'
+# 'meses' limita o agrupamento aos últimos N meses com sinistros (None = todos)
+def construir_hotspots(sinistros, destino=caminho_hotspots, raio_m=RAIO_PADRAO_M, ups_minima=UPS_MINIMA_PADRAO,
+                       meses=None):
+    from src.pre_processamento.armazenamento import gravar_metadados, ler_metadados
+
+    destino = Path(destino)
+    anterior = ler_metadados(destino)
+
+    inicio = time.perf_counter()
+    fontes, veiculos, regravados, n_sinistros = atualizar_meses(sinistros, destino, anterior)
+    tempo_meses_s = time.perf_counter() - inicio
+
+    usados = sorted(fontes)[-meses:] if meses else sorted(fontes)
+    partes = [pd.read_parquet(destino / "meses" / f"{ano_mes}.parquet") for ano_mes in usados]
+    celulas = (pd.concat(partes, ignore_index=True).groupby(["i", "j"], as_index=False, sort=True).sum()
+               if partes else pd.DataFrame())
+    colecao = detectar_hotspots(celulas, veiculos, raio_m, ups_minima)
+    conteudo = json.dumps(colecao, ensure_ascii=False, separators=(",", ":"))
+    temporario = destino / "hotspots.geojson.tmp"
+    temporario.write_text(conteudo, encoding="utf-8")
+    os.replace(temporario, destino / "hotspots.geojson")
+
+    metadados = {
+        "tamanho_celula": TAMANHO_CELULA,
+        "raio_m": raio_m,
+        "ups_minima": ups_minima,
+        "pesos_gravidade": PESOS_GRAVIDADE,
+        "veiculos": veiculos,
+        "meses": usados,
+        "fontes": fontes,
+        "sinistros": n_sinistros,
+        "celulas": len(celulas),
+        "hotspots": len(colecao["features"]),
+        "hash": hashlib.sha256(conteudo.encode()).hexdigest()[:16],
+        "meses_regravados": regravados,
+        "tempo_meses_s": round(tempo_meses_s, 3),
+        "tempo_construcao_s": round(time.perf_counter() - inicio, 3),
+    }
+    gravar_metadados(destino, metadados)
+    logging.info(f"Hotspots: {metadados['hotspots']} zonas a partir de {len(celulas)} células de {n_sinistros} "
+                 f"sinistros ({regravados} de {len(fontes)} meses somados de novo).")
+    return metadados
+
+
+class IndiceHotspots:
+    # Polígonos dos hotspots numa STRtree e as propriedades de cada um (mesma ordem)
+    def __init__(self, colecao, hash_conteudo=None):
+        self.colecao = colecao
+        self.hash = hash_conteudo
+        self.propriedades = [hotspot["properties"] for hotspot in colecao["features"]]
+        self.poligonos = np.array([shapely.geometry.shape(hotspot["geometry"]) for hotspot in colecao["features"]],
+                                  dtype=object)
+        self.arvore = shapely.STRtree(self.poligonos)
+
+    def __len__(self):
+        return len(self.propriedades)
+
+    # Função para as posições dos hotspots que contêm um ponto (em ordem de gravidade)
+    def no_ponto(self, latitude, longitude):
+        return np.sort(self.arvore.query(shapely.Point(longitude, latitude), predicate="intersects"))
+
+    # Função para o resumo de um hotspot na resposta do risco: totais, a faixa de hora e o veículo pedidos
+    def resumo(self, posicao, hora=None, veiculo=None):
+        propriedades = self.propriedades[posicao]
+        resumo = {chave: propriedades[chave] for chave in ("id", "sinistros", "ups", "ups_por_km2", "vitimas")}
+        if hora is not None:
+            faixa = faixas_hora(np.array([hora]))[0]
+            resumo["faixa_hora"] = {"faixa": faixa, **propriedades["por_faixa_hora"][faixa]}
+        if veiculo is not None:
+            resumo["veiculo"] = propriedades["por_veiculo"].get(veiculo.removeprefix("tp_veiculo_"))
+        return resumo
+
+
+class Hotspots:
+    # Hotspots carregados de data/hotspots/; recarregados quando o metadados.json muda em disco
+    def __init__(self, diretorio=caminho_hotspots):
+        self.diretorio = Path(diretorio)
+        self.indice = DiretorioMonitorado(self.diretorio, self.montar)
+
+    # Função para montar o índice a partir do hotspots.geojson
+    def montar(self, metadados):
+        inicio = time.perf_counter()
+        with open(self.diretorio / "hotspots.geojson", encoding="utf-8") as file:
+            indice = IndiceHotspots(json.load(file), metadados["hash"])
+        logging.info(f"Hotspots carregados: {len(indice)} zonas em {time.perf_counter() - inicio:.3f} s.")
+        return indice
+
+    # Função para obter o índice atual (None se os hotspots ainda não foram construídos)
+    def obter(self):
+        return self.indice.obter()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Detecta os hotspots de sinistros (zonas perigosas)")
+    parser.add_argument("--sinistros", nargs="+", default=[str(caminho_sinistros)],
+                        help="Arquivos de sinistros limpos (CSV ou Parquet)")
+    parser.add_argument("--destino", default=str(caminho_hotspots))
+    parser.add_argument("--raio-m", type=float, default=RAIO_PADRAO_M, help="Distância entre células vizinhas")
+    parser.add_argument("--ups-minima", type=float, default=UPS_MINIMA_PADRAO,
+                        help="UPS mínima na vizinhança de uma célula para ela formar um hotspot")
+    parser.add_argument("--meses", type=int, help="Usa só os últimos N meses (padrão: todos)")
+    args = parser.parse_args()
+
+    from src.pre_processamento.armazenamento import carregar
+
+    sinistros = pd.concat([carregar(caminho) for caminho in args.sinistros], ignore_index=True)
+    metadados = construir_hotspots(sinistros, args.destino, args.raio_m, args.ups_minima, args.meses)
+    logging.info(f"Hotspots gravados em {args.destino} ({metadados['tempo_construcao_s']} s).")
+
+
+if __name__ == "__main__":
+    main()
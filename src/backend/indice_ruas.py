@@ -0,0 +1,120 @@
+# Índice espacial da malha viária de Bauru (ruas_de_bauru.gpkg)
+#
+# Usado pelo /calcular_risco_rota para transformar uma rota (lista de coordenadas GPS) em amostras
+# sobre as ruas:
+# - A rota é projetada em metros (SIRGAS 2000 / UTM 22S) e densificada a cada 'espacamento_m'
+# - Cada amostra é ajustada ao ponto mais próximo da rua mais próxima (STRtree do Shapely, vetorizado)
+# - Amostras seguidas na mesma rua formam um trecho, que é a unidade de risco devolvida ao cliente
+import logging
+import time
+from pathlib import Path
+import numpy as np
+import shapely
+from pyproj import Transformer
+
+from src.backend.cubo_risco import CRS_METRICO, caminho_ruas
+
+# Vias onde não circulam veículos (ficam fora do ajuste da rota)
+VIAS_SEM_VEICULOS = {"footway", "path", "steps", "cycleway", "pedestrian", "proposed", "construction", "raceway"}
+
+# Amostras mais longe que isto de qualquer rua ficam onde estão (sem trecho)
+DISTANCIA_MAXIMA_AJUSTE_M = 50.0
+
+para_metros = Transformer.from_crs("EPSG:4326", CRS_METRICO, always_xy=True)
+para_graus = Transformer.from_crs(CRS_METRICO, "EPSG:4326", always_xy=True)
+
+
+class IndiceRuas:
+    def __init__(self, geometrias, nomes, tipos):
+        self.geometrias = geometrias
+        self.nomes = nomes
+        self.tipos = tipos
+
+        # A árvore é montada sobre os segmentos de reta de cada rua (2 vértices): a distância até um
+        # segmento é bem mais barata que até uma rua inteira, e a busca fica ~3x mais rápida
+        coordenadas, rua = shapely.get_coordinates(geometrias, return_index=True)
+        mesma_rua = rua[1:] == rua[:-1]
+        self.segmentos = shapely.linestrings(np.stack([coordenadas[:-1][mesma_rua], coordenadas[1:][mesma_rua]], axis=1))
+        self.rua_do_segmento = rua[:-1][mesma_rua]
+        self.arvore = shapely.STRtree(self.segmentos)
+
+    # Função para carregar as ruas (LineString) do GeoPackage, já em metros
+    @classmethod
+    def carregar(cls, caminho=caminho_ruas):
+        import geopandas as gpd
+
+        inicio = time.perf_counter()
+        ruas = gpd.read_file(caminho, columns=["highway", "name"])
+        ruas = ruas[ruas.geometry.geom_type.eq("LineString") & ~ruas["highway"].isin(VIAS_SEM_VEICULOS)]
+        ruas = ruas.to_crs(CRS_METRICO)
+
+        indice = cls(
+            ruas.geometry.to_numpy(),
+            np.array([nome if isinstance(nome, str) else None for nome in ruas["name"]], dtype=object),
+            ruas["highway"].to_numpy(dtype=object),
+        )
+        logging.info(f"Índice de ruas com {len(indice.geometrias)} ruas ({len(indice.segmentos)} segmentos) carregado em "
+                     f"{time.perf_counter() - inicio:.2f} s ({Path(caminho).name}).")
+        return indice
+
+    # Função para densificar uma rota: pontos a cada 'espacamento_m' metros (o último ponto sempre entra)
+    # Retorna x, y em metros e a distância de cada amostra desde o início da rota
+    @staticmethod
+    def densificar(latitudes, longitudes, espacamento_m):
+        x, y = para_metros.transform(np.asarray(longitudes, dtype=float), np.asarray(latitudes, dtype=float))
+        rota = shapely.linestrings(np.column_stack([x, y]))
+        distancias = np.append(np.arange(0, rota.length, espacamento_m), rota.length)
+        amostras = shapely.get_coordinates(shapely.line_interpolate_point(rota, distancias))
+        return amostras[:, 0], amostras[:, 1], distancias
+
+    # Função para ajustar pontos (em metros) à rua mais próxima
+    # Retorna x, y ajustados e o índice da rua de cada ponto (-1 = nenhuma rua a menos de 'distancia_maxima_m')
+    def ajustar(self, x, y, distancia_maxima_m=DISTANCIA_MAXIMA_AJUSTE_M):
+        pontos = shapely.points(x, y)
+        (idx_pontos, idx_segmentos), _ = self.arvore.query_nearest(
+            pontos, max_distance=distancia_maxima_m, return_distance=True, all_matches=False
+        )
+
+        ruas = np.full(len(pontos), -1, dtype=np.int64)
+        ruas[idx_pontos] = self.rua_do_segmento[idx_segmentos]
+
+        x_ajustado, y_ajustado = np.array(x, dtype=float), np.array(y, dtype=float)
+        if len(idx_pontos):
+            geometrias = self.segmentos[idx_segmentos]
+            projetados = shapely.line_interpolate_point(geometrias, shapely.line_locate_point(geometrias, pontos[idx_pontos]))
+            coordenadas = shapely.get_coordinates(projetados)
+            x_ajustado[idx_pontos], y_ajustado[idx_pontos] = coordenadas[:, 0], coordenadas[:, 1]
+        return x_ajustado, y_ajustado, ruas
+
+    # Função para densificar e ajustar uma rota de uma só vez; devolve tudo em graus
+    def amostrar_rota(self, latitudes, longitudes, espacamento_m):
+        x, y, distancias = self.densificar(latitudes, longitudes, espacamento_m)
+        x, y, ruas = self.ajustar(x, y)
+        lon, lat = para_graus.transform(x, y)
+        return lat, lon, distancias, ruas
+
+    # Função para montar a chave de trecho de cada amostra: o nome da rua (um logradouro costuma ser
+    # dividido em vários segmentos no OSM) ou, sem nome, o próprio segmento; -1 = fora das ruas
+    def chaves_trechos(self, ruas):
+        chaves = np.full(len(ruas), -1, dtype=object)
+        na_rua = ruas >= 0
+        nomes = self.nomes[ruas[na_rua]]
+        chaves[na_rua] = np.where(nomes == None, ruas[na_rua], nomes)  # noqa: E711
+        return chaves
+
+
+# Função para agrupar amostras consecutivas com a mesma chave em trechos
+# Retorna, para cada trecho, o índice da primeira e da última amostra (inclusive)
+def agrupar_trechos(chaves):
+    quebras = np.flatnonzero(chaves[1:] != chaves[:-1]) + 1
+    inicios = np.concatenate([[0], quebras])
+    fins = np.concatenate([quebras, [len(chaves)]]) - 1
+    return inicios, fins
+
+
+# Função para calcular o comprimento de rota que cada amostra representa (metade do caminho até cada vizinha)
+def pesos_amostras(distancias):
+    if len(distancias) < 2:
+        return np.ones(len(distancias))
+    meios = (distancias[1:] + distancias[:-1]) / 2
+    return np.diff(np.concatenate([[distancias[0]], meios, [distancias[-1]]]))
@@ -0,0 +1,240 @@
+# Índice espacial dos sinistros limpos (o que aconteceu perto de um ponto)
+#
+# Os pontos dos sinistros chegavam ao cliente só como listas (marcadores.json, coordenadas.json). Aqui eles
+# ficam em memória em uma KD-tree (cKDTree do SciPy) para responder:
+# - sinistros num raio (em metros) de um ponto
+# - os k sinistros mais próximos de um ponto
+# - contagem de sinistros por célula de uma grade regular (em graus, como no cubo de risco)
+# com filtros de período, tipo de veículo envolvido e gravidade.
+#
+# A árvore é montada sobre as coordenadas 3D dos pontos em uma esfera com o raio da Terra (em metros). A
+# distância reta entre dois pontos (corda) é convertida na distância sobre a superfície, então o índice
+# vale para o estado inteiro sem as distorções de uma única zona UTM. Pontos sem coordenada (nulos ou a
+# sentinela -9999 da limpeza, que 'carregar' mantém) ficam fora do índice.
+#
+# Os sinistros são guardados em ordem de data: um intervalo de datas vira uma fatia contígua dos vetores
+# (np.searchsorted), e os filtros de veículo e gravidade são aplicados só aos candidatos da árvore.
+import logging
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from src.backend.agregacoes import GRAVIDADES_SINISTRO, NAO_DISPONIVEL, converter_datas
+from src.pre_processamento.armazenamento import carregar as carregar_dataset
+
+src_path = Path(__file__).parent.parent
+raiz_projeto = src_path.parent
+caminho_sinistros = raiz_projeto / "data" / "Acidentes" / "sinistros_com_chuva_2022-2025.csv"
+
+# Raio médio da Terra, em metros
+RAIO_TERRA_M = 6_371_008.8
+
+# Ordem dos rótulos de gravidade (código = posição na lista)
+GRAVIDADES = [rotulo for _, rotulo in GRAVIDADES_SINISTRO] + [NAO_DISPONIVEL]
+
+# Maior grade contada com np.bincount (células, ocupadas ou não); acima disso, só as células ocupadas
+MAX_CELULAS_DENSAS = 4_000_000
+
+# Até este número de sinistros no período, o retângulo é cortado por varredura; acima, pela árvore
+MAX_VARREDURA_RETANGULO = 50_000
+
+
+# Função para converter latitude/longitude (graus) em coordenadas 3D sobre a esfera (metros)
+def coordenadas_3d(latitudes, longitudes):
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    return RAIO_TERRA_M * np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+# Funções para converter a distância sobre a superfície em corda (distância reta em 3D) e vice-versa
+def corda(distancia_m):
+    distancia_m = np.minimum(np.asarray(distancia_m, dtype=float), np.pi * RAIO_TERRA_M)
+    return 2 * RAIO_TERRA_M * np.sin(distancia_m / (2 * RAIO_TERRA_M))
+
+
+def distancia_superficie(corda_m):
+    return 2 * RAIO_TERRA_M * np.arcsin(np.clip(np.asarray(corda_m, dtype=float) / (2 * RAIO_TERRA_M), 0, 1))
+
+
+class IndiceSinistros:
+    # Vetores paralelos (um elemento por sinistro, em ordem de data) e a árvore sobre as coordenadas 3D
+    # veiculos: bits dos tipos de veículo envolvidos (bit k = nomes_veiculos[k])
+    def __init__(self, ids, latitudes, longitudes, dias, gravidades, veiculos, nomes_veiculos):
+        ordem = np.argsort(dias, kind="stable")
+        self.ids = np.asarray(ids, dtype=object)[ordem]
+        self.latitudes = np.asarray(latitudes, dtype=float)[ordem]
+        self.longitudes = np.asarray(longitudes, dtype=float)[ordem]
+        self.dias = np.asarray(dias, dtype="datetime64[D]")[ordem]
+        self.gravidades = np.asarray(gravidades, dtype=np.int8)[ordem]
+        self.veiculos = np.asarray(veiculos, dtype=np.uint16)[ordem]
+        self.nomes_veiculos = list(nomes_veiculos)
+        self.bits_veiculos = {nome: 1 << k for k, nome in enumerate(self.nomes_veiculos)}
+        self.codigos_gravidade = {rotulo: k for k, rotulo in enumerate(GRAVIDADES)}
+        self.arvore = cKDTree(coordenadas_3d(self.latitudes, self.longitudes), balanced_tree=False)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Função para montar o índice a partir de um DataFrame de sinistros limpos
+    @classmethod
+    def de_sinistros(cls, sinistros):
+        sinistros = sinistros.reset_index(drop=True)
+        latitudes = sinistros["latitude"].astype(float).to_numpy()
+        longitudes = sinistros["longitude"].astype(float).to_numpy()
+        dias = converter_datas(sinistros["data_sinistro"]).to_numpy().astype("datetime64[D]")
+        # Sentinela -9999 (ou nulo), coordenadas fora do globo e datas inválidas ficam de fora
+        validos = (np.isfinite(latitudes) & np.isfinite(longitudes) & (latitudes != -9999) & (longitudes != -9999)
+                   & (np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180) & ~np.isnat(dias))
+
+        # A gravidade do sinistro é a mais grave presente (mesma regra do cubo de acidentes)
+        gravidades = np.full(len(sinistros), GRAVIDADES.index(NAO_DISPONIVEL), dtype=np.int8)
+        for col, rotulo in reversed(GRAVIDADES_SINISTRO):
+            if col in sinistros.columns:
+                gravidades[sinistros[col].fillna(0).to_numpy() > 0] = GRAVIDADES.index(rotulo)
+
+        colunas_veiculos = [col for col in sinistros.columns if col.startswith("tp_veiculo_")]
+        veiculos = np.zeros(len(sinistros), dtype=np.uint16)
+        for k, col in enumerate(colunas_veiculos):
+            veiculos[sinistros[col].fillna(0).to_numpy() > 0] |= np.uint16(1 << k)
+
+        return cls(sinistros["id_sinistro"].to_numpy()[validos], latitudes[validos], longitudes[validos],
+                   dias[validos], gravidades[validos], veiculos[validos],
+                   [col.removeprefix("tp_veiculo_") for col in colunas_veiculos])
+
+    # Função para carregar o índice de um ou mais arquivos de sinistros (CSV ou Parquet, ex: vários municípios)
+    @classmethod
+    def carregar(cls, caminhos=(caminho_sinistros,)):
+        inicio = time.perf_counter()
+        sinistros = pd.concat([carregar_dataset(caminho) for caminho in caminhos], ignore_index=True)
+        indice = cls.de_sinistros(sinistros)
+        logging.info(f"Índice de sinistros com {len(indice)} pontos ({len(sinistros) - len(indice)} sem coordenada) "
+                     f"carregado em {time.perf_counter() - inicio:.2f} s.")
+        return indice
+
+    # Função para o domínio dos filtros (valores aceitos e período coberto)
+    def dominio(self):
+        return {
+            "sinistros": len(self),
+            "veiculo": self.nomes_veiculos,
+            "gravidade": GRAVIDADES,
+            "data": {"min": str(self.dias[0]), "max": str(self.dias[-1])} if len(self) else None,
+        }
+
+    # Função para a fatia (início, fim) dos vetores dentro de um intervalo de datas (ISO, inclusivo)
+    def fatia_datas(self, data_inicio=None, data_fim=None):
+        inicio = int(np.searchsorted(self.dias, np.datetime64(data_inicio, "D"), "left")) if data_inicio else 0
+        fim = int(np.searchsorted(self.dias, np.datetime64(data_fim, "D"), "right")) if data_fim else len(self)
+        return inicio, fim
+
+    # Função para montar o teste dos filtros de veículo e gravidade (None = sem filtro)
+    # Retorna uma função que recebe posições nos vetores e devolve a máscara das que passam
+    def filtro(self, data_inicio=None, data_fim=None, veiculos=None, gravidades=None):
+        desconhecidos = [v for v in veiculos or [] if v not in self.bits_veiculos]
+        desconhecidos += [g for g in gravidades or [] if g not in self.codigos_gravidade]
+        if desconhecidos:
+            raise ValueError(f"Valores de filtro desconhecidos: {', '.join(desconhecidos)}")
+
+        inicio, fim = self.fatia_datas(data_inicio, data_fim)
+        bits = np.uint16(sum(self.bits_veiculos[v] for v in veiculos)) if veiculos else None
+        codigos = np.array([self.codigos_gravidade[g] for g in gravidades], dtype=np.int8) if gravidades else None
+
+        def aceitar(posicoes):
+            mascara = (posicoes >= inicio) & (posicoes < fim)
+            if bits is not None:
+                mascara &= (self.veiculos[posicoes] & bits) != 0
+            if codigos is not None:
+                mascara &= np.isin(self.gravidades[posicoes], codigos)
+            return mascara
+
+        return aceitar
+
+    # Função para descrever os sinistros de um conjunto de posições (resposta da API)
+    def descrever(self, posicoes, distancias=None):
+        nomes = np.array(self.nomes_veiculos, dtype=object)
+        itens = []
+        for k, p in enumerate(posicoes.tolist()):
+            item = {
+                "id_sinistro": self.ids[p],
+                "latitude": float(self.latitudes[p]),
+                "longitude": float(self.longitudes[p]),
+                "data_sinistro": str(self.dias[p]),
+                "gravidade": GRAVIDADES[self.gravidades[p]],
+                "veiculos": nomes[(int(self.veiculos[p]) >> np.arange(len(nomes))) & 1 == 1].tolist(),
+            }
+            if distancias is not None:
+                item["distancia_m"] = round(float(distancias[k]), 1)
+            itens.append(item)
+        return itens
+
+    # Função para os sinistros a até 'raio_m' metros de um ponto, do mais próximo ao mais distante
+    # Retorna as posições, as distâncias (m) e o total encontrado (antes do 'limite')
+    def no_raio(self, latitude, longitude, raio_m, limite=None, **filtros):
+        centro = coordenadas_3d([latitude], [longitude])[0]
+        posicoes = np.asarray(self.arvore.query_ball_point(centro, float(corda(raio_m)), return_sorted=False),
+                              dtype=np.int64)
+        posicoes = posicoes[self.filtro(**filtros)(posicoes)]
+        distancias = distancia_superficie(np.linalg.norm(self.arvore.data[posicoes] - centro, axis=1))
+        ordem = np.argsort(distancias, kind="stable")[:limite]
+        return posicoes[ordem], distancias[ordem], len(posicoes)
+
+    # Função para os k sinistros mais próximos de um ponto que passam pelos filtros
+    # Com filtros, a busca é repetida com 4x mais vizinhos até achar k aceitos (ou esgotar o índice)
+    def mais_proximos(self, latitude, longitude, k, raio_maximo_m=None, **filtros):
+        centro = coordenadas_3d([latitude], [longitude])[0]
+        aceitar = self.filtro(**filtros)
+        limite = float(corda(raio_maximo_m)) if raio_maximo_m else np.inf
+        vizinhos = k
+        while True:
+            n = min(vizinhos, len(self))
+            if n == 0:
+                return np.array([], dtype=np.int64), np.array([])
+            cordas, posicoes = self.arvore.query(centro, k=n, distance_upper_bound=limite)
+            cordas, posicoes = np.atleast_1d(cordas), np.atleast_1d(posicoes)
+            encontrados = posicoes < len(self)
+            cordas, posicoes = cordas[encontrados], posicoes[encontrados]
+            aceitos = aceitar(posicoes)
+            # Para quando há k aceitos, quando o índice acabou ou quando o raio máximo já foi esgotado
+            if aceitos.sum() >= k or n == len(self) or len(posicoes) < n:
+                return posicoes[aceitos][:k], distancia_superficie(cordas[aceitos][:k])
+            vizinhos *= 4
+
+    # Função para contar os sinistros por célula de 'tamanho_celula' graus, opcionalmente dentro de um
+    # retângulo (lat_min, lon_min, lat_max, lon_max). Retorna o centro de cada célula não vazia e a contagem
+    def contar_celulas(self, tamanho_celula, retangulo=None, **filtros):
+        inicio, fim = self.fatia_datas(filtros.get("data_inicio"), filtros.get("data_fim"))
+        if retangulo is not None and fim - inicio > MAX_VARREDURA_RETANGULO:
+            # Candidatos da árvore no círculo que contém o retângulo; depois o corte exato nos lados
+            lat_min, lon_min, lat_max, lon_max = retangulo
+            centro = coordenadas_3d([(lat_min + lat_max) / 2], [(lon_min + lon_max) / 2])[0]
+            raio = np.linalg.norm(coordenadas_3d([lat_min, lat_max], [lon_min, lon_max]) - centro, axis=1).max()
+            posicoes = np.asarray(self.arvore.query_ball_point(centro, raio * (1 + 1e-9), return_sorted=False),
+                                  dtype=np.int64)
+            posicoes = posicoes[(posicoes >= inicio) & (posicoes < fim)]
+        else:
+            posicoes = np.arange(inicio, fim)
+        if retangulo is not None:
+            lat_min, lon_min, lat_max, lon_max = retangulo
+            latitudes, longitudes = self.latitudes[posicoes], self.longitudes[posicoes]
+            posicoes = posicoes[(latitudes >= lat_min) & (latitudes <= lat_max)
+                                & (longitudes >= lon_min) & (longitudes <= lon_max)]
+        if filtros.get("veiculos") or filtros.get("gravidades"):
+            posicoes = posicoes[self.filtro(**filtros)(posicoes)]
+        if not len(posicoes):
+            return np.array([]), np.array([]), np.array([], dtype=np.int64)
+
+        i = np.floor(self.latitudes[posicoes] / tamanho_celula).astype(np.int64)
+        j = np.floor(self.longitudes[posicoes] / tamanho_celula).astype(np.int64)
+        i_min, j_min = int(i.min()), int(j.min())
+        linhas, colunas = int(i.max()) - i_min + 1, int(j.max()) - j_min + 1
+        chaves = (i - i_min) * colunas + (j - j_min)
+        # Grade densa (np.bincount) quando cabe em memória; senão, só as células ocupadas (np.unique)
+        if linhas * colunas <= MAX_CELULAS_DENSAS:
+            contagens = np.bincount(chaves, minlength=linhas * colunas)
+            celulas = np.flatnonzero(contagens)
+            totais = contagens[celulas]
+        else:
+            celulas, totais = np.unique(chaves, return_counts=True)
+        i_celula, j_celula = celulas // colunas + i_min, celulas % colunas + j_min
+        return (i_celula + 0.5) * tamanho_celula, (j_celula + 0.5) * tamanho_celula, totais
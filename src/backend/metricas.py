@@ -0,0 +1,256 @@
+# Métricas no formato do Prometheus (/metrics) e log sem bloqueio para o servidor de risco
+#
+# Métricas:
+# - Contador, Histograma e MedidorFuncao guardam os valores em memória, por combinação de rótulos, e
+#   são exportados em texto pelo RegistroMetricas (formato 0.0.4, o que o Prometheus raspa)
+# - O Histograma tem limites fixos: observar() é uma busca binária e dois incrementos
+# - O MedidorFuncao calcula o valor só na raspagem (ex: tempo de carga dos modelos já registrados)
+# - O MiddlewareMetricas (ASGI puro) mede cada requisição HTTP. O handler marca quando começou e quando
+#   terminou (marcar_inicio_handler / marcar_fim_handler); com isso a requisição se divide em
+#   recebimento + validação do corpo ("parse"), o handler, e a serialização da resposta ("serializacao")
+#
+# Cada worker do uvicorn tem as próprias métricas: o Prometheus raspa cada processo (ou soma as séries).
+#
+# Log:
+# - iniciar_log_em_fila troca os handlers da raiz e do uvicorn por um QueueHandler. A escrita no terminal
+#   fica numa thread separada (QueueListener) e o event loop só enfileira o registro
+# - AmostragemLog deixa passar só 1 de cada N linhas de log por requisição (avisos e erros sempre passam)
+import atexit
+import contextvars
+import logging
+import queue
+import threading
+import time
+from bisect import bisect_left
+from logging.handlers import QueueHandler, QueueListener
+
+# Limites (em segundos) dos histogramas de latência: de 50 µs a 2,5 s
+LIMITES_LATENCIA = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                    0.5, 1.0, 2.5)
+
+# Marcas de tempo da requisição em andamento: [inicio, inicio_handler, fim_handler]
+requisicao_atual = contextvars.ContextVar("requisicao_atual", default=None)
+
+
+# Função para escapar o valor de um rótulo no formato de texto do Prometheus
+def escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# Função para montar o trecho {rotulo="valor",...} de uma série
+def formatar_rotulos(nomes, valores, extra=""):
+    pares = [f'{nome}="{escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def formatar_numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome, descricao, rotulos=()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def incrementar(self, *valores_rotulos, valor=1):
+        with self.lock:
+            self.series[valores_rotulos] = self.series.get(valores_rotulos, 0) + valor
+
+    def valor(self, *valores_rotulos):
+        return self.series.get(valores_rotulos, 0)
+
+    def exportar(self):
+        with self.lock:
+            series = list(self.series.items())
+        return [f"{self.nome}{formatar_rotulos(self.rotulos, valores)} {formatar_numero(total)}"
+                for valores, total in series]
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome, descricao, rotulos=(), limites=LIMITES_LATENCIA):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self.limites = tuple(limites)
+        self.lock = threading.Lock()
+        # rótulos -> [contagem por faixa (a última é +Inf), soma]
+        self.series = {}
+
+    def observar(self, valor, *valores_rotulos):
+        faixa = bisect_left(self.limites, valor)
+        with self.lock:
+            serie = self.series.get(valores_rotulos)
+            if serie is None:
+                serie = self.series[valores_rotulos] = [[0] * (len(self.limites) + 1), 0.0]
+            serie[0][faixa] += 1
+            serie[1] += valor
+
+    def exportar(self):
+        with self.lock:
+            series = [(valores, list(contagens), soma) for valores, (contagens, soma) in self.series.items()]
+        linhas = []
+        for valores, contagens, soma in series:
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float("inf"),), contagens):
+                acumulado += contagem
+                rotulos = formatar_rotulos(self.rotulos, valores, f'le="{formatar_numero(limite)}"')
+                linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+            rotulos = formatar_rotulos(self.rotulos, valores)
+            linhas.append(f"{self.nome}_sum{rotulos} {formatar_numero(soma)}")
+            linhas.append(f"{self.nome}_count{rotulos} {acumulado}")
+        return linhas
+
+
+class MedidorFuncao:
+    # Valor calculado na raspagem: 'funcao' devolve {tupla de valores dos rótulos: valor}
+    # tipo "counter" para contadores que já existem em outro objeto (ex: pedidos rejeitados do executor)
+    def __init__(self, nome, descricao, rotulos, funcao, tipo="gauge"):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self.funcao = funcao
+        self.tipo = tipo
+
+    def exportar(self):
+        try:
+            series = self.funcao()
+        except Exception as e:
+            logging.error(f"Falha ao calcular a métrica '{self.nome}': {e}")
+            return []
+        return [f"{self.nome}{formatar_rotulos(self.rotulos, valores)} {formatar_numero(valor)}"
+                for valores, valor in series.items() if valor is not None]
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self.metricas = []
+
+    def registrar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def contador(self, nome, descricao, rotulos=()):
+        return self.registrar(Contador(nome, descricao, rotulos))
+
+    def histograma(self, nome, descricao, rotulos=(), limites=LIMITES_LATENCIA):
+        return self.registrar(Histograma(nome, descricao, rotulos, limites))
+
+    def medidor(self, nome, descricao, rotulos, funcao, tipo="gauge"):
+        return self.registrar(MedidorFuncao(nome, descricao, rotulos, funcao, tipo))
+
+    # Texto no formato de exposição do Prometheus
+    def exportar(self):
+        linhas = []
+        for metrica in self.metricas:
+            linhas.append(f"# HELP {metrica.nome} {metrica.descricao}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.exportar())
+        return "\n".join(linhas) + "\n"
+
+
+# Funções chamadas pelos handlers para dividir a requisição em etapas (sem efeito fora do middleware)
+def marcar_inicio_handler():
+    marcas = requisicao_atual.get()
+    if marcas is not None:
+        marcas[1] = time.perf_counter()
+
+
+def marcar_fim_handler():
+    marcas = requisicao_atual.get()
+    if marcas is not None:
+        marcas[2] = time.perf_counter()
+
+
+class MiddlewareMetricas:
+    # 'duracao': histograma (rota, status), que também conta as respostas por status; 'etapas': histograma
+    # (rota, etapa). A rota é o molde do caminho (ex: /mapa/acidentes/{z}/{x}/{y}), para não criar uma
+    # série por tile
+    def __init__(self, app, duracao, etapas):
+        self.app = app
+        self.duracao = duracao
+        self.etapas = etapas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # [inicio, inicio_handler, fim_handler, inicio_resposta]; as observações ficam todas para o final
+        marcas = [time.perf_counter(), None, None, None]
+        token = requisicao_atual.set(marcas)
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                marcas[3] = time.perf_counter()
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            fim = time.perf_counter()
+            requisicao_atual.reset(token)
+            encontrada = scope.get("route")
+            nome_rota = encontrada.path if encontrada is not None else "nao_encontrada"
+            self.duracao.observar(fim - marcas[0], nome_rota, status)
+            if marcas[1] is not None:
+                self.etapas.observar(marcas[1] - marcas[0], nome_rota, "parse")
+            if marcas[2] is not None and marcas[3] is not None:
+                self.etapas.observar(marcas[3] - marcas[2], nome_rota, "serializacao")
+
+
+class AmostragemLog(logging.Filter):
+    # Deixa passar 1 de cada 'periodo' registros (periodo = 1 / taxa; taxa 0 = nenhum); avisos e erros
+    # sempre passam. Também serve para decidir, antes de montar a mensagem, se vale a pena montá-la.
+    def __init__(self, taxa):
+        super().__init__()
+        self.periodo = round(1 / taxa) if taxa > 0 else 0
+        self.contador = 0
+
+    def deve_registrar(self):
+        if not self.periodo:
+            return False
+        self.contador += 1
+        return self.contador % self.periodo == 0
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.deve_registrar()
+
+
+class QueueHandlerLocal(QueueHandler):
+    # O registro fica no mesmo processo: não precisa ser achatado em texto antes de entrar na fila,
+    # e formatadores que leem record.args (ex: o do access log do uvicorn) continuam funcionando
+    def prepare(self, record):
+        return record
+
+
+# Função para configurar o log e mover a escrita dos loggers para uma thread de fundo
+# nomes: loggers que já têm handlers próprios (a raiz sempre entra)
+def iniciar_log_em_fila(nivel=logging.INFO, formato="%(asctime)s - %(levelname)s - %(message)s",
+                        nomes=("uvicorn", "uvicorn.access")):
+    logging.basicConfig(level=nivel, format=formato)
+    for nome in ("",) + tuple(nomes):
+        logger = logging.getLogger(nome)
+        handlers = [h for h in logger.handlers if not isinstance(h, QueueHandler)]
+        if not handlers:
+            continue
+        fila = queue.SimpleQueue()
+        listener = QueueListener(fila, *handlers, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(QueueHandlerLocal(fila))
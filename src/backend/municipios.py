@@ -0,0 +1,414 @@
+# Municípios atendidos pelo servidor de risco: limites, roteamento das coordenadas e artefatos por cidade
+#
+# Os municípios ficam em src/model/municipios.json (nome -> caminhos dos artefatos). O que não estiver no
+# arquivo segue a convenção de caminhos_municipio, a mesma usada pelo pipeline (--municipios):
+#   modelos         src/model/municipios/<sufixo>/modelos.json (sem ele, o src/model/modelos.json de sempre)
+#   ruas            ruas_de_<sufixo>.gpkg na raiz do projeto
+#   grade_tipo_via  data/enriquecimento/<sufixo>/tipo_via.npz (Bauru: data/enriquecimento/tipo_via.npz)
+#   limite          data/limites/<sufixo>.geojson (etapa 'limite' do pipeline)
+#
+# - RoteadorMunicipios: grade uniforme sobre os limites. Cada célula guarda o município que a cobre por
+#   inteiro (resposta direta, sem teste de geometria) ou os candidatos de uma célula de borda, testados com
+#   contains_xy no polígono já preparado. Sem nenhum limite, tudo vai para o município padrão
+# - RegistroMunicipios: os artefatos de um município (registro de modelos, índice de tipo de via, índice das
+#   ruas) só são carregados na primeira coordenada que cair nele, e as geometrias do tipo de via só no
+#   primeiro ponto de uma célula mista. No máximo 'max_carregados' municípios ficam na memória ao mesmo
+#   tempo (LRU); o município padrão nunca sai. Municípios que usam o mesmo modelos.json compartilham o mesmo
+#   RegistroModelos (e as mesmas tabelas compiladas e cubos com mmap)
+#
+# Construção de um limite (na raiz do projeto):
+#   python -m src.backend.municipios MARILIA
+#   python -m src.backend.municipios MARILIA --malha data_bruto/Limites/SP_Municipios_2022.zip
+import argparse
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from pathlib import Path
+import numpy as np
+
+from src.backend.enriquecimento import Enriquecimento, IndiceTipoVia, caminho_grade_tipo_via
+from src.backend.registro_modelos import RegistroModelos
+from src.pre_processamento.Acidentes.ingestao_infosiga import sufixo_municipio
+
+raiz_projeto = Path(__file__).parent.parent.parent
+src_path = Path(__file__).parent.parent
+caminho_municipios = src_path / "model" / "municipios.json"
+caminho_limites = raiz_projeto / "data" / "limites"
+
+# Lado padrão das células da grade de roteamento, em graus (~1,1 km)
+LADO_ROTEAMENTO_GRAUS = 0.01
+
+# Margem (em graus, ~200 m) em volta das ruas quando o limite sai da envoltória da malha viária
+MARGEM_LIMITE_GRAUS = 0.002
+
+# Valor da grade de roteamento para células fora de todos os limites
+FORA_DOS_LIMITES = -1
+
+# Municípios carregados ao mesmo tempo, por padrão
+MAX_MUNICIPIOS_CARREGADOS = 8
+
+
+# Função para os caminhos dos artefatos de um município pela convenção do projeto (Bauru mantém os de sempre)
+def caminhos_municipio(municipio):
+    sufixo = sufixo_municipio(municipio)
+    modelos = src_path / "model" / "municipios" / sufixo / "modelos.json"
+    return {
+        "modelos": modelos if modelos.exists() else src_path / "model" / "modelos.json",
+        "ruas": raiz_projeto / f"ruas_de_{sufixo}.gpkg",
+        "grade_tipo_via": (caminho_grade_tipo_via if sufixo == "bauru"
+                           else caminho_grade_tipo_via.parent / sufixo / caminho_grade_tipo_via.name),
+        "limite": caminho_limites / f"{sufixo}.geojson",
+    }
+
+
+# Função para o limite de um município: o polígono da malha municipal do IBGE (coluna NM_MUN), se informada;
+# senão, a envoltória convexa das ruas com uma margem
+def construir_limite(caminho_ruas, destino, municipio, malha=None):
+    import geopandas as gpd
+    import shapely
+
+    inicio = time.perf_counter()
+    if malha is not None:
+        municipios = gpd.read_file(malha, columns=["NM_MUN"]).to_crs("EPSG:4326")
+        encontrados = municipios[municipios["NM_MUN"].map(sufixo_municipio) == sufixo_municipio(municipio)]
+        if encontrados.empty:
+            raise ValueError(f"Município '{municipio}' não encontrado na malha {Path(malha).name}.")
+        limite = shapely.union_all(encontrados.geometry.to_numpy())
+        origem = Path(malha).name
+    else:
+        ruas = gpd.read_file(caminho_ruas, columns=[]).to_crs("EPSG:4326")
+        limite = shapely.convex_hull(shapely.union_all(ruas.geometry.to_numpy())).buffer(MARGEM_LIMITE_GRAUS)
+        origem = f"envoltória de {Path(caminho_ruas).name}"
+
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    destino.write_text(shapely.to_geojson(limite), encoding="utf-8")
+    logging.info(f"Limite de {municipio} ({origem}) salvo em {destino} em {time.perf_counter() - inicio:.1f} s.")
+    return limite
+
+
+class RoteadorMunicipios:
+    # limites: um polígono (shapely, lon/lat) por município, na ordem de 'nomes'
+    def __init__(self, nomes, limites, lado=LADO_ROTEAMENTO_GRAUS):
+        import shapely
+
+        self.nomes = list(nomes)
+        self.limites = np.array(limites, dtype=object)
+        self.lado = float(lado)
+        self.buscas_borda = 0
+        self.grade = None
+        if not len(self.limites):
+            return
+
+        shapely.prepare(self.limites)
+        lon_min, lat_min, lon_max, lat_max = shapely.total_bounds(self.limites)
+        self.lat_origem, self.lon_origem = float(lat_min), float(lon_min)
+        linhas = max(int(np.ceil((lat_max - lat_min) / self.lado)), 1)
+        colunas = max(int(np.ceil((lon_max - lon_min) / self.lado)), 1)
+        i, j = np.divmod(np.arange(linhas * colunas), colunas)
+        celulas = shapely.box(lon_min + j * self.lado, lat_min + i * self.lado,
+                              lon_min + (j + 1) * self.lado, lat_min + (i + 1) * self.lado)
+        arvore = shapely.STRtree(celulas)
+
+        # Pares (município, célula) que se tocam e pares em que o município cobre a célula inteira
+        tocam = arvore.query(self.limites, predicate="intersects")
+        cobrem = arvore.query(self.limites, predicate="contains_properly")
+        grade = np.full(linhas * colunas, FORA_DOS_LIMITES, dtype=np.int32)
+        por_celula = np.bincount(tocam[1], minlength=len(celulas))
+        grade[cobrem[1]] = cobrem[0]
+
+        # Células de borda (mais de um município, ou um que não a cobre inteira): -2 - posição em 'candidatos'
+        borda = (por_celula > 1) | ((por_celula == 1) & (grade == FORA_DOS_LIMITES))
+        ordem = np.lexsort((tocam[0], tocam[1]))
+        celula_par, municipio_par = tocam[1][ordem], tocam[0][ordem]
+        no_borda = borda[celula_par]
+        celula_par, municipio_par = celula_par[no_borda], municipio_par[no_borda]
+        celulas_borda, inicios = np.unique(celula_par, return_index=True)
+        self.candidatos = [tuple(grupo.tolist()) for grupo in np.split(municipio_par, inicios[1:])] if len(inicios) else []
+        grade[celulas_borda] = -2 - np.arange(len(celulas_borda), dtype=np.int32)
+        self.grade = grade.reshape(linhas, colunas)
+        self.celulas_borda = len(celulas_borda)
+
+    # Função para a posição (em 'nomes') do município de um ponto, ou FORA_DOS_LIMITES
+    def localizar(self, latitude, longitude):
+        import shapely
+
+        if self.grade is None:
+            return FORA_DOS_LIMITES
+        i = int((latitude - self.lat_origem) // self.lado)
+        j = int((longitude - self.lon_origem) // self.lado)
+        if not (0 <= i < self.grade.shape[0] and 0 <= j < self.grade.shape[1]):
+            return FORA_DOS_LIMITES
+        codigo = int(self.grade[i, j])
+        if codigo >= FORA_DOS_LIMITES:
+            return codigo
+        self.buscas_borda += 1
+        for k in self.candidatos[-2 - codigo]:
+            if shapely.contains_xy(self.limites[k], longitude, latitude):
+                return k
+        return FORA_DOS_LIMITES
+
+    # Função para o município de vários pontos (vetorizada; só os pontos de células de borda testam geometria)
+    def localizar_lote(self, latitudes, longitudes):
+        import shapely
+
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        resultado = np.full(len(latitudes), FORA_DOS_LIMITES, dtype=np.int32)
+        if self.grade is None:
+            return resultado
+
+        i = np.floor((latitudes - self.lat_origem) / self.lado).astype(np.int64)
+        j = np.floor((longitudes - self.lon_origem) / self.lado).astype(np.int64)
+        dentro = (i >= 0) & (i < self.grade.shape[0]) & (j >= 0) & (j < self.grade.shape[1])
+        resultado[dentro] = self.grade[i[dentro], j[dentro]]
+
+        na_borda = np.flatnonzero(resultado < FORA_DOS_LIMITES)
+        if len(na_borda):
+            self.buscas_borda += len(na_borda)
+            codigos = resultado[na_borda]
+            resultado[na_borda] = FORA_DOS_LIMITES
+            for codigo in np.unique(codigos).tolist():
+                pontos = na_borda[codigos == codigo]
+                for k in self.candidatos[-2 - codigo]:
+                    dentro_limite = shapely.contains_xy(self.limites[k], longitudes[pontos], latitudes[pontos])
+                    resultado[pontos[dentro_limite]] = k
+                    pontos = pontos[~dentro_limite]
+                    if not len(pontos):
+                        break
+        return resultado
+
+    def estado(self):
+        return {
+            "municipios_com_limite": len(self.nomes),
+            "celulas": int(self.grade.size) if self.grade is not None else 0,
+            "celulas_borda": self.celulas_borda if self.grade is not None else 0,
+            "buscas_borda": self.buscas_borda,
+        }
+
+
+class Municipio:
+    # Artefatos de um município; preenchidos por RegistroMunicipios.montar
+    def __init__(self, nome, caminhos):
+        self.nome = nome
+        self.caminhos = caminhos
+        self.registro = None
+        self.enriquecimento = None
+        self.indice_ruas = None
+        self.lock_indice_ruas = threading.Lock()
+        self.tempo_carga_s = None
+
+    # Índice das ruas do município (para /calcular_risco_rota), carregado na primeira rota pedida
+    def obter_indice_ruas(self):
+        from src.backend.indice_ruas import IndiceRuas
+
+        if self.indice_ruas is None:
+            with self.lock_indice_ruas:
+                if self.indice_ruas is None:
+                    self.indice_ruas = IndiceRuas.carregar(self.caminhos["ruas"])
+        return self.indice_ruas
+
+    def estado(self):
+        return {
+            "modelos": str(self.caminhos["modelos"]),
+            "modelos_carregados": sorted(self.registro.modelos) if self.registro is not None else [],
+            "enriquecimento": self.enriquecimento.estado() if self.enriquecimento is not None else None,
+            "indice_ruas": self.indice_ruas is not None,
+            "tempo_carga_s": round(self.tempo_carga_s, 4) if self.tempo_carga_s is not None else None,
+        }
+
+
+class RegistroMunicipios:
+    # padrao_modelo: modelo padrão de cada registro (se existir nele); chuva: FonteChuva compartilhada por todos
+    # os municípios (uma série com várias estações); enriquecer=False: sem índice de tipo de via
+    # em_segundo_plano: o índice de tipo de via de cada município é carregado numa thread de fundo (o modelo não)
+    def __init__(self, caminho_config=caminho_municipios, max_carregados=MAX_MUNICIPIOS_CARREGADOS,
+                 padrao_modelo=None, chuva=None, enriquecer=True, lado=LADO_ROTEAMENTO_GRAUS, em_segundo_plano=False):
+        self.caminho_config = Path(caminho_config)
+        if self.caminho_config.exists():
+            with open(self.caminho_config, encoding="utf-8") as file:
+                config = json.load(file)
+        else:
+            config = {"padrao": "BAURU", "municipios": {"BAURU": {}}}
+
+        self.padrao = config["padrao"]
+        self.recusar_fora = config.get("fora_dos_limites") == "recusar"
+        self.configs = {}
+        for nome, sobrescritos in config["municipios"].items():
+            caminhos = caminhos_municipio(nome)
+            caminhos.update({chave: self.caminho_config.parent / valor for chave, valor in sobrescritos.items()})
+            self.configs[nome] = caminhos
+        if self.padrao not in self.configs:
+            raise ValueError(f"Município padrão '{self.padrao}' não está em {self.caminho_config.name}.")
+
+        self.max_carregados = max(int(max_carregados), 1)
+        self.padrao_modelo = padrao_modelo
+        self.chuva = chuva
+        self.enriquecer = enriquecer
+        self.em_segundo_plano = em_segundo_plano
+        self.carregados = OrderedDict()
+        self.registros = {}
+        self.lock = threading.Lock()
+        self.locks = {nome: threading.Lock() for nome in self.configs}
+        self.carregamentos = 0
+        self.descartes = 0
+        self.observador = None
+        self.roteador = self.montar_roteador(lado)
+
+    # Função para o roteador sobre os limites encontrados em disco (municípios sem limite só recebem os pontos
+    # de fora como padrão)
+    def montar_roteador(self, lado):
+        import shapely
+
+        inicio = time.perf_counter()
+        nomes, limites = [], []
+        for nome, caminhos in self.configs.items():
+            if Path(caminhos["limite"]).exists():
+                nomes.append(nome)
+                limites.append(shapely.from_geojson(Path(caminhos["limite"]).read_text(encoding="utf-8")))
+            elif nome != self.padrao:
+                logging.warning(f"Limite de {nome} não encontrado ({caminhos['limite']}): o município não recebe "
+                                f"pontos (python -m src.pre_processamento.pipeline --municipios ... limite).")
+        roteador = RoteadorMunicipios(nomes, limites, lado)
+        if limites:
+            logging.info(f"Roteador de {len(limites)} municípios montado em {time.perf_counter() - inicio:.2f} s "
+                         f"({roteador.grade.size} células, {roteador.celulas_borda} de borda).")
+        return roteador
+
+    # Função para o nome do município de um ponto (None se estiver fora de todos e pontos de fora forem recusados)
+    def localizar(self, latitude, longitude):
+        k = self.roteador.localizar(latitude, longitude)
+        if k == FORA_DOS_LIMITES:
+            return None if self.recusar_fora else self.padrao
+        return self.roteador.nomes[k]
+
+    # Função para agrupar vários pontos por município: {nome: posições dos pontos} (None: pontos recusados)
+    def agrupar(self, latitudes, longitudes):
+        codigos = self.roteador.localizar_lote(latitudes, longitudes)
+        ordem = np.argsort(codigos, kind="stable")
+        valores, inicios = np.unique(codigos[ordem], return_index=True)
+        grupos = {}
+        for codigo, posicoes in zip(valores.tolist(), np.split(ordem, inicios[1:])):
+            nome = self.roteador.nomes[codigo] if codigo != FORA_DOS_LIMITES else (
+                None if self.recusar_fora else self.padrao)
+            grupos[nome] = np.sort(np.concatenate([grupos[nome], posicoes])) if nome in grupos else posicoes
+        return grupos
+
+    # Função para montar (sem registrar) os artefatos de um município
+    def montar(self, nome):
+        inicio = time.perf_counter()
+        caminhos = self.configs[nome]
+        municipio = Municipio(nome, caminhos)
+
+        chave = str(Path(caminhos["modelos"]).resolve())
+        registro = self.registros.get(chave)
+        if registro is None:
+            registro = RegistroModelos(caminhos["modelos"])
+            if self.padrao_modelo in registro.configs:
+                registro.padrao = self.padrao_modelo
+        municipio.registro = registro
+        registro.obter()
+
+        # Fora do município padrão, as geometrias só são lidas no primeiro ponto de uma célula mista
+        carregar_tipo_via = partial(IndiceTipoVia.carregar, caminhos["grade_tipo_via"], caminhos["ruas"],
+                                    preparar=nome == self.padrao)
+        if not self.enriquecer:
+            municipio.enriquecimento = Enriquecimento(None, self.chuva)
+        elif self.em_segundo_plano:
+            municipio.enriquecimento = Enriquecimento(chuva=self.chuva, carregar_tipo_via=carregar_tipo_via)
+        else:
+            tipo_via = None
+            try:
+                tipo_via = carregar_tipo_via()
+            except Exception as e:
+                logging.error(f"Falha ao carregar o índice de tipo de via de {nome} (tipo_via_num = 0): {e}")
+            municipio.enriquecimento = Enriquecimento(tipo_via, self.chuva)
+
+        municipio.tempo_carga_s = time.perf_counter() - inicio
+        logging.info(f"Município {nome} carregado em {municipio.tempo_carga_s:.2f} s.")
+        return municipio
+
+    # Retorna o município já carregado (ou o carrega); KeyError se não existir
+    def obter(self, nome=None):
+        nome = nome or self.padrao
+        with self.lock:
+            municipio = self.carregados.get(nome)
+            if municipio is not None:
+                self.carregados.move_to_end(nome)
+                return municipio
+
+        if nome not in self.configs:
+            raise KeyError(nome)
+        with self.locks[nome]:
+            municipio = self.carregados.get(nome)
+            if municipio is None:
+                municipio = self.montar(nome)
+                with self.lock:
+                    self.registros[str(Path(municipio.caminhos["modelos"]).resolve())] = municipio.registro
+                    self.carregados[nome] = municipio
+                    self.carregamentos += 1
+                    self.descartar_excedentes()
+        return municipio
+
+    # Função para tirar da memória os municípios usados há mais tempo (chamada com self.lock)
+    # Requisições em andamento continuam com a referência que já pegaram
+    def descartar_excedentes(self):
+        for nome in list(self.carregados):
+            if len(self.carregados) <= self.max_carregados:
+                break
+            if nome == self.padrao:
+                continue
+            descartado = self.carregados.pop(nome)
+            self.descartes += 1
+            chave = str(Path(descartado.caminhos["modelos"]).resolve())
+            if all(str(Path(m.caminhos["modelos"]).resolve()) != chave for m in self.carregados.values()):
+                self.registros.pop(chave, None)
+            logging.info(f"Município {nome} descarregado (limite de {self.max_carregados} carregados).")
+
+    # Recarrega os modelos alterados em disco de todos os registros em uso
+    def verificar_alteracoes(self):
+        return [nome for registro in list(self.registros.values()) for nome in registro.verificar_alteracoes()]
+
+    # Observa os artefatos em uma thread de fundo, a cada 'intervalo_s' segundos
+    def iniciar_observador(self, intervalo_s):
+        def observar():
+            while True:
+                time.sleep(intervalo_s)
+                self.verificar_alteracoes()
+
+        self.observador = threading.Thread(target=observar, name="observador-modelos", daemon=True)
+        self.observador.start()
+
+    def estado(self):
+        return {
+            "padrao": self.padrao,
+            "disponiveis": sorted(self.configs),
+            "fora_dos_limites": "recusar" if self.recusar_fora else self.padrao,
+            "max_carregados": self.max_carregados,
+            "carregamentos": self.carregamentos,
+            "descartes": self.descartes,
+            "roteador": self.roteador.estado(),
+            "carregados": {nome: municipio.estado() for nome, municipio in list(self.carregados.items())},
+        }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Constrói o limite de um município usado no roteamento do servidor")
+    parser.add_argument("municipio")
+    parser.add_argument("--malha", help="Malha municipal do IBGE (shapefile/zip/GeoPackage com a coluna NM_MUN)")
+    parser.add_argument("--ruas", help="GeoPackage das ruas (padrão: ruas_de_<municipio>.gpkg)")
+    parser.add_argument("--destino", help="Padrão: data/limites/<municipio>.geojson")
+    args = parser.parse_args()
+
+    caminhos = caminhos_municipio(args.municipio.strip().upper())
+    construir_limite(args.ruas or caminhos["ruas"], args.destino or caminhos["limite"], args.municipio.strip().upper(),
+                     args.malha)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# Registro de modelos do servidor de risco
+#
+# Os modelos disponíveis ficam em src/model/modelos.json (nome -> artefato .pkl, limiares e veículo padrão).
+# Cada modelo é carregado sob demanda na primeira vez em que é pedido:
+# - As features são descobertas no próprio artefato (get_booster().feature_names / feature_names_in_)
+# - A floresta é compilada em tabelas de nós salvas como .npy em src/model/compilados/<modelo>/ e aberta
+#   com mmap. Assim os N workers do uvicorn compartilham as mesmas páginas de memória, e o objeto
+#   Scikit-learn/XGBoost original só é desserializado se um lote grande precisar dele.
+# - O cubo de risco pré-calculado (se existir para este artefato) também é aberto com mmap
+# - Artefatos gerados por src/treinamento/treinar.py têm um manifesto ao lado (<artefato>.manifesto.json) com a
+#   versão e as features; se ele for deste artefato, as features do artefato precisam ser as do manifesto.
+#   Artefatos compactados (src/treinamento/compactar.py) com "precisao_reduzida" são compilados em tabelas menores
+#
+# A recarga é atômica: o modelo novo é montado por completo e só então substitui o antigo no registro.
+# Requisições em andamento continuam usando a referência que já pegaram.
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+import joblib
+import pandas as pd
+
+from src.backend.features import extrair_model_features, interpretar_riscos
+from src.backend.floresta_compilada import FlorestaCompilada, compilar_modelo
+from src.backend.cubo_risco import CuboRisco, diretorio_cubo, hash_arquivo
+
+src_path = Path(__file__).parent.parent
+caminho_compilados = src_path / "model" / "compilados"
+
+# Até este número de linhas o avaliador compilado é mais rápido que o predict_proba original
+LIMITE_LINHAS_COMPILADO = 32
+
+
+class ModeloRegistrado:
+    def __init__(self, nome, caminho, limiar_alto, limiar_medio, veiculo_padrao=None):
+        self.nome = nome
+        self.caminho = Path(caminho)
+        self.limiar_alto = limiar_alto
+        self.limiar_medio = limiar_medio
+        self.veiculo_padrao = veiculo_padrao
+        self.lock = threading.Lock()
+        self.estimador = None
+        self.compilado = None
+        self.cubo = None
+        self.model_features = []
+        self.manifesto = None
+        self.tempo_desserializacao_s = None
+
+    # Carrega tudo o que é necessário para responder; chamado uma única vez antes de entrar no registro
+    def carregar(self):
+        inicio = time.perf_counter()
+        self.sha256 = hash_arquivo(self.caminho)
+        self.mtime = self.caminho.stat().st_mtime
+
+        self.manifesto = self.ler_manifesto()
+        self.compilado, self.model_features = self.carregar_compilado()
+        if self.compilado is None:
+            # Tipo não suportado pelo avaliador compilado (ex: Pipeline): usa o predict_proba original
+            self.model_features = extrair_model_features(self.model)
+
+        if self.manifesto is not None:
+            if not self.model_features:
+                self.model_features = list(self.manifesto["model_features"])
+            elif list(self.model_features) != list(self.manifesto["model_features"]):
+                raise ValueError(f"As features do artefato {self.caminho.name} não são as do manifesto.")
+
+        if not self.model_features:
+            raise ValueError(f"O artefato {self.caminho.name} não expõe a lista de features do modelo.")
+
+        try:
+            self.cubo = CuboRisco.carregar(diretorio_cubo(self.caminho), self.sha256)
+        except Exception as e:
+            logging.error(f"Falha ao carregar cubo de risco de '{self.nome}': {e}")
+
+        self.tempo_carga_s = time.perf_counter() - inicio
+        self.carregado_em = time.time()
+        logging.info(
+            f"Modelo '{self.nome}' pronto em {self.tempo_carga_s:.3f} s "
+            f"({len(self.model_features)} features, compilado={self.compilado is not None}, cubo={self.cubo is not None})."
+        )
+        return self
+
+    # Abre as tabelas compiladas com mmap; se não existirem (ou forem de outro artefato), compila e salva
+    def carregar_compilado(self):
+        diretorio = caminho_compilados / self.caminho.stem
+        try:
+            if (diretorio / "metadados.json").exists():
+                compilado, metadados = FlorestaCompilada.carregar(diretorio)
+                if metadados.get("modelo_sha256") == self.sha256:
+                    return compilado, metadados["model_features"]
+
+            compilado = compilar_modelo(self.model)
+            if compilado is None:
+                return None, []
+            if self.manifesto and self.manifesto.get("precisao_reduzida"):
+                compilado = compilado.reduzir_precisao()
+            model_features = extrair_model_features(self.model)
+            compilado.salvar(diretorio, modelo_sha256=self.sha256, model_features=model_features)
+            # Reabre do disco para que este processo também use a cópia compartilhada
+            return FlorestaCompilada.carregar(diretorio)[0], model_features
+        except Exception as e:
+            logging.error(f"Falha ao preparar o avaliador compilado de '{self.nome}': {e}")
+            return None, []
+
+    # Manifesto do treinamento, se existir e for deste artefato (mesmo sha256)
+    def ler_manifesto(self):
+        caminho = self.caminho.with_name(f"{self.caminho.stem}.manifesto.json")
+        if not caminho.exists():
+            return None
+        with open(caminho, encoding="utf-8") as file:
+            manifesto = json.load(file)
+        if manifesto.get("sha256") != self.sha256:
+            logging.warning(f"O manifesto {caminho.name} é de outro artefato e foi ignorado.")
+            return None
+        return manifesto
+
+    # Objeto original do Scikit-learn/XGBoost, desserializado só quando necessário
+    @property
+    def model(self):
+        if self.estimador is None:
+            with self.lock:
+                if self.estimador is None:
+                    inicio = time.perf_counter()
+                    self.estimador = joblib.load(self.caminho)
+                    self.tempo_desserializacao_s = time.perf_counter() - inicio
+        return self.estimador
+
+    # Função para prever o risco de uma matriz já alinhada a model_features
+    def prever_riscos(self, matriz):
+        if self.compilado is not None and len(matriz) <= LIMITE_LINHAS_COMPILADO:
+            return self.compilado.prever_proba(matriz)
+        return self.model.predict_proba(pd.DataFrame(matriz, columns=self.model_features))[:, 1]
+
+    def interpretar(self, riscos):
+        return interpretar_riscos(riscos, self.limiar_alto, self.limiar_medio)
+
+    def descricao(self):
+        return {
+            "arquivo": self.caminho.name,
+            "sha256": self.sha256,
+            "versao": self.manifesto["versao"] if self.manifesto else None,
+            "features_esperadas": len(self.model_features),
+            "limiares": {"ALTO": self.limiar_alto, "MÉDIO": self.limiar_medio},
+            "avaliador_compilado": self.compilado is not None,
+            "cubo_carregado": self.cubo is not None,
+            "estimador_desserializado": self.estimador is not None,
+            "tempo_carga_s": round(self.tempo_carga_s, 4),
+            "tempo_desserializacao_s": None if self.tempo_desserializacao_s is None else round(self.tempo_desserializacao_s, 4),
+            "carregado_em": self.carregado_em,
+        }
+
+
+class RegistroModelos:
+    def __init__(self, caminho_config, padrao=None):
+        self.caminho_config = Path(caminho_config)
+        with open(self.caminho_config, encoding="utf-8") as file:
+            config = json.load(file)
+
+        self.configs = config["modelos"]
+        self.padrao = padrao or config["padrao"]
+        self.modelos = {}
+        self.locks = {nome: threading.Lock() for nome in self.configs}
+        self.observador = None
+
+    # Função para montar (sem registrar) um modelo a partir da configuração
+    def montar(self, nome):
+        config = self.configs[nome]
+        return ModeloRegistrado(
+            nome,
+            self.caminho_config.parent / config["arquivo"],
+            config["limiar_alto"],
+            config["limiar_medio"],
+            config.get("veiculo_padrao"),
+        ).carregar()
+
+    # Retorna o modelo pedido (ou o padrão), carregando-o na primeira vez; KeyError se não existir
+    def obter(self, nome=None):
+        nome = nome or self.padrao
+        modelo = self.modelos.get(nome)
+        if modelo is not None:
+            return modelo
+
+        if nome not in self.configs:
+            raise KeyError(nome)
+        with self.locks[nome]:
+            if nome not in self.modelos:
+                self.modelos[nome] = self.montar(nome)
+        return self.modelos[nome]
+
+    # Recarrega um modelo já registrado; a troca só acontece depois que o novo está pronto
+    def recarregar(self, nome=None):
+        nome = nome or self.padrao
+        if nome not in self.configs:
+            raise KeyError(nome)
+        with self.locks[nome]:
+            novo = self.montar(nome)
+            self.modelos[nome] = novo
+        logging.info(f"Modelo '{nome}' recarregado ({novo.sha256[:12]}).")
+        return novo
+
+    # Recarrega os modelos cujo artefato mudou em disco
+    def verificar_alteracoes(self):
+        recarregados = []
+        for nome, modelo in list(self.modelos.items()):
+            try:
+                mtime = modelo.caminho.stat().st_mtime
+                if mtime == modelo.mtime:
+                    continue
+                if hash_arquivo(modelo.caminho) == modelo.sha256:
+                    modelo.mtime = mtime  # só o mtime mudou (ex: checkout), o conteúdo é o mesmo
+                    continue
+                self.recarregar(nome)
+                recarregados.append(nome)
+            except Exception as e:
+                logging.error(f"Falha ao recarregar '{nome}': {e}")
+        return recarregados
+
+    # Observa os artefatos em uma thread de fundo, a cada 'intervalo_s' segundos
+    def iniciar_observador(self, intervalo_s):
+        def observar():
+            while True:
+                time.sleep(intervalo_s)
+                self.verificar_alteracoes()
+
+        self.observador = threading.Thread(target=observar, name="observador-modelos", daemon=True)
+        self.observador.start()
+
+    def estado(self):
+        return {
+            "padrao": self.padrao,
+            "disponiveis": sorted(self.configs),
+            "carregados": {nome: modelo.descricao() for nome, modelo in self.modelos.items()},
+        }
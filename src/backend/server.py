@@ -1,149 +1,1087 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel, Field
 from datetime import datetime
 from pathlib import Path
-import pandas as pd
+from typing import List, Optional
+import threading
 import numpy as np
-import joblib
 import traceback
 import logging
+import json
+import time
+import os
+
+from src.backend.features import (COLUNAS_VEICULOS, FUSO_BAURU, features_temporais, momentos_locais,
+                                  montar_matriz_features)
+from src.backend.cache_risco import BackendSQLite, CacheRisco
+from src.backend.executor_inferencia import ExecutorInferencia, FilaCheia
+from src.backend.canal_alertas import EstatisticasAlertas, SessaoAlertas
+from src.backend.municipios import MAX_MUNICIPIOS_CARREGADOS, RegistroMunicipios, caminho_municipios
+from src.backend.metricas import (AmostragemLog, MiddlewareMetricas, RegistroMetricas, iniciar_log_em_fila,
+                                  marcar_fim_handler, marcar_inicio_handler)
+from src.backend.indice_ruas import agrupar_trechos, pesos_amostras
+from src.backend.enriquecimento import FonteChuva, caminho_serie
+from src.backend.indice_sinistros import IndiceSinistros, caminho_sinistros
+from src.backend.agregacoes import (Agregacoes, CacheRespostas, caminho_agregacoes, comprimir, escolher_codificacao,
+                                   etag_consulta, etag_cubos)
+from src.backend.clusters_mapa import (MAX_TILES_EM_CACHE, ZOOM_MAX, ClustersRisco, MapaAcidentes, caminho_mapa,
+                                      etag_tile, limites_tile)
+from src.backend.hotspots import Hotspots, caminho_hotspots
 
 # CONFIGURAÇÕES E LOGS
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# A escrita do log fica numa thread de fundo: a requisição só enfileira o registro
+iniciar_log_em_fila(logging.INFO, "%(asctime)s - %(levelname)s - %(message)s")
+inicio_servidor = time.perf_counter()
+
+# Tamanho máximo de um lote em /calcular_risco_lote
+MAX_ITENS_LOTE = 100_000
 
-src_path = Path(__file__).parent.parent
-model_path = src_path / "model" / "modelo_risco_viario_3.pkl"
+# Limites de /calcular_risco_rota: pontos enviados e amostras depois de densificar
+MAX_PONTOS_ROTA = 10_000
+MAX_AMOSTRAS_ROTA = 100_000
 
 app = FastAPI(
     title="API de Risco Viário",
     description="API para previsão de risco de acidentes de trânsito com base em coordenadas geográficas.",
-    version="1.1.0"
+    version="2.0.0"
 )
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"], 
+    allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],  # inclui OPTIONS, GET, POST etc
     allow_headers=["*"],
 )
 
-# CARREGAMENTO DO MODELO
-try:
-    model = joblib.load(model_path)
+# MÉTRICAS (/metrics) E AMOSTRAGEM DO LOG
+#   RISCO_LOG_AMOSTRAGEM  fração das linhas de log por requisição (dados da predição, access log do uvicorn)
+#                         que são escritas; avisos e erros são sempre escritos (0 = nenhuma, 1 = todas)
+metricas = RegistroMetricas()
+duracao_http = metricas.histograma("risco_http_requisicao_segundos", "Duração das requisições HTTP", ["rota", "status"])
+etapas_http = metricas.histograma("risco_http_etapa_segundos",
+                                  "Recebimento e validação do corpo (parse) e serialização da resposta",
+                                  ["rota", "etapa"])
+etapas_modelo = metricas.histograma("risco_modelo_etapa_segundos",
+                                    "Montagem das features e inferência, por chamada ao modelo", ["modelo", "etapa"])
+origens_risco = metricas.contador("risco_origem_total", "Pontos respondidos pelo cubo, pelo cache ou pelo modelo",
+                                  ["origem"])
+avaliacoes_risco = metricas.contador("risco_avaliacoes_total", "Pontos avaliados por nível de risco e tipo de veículo",
+                                     ["modelo", "interpretacao", "tp_veiculo"])
+erros_risco = metricas.contador("risco_erros_total", "Erros no cálculo do risco", ["rota", "tipo"])
+app.add_middleware(MiddlewareMetricas, duracao=duracao_http, etapas=etapas_http)
+veiculos_conhecidos = set(COLUNAS_VEICULOS)
 
-    model_features = []  # valor padrão
 
-    # Se o modelo for um pipeline, tenta acessar o estimador final (ex: XGBClassifier)
-    if hasattr(model, "named_steps"):
-        for name, step in model.named_steps.items():
-            if hasattr(step, "get_booster"):
-                booster = step.get_booster()
-                model_features = booster.feature_names or []
-                break
+# Função para o rótulo do veículo nas métricas (um texto qualquer enviado pelo cliente não vira uma série nova)
+def rotulo_veiculo(veiculo):
+    return veiculo if veiculo in veiculos_conhecidos else "desconhecido"
 
-        logging.info(f"Modelo carregado (Pipeline, {len(model_features)} features detectadas).")
 
-    # Se for um XGBoost puro
-    elif hasattr(model, "get_booster"):
-        booster = model.get_booster()
-        model_features = booster.feature_names or []
-        logging.info(f"Modelo XGBoost carregado ({len(model_features)} features).")
+taxa_log = float(os.environ.get("RISCO_LOG_AMOSTRAGEM", 0.01))
+amostragem_predicoes = AmostragemLog(taxa_log)
+logging.getLogger("uvicorn.access").addFilter(AmostragemLog(taxa_log))
 
-    else:
-        logging.info("Modelo carregado (outro tipo, sem feature_names).")
+# REGISTRO DE MODELOS
+# Configurável por variáveis de ambiente:
+#   RISCO_MODELO_PADRAO       nome (em modelos.json) do modelo usado quando a requisição não escolhe um
+#   RISCO_USAR_CUBO           0 = ignora o cubo pré-calculado e sempre roda o modelo (ex: em testes de carga)
+#   RISCO_MODELOS_OBSERVAR_S  intervalo, em segundos, para recarregar artefatos alterados em disco (0 = desativado)
+#   RISCO_ADMIN_TOKEN         token exigido no cabeçalho X-Admin-Token dos endpoints /admin
+usar_cubo = os.environ.get("RISCO_USAR_CUBO", "1") != "0"
+
+# ENRIQUECIMENTO DAS FEATURES (TIPO DE VIA E CHUVA)
+# 'tipo_via_num' e 'Chuva' não vêm do cliente: saem de dois índices carregados uma vez, numa thread de fundo
+# (a inicialização não espera por eles; as primeiras requisições, se chegarem antes, esperam a carga)
+#   RISCO_ENRIQUECER             0 = mantém 'Chuva' e 'tipo_via_num' em 0 (comportamento antigo)
+#   RISCO_TIPO_VIA_GRADE         grade pré-calculada do tipo de via do município padrão (padrão:
+#                                data/enriquecimento/tipo_via.npz; sem ela, todo ponto usa a busca exata na STRtree)
+#   RISCO_CHUVA_ARQUIVOS         CSVs de leituras de chuva (estacao;datetime_brt;precipitacao_mm) separados por
+#                                os.pathsep; o último é o feed local de leituras recentes
+#                                (padrão: data/Chuva/serie_inmet_horaria.csv)
+#   RISCO_CHUVA_ESTACOES         CSV codigo;latitude;longitude das estações (quando há mais de uma)
+#   RISCO_CHUVA_TOLERANCIA_MIN   idade máxima da leitura usada, em minutos (padrão: 59, como na junção)
+#   RISCO_CHUVA_INTERVALO_S      de quanto em quanto tempo os CSVs de chuva são conferidos e relidos se mudaram
+enriquecer = os.environ.get("RISCO_ENRIQUECER", "1") != "0"
+chuva = None
+if enriquecer:
+    # A série de chuva é uma só para todos os municípios (cada ponto usa a estação mais próxima)
+    chuva = FonteChuva(
+        [c for c in os.environ.get("RISCO_CHUVA_ARQUIVOS", "").split(os.pathsep) if c] or [caminho_serie],
+        estacoes=os.environ.get("RISCO_CHUVA_ESTACOES"),
+        tolerancia_min=float(os.environ.get("RISCO_CHUVA_TOLERANCIA_MIN", 59)),
+        intervalo_s=float(os.environ.get("RISCO_CHUVA_INTERVALO_S", 60)),
+        em_segundo_plano=True,
+    )
+
+# MUNICÍPIOS
+# Cada coordenada vai para o município cujo limite a contém (src/backend/municipios.py), com os modelos e a
+# grade de tipo de via desse município; pontos fora de todos os limites vão para o município padrão
+#   RISCO_MUNICIPIOS             arquivo dos municípios atendidos (padrão: src/model/municipios.json)
+#   RISCO_MUNICIPIOS_CARREGADOS  municípios com os artefatos na memória ao mesmo tempo (LRU; o padrão nunca sai)
+municipios = RegistroMunicipios(
+    os.environ.get("RISCO_MUNICIPIOS") or caminho_municipios,
+    max_carregados=int(os.environ.get("RISCO_MUNICIPIOS_CARREGADOS", MAX_MUNICIPIOS_CARREGADOS)),
+    padrao_modelo=os.environ.get("RISCO_MODELO_PADRAO"),
+    chuva=chuva,
+    enriquecer=enriquecer,
+    em_segundo_plano=True,
+)
+if os.environ.get("RISCO_TIPO_VIA_GRADE"):
+    municipios.configs[municipios.padrao]["grade_tipo_via"] = Path(os.environ["RISCO_TIPO_VIA_GRADE"])
 
+# O município padrão (com o seu modelo padrão) é carregado já na inicialização; os demais, na primeira
+# coordenada que cair neles
+try:
+    municipios.obter()
 except Exception as e:
-    logging.error(f"Falha ao carregar modelo: {e}")
-    model = None
-    model_features = []
+    logging.error(f"Falha ao carregar o município padrão '{municipios.padrao}': {e}")
+
+tempo_inicializacao_s = time.perf_counter() - inicio_servidor
+logging.info(f"Servidor inicializado em {tempo_inicializacao_s:.3f} s.")
+
+intervalo_observador = float(os.environ.get("RISCO_MODELOS_OBSERVAR_S", 0))
+if intervalo_observador > 0:
+    municipios.iniciar_observador(intervalo_observador)
+
+
+# Função para obter um município já carregado (ou carregá-lo), traduzindo falhas em erros HTTP
+def carregar_municipio(nome=None):
+    try:
+        return municipios.obter(nome)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Município '{nome}' não registrado.")
+    except Exception as e:
+        logging.error(f"Falha ao carregar o município '{nome or municipios.padrao}': {e}")
+        raise HTTPException(status_code=500, detail="Município não disponível no servidor.")
+
+
+# Função para o município de um ponto, com 422 se estiver fora dos municípios atendidos
+def obter_municipio(latitude, longitude):
+    nome = municipios.localizar(latitude, longitude)
+    if nome is None:
+        raise HTTPException(status_code=422, detail=f"Coordenada ({latitude}, {longitude}) fora dos municípios atendidos.")
+    return carregar_municipio(nome)
+
+
+# Função para obter o modelo pedido (ou o padrão) de um município, traduzindo falhas em erros HTTP
+def obter_modelo(nome, municipio):
+    try:
+        return municipio.registro.obter(nome)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Modelo '{nome}' não registrado para {municipio.nome}.")
+    except Exception as e:
+        logging.error(f"Falha ao carregar modelo '{nome or municipio.registro.padrao}' de {municipio.nome}: {e}")
+        raise HTTPException(status_code=500, detail="Modelo não disponível no servidor.")
+
+
+# CACHE DE RESULTADOS
+# Configurável por variáveis de ambiente:
+#   RISCO_CACHE_TAMANHO        número máximo de entradas (LRU)
+#   RISCO_CACHE_PRECISAO       passo de quantização da latitude/longitude, em graus
+#   RISCO_CACHE_COMPARTILHADO  arquivo SQLite compartilhado entre os workers (vazio = desativado)
+tamanho_cache = int(os.environ.get("RISCO_CACHE_TAMANHO", 100_000))
+caminho_cache_compartilhado = os.environ.get("RISCO_CACHE_COMPARTILHADO")
+cache = CacheRisco(
+    tamanho_maximo=tamanho_cache,
+    precisao=float(os.environ.get("RISCO_CACHE_PRECISAO", 0.0005)),
+    compartilhado=BackendSQLite(caminho_cache_compartilhado, tamanho_cache) if caminho_cache_compartilhado else None,
+)
+
+# EXECUTOR DE INFERÊNCIA (MICRO-LOTES)
+# Configurável por variáveis de ambiente:
+#   RISCO_MICRO_LOTES             1 = /calcular_risco usa o executor; 0 = roda o modelo direto no event loop
+#   RISCO_LOTE_JANELA_MS          tempo máximo que um pedido espera por outros para formar um lote
+#   RISCO_LOTE_TAMANHO_MAXIMO     número máximo de pedidos por lote
+#   RISCO_INFERENCIA_TRABALHADORES threads que rodam os lotes (= lotes em voo ao mesmo tempo)
+#   RISCO_FILA_MAXIMA             pedidos esperando na fila antes de responder 503
+usar_micro_lotes = os.environ.get("RISCO_MICRO_LOTES", "1") != "0"
+executor = ExecutorInferencia(
+    janela_ms=float(os.environ.get("RISCO_LOTE_JANELA_MS", 3.0)),
+    tamanho_maximo_lote=int(os.environ.get("RISCO_LOTE_TAMANHO_MAXIMO", 256)),
+    trabalhadores=int(os.environ.get("RISCO_INFERENCIA_TRABALHADORES", 2)),
+    profundidade_maxima_fila=int(os.environ.get("RISCO_FILA_MAXIMA", 10_000)),
+    etapas=etapas_modelo,
+)
+
+# CANAL DE ALERTAS
+#   RISCO_ALERTAS_PRECISAO  tamanho da célula, em graus, dentro da qual uma nova posição não é reavaliada
+precisao_alertas = float(os.environ.get("RISCO_ALERTAS_PRECISAO", 0.0005))
+estatisticas_alertas = EstatisticasAlertas()
+
+# AGREGAÇÕES DOS GRÁFICOS
+#   RISCO_AGREGACOES_DIR      diretório dos cubos de agregação (padrão: data/agregacoes)
+#   RISCO_AGREGACOES_MAX_AGE  segundos em que o navegador reutiliza uma resposta sem revalidar
+agregacoes = Agregacoes(os.environ.get("RISCO_AGREGACOES_DIR") or caminho_agregacoes)
+max_age_agregacoes = int(os.environ.get("RISCO_AGREGACOES_MAX_AGE", 60))
+
+# ÍNDICE ESPACIAL DOS SINISTROS
+#   RISCO_SINISTROS  arquivos de sinistros limpos (CSV ou Parquet) separados por os.pathsep
+#                    (padrão: data/Acidentes/sinistros_com_chuva_2022-2025.csv)
+caminhos_sinistros = [c for c in os.environ.get("RISCO_SINISTROS", "").split(os.pathsep) if c] or [caminho_sinistros]
 
+# MAPA DE ACIDENTES E DE RISCO (TILES)
+#   RISCO_MAPA_DIR      diretório dos clusters de acidentes por zoom (padrão: data/mapa)
+#   RISCO_MAPA_MAX_AGE  segundos em que o navegador reutiliza um tile sem revalidar
+mapa_acidentes = MapaAcidentes(os.environ.get("RISCO_MAPA_DIR") or caminho_mapa)
+max_age_mapa = int(os.environ.get("RISCO_MAPA_MAX_AGE", 300))
+tiles_em_cache = CacheRespostas(MAX_TILES_EM_CACHE)
+
+# HOTSPOTS (ZONAS PERIGOSAS)
+#   RISCO_HOTSPOTS_DIR  diretório dos hotspots pré-calculados (padrão: data/hotspots; sem eles, a resposta do
+#                       risco vem com "hotspots" vazio)
+hotspots = Hotspots(os.environ.get("RISCO_HOTSPOTS_DIR") or caminho_hotspots)
+respostas_hotspots = CacheRespostas(4)
 
 # SCHEMA DE ENTRADA
 class InputFeatures(BaseModel):
     latitude: float
     longitude: float
     tp_veiculo_selecionado: str = Field(..., description="Tipo de veículo selecionado")
+    modelo: Optional[str] = Field(None, description="Nome do modelo em modelos.json (padrão: modelo padrão do servidor)")
+
+
+# SCHEMA DE ENTRADA EM LOTE
+class ItemLote(BaseModel):
+    latitude: float
+    longitude: float
+    tp_veiculo_selecionado: str = Field(..., description="Tipo de veículo selecionado")
+    timestamp: Optional[datetime] = Field(None, description="Momento da previsão (padrão: agora)")
+
+
+class EntradaLote(BaseModel):
+    itens: List[ItemLote] = Field(..., max_length=MAX_ITENS_LOTE)
+    modelo: Optional[str] = Field(None, description="Nome do modelo em modelos.json (padrão: modelo padrão do servidor)")
+
+
+# SCHEMA DE ENTRADA DE ROTA
+class PontoRota(BaseModel):
+    latitude: float
+    longitude: float
+
+
+class EntradaRota(BaseModel):
+    pontos: List[PontoRota] = Field(..., min_length=2, max_length=MAX_PONTOS_ROTA,
+                                    description="Polilinha da rota ou sequência de posições GPS, na ordem do trajeto")
+    tp_veiculo_selecionado: str = Field(..., description="Tipo de veículo selecionado")
+    timestamp: Optional[datetime] = Field(None, description="Momento da viagem (padrão: agora)")
+    espacamento_m: float = Field(25.0, ge=5.0, le=1_000.0, description="Distância entre as amostras da rota, em metros")
+    n_piores: int = Field(5, ge=0, le=100, description="Quantidade de trechos mais arriscados destacados")
+    incluir_amostras: bool = Field(False, description="Devolve também cada amostra (latitude, longitude, risco)")
+    modelo: Optional[str] = Field(None, description="Nome do modelo em modelos.json (padrão: modelo padrão do servidor)")
+
+
+# Índice espacial dos sinistros, carregado na primeira consulta de sinistros
+indice_sinistros = None
+lock_indice_sinistros = threading.Lock()
+
+
+def obter_indice_sinistros():
+    global indice_sinistros
+    if indice_sinistros is None:
+        with lock_indice_sinistros:
+            if indice_sinistros is None:
+                try:
+                    indice_sinistros = IndiceSinistros.carregar(caminhos_sinistros)
+                except FileNotFoundError as e:
+                    raise HTTPException(status_code=503, detail=f"Sinistros não disponíveis: {e}")
+    return indice_sinistros
+
+
+# Função para calcular o risco de um ponto no horário atual: cubo -> cache -> modelo
+async def risco_ponto(modelo, municipio, latitude, longitude, veiculo):
+    # Conversão e enriquecimento temporal
+    temporais = features_temporais([None])
+    dia_semana = int(temporais["dia_semana"][0])
+    mes = int(temporais["mes"][0])
+    hora_int = int(temporais["hora"][0])
+
+    # Chuva agora na estação mais próxima e tipo da via mais próxima
+    inicio = time.perf_counter()
+    chuva, tipo_via = municipio.enriquecimento.ponto(latitude, longitude, datetime.now())
+    etapas_modelo.observar(time.perf_counter() - inicio, modelo.nome, "enriquecimento")
+
+    # Consulta O(1) no cubo pré-calculado; o modelo só roda para pontos fora dele
+    # O cubo foi calculado sem chuva e em via municipal: com chuva ou em rodovia, o ponto vai para o modelo
+    if usar_cubo and modelo.cubo is not None and chuva == 0 and tipo_via == 0:
+        risco = modelo.cubo.consultar(latitude, longitude, mes, dia_semana, hora_int, veiculo)
+        if risco is not None:
+            origens_risco.incrementar("cubo")
+            return risco
+
+    # Fora do cubo: tenta o cache de resultados antes de rodar o modelo
+    chave_cache = cache.chave(latitude, longitude, mes, dia_semana, hora_int, veiculo, modelo.sha256, chuva, tipo_via)
+    risco = cache.obter(chave_cache)
+    if risco is not None:
+        origens_risco.incrementar("cache")
+        return risco
+
+    origens_risco.incrementar("modelo")
+    if usar_micro_lotes:
+        # O modelo roda fora do event loop, junto com os pedidos concorrentes
+        risco = await executor.prever(modelo, latitude, longitude, veiculo, mes, dia_semana, hora_int, chuva, tipo_via)
+    else:
+        # Monta a linha de features na ordem exata do modelo
+        inicio = time.perf_counter()
+        temporais.update({"Chuva": [chuva], "tipo_via_num": [tipo_via]})
+        matriz = montar_matriz_features([latitude], [longitude], [veiculo], temporais,
+                                        modelo.model_features, modelo.veiculo_padrao)
+        inicio_modelo = time.perf_counter()
+
+        # Realiza a predição
+        risco = float(modelo.prever_riscos(matriz)[0])
+        etapas_modelo.observar(inicio_modelo - inicio, modelo.nome, "features")
+        etapas_modelo.observar(time.perf_counter() - inicio_modelo, modelo.nome, "inferencia")
+
+        # Só uma amostra das entradas vai para o log (montar a mensagem custa mais que a predição)
+        if amostragem_predicoes.deve_registrar():
+            logging.info(f"Dados para predição: {dict(zip(modelo.model_features, matriz[0].tolist()))}")
+
+    cache.guardar(chave_cache, risco)
+    return risco
+
+
+# Função para os hotspots que contêm um ponto, com as estatísticas da hora e do veículo pedidos
+def hotspots_no_ponto(latitude, longitude, hora, veiculo):
+    indice = hotspots.obter()
+    if indice is None:
+        return []
+    return [indice.resumo(posicao, hora, veiculo) for posicao in indice.no_ponto(latitude, longitude)]
 
 
 # ENDPOINT PRINCIPAL
 @app.post("/calcular_risco")
 async def calcular_risco(features: InputFeatures):
-    if model is None:
-        raise HTTPException(status_code=500, detail="Modelo não disponível no servidor.")
+    marcar_inicio_handler()
+    # As referências ao município e ao modelo são pegas uma vez: uma recarga no meio da requisição não as afeta
+    municipio = obter_municipio(features.latitude, features.longitude)
+    modelo = obter_modelo(features.modelo, municipio)
 
     try:
-        # Conversão e enriquecimento temporal
-        now = datetime.now()
-        dia_semana = now.weekday()
-        mes = now.month
-        is_weekend = 1 if dia_semana >= 5 else 0
-        hora_int = now.hour
-
-        # Criação do DataFrame inicial
-        input_data = {
-            "latitude": features.latitude,
-            "longitude": features.longitude,
-            "dia_semana": dia_semana,
-            "mes": mes,
-            "is_weekend": is_weekend,
-            "hora": hora_int,
-            "tp_veiculo_bicicleta": 0,
-            "tp_veiculo_caminhao": 0,
-            "tp_veiculo_motocicleta": 0,
-            "tp_veiculo_nao_disponivel": 0,
-            "tp_veiculo_onibus": 0,
-            "tp_veiculo_outros": 0,
-            "tp_veiculo_automovel": 0
+        risco = await risco_ponto(modelo, municipio, features.latitude, features.longitude,
+                                  features.tp_veiculo_selecionado)
+        interpretacao = str(modelo.interpretar(risco))
+        avaliacoes_risco.incrementar(modelo.nome, interpretacao, rotulo_veiculo(features.tp_veiculo_selecionado))
+        agora = datetime.now()
+        # Zonas perigosas conhecidas que contêm o ponto (consulta na STRtree, independente do modelo)
+        zonas = hotspots_no_ponto(features.latitude, features.longitude, agora.hour, features.tp_veiculo_selecionado)
+
+        marcar_fim_handler()
+        return {
+            "risco_estimado": risco,
+            "interpretacao": interpretacao,
+            "modelo": modelo.nome,
+            "municipio": municipio.nome,
+            "hotspots": zonas,
+            "timestamp": agora.isoformat(),
         }
 
-        # Ativa o veículo que o frontend enviou
-        if features.tp_veiculo_selecionado in input_data:
-            input_data[features.tp_veiculo_selecionado] = 1
+    except FilaCheia as e:
+        erros_risco.incrementar("/calcular_risco", "fila_cheia")
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        erros_risco.incrementar("/calcular_risco", "predicao")
+        logging.error(f"Erro na predição: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
+# CANAL DE ALERTAS (WEBSOCKET)
+# O cliente envia as posições GPS e só recebe mensagem quando o nível de risco muda
+@app.websocket("/ws/alertas")
+async def canal_alertas(websocket: WebSocket, tp_veiculo_selecionado: str, modelo: Optional[str] = None):
+    padrao = municipios.carregados.get(municipios.padrao)
+    if modelo is not None and padrao is not None and modelo not in padrao.registro.configs:
+        await websocket.close(code=1008, reason=f"Modelo '{modelo}' não registrado.")
+        return
 
-        df_input = pd.DataFrame([input_data])
-        logging.info(f"Dados para predição: {df_input.to_dict()}")
+    await websocket.accept()
+    sessao = SessaoAlertas(tp_veiculo_selecionado, precisao_alertas)
+    estatisticas_alertas.conectar()
+    try:
+        while True:
+            mensagem = await websocket.receive_text()
+            try:
+                posicao = json.loads(mensagem)
+                latitude, longitude = float(posicao["latitude"]), float(posicao["longitude"])
+                veiculo = posicao.get("tp_veiculo_selecionado")
+            except (ValueError, KeyError, TypeError, AttributeError):
+                estatisticas_alertas.registrar(avaliada=False, erro=True)
+                await websocket.send_json({"tipo": "erro", "detalhe": "Posição inválida: esperado {latitude, longitude}."})
+                continue
 
-        # Adiciona colunas que o modelo espera mas não vieram do input
-        for col in model_features:
-            if col not in df_input.columns:
-                df_input[col] = 0  # Adiciona a coluna com valor padrão 0
+            if not sessao.precisa_avaliar(latitude, longitude, veiculo):
+                estatisticas_alertas.registrar(avaliada=False)
+                continue
 
-        # Garante a ordem exata das colunas e remove extras
-        df_processed = df_input[model_features]
-        df_processed = df_processed.astype(float)
+            try:
+                # O município e o modelo são buscados a cada posição: a viagem pode passar de um município para
+                # outro, e uma recarga vale também para conexões já abertas
+                nome_municipio = municipios.localizar(latitude, longitude)
+                if nome_municipio is None:
+                    raise ValueError("posição fora dos municípios atendidos")
+                municipio = municipios.obter(nome_municipio)
+                modelo_atual = municipio.registro.obter(modelo)
+                risco = await risco_ponto(modelo_atual, municipio, latitude, longitude, sessao.veiculo)
+            except Exception as e:
+                sessao.ultima_chave = None  # tenta de novo na próxima posição
+                estatisticas_alertas.registrar(avaliada=False, erro=True)
+                await websocket.send_json({"tipo": "erro", "detalhe": f"Falha ao calcular o risco: {e}"})
+                continue
 
-        # Realiza a predição
-        prob = model.predict_proba(df_processed[model_features])[:, 1]
-        risco = float(prob[0])
+            nivel = str(modelo_atual.interpretar(risco))
+            anterior = sessao.atualizar_nivel(nivel)
+            estatisticas_alertas.registrar(avaliada=True, alerta=nivel != anterior)
+            if nivel != anterior:
+                await websocket.send_json({
+                    "tipo": "alerta",
+                    "nivel": nivel,
+                    "nivel_anterior": anterior,
+                    "risco_estimado": risco,
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "modelo": modelo_atual.nome,
+                    "municipio": municipio.nome,
+                    "timestamp": datetime.now().isoformat(),
+                })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        estatisticas_alertas.desconectar()
+
+# Função para prever o risco de vários pontos: primeiro o cubo pré-calculado, e os pontos fora dele
+# (NaN) vão juntos para uma única chamada do modelo
+# momentos: datetime64 de cada ponto (momentos_locais), usado para buscar a chuva
+def prever_pontos(modelo, municipio, latitudes, longitudes, veiculos, temporais, momentos):
+    inicio = time.perf_counter()
+    temporais = {**temporais, **municipio.enriquecimento.colunas(latitudes, longitudes, momentos)}
+    etapas_modelo.observar(time.perf_counter() - inicio, modelo.nome, "enriquecimento")
+
+    riscos = np.full(len(latitudes), np.nan)
+    if usar_cubo and modelo.cubo is not None:
+        riscos = modelo.cubo.consultar_lote(latitudes, longitudes, temporais["mes"], temporais["dia_semana"],
+                                            temporais["hora"], veiculos)
+        # O cubo foi calculado sem chuva e em via municipal: os demais pontos vão para o modelo
+        riscos[(temporais["Chuva"] != 0) | (temporais["tipo_via_num"] != 0)] = np.nan
+
+    faltantes = np.isnan(riscos)
+    n_faltantes = int(faltantes.sum())
+    if n_faltantes < len(riscos):
+        origens_risco.incrementar("cubo", valor=len(riscos) - n_faltantes)
+    if n_faltantes:
+        origens_risco.incrementar("modelo", valor=n_faltantes)
+        inicio = time.perf_counter()
+        matriz = montar_matriz_features(
+            latitudes[faltantes],
+            longitudes[faltantes],
+            veiculos[faltantes],
+            {nome: valores[faltantes] for nome, valores in temporais.items()},
+            modelo.model_features,
+            modelo.veiculo_padrao,
+        )
+        inicio_modelo = time.perf_counter()
+        riscos[faltantes] = modelo.prever_riscos(matriz)
+        etapas_modelo.observar(inicio_modelo - inicio, modelo.nome, "features")
+        etapas_modelo.observar(time.perf_counter() - inicio_modelo, modelo.nome, "inferencia")
+    return riscos
 
-        limiar = 0.5
+# ENDPOINT EM LOTE
+# Monta uma única matriz de features por município e faz um só predict_proba para cada um
+@app.post("/calcular_risco_lote")
+def calcular_risco_lote(entrada: EntradaLote):
+    marcar_inicio_handler()
+    itens = entrada.itens
+    if not itens:
+        # Lote vazio: nada a separar por município, responde com o modelo pedido (ou o padrão) do município padrão
+        modelo = obter_modelo(entrada.modelo, carregar_municipio())
+        marcar_fim_handler()
+        return {"resultados": [], "quantidade": 0, "modelo": modelo.nome, "municipios": {},
+                "timestamp": datetime.now().isoformat()}
 
-        if risco >= limiar:
-            interpretacao = "ALTO"
-        elif risco >= 0.2:
-            interpretacao = "MÉDIO"
-        else:
-            interpretacao = "BAIXO"
+    latitudes = np.array([item.latitude for item in itens], dtype=float)
+    longitudes = np.array([item.longitude for item in itens], dtype=float)
 
+    # Os itens são separados por município; cada grupo usa os modelos e a grade de tipo de via do seu município
+    grupos = municipios.agrupar(latitudes, longitudes)
+    if None in grupos:
+        raise HTTPException(status_code=422, detail=f"{len(grupos[None])} itens fora dos municípios atendidos "
+                                                    f"(primeiro: posição {int(grupos[None][0])}).")
+    # Com um só município, o lote inteiro segue sem cópias
+    grupos = [(carregar_municipio(nome), slice(None) if len(grupos) == 1 else posicoes)
+              for nome, posicoes in grupos.items()]
+    grupos = [(municipio, obter_modelo(entrada.modelo, municipio), posicoes) for municipio, posicoes in grupos]
+
+    try:
+        veiculos = np.array([item.tp_veiculo_selecionado for item in itens], dtype=object)
+        momentos = momentos_locais([item.timestamp for item in itens])
+        temporais = features_temporais(momentos)
+        momentos = momentos.to_numpy()
+
+        riscos = np.empty(len(itens))
+        interpretacoes = np.empty(len(itens), dtype=object)
+        for municipio, modelo, posicoes in grupos:
+            riscos[posicoes] = prever_pontos(modelo, municipio, latitudes[posicoes], longitudes[posicoes],
+                                             veiculos[posicoes], {nome: valores[posicoes] for nome, valores in
+                                                                  temporais.items()}, momentos[posicoes])
+            interpretacoes[posicoes] = modelo.interpretar(riscos[posicoes])
+            combinacoes, totais = np.unique(np.char.add(np.char.add(interpretacoes[posicoes].astype(str), "|"),
+                                                        veiculos[posicoes].astype(str)), return_counts=True)
+            for combinacao, total in zip(combinacoes.tolist(), totais.tolist()):
+                interpretacao, veiculo = combinacao.split("|", 1)
+                avaliacoes_risco.incrementar(modelo.nome, interpretacao, rotulo_veiculo(veiculo), valor=total)
+
+        marcar_fim_handler()
         return {
-            "risco_estimado": risco,
-            "interpretacao": interpretacao,
+            "resultados": [
+                {"risco_estimado": risco, "interpretacao": interpretacao}
+                for risco, interpretacao in zip(riscos.tolist(), interpretacoes.tolist())
+            ],
+            "quantidade": len(itens),
+            "modelo": grupos[0][1].nome,
+            "municipios": {municipio.nome: len(itens) if isinstance(posicoes, slice) else len(posicoes)
+                           for municipio, _, posicoes in grupos},
             "timestamp": datetime.now().isoformat(),
         }
 
     except Exception as e:
-        logging.error(f"Erro na predição: {traceback.format_exc()}")
+        erros_risco.incrementar("/calcular_risco_lote", "predicao")
+        logging.error(f"Erro na predição em lote: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
+# ENDPOINT DE ROTA
+# Densifica a rota, ajusta as amostras às ruas e calcula o risco de todas em uma só chamada
+@app.post("/calcular_risco_rota")
+def calcular_risco_rota(entrada: EntradaRota):
+    marcar_inicio_handler()
+    # A rota inteira usa o município do ponto de partida (as ruas, os modelos e a grade de tipo de via dele)
+    municipio = obter_municipio(entrada.pontos[0].latitude, entrada.pontos[0].longitude)
+    modelo = obter_modelo(entrada.modelo, municipio)
+
+    try:
+        indice = municipio.obter_indice_ruas()
+        latitudes, longitudes, distancias, ruas = indice.amostrar_rota(
+            [p.latitude for p in entrada.pontos], [p.longitude for p in entrada.pontos], entrada.espacamento_m
+        )
+    except Exception as e:
+        erros_risco.incrementar("/calcular_risco_rota", "amostragem_rota")
+        logging.error(f"Erro ao amostrar a rota: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
+    if len(latitudes) > MAX_AMOSTRAS_ROTA:
+        raise HTTPException(status_code=422, detail=f"Rota gera {len(latitudes)} amostras (máximo {MAX_AMOSTRAS_ROTA}); "
+                                                    f"aumente 'espacamento_m'.")
+
+    try:
+        n_amostras = len(latitudes)
+        veiculos = np.full(n_amostras, entrada.tp_veiculo_selecionado, dtype=object)
+        momento = momentos_locais([entrada.timestamp])
+        temporais = features_temporais(momento)
+        temporais = {nome: np.repeat(valores, n_amostras) for nome, valores in temporais.items()}
+        riscos = prever_pontos(modelo, municipio, latitudes, longitudes, veiculos, temporais, momento.to_numpy()[0])
+
+        # Cada amostra vale o trecho de rota ao seu redor; os agregados são ponderados pelo comprimento
+        pesos = pesos_amostras(distancias)
+        inicios, fins = agrupar_trechos(indice.chaves_trechos(ruas))
+        comprimentos = np.add.reduceat(pesos, inicios)
+        riscos_medios = np.add.reduceat(pesos * riscos, inicios) / np.maximum(comprimentos, 1e-9)
+        riscos_maximos = np.maximum.reduceat(riscos, inicios)
+        interpretacoes = modelo.interpretar(riscos_maximos)
+
+        trechos = []
+        for k, (inicio, fim) in enumerate(zip(inicios.tolist(), fins.tolist())):
+            pior = inicio + int(np.argmax(riscos[inicio:fim + 1]))
+            rua = int(ruas[inicio])
+            trechos.append({
+                "nome": indice.nomes[rua] if rua >= 0 else None,
+                "tipo_via": indice.tipos[rua] if rua >= 0 else None,
+                "na_malha_viaria": rua >= 0,
+                "inicio_m": round(float(distancias[inicio]), 1),
+                "fim_m": round(float(distancias[fim]), 1),
+                "comprimento_m": round(float(comprimentos[k]), 1),
+                "risco_medio": float(riscos_medios[k]),
+                "risco_maximo": float(riscos_maximos[k]),
+                "interpretacao": str(interpretacoes[k]),
+                "latitude_pior": float(latitudes[pior]),
+                "longitude_pior": float(longitudes[pior]),
+            })
+
+        risco_rota = float(np.average(riscos, weights=pesos)) if pesos.sum() > 0 else float(riscos.mean())
+        na_faixa_alta = modelo.interpretar(riscos) == "ALTO"
+        ordem = np.argsort(-riscos_maximos, kind="stable")[:entrada.n_piores]
+
+        resposta = {
+            "risco_rota": risco_rota,
+            "interpretacao": str(modelo.interpretar(risco_rota)),
+            "risco_maximo": float(riscos.max()),
+            "comprimento_m": round(float(distancias[-1]), 1),
+            "comprimento_alto_m": round(float(pesos[na_faixa_alta].sum()), 1),
+            "amostras": n_amostras,
+            "amostras_fora_das_ruas": int((ruas < 0).sum()),
+            "trechos": trechos,
+            "piores_trechos": [trechos[k] for k in ordem.tolist()],
+            "modelo": modelo.nome,
+            "municipio": municipio.nome,
+            "timestamp": datetime.now().isoformat(),
+        }
+        if entrada.incluir_amostras:
+            resposta["amostras_rota"] = [
+                [lat, lon, risco] for lat, lon, risco in zip(latitudes.tolist(), longitudes.tolist(), riscos.tolist())
+            ]
+        marcar_fim_handler()
+        return resposta
+
+    except Exception as e:
+        erros_risco.incrementar("/calcular_risco_rota", "predicao")
+        logging.error(f"Erro na predição da rota: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
 # ============================
-# HEALTHCHECK
+# AGREGAÇÕES DOS GRÁFICOS
 # ============================
+
+# Parâmetros da consulta que não são filtros de dimensão
+PARAMETROS_CONSULTA = {"por", "data_inicio", "data_fim"}
+
+
+# Função para responder com ETag, revalidação (304) e compressão negociada pelo Accept-Encoding
+# As respostas ficam em 'respostas' (CacheRespostas) por ETag; o navegador as reutiliza por 'max_age' segundos
+def responder_em_cache(request, etag, gerar, respostas, max_age):
+    cabecalhos = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}", "Vary": "Accept-Encoding"}
+    # Comparação fraca (RFC 9110): o prefixo W/ é ignorado dos dois lados
+    recebidos = [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]
+    if "*" in recebidos or etag.removeprefix("W/") in recebidos:
+        return Response(status_code=304, headers=cabecalhos)
+
+    resposta = respostas.obter(etag, gerar)
+    codificacao = escolher_codificacao(request.headers.get("accept-encoding"))
+    if codificacao != "identity":
+        cabecalhos["Content-Encoding"] = codificacao
+    return Response(comprimir(resposta, codificacao), media_type="application/json", headers=cabecalhos)
+
+
+# Função para obter os cubos, com 503 se ainda não foram construídos
+def obter_cubos():
+    cubos = agregacoes.obter()
+    if not cubos:
+        raise HTTPException(status_code=503, detail="Cubos de agregação não construídos (python -m src.backend.agregacoes).")
+    return cubos
+
+
+# Dimensões e valores possíveis de cada cubo (para montar filtros e eixos no frontend)
+@app.get("/agregacoes")
+def listar_agregacoes(request: Request):
+    cubos = obter_cubos()
+    return responder_em_cache(request, etag_cubos(cubos), lambda: {
+        nome: {"dimensoes": list(cubo.codigos), "dominio": cubo.dominio()} for nome, cubo in cubos.items()
+    }, agregacoes.respostas, max_age_agregacoes)
+
+
+# Fatia de um cubo: /agregacoes/acidentes?por=hora&chuva=Chuva fraca&data_inicio=2023-01-01&data_fim=2023-12-31
+# Cada parâmetro que não é por/data_inicio/data_fim filtra uma dimensão (pode ser repetido: ?veiculo=a&veiculo=b)
+@app.get("/agregacoes/{nome}")
+def consultar_agregacao(nome: str, request: Request):
+    cubo = obter_cubos().get(nome)
+    if cubo is None:
+        raise HTTPException(status_code=404, detail=f"Cubo '{nome}' não existe.")
+
+    parametros = request.query_params
+    por = parametros.getlist("por")
+    filtros = {dim: parametros.getlist(dim) for dim in parametros.keys() if dim not in PARAMETROS_CONSULTA}
+    data_inicio, data_fim = parametros.get("data_inicio") or None, parametros.get("data_fim") or None
+    try:
+        for data in (data_inicio, data_fim):
+            if data:
+                datetime.strptime(data, "%Y-%m-%d")
+        # A consulta é validada antes do ETag: dimensões inválidas não geram 304 nem entram no cache
+        desconhecidas = (set(por) | set(filtros)) - set(cubo.codigos)
+        if desconhecidas:
+            raise ValueError(f"Dimensões inexistentes no cubo '{nome}': {', '.join(sorted(desconhecidas))}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    etag = etag_consulta(cubo, por, filtros, data_inicio, data_fim)
+    return responder_em_cache(request, etag, lambda: cubo.consultar(por, filtros, data_inicio, data_fim),
+                              agregacoes.respostas, max_age_agregacoes)
+
+
+# ============================
+# SINISTROS PRÓXIMOS
+# ============================
+
+# Limites das consultas ao índice de sinistros
+MAX_RAIO_M = 50_000
+MAX_SINISTROS_RESPOSTA = 5_000
+
+
+# Função para montar os filtros comuns das consultas de sinistros
+def filtros_sinistros(data_inicio, data_fim, veiculo, gravidade):
+    for data in (data_inicio, data_fim):
+        if data:
+            try:
+                datetime.strptime(data, "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Data inválida: '{data}' (use AAAA-MM-DD).")
+    return {"data_inicio": data_inicio, "data_fim": data_fim, "veiculos": veiculo, "gravidades": gravidade}
+
+
+# Tipos de veículo, gravidades e período disponíveis para os filtros
+@app.get("/sinistros")
+def dominio_sinistros():
+    return obter_indice_sinistros().dominio()
+
+
+# Sinistros a até raio_m metros de um ponto, do mais próximo ao mais distante
+# Filtros repetíveis: /sinistros/raio?latitude=-22.32&longitude=-49.07&raio_m=300&veiculo=motocicleta&gravidade=GRAVE
+@app.get("/sinistros/raio")
+def sinistros_no_raio(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    raio_m: float = Query(500.0, gt=0, le=MAX_RAIO_M),
+    limite: int = Query(500, ge=1, le=MAX_SINISTROS_RESPOSTA),
+    data_inicio: Optional[str] = None,
+    data_fim: Optional[str] = None,
+    veiculo: Optional[List[str]] = Query(None),
+    gravidade: Optional[List[str]] = Query(None),
+):
+    indice = obter_indice_sinistros()
+    try:
+        posicoes, distancias, total = indice.no_raio(latitude, longitude, raio_m, limite,
+                                                     **filtros_sinistros(data_inicio, data_fim, veiculo, gravidade))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"total": total, "sinistros": indice.descrever(posicoes, distancias)}
+
+
+# Os k sinistros mais próximos de um ponto (opcionalmente a até raio_maximo_m metros)
+@app.get("/sinistros/proximos")
+def sinistros_proximos(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=MAX_SINISTROS_RESPOSTA),
+    raio_maximo_m: Optional[float] = Query(None, gt=0),
+    data_inicio: Optional[str] = None,
+    data_fim: Optional[str] = None,
+    veiculo: Optional[List[str]] = Query(None),
+    gravidade: Optional[List[str]] = Query(None),
+):
+    indice = obter_indice_sinistros()
+    try:
+        posicoes, distancias = indice.mais_proximos(latitude, longitude, k, raio_maximo_m,
+                                                    **filtros_sinistros(data_inicio, data_fim, veiculo, gravidade))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"sinistros": indice.descrever(posicoes, distancias)}
+
+
+# Contagem de sinistros por célula de tamanho_celula graus, opcionalmente dentro de um retângulo
+@app.get("/sinistros/celulas")
+def sinistros_por_celula(
+    tamanho_celula: float = Query(0.005, ge=0.0001, le=1.0),
+    lat_min: Optional[float] = None,
+    lon_min: Optional[float] = None,
+    lat_max: Optional[float] = None,
+    lon_max: Optional[float] = None,
+    data_inicio: Optional[str] = None,
+    data_fim: Optional[str] = None,
+    veiculo: Optional[List[str]] = Query(None),
+    gravidade: Optional[List[str]] = Query(None),
+):
+    limites = [lat_min, lon_min, lat_max, lon_max]
+    if any(v is not None for v in limites) and any(v is None for v in limites):
+        raise HTTPException(status_code=400, detail="O retângulo precisa de lat_min, lon_min, lat_max e lon_max.")
+
+    indice = obter_indice_sinistros()
+    try:
+        latitudes, longitudes, totais = indice.contar_celulas(
+            tamanho_celula, limites if lat_min is not None else None,
+            **filtros_sinistros(data_inicio, data_fim, veiculo, gravidade),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "tamanho_celula": tamanho_celula,
+        "total": int(totais.sum()),
+        "celulas": [[lat, lon, n] for lat, lon, n in zip(latitudes.round(6).tolist(), longitudes.round(6).tolist(),
+                                                         totais.tolist())],
+    }
+
+# ============================
+# HOTSPOTS (ZONAS PERIGOSAS)
+# ============================
+
+# Função para obter os hotspots, com 503 se ainda não foram construídos
+def obter_hotspots():
+    indice = hotspots.obter()
+    if indice is None:
+        raise HTTPException(status_code=503, detail="Hotspots não construídos (python -m src.backend.hotspots).")
+    return indice
+
+
+# Todos os hotspots em GeoJSON (polígonos e estatísticas), para desenhar no mapa
+@app.get("/hotspots")
+def listar_hotspots(request: Request):
+    indice = obter_hotspots()
+    return responder_em_cache(request, f'W/"{indice.hash}"', lambda: indice.colecao, respostas_hotspots, max_age_mapa)
+
+
+# Hotspots que contêm um ponto; com hora (0 a 23) e/ou veículo, traz também as estatísticas deles
+@app.get("/hotspots/ponto")
+def hotspots_do_ponto(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    hora: Optional[int] = Query(None, ge=0, le=23),
+    tp_veiculo_selecionado: Optional[str] = None,
+):
+    indice = obter_hotspots()
+    return {"hotspots": [indice.resumo(posicao, hora, tp_veiculo_selecionado)
+                         for posicao in indice.no_ponto(latitude, longitude)]}
+
+# ============================
+# MAPA (TILES DE CLUSTERS)
+# ============================
+
+# Zoom máximo aceito nos tiles (acima de ZOOM_MAX, os clusters de ZOOM_MAX são recortados)
+ZOOM_MAXIMO_TILE = 22
+
+# Clusters de risco de cada modelo (pela versão do artefato), montados no primeiro tile pedido
+clusters_risco = {}
+lock_clusters_risco = threading.Lock()
+
+
+# Função para validar as coordenadas de um tile
+def validar_tile(z, x, y):
+    if not 0 <= z <= ZOOM_MAXIMO_TILE or not (0 <= x < 1 << z and 0 <= y < 1 << z):
+        raise HTTPException(status_code=400, detail=f"Tile inválido: {z}/{x}/{y}.")
+
+
+# Função para validar um mês no formato AAAA-MM
+def validar_mes(mes):
+    if mes:
+        try:
+            datetime.strptime(mes, "%Y-%m")
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Mês inválido: '{mes}' (use AAAA-MM).")
+
+
+# Função para obter a camada de acidentes, com 503 se ainda não foi construída
+def obter_mapa_acidentes():
+    clusters = mapa_acidentes.obter()
+    if clusters is None:
+        raise HTTPException(status_code=503, detail="Mapa não construído (python -m src.backend.clusters_mapa).")
+    return clusters
+
+
+# Função para obter os clusters de risco de um modelo, com 503 se o modelo não tiver cubo de risco
+def obter_clusters_risco(modelo):
+    if modelo.cubo is None:
+        raise HTTPException(status_code=503, detail=f"Modelo '{modelo.nome}' sem cubo de risco pré-calculado.")
+    if modelo.sha256 not in clusters_risco:
+        with lock_clusters_risco:
+            if modelo.sha256 not in clusters_risco:
+                clusters_risco[modelo.sha256] = ClustersRisco(modelo.cubo)
+    return clusters_risco[modelo.sha256]
+
+
+# Zoom máximo com clusters próprios e meses disponíveis na camada de acidentes
+@app.get("/mapa")
+def descrever_mapa():
+    clusters = mapa_acidentes.obter()
+    return {"zoom_max": ZOOM_MAX, "meses": clusters.meses if clusters else [], "camadas": ["acidentes", "risco"]}
+
+
+# Clusters de acidentes de um tile: [[latitude, longitude, sinistros], ...] no período inicio..fim (AAAA-MM)
+@app.get("/mapa/acidentes/{z}/{x}/{y}")
+def tile_acidentes(z: int, x: int, y: int, request: Request, inicio: Optional[str] = None,
+                   fim: Optional[str] = None):
+    validar_tile(z, x, y)
+    validar_mes(inicio)
+    validar_mes(fim)
+    clusters = obter_mapa_acidentes()
+
+    def gerar():
+        latitudes, longitudes, totais = clusters.tile(z, x, y, inicio, fim)
+        return {"z": z, "x": x, "y": y, "clusters": [
+            [lat, lon, n] for lat, lon, n in zip(latitudes.round(6).tolist(), longitudes.round(6).tolist(),
+                                                 totais.tolist())
+        ]}
+
+    etag = etag_tile("acidentes", z, x, y, inicio, fim, clusters.particoes_no_intervalo(inicio, fim))
+    return responder_em_cache(request, etag, gerar, tiles_em_cache, max_age_mapa)
+
+
+# Clusters de risco previsto de um tile (cubo de risco do modelo), no momento pedido ou agora:
+# [[latitude, longitude, células, risco médio, risco máximo, interpretação do máximo], ...]
+@app.get("/mapa/risco/{z}/{x}/{y}")
+def tile_risco(z: int, x: int, y: int, request: Request, tp_veiculo_selecionado: Optional[str] = None,
+               timestamp: Optional[datetime] = None, modelo: Optional[str] = None):
+    validar_tile(z, x, y)
+    # O tile usa o modelo do município do seu centro (fora de todos, o município padrão)
+    lat_min, lon_min, lat_max, lon_max = limites_tile(z, x, y)
+    municipio = carregar_municipio(municipios.localizar((lat_min + lat_max) / 2, (lon_min + lon_max) / 2))
+    modelo_carregado = obter_modelo(modelo, municipio)
+    clusters = obter_clusters_risco(modelo_carregado)
+    temporais = features_temporais([timestamp])
+    mes, dia_semana, hora = int(temporais["mes"][0]), int(temporais["dia_semana"][0]), int(temporais["hora"][0])
+
+    if modelo_carregado.cubo.pos_mes[mes] < 0:
+        raise HTTPException(status_code=404, detail=f"Mês {mes} fora do cubo de risco de '{modelo_carregado.nome}'.")
+
+    def gerar():
+        latitudes, longitudes, celulas, medios, maximos = clusters.tile(z, x, y, mes, dia_semana, hora,
+                                                                        tp_veiculo_selecionado)
+        interpretacoes = modelo_carregado.interpretar(maximos) if len(maximos) else []
+        return {"z": z, "x": x, "y": y, "mes": mes, "dia_semana": dia_semana, "hora": hora,
+                "modelo": modelo_carregado.nome, "clusters": [
+                    [lat, lon, n, medio, maximo, str(interpretacao)] for lat, lon, n, medio, maximo, interpretacao in
+                    zip(latitudes.round(6).tolist(), longitudes.round(6).tolist(), celulas.tolist(),
+                        medios.round(5).tolist(), maximos.round(5).tolist(), interpretacoes)
+                ]}
+
+    # Sem timestamp, o tile vale até a hora virar
+    max_age = max_age_mapa
+    if timestamp is None:
+        agora = datetime.now()
+        max_age = min(max_age, 3600 - agora.minute * 60 - agora.second)
+    etag = etag_tile("risco", modelo_carregado.sha256, z, x, y, mes, dia_semana, hora, tp_veiculo_selecionado)
+    return responder_em_cache(request, etag, gerar, tiles_em_cache, max_age)
+
+# ============================
+# ADMINISTRAÇÃO DOS MODELOS
+# ============================
+
+# Função para validar o token de administração (se RISCO_ADMIN_TOKEN estiver definido)
+def verificar_admin(token):
+    esperado = os.environ.get("RISCO_ADMIN_TOKEN")
+    if esperado and token != esperado:
+        raise HTTPException(status_code=403, detail="Token de administração inválido.")
+
+
+# Recarrega um modelo de forma atômica, sem derrubar as requisições em andamento
+@app.post("/admin/recarregar_modelo")
+def recarregar_modelo(nome: Optional[str] = None, municipio: Optional[str] = None,
+                      x_admin_token: Optional[str] = Header(None)):
+    verificar_admin(x_admin_token)
+    registro = carregar_municipio(municipio).registro
+    try:
+        modelo = registro.recarregar(nome)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Modelo '{nome}' não registrado.")
+    except Exception as e:
+        logging.error(f"Falha ao recarregar modelo: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Falha ao recarregar: {str(e)}")
+
+    return {"modelo": modelo.nome, **modelo.descricao()}
+
+
+@app.get("/admin/modelos")
+def listar_modelos(municipio: Optional[str] = None):
+    return carregar_municipio(municipio).registro.estado()
+
+
+@app.get("/admin/municipios")
+def listar_municipios():
+    return municipios.estado()
+
+# ============================
+# MÉTRICAS (PROMETHEUS)
+# ============================
+
+# Calculadas na raspagem, a partir do estado que o servidor já guarda
+metricas.medidor("risco_servidor_inicializacao_segundos", "Tempo de inicialização do servidor", [],
+                 lambda: {(): tempo_inicializacao_s})
+
+
+# Função para os modelos carregados de todos os registros em uso, com o modelos.json de origem
+def modelos_carregados():
+    return [(registro.caminho_config.parent.name, registro, nome, modelo)
+            for registro in list(municipios.registros.values()) for nome, modelo in list(registro.modelos.items())]
+
+
+metricas.medidor("risco_modelo_info", "Modelos carregados (artefato, sha256 e se é o padrão)",
+                 ["registro", "modelo", "arquivo", "sha256", "padrao"],
+                 lambda: {(origem, nome, m.caminho.name, m.sha256, str(nome == registro.padrao).lower()): 1
+                          for origem, registro, nome, m in modelos_carregados()})
+metricas.medidor("risco_modelo_carga_segundos", "Tempo de carga do modelo (tabelas compiladas e cubo)",
+                 ["registro", "modelo"],
+                 lambda: {(origem, nome): m.tempo_carga_s for origem, _, nome, m in modelos_carregados()})
+metricas.medidor("risco_modelo_desserializacao_segundos", "Tempo de desserialização do artefato original",
+                 ["registro", "modelo"],
+                 lambda: {(origem, nome): m.tempo_desserializacao_s for origem, _, nome, m in modelos_carregados()})
+metricas.medidor("risco_cache_consultas_total", "Consultas ao cache de resultados", ["resultado"],
+                 lambda: {("acerto",): cache.acertos, ("acerto_compartilhado",): cache.acertos_compartilhado,
+                          ("falha",): cache.falhas}, tipo="counter")
+metricas.medidor("risco_executor_fila", "Pedidos esperando na fila do executor de micro-lotes", [],
+                 lambda: {(): executor.fila.qsize() if executor.fila is not None else 0})
+metricas.medidor("risco_executor_lotes_total", "Micro-lotes rodados pelo executor", [],
+                 lambda: {(): executor.lotes}, tipo="counter")
+metricas.medidor("risco_executor_rejeitados_total", "Pedidos rejeitados com a fila do executor cheia", [],
+                 lambda: {(): executor.rejeitados}, tipo="counter")
+
+
+# Função para o momento (segundos Unix) da leitura de chuva mais recente, para alertar quando o feed para
+def ultima_leitura_chuva():
+    ultima = chuva.ultima_leitura() if chuva is not None else None
+    return {(): ultima.tz_localize(FUSO_BAURU).timestamp() if ultima is not None else None}
+
+
+metricas.medidor("risco_chuva_ultima_leitura_timestamp_segundos", "Momento da leitura de chuva mais recente carregada",
+                 [], ultima_leitura_chuva)
+metricas.medidor("risco_tipo_via_buscas_exatas_total", "Pontos cujo tipo de via precisou da busca exata na STRtree",
+                 ["municipio"], lambda: {(nome,): m.enriquecimento.indice_tipo_via.buscas_exatas
+                                         for nome, m in list(municipios.carregados.items())
+                                         if m.enriquecimento.indice_tipo_via is not None}, tipo="counter")
+metricas.medidor("risco_municipios_carregados", "Municípios com os artefatos na memória", [],
+                 lambda: {(): len(municipios.carregados)})
+metricas.medidor("risco_municipios_carregamentos_total", "Municípios carregados desde a inicialização", [],
+                 lambda: {(): municipios.carregamentos}, tipo="counter")
+metricas.medidor("risco_municipios_descartes_total", "Municípios tirados da memória pelo limite de carregados", [],
+                 lambda: {(): municipios.descartes}, tipo="counter")
+metricas.medidor("risco_roteamento_buscas_borda_total",
+                 "Pontos em células de borda, roteados pelo teste no polígono do limite", [],
+                 lambda: {(): municipios.roteador.buscas_borda}, tipo="counter")
+
+
+@app.get("/metrics")
+def exportar_metricas():
+    return Response(metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ============================
+# HEALTHCHECK E PRONTIDÃO
+# ============================
+# Função para o município padrão e o seu modelo padrão, se já carregados
+def padrao_carregado():
+    municipio = municipios.carregados.get(municipios.padrao)
+    if municipio is None:
+        return None, None
+    return municipio, municipio.registro.modelos.get(municipio.registro.padrao)
+
+
 @app.get("/healthcheck")
 def healthcheck():
+    municipio, modelo = padrao_carregado()
     return {
-        "status": "ok" if model else "erro",
-        "modelo_carregado": model is not None,
-        "features_esperadas": len(model_features)
-    }
\ No newline at end of file
+        "status": "ok" if modelo else "erro",
+        "modelo_carregado": modelo is not None,
+        "features_esperadas": len(modelo.model_features) if modelo else 0,
+        "modelos": municipio.registro.estado() if municipio else None,
+        "cache": cache.estatisticas(),
+        "executor": executor.estatisticas() if usar_micro_lotes else None,
+        "alertas": estatisticas_alertas.estatisticas(),
+        "enriquecimento": municipio.enriquecimento.estado() if municipio else None,
+        "municipios": municipios.estado(),
+    }
+
+
+# Responde 200 só quando o modelo padrão do município padrão está pronto (para balanceadores/orquestradores)
+@app.get("/readiness")
+def readiness():
+    municipio, modelo = padrao_carregado()
+    conteudo = {
+        "pronto": modelo is not None,
+        "municipio_padrao": municipios.padrao,
+        "modelo_padrao": municipio.registro.padrao if municipio else None,
+        "tempo_inicializacao_s": round(tempo_inicializacao_s, 4),
+        "tempo_carga_modelo_s": round(modelo.tempo_carga_s, 4) if modelo else None,
+    }
+    return JSONResponse(conteudo, status_code=200 if modelo else 503)
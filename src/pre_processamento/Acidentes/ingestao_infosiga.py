@@ -0,0 +1,248 @@
+# Ingestão em fluxo dos arquivos estaduais do INFOSIGA (sinistros, pessoas e veículos de SP)
+#
+# Os arquivos brutos têm o estado inteiro, mas só os municípios escolhidos são usados. Em vez de ler o
+# arquivo todo e filtrar depois, cada arquivo é lido em lotes pelo leitor de CSV em fluxo do Arrow:
+# - A codificação é detectada em uma amostra limitada (início, meio e fim do arquivo), não no arquivo inteiro
+# - Cada lote é filtrado assim que é lido (município, ou id_sinistro para os veículos) e anexado à saída
+# - Todas as colunas são lidas como texto, então os valores saem exatamente como estão no arquivo bruto
+# - Pessoas e veículos são lidos só com as colunas usadas depois do recorte (COLUNAS_RECORTE); as demais
+#   nem chegam a ser convertidas pelo leitor
+#
+# A memória fica limitada ao tamanho do lote, independentemente do tamanho do arquivo. Vários municípios
+# são extraídos em uma única passada: cada um vai para o seu arquivo (ex: sinistros_2022-2025_bauru.csv).
+#
+# Uso (na raiz do projeto):
+#   python -m src.pre_processamento.Acidentes.ingestao_infosiga
+#   python -m src.pre_processamento.Acidentes.ingestao_infosiga --municipios BAURU MARILIA "SAO JOSE DO RIO PRETO"
+import argparse
+import codecs
+import csv
+import os
+import time
+import unicodedata
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+
+from src.pre_processamento.armazenamento import salvar
+
+# Chegar na raiz do projeto
+raiz_projeto = Path(__file__).parent.parent.parent.parent
+caminho_data_bruto = raiz_projeto / "data_bruto"
+caminho_data = raiz_projeto / "data"
+
+# Tamanho da amostra (em bytes) de cada trecho usado para detectar a codificação
+BYTES_AMOSTRA = 256 * 1024
+
+# Bytes do arquivo bruto por lote de leitura
+BYTES_BLOCO = 4 * 1024 * 1024
+
+# Colunas mantidas no recorte de cada arquivo: as chaves do filtro e as que a limpeza
+# (data_cleaning_acidentes.py), os cubos de agregação e o insights.ipynb usam. Os sinistros ficam com todas:
+# a junção de chuva, a amostragem negativa e os hotspots usam quase todas, e as famílias tp_veiculo_*,
+# gravidade_* e tp_sinistro_* mudam com o arquivo
+COLUNAS_RECORTE = {
+    "sinistros": None,
+    "pessoas": ["id_sinistro", "municipio", "data_sinistro", "tipo_de vítima", "tipo_vitima", "idade",
+                "faixa_etaria_demografica", "gravidade_lesao", "tipo_veiculo_vitima", "profissao", "data_obito",
+                "ano_obito", "mes_obito", "dia_obito", "ano_mes_obito"],
+    "veiculos": ["id_sinistro", "ano_fab", "ano_modelo", "cor_veiculo"],
+}
+
+
+# Função para detectar a codificação a partir de trechos do início, do meio e do fim do arquivo
+def detectar_encoding(caminho, bytes_amostra=BYTES_AMOSTRA):
+    tamanho = os.path.getsize(caminho)
+    with open(caminho, "rb") as file:
+        inicio = file.read(4)
+        if inicio.startswith(b"\xef\xbb\xbf"):
+            return "utf-8-sig"
+
+        amostra = b""
+        for posicao in sorted({0, max(tamanho // 2 - bytes_amostra // 2, 0), max(tamanho - bytes_amostra, 0)}):
+            file.seek(posicao)
+            trecho = file.read(bytes_amostra)
+            # Descarta as linhas cortadas nas pontas do trecho (e um caractere multibyte partido ao meio)
+            if posicao > 0:
+                trecho = trecho[trecho.find(b"\n") + 1:]
+            amostra += trecho[:trecho.rfind(b"\n") + 1] or trecho
+
+    # Os arquivos do INFOSIGA vêm em UTF-8 ou em Windows-1252. O chardet confunde amostras curtas em
+    # português com outras codificações de 1 byte (ex: CP874), então as candidatas são testadas em ordem
+    for encoding in ("utf-8", "cp1252"):
+        try:
+            amostra.decode(encoding)
+            return encoding
+        except UnicodeDecodeError:
+            pass
+    return "latin-1"
+
+
+# Detecta o separador pela primeira linha
+def detecta_separador(caminho, encoding):
+    with open(caminho, "r", encoding=encoding) as file:
+        primeira_linha = next(file).strip()
+    separadores = {",": primeira_linha.count(","), ";": primeira_linha.count(";"), "\t": primeira_linha.count("\t")}
+    return max(separadores, key=separadores.get)
+
+
+# Função para ler um CSV em lotes do Arrow (todas as colunas como texto); 'colunas' limita as colunas lidas
+# (na ordem do arquivo; as que o arquivo não tem são ignoradas)
+def ler_em_blocos(caminho, colunas=None, bytes_bloco=BYTES_BLOCO):
+    encoding = detectar_encoding(caminho)
+    separador = detecta_separador(caminho, encoding)
+    with open(caminho, encoding=encoding) as file:
+        cabecalho = next(csv.reader(file, delimiter=separador))
+    if colunas is not None:
+        colunas = [col for col in cabecalho if col in set(colunas)]
+
+    return pv.open_csv(
+        caminho,
+        read_options=pv.ReadOptions(encoding=encoding, block_size=bytes_bloco, use_threads=False),
+        parse_options=pv.ParseOptions(delimiter=separador),
+        convert_options=pv.ConvertOptions(column_types={col: pa.string() for col in cabecalho},
+                                          include_columns=colunas, strings_can_be_null=True),
+    )
+
+
+# Função para o nome de arquivo de um município (minúsculo, sem acentos, espaços viram '_')
+def sufixo_municipio(municipio):
+    sem_acentos = unicodedata.normalize("NFKD", municipio).encode("ascii", "ignore").decode()
+    return sem_acentos.strip().lower().replace(" ", "_")
+
+
+class SaidaIncremental:
+    # Saída CSV (UTF-8, sep=';') escrita lote a lote; o arquivo é aberto no primeiro lote
+    def __init__(self, caminho, bom=True):
+        self.caminho = Path(caminho)
+        self.bom = bom
+        self.linhas = 0
+        self.arquivo = None
+        self.escritor = None
+
+    def escrever(self, lote):
+        if self.escritor is None:
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            self.arquivo = open(self.caminho, "wb")
+            if self.bom:
+                self.arquivo.write(codecs.BOM_UTF8)
+            self.escritor = pv.CSVWriter(self.arquivo, lote.schema,
+                                         write_options=pv.WriteOptions(delimiter=";", quoting_style="needed"))
+        self.escritor.write(lote)
+        self.linhas += lote.num_rows
+
+    # Função para fechar a saída; sem nenhuma linha, o arquivo fica só com o cabeçalho
+    def fechar(self, esquema):
+        if self.escritor is None:
+            self.escrever(esquema.empty_table())
+        self.escritor.close()
+        self.arquivo.close()
+
+    # Função para gravar também a versão Parquet (o arquivo filtrado é pequeno perto do bruto)
+    def salvar_parquet(self):
+        salvar(pd.read_csv(self.caminho, sep=";", encoding="utf-8-sig", low_memory=False),
+               self.caminho.with_suffix(".parquet"))
+
+
+# Função para anexar cada linha do lote à saída do seu município (codigos: posição em 'saidas', -1 = nenhuma)
+# Um único argsort estável agrupa as linhas, então o custo por lote não cresce com o número de municípios
+# Retorna [(codigo, linhas selecionadas)]
+def escrever_por_municipio(lote, codigos, saidas):
+    ordem = np.argsort(codigos, kind="stable")
+    valores, inicios = np.unique(codigos[ordem], return_index=True)
+    fins = np.append(inicios[1:], len(ordem))
+    escritos = []
+    for codigo, inicio, fim in zip(valores.tolist(), inicios.tolist(), fins.tolist()):
+        if codigo >= 0:
+            selecionados = lote.take(pa.array(ordem[inicio:fim]))
+            saidas[codigo].escrever(selecionados)
+            escritos.append((codigo, selecionados))
+    return escritos
+
+
+# Função para filtrar um arquivo estadual por município, em uma passada
+# Retorna, para cada município, o conjunto de id_sinistro selecionados
+def filtrar_municipios(caminho, saidas, colunas=None, bytes_bloco=BYTES_BLOCO):
+    nomes = list(saidas)
+    lista_saidas = [saidas[nome] for nome in nomes]
+    ids = {municipio: set() for municipio in nomes}
+    valores = pa.array(nomes, type=pa.string())
+    leitor = ler_em_blocos(caminho, colunas, bytes_bloco)
+    for lote in leitor:
+        municipios = pc.utf8_upper(pc.utf8_trim_whitespace(lote.column("municipio")))
+        codigos = pc.fill_null(pc.index_in(municipios, value_set=valores), -1).to_numpy()
+        for codigo, selecionados in escrever_por_municipio(lote, codigos, lista_saidas):
+            ids[nomes[codigo]].update(selecionados.column("id_sinistro").to_pylist())
+    for saida in saidas.values():
+        saida.fechar(leitor.schema)
+    return ids
+
+
+# Função para filtrar um arquivo estadual pelos id_sinistro de cada município (semi-junção), em uma passada
+# Quando cada id_sinistro é de um só município, uma única busca no conjunto de todos os ids dá o município
+# de cada linha; se algum id estiver em mais de um município, cada município tem a sua busca
+def filtrar_ids(caminho, saidas, ids, colunas=None, bytes_bloco=BYTES_BLOCO):
+    nomes = list(saidas)
+    lista_saidas = [saidas[nome] for nome in nomes]
+    todos = pa.array([id_sinistro for nome in nomes for id_sinistro in sorted(ids[nome])], type=pa.string())
+    municipio_do_id = np.repeat(np.arange(len(nomes)), [len(ids[nome]) for nome in nomes])
+    ids_unicos = len(pc.unique(todos)) == len(todos)
+    conjuntos = None if ids_unicos else [pa.array(sorted(ids[nome]), type=pa.string()) for nome in nomes]
+    leitor = ler_em_blocos(caminho, colunas, bytes_bloco)
+    for lote in leitor:
+        if ids_unicos:
+            posicoes = pc.fill_null(pc.index_in(lote.column("id_sinistro"), value_set=todos), -1).to_numpy()
+            codigos = np.where(posicoes >= 0, municipio_do_id[np.maximum(posicoes, 0)], -1) if len(todos) else posicoes
+            escrever_por_municipio(lote, codigos, lista_saidas)
+            continue
+        for saida, conjunto in zip(lista_saidas, conjuntos):
+            selecionados = lote.filter(pc.is_in(lote.column("id_sinistro"), value_set=conjunto))
+            if selecionados.num_rows:
+                saida.escrever(selecionados)
+    for saida in saidas.values():
+        saida.fechar(leitor.schema)
+
+
+# Função para montar as saídas de um dataset (ex: "sinistros") para cada município
+def montar_saidas(dataset, municipios, diretorio=caminho_data / "Acidentes", bom=True):
+    return {
+        municipio: SaidaIncremental(diretorio / f"{dataset}_2022-2025_{sufixo_municipio(municipio)}.csv", bom)
+        for municipio in municipios
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extrai municípios dos arquivos estaduais do INFOSIGA em blocos")
+    parser.add_argument("--municipios", nargs="+", default=["BAURU"])
+    parser.add_argument("--entrada", default=str(caminho_data_bruto / "Acidentes"),
+                        help="Pasta com sinistros_2022-2025.csv, pessoas_2022-2025.csv e veiculos_2022-2025.csv")
+    parser.add_argument("--saida", default=str(caminho_data / "Acidentes"))
+    parser.add_argument("--bytes-bloco", type=int, default=BYTES_BLOCO, help="Bytes do arquivo bruto por lote")
+    args = parser.parse_args()
+
+    municipios = [municipio.strip().upper() for municipio in args.municipios]
+    entrada, saida = Path(args.entrada), Path(args.saida)
+
+    inicio = time.perf_counter()
+    sinistros = montar_saidas("sinistros", municipios, saida)
+    filtrar_municipios(entrada / "sinistros_2022-2025.csv", sinistros, COLUNAS_RECORTE["sinistros"], args.bytes_bloco)
+    pessoas = montar_saidas("pessoas", municipios, saida, bom=False)
+    ids_pessoas = filtrar_municipios(entrada / "pessoas_2022-2025.csv", pessoas, COLUNAS_RECORTE["pessoas"],
+                                     args.bytes_bloco)
+    # Veículos não têm município: entram os dos sinistros com pessoas selecionadas
+    veiculos = montar_saidas("veiculos", municipios, saida, bom=False)
+    filtrar_ids(entrada / "veiculos_2022-2025.csv", veiculos, ids_pessoas, COLUNAS_RECORTE["veiculos"],
+                args.bytes_bloco)
+
+    for dataset, saidas in [("sinistros", sinistros), ("pessoas", pessoas), ("veiculos", veiculos)]:
+        for municipio, saida_municipio in saidas.items():
+            saida_municipio.salvar_parquet()
+            print(f"{dataset:<9} {municipio:<25} {saida_municipio.linhas:>8} linhas -> {saida_municipio.caminho.name}")
+    print(f"Ingestão concluída em {time.perf_counter() - inicio:.1f} s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,21 @@
-import pandas as pd
 from pathlib import Path
-import chardet
 
-# Função para filtrar a cidade de bauru
-def seleciona_bauru(df):
-    df_bauru = pd.DataFrame(df)
-    df_bauru = df_bauru[df_bauru["municipio"] == "BAURU"]
-    return df_bauru
+from src.pre_processamento.Acidentes.ingestao_infosiga import COLUNAS_RECORTE, filtrar_municipios, montar_saidas
 
-# Função para detectar a codificação de um arquivo
-def detectar_encoding(arquivo_path):
-    with open(arquivo_path, 'rb') as file:
-        resultado = chardet.detect(file.read())
-        return resultado['encoding']
-    
-# Detecta o separador
-def detecta_separador(caminho, encoding):
-    with open(caminho, 'r', encoding=encoding) as file:
-        # Lê a primeira linha de dados
-        primeira_linha = next(file).strip()
-        # Conta ocorrências de possíveis separadores
-        separadores = {',': primeira_linha.count(','), 
-                       ';': primeira_linha.count(';'), 
-                       '\t': primeira_linha.count('\t')}
-        # Retorna o separador com mais ocorrências
-        return max(separadores, key=separadores.get)
-
-# Função para ler arquivos na codificação certa
-def leitura_csv(caminho):
-    encoding_original = detectar_encoding(caminho)
-    separador = detecta_separador(caminho, encoding_original)
-    return pd.read_csv(caminho, encoding=encoding_original, sep=separador)
+# Filtra a cidade de Bauru dos arquivos estaduais, lendo em blocos (veja ingestao_infosiga.py)
 
 # Chegar na raiz do projeto
-raiz_projeto = Path(__file__).parent.parent.parent
+raiz_projeto = Path(__file__).parent.parent.parent.parent
 caminho_data_bruto = raiz_projeto / "data_bruto"
 caminho_data = raiz_projeto / "data"
 
-# Leitura dos arquivos
-df_sinistros_2022_r = leitura_csv(caminho_data_bruto / "Acidentes" / "sinistros_2022-2025.csv")
-df_pessoas_2022_r = leitura_csv(caminho_data_bruto / "Acidentes" / "pessoas_2022-2025.csv")
+# Cada bloco é filtrado e anexado à saída assim que é lido (só com as colunas usadas depois do recorte)
+sinistros = montar_saidas("sinistros", ["BAURU"], caminho_data / "Acidentes")
+filtrar_municipios(caminho_data_bruto / "Acidentes" / "sinistros_2022-2025.csv", sinistros,
+                   COLUNAS_RECORTE["sinistros"])
 
-df_sinistros_2022 = seleciona_bauru(df_sinistros_2022_r)
-df_pessoas_2022 = seleciona_bauru(df_pessoas_2022_r)
+pessoas = montar_saidas("pessoas", ["BAURU"], caminho_data / "Acidentes", bom=False)
+filtrar_municipios(caminho_data_bruto / "Acidentes" / "pessoas_2022-2025.csv", pessoas, COLUNAS_RECORTE["pessoas"])
 
-df_sinistros_2022.to_csv(caminho_data / "Acidentes" / "sinistros_2022-2025_bauru.csv", index=False, encoding="utf-8-sig", sep=";")
-df_pessoas_2022.to_csv(caminho_data / "Acidentes" / "pessoas_2022-2025_bauru.csv", index=False, encoding="utf-8", sep=";")
+for saida in [sinistros["BAURU"], pessoas["BAURU"]]:
+    saida.salvar_parquet()
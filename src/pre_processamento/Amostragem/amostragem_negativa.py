@@ -0,0 +1,317 @@
+# Geração das amostras negativas do dataset de treino (versão vetorizada de amostragem_negativa.ipynb)
+#
+# Para cada acidente (positivo) são gerados negativos de dois tipos:
+# - Tipo 1 (contraste temporal): mesmo local do acidente, com data, hora, chuva e veículo aleatórios.
+#   Combinações (local, data, hora) que coincidem com um acidente real são sorteadas de novo.
+# - Tipo 2 (contraste espacial): ponto aleatório sobre as ruas de Bauru (a até ~11 m de uma geometria
+#   de ruas_de_bauru.gpkg), com tipo de via da geometria mais próxima e data, hora, chuva e veículo aleatórios.
+#
+# Em vez de um negativo por vez, os candidatos são sorteados em lotes NumPy: a checagem de colisão é um
+# np.isin sobre chaves inteiras e o filtro espacial é uma consulta em lote na STRtree. O trabalho é
+# dividido em blocos de tamanho fixo, cada um com a sua semente (SeedSequence.spawn), e os blocos são
+# distribuídos entre processos. O resultado só depende da semente, não do número de processos.
+#
+# Uso (na raiz do projeto):
+#   python -m src.pre_processamento.Amostragem.amostragem_negativa --proporcao 200
+#   python -m src.pre_processamento.Amostragem.amostragem_negativa --proporcao 4 \
+#       --positivos dataset_final_para_modelo.csv --saida dataset_final_para_modelo_1_4.parquet
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from src.backend.features import COLUNAS_VEICULOS
+from src.pre_processamento.armazenamento import carregar, salvar
+
+# Chegar na raiz do projeto
+raiz_projeto = Path(__file__).parent.parent.parent.parent
+caminho_sinistros = raiz_projeto / "data" / "Acidentes" / "sinistros_com_chuva_2022-2025.csv"
+caminho_ruas = raiz_projeto / "ruas_de_bauru.gpkg"
+
+# Colunas do dataset final, na ordem de dataset_final_para_modelo*.csv
+COLUNAS_BASE = ["latitude", "longitude", "data", "dia_semana", "mes", "is_weekend", "hora", "Sinistro", "Chuva", "tipo_via_num"]
+COLUNAS_DATASET = COLUNAS_BASE + COLUNAS_VEICULOS
+
+# Intervalo de datas sorteadas para os negativos
+DATA_INICIO = date(2022, 1, 1)
+DATA_FIM = date(2025, 12, 31)
+
+# Probabilidade de chuva nos negativos
+PROBABILIDADE_CHUVA = 0.2
+
+# Ponderação de quais veículos são mais comuns no tráfego normal ("não disponível" nunca é sorteado)
+PESOS_VEICULOS = {
+    "tp_veiculo_automovel": 0.80,
+    "tp_veiculo_motocicleta": 0.10,
+    "tp_veiculo_caminhao": 0.04,
+    "tp_veiculo_onibus": 0.05,
+    "tp_veiculo_bicicleta": 0.02,
+    "tp_veiculo_outros": 0.01,
+}
+
+# Tipos de via do OpenStreetMap considerados rodovia (1); todo o resto é via municipal (0)
+RODOVIAS_OSM = {"motorway", "trunk"}
+
+# Distância máxima (em graus, como o buffer do notebook) entre um ponto tipo 2 e alguma geometria das ruas
+DISTANCIA_RUAS_GRAUS = 0.0001
+
+# Lado (em graus) das células da grade usada para sortear os candidatos tipo 2 só perto das ruas
+LADO_CELULA_GRAUS = 0.0005
+
+# Tamanho fixo dos blocos (define as sementes; não muda com o número de processos)
+TAMANHO_BLOCO = 100_000
+
+
+# Função para carregar os acidentes (positivos) já no formato do dataset final
+# Aceita o CSV de sinistros com chuva (sep=';') ou um dataset_final_para_modelo* em CSV ou Parquet (linhas com Sinistro = 1)
+def carregar_positivos(caminho):
+    if Path(caminho).suffix == ".parquet":
+        df = carregar(caminho, filtros=[("Sinistro", "==", 1)])
+        df["data"] = df["data"].dt.strftime("%Y-%m-%d")
+        return df[COLUNAS_DATASET]
+
+    with open(caminho, encoding="utf-8-sig") as file:
+        cabecalho = file.readline()
+
+    if "Sinistro" in cabecalho:
+        df = pd.read_csv(caminho, decimal=",")
+        df = df[df["Sinistro"] == 1]
+    else:
+        df = pd.read_csv(caminho, delimiter=";")
+        df["latitude"] = df["latitude"].astype(str).str.replace(",", ".").astype(float)
+        df["longitude"] = df["longitude"].astype(str).str.replace(",", ".").astype(float)
+        data_sinistro = pd.to_datetime(df["data_sinistro"], dayfirst=True)
+        hora_sinistro = pd.to_datetime(df["hora_sinistro"].astype(str).replace("99:99", np.nan), format="%H:%M")
+
+        # Mapear 'tipo_via' para números (0: Municipal, 1: Rodovia) e 'Chuva' para binário
+        df["tipo_via_num"] = df["tipo_via"].map({"VIAS MUNICIPAIS": 0, "RODOVIAS": 1})
+        df["Chuva"] = (df["Chuva"] != "Sem chuva").astype(int)
+
+        df["hora"] = hora_sinistro.dt.hour.fillna(-1).astype(int)
+        df["data"] = data_sinistro.dt.date.astype(str)
+        df["dia_semana"] = data_sinistro.dt.dayofweek
+        df["mes"] = data_sinistro.dt.month
+        df["is_weekend"] = df["dia_semana"].isin([5, 6]).astype(int)
+        df["Sinistro"] = 1
+
+    for col in COLUNAS_VEICULOS:
+        if col not in df.columns:
+            df[col] = 0
+    return df[COLUNAS_DATASET].reset_index(drop=True)
+
+
+# Função para montar a chave inteira (local, dia, hora) de cada linha
+# 'locais' é o índice do par latitude/longitude em 'tabela_locais'; hora -1 (desconhecida) também tem chave própria
+def chaves_colisao(locais, dias, horas):
+    return (locais.astype(np.int64) * 100_000 + dias) * 25 + (horas + 1)
+
+
+# Função para sortear as features temporais, a chuva e o veículo de 'n' negativos
+def sortear_atributos(rng, n):
+    total_dias = (DATA_FIM - DATA_INICIO).days
+    dias = rng.integers(0, total_dias + 1, n)
+    horas = rng.integers(0, 24, n)
+
+    colunas_veiculos = list(PESOS_VEICULOS)
+    pesos = np.array(list(PESOS_VEICULOS.values()))
+    veiculos = rng.choice(len(colunas_veiculos), size=n, p=pesos / pesos.sum())
+    chuva = (rng.random(n) < PROBABILIDADE_CHUVA).astype(int)
+    return dias, horas, chuva, veiculos
+
+
+# Função para montar o DataFrame dos negativos a partir dos atributos sorteados
+def montar_negativos(latitudes, longitudes, tipo_via, dias, horas, chuva, veiculos):
+    datas = np.datetime64(DATA_INICIO) + dias.astype("timedelta64[D]")
+    dia_semana = (datas.astype("datetime64[D]").view(np.int64) - 4) % 7  # 1970-01-01 foi uma quinta
+    df = pd.DataFrame({
+        "latitude": latitudes,
+        "longitude": longitudes,
+        "data": np.datetime_as_string(datas, unit="D"),
+        "dia_semana": dia_semana,
+        "mes": pd.DatetimeIndex(datas).month.to_numpy(),
+        "is_weekend": (dia_semana >= 5).astype(int),
+        "hora": horas,
+        "Sinistro": 0,
+        "Chuva": chuva,
+        "tipo_via_num": tipo_via,
+    })
+    colunas_sorteadas = list(PESOS_VEICULOS)
+    for col in COLUNAS_VEICULOS:
+        df[col] = (veiculos == colunas_sorteadas.index(col)).astype(int) if col in colunas_sorteadas else 0
+    return df[COLUNAS_DATASET]
+
+
+# Estado de cada processo trabalhador (preenchido pelo inicializador)
+estado = {}
+
+
+def inicializar_trabalhador(latitudes_locais, longitudes_locais, tipo_via_locais, chaves_positivos, caminho_ruas_gpkg):
+    estado["latitudes_locais"] = latitudes_locais
+    estado["longitudes_locais"] = longitudes_locais
+    estado["tipo_via_locais"] = tipo_via_locais
+    estado["chaves_positivos"] = chaves_positivos
+    estado["caminho_ruas"] = caminho_ruas_gpkg
+
+
+# Função para carregar as ruas (uma vez por processo), montar a STRtree e a grade de células perto das ruas
+def indice_ruas():
+    if "arvore" not in estado:
+        import geopandas as gpd
+        import shapely
+
+        ruas = gpd.read_file(estado["caminho_ruas"], columns=["highway"])
+        geometrias = ruas.geometry.to_numpy()
+        tipo_via = ruas["highway"].isin(RODOVIAS_OSM).astype(int).to_numpy()
+
+        # Como no índice do backend, as linhas entram na árvore quebradas em segmentos de 2 vértices (a
+        # distância até um segmento é bem mais barata que até a rua inteira); as demais geometrias entram inteiras
+        linhas = shapely.get_type_id(geometrias) == 1
+        coordenadas, rua = shapely.get_coordinates(geometrias[linhas], return_index=True)
+        mesma_rua = rua[1:] == rua[:-1]
+        segmentos = shapely.linestrings(np.stack([coordenadas[:-1][mesma_rua], coordenadas[1:][mesma_rua]], axis=1))
+        estado["geometrias"] = np.concatenate([segmentos, geometrias[~linhas]])
+        estado["tipo_via_ruas"] = np.concatenate([tipo_via[linhas][rua[:-1][mesma_rua]], tipo_via[~linhas]])
+        arvore = shapely.STRtree(estado["geometrias"])
+
+        # Só ~10% das células do retângulo das ruas têm alguma rua a menos de DISTANCIA_RUAS_GRAUS. Sortear
+        # candidatos uniformes dentro dessas células continua uniforme sobre a área aceita, e descarta bem menos
+        min_lon, min_lat, max_lon, max_lat = ruas.total_bounds
+        linhas = int(np.ceil((max_lat - min_lat) / LADO_CELULA_GRAUS))
+        colunas = int(np.ceil((max_lon - min_lon) / LADO_CELULA_GRAUS))
+        i, j = np.divmod(np.arange(linhas * colunas), colunas)
+        celulas = shapely.box(min_lon + j * LADO_CELULA_GRAUS, min_lat + i * LADO_CELULA_GRAUS,
+                              min_lon + (j + 1) * LADO_CELULA_GRAUS, min_lat + (i + 1) * LADO_CELULA_GRAUS)
+        ocupadas = np.unique(arvore.query(celulas, predicate="dwithin", distance=DISTANCIA_RUAS_GRAUS)[0])
+        estado["celulas"] = (min_lat + i[ocupadas] * LADO_CELULA_GRAUS, min_lon + j[ocupadas] * LADO_CELULA_GRAUS)
+        estado["arvore"] = arvore
+    return estado["arvore"]
+
+
+# Negativos tipo 1 de um bloco: 'locais' diz de qual local de acidente vem cada negativo
+def gerar_bloco_tipo1(locais, semente):
+    rng = np.random.default_rng(semente)
+    dias, horas, chuva, veiculos = sortear_atributos(rng, len(locais))
+
+    # Sorteia de novo só as linhas que coincidem com um acidente real (local, data, hora)
+    colide = np.isin(chaves_colisao(locais, dias, horas), estado["chaves_positivos"])
+    while colide.any():
+        n = int(colide.sum())
+        dias[colide] = rng.integers(0, (DATA_FIM - DATA_INICIO).days + 1, n)
+        horas[colide] = rng.integers(0, 24, n)
+        colide[colide] = np.isin(chaves_colisao(locais[colide], dias[colide], horas[colide]), estado["chaves_positivos"])
+
+    return montar_negativos(
+        estado["latitudes_locais"][locais], estado["longitudes_locais"][locais], estado["tipo_via_locais"][locais],
+        dias, horas, chuva, veiculos,
+    )
+
+
+# Negativos tipo 2 de um bloco: pontos uniformes nas células perto das ruas, aceitos só perto de uma rua
+def gerar_bloco_tipo2(n, semente):
+    import shapely
+
+    rng = np.random.default_rng(semente)
+    arvore = indice_ruas()
+    celulas_lat, celulas_lon = estado["celulas"]
+
+    latitudes, longitudes = [], []
+    aceitos, sorteados = 0, 0
+    while aceitos < n:
+        # Sorteia com folga, estimando a taxa de aceitação pelos lotes anteriores
+        taxa = max(aceitos / sorteados, 0.05) if sorteados else 0.3
+        candidatos = max(int(1.2 * (n - aceitos) / taxa), 1_000)
+        celulas = rng.integers(0, len(celulas_lat), candidatos)
+        lat = celulas_lat[celulas] + rng.uniform(0, LADO_CELULA_GRAUS, candidatos)
+        lon = celulas_lon[celulas] + rng.uniform(0, LADO_CELULA_GRAUS, candidatos)
+        # O filtro por distância em lote ('dwithin') é bem mais barato que buscar a rua mais próxima
+        idx_pontos = np.unique(arvore.query(shapely.points(lon, lat), predicate="dwithin",
+                                            distance=DISTANCIA_RUAS_GRAUS)[0])[:n - aceitos]
+        latitudes.append(lat[idx_pontos])
+        longitudes.append(lon[idx_pontos])
+        aceitos += len(idx_pontos)
+        sorteados += candidatos
+
+    latitudes, longitudes = np.concatenate(latitudes), np.concatenate(longitudes)
+    # Tipo de via da geometria mais próxima, só para os pontos aceitos
+    _, idx_ruas = arvore.query_nearest(shapely.points(longitudes, latitudes), max_distance=DISTANCIA_RUAS_GRAUS,
+                                       all_matches=False)
+    tipo_via = estado["tipo_via_ruas"][idx_ruas]
+
+    dias, horas, chuva, veiculos = sortear_atributos(rng, n)
+    return montar_negativos(latitudes, longitudes, tipo_via, dias, horas, chuva, veiculos)
+
+
+# Função para gerar o dataset final (positivos + negativos tipo 1 e 2, embaralhados)
+# proporcao: negativos por positivo; fracao_tipo1: parte deles que é do tipo 1 (o notebook usa metade)
+def gerar_dataset(positivos, proporcao, fracao_tipo1=0.5, semente=42, processos=None, caminho_ruas_gpkg=caminho_ruas):
+    inicio = time.perf_counter()
+    n_positivos = len(positivos)
+    por_positivo_tipo1 = int(round(proporcao * fracao_tipo1))
+    n_tipo2 = int(round(proporcao * n_positivos)) - por_positivo_tipo1 * n_positivos
+
+    # Índice de cada local (latitude, longitude) distinto e chaves (local, dia, hora) dos acidentes
+    tabela_locais, locais_positivos = np.unique(
+        positivos[["latitude", "longitude"]].to_numpy(), axis=0, return_inverse=True
+    )
+    locais_positivos = locais_positivos.ravel()
+    dias_positivos = (pd.to_datetime(positivos["data"]).to_numpy().astype("datetime64[D]")
+                      - np.datetime64(DATA_INICIO)).astype(np.int64)
+    chaves_positivos = np.unique(chaves_colisao(locais_positivos, dias_positivos, positivos["hora"].to_numpy()))
+    # O tipo de via do tipo 1 é o do acidente de origem (o primeiro, se o local se repete)
+    tipo_via_locais = np.full(len(tabela_locais), np.nan)
+    tipo_via_locais[locais_positivos[::-1]] = positivos["tipo_via_num"].to_numpy()[::-1]
+
+    # Blocos de tamanho fixo, cada um com a sua semente
+    locais_tipo1 = np.repeat(locais_positivos, por_positivo_tipo1)
+    blocos_tipo1 = [locais_tipo1[i:i + TAMANHO_BLOCO] for i in range(0, len(locais_tipo1), TAMANHO_BLOCO)]
+    blocos_tipo2 = [min(TAMANHO_BLOCO, n_tipo2 - i) for i in range(0, n_tipo2, TAMANHO_BLOCO)]
+    sementes = np.random.SeedSequence(semente).spawn(len(blocos_tipo1) + len(blocos_tipo2) + 1)
+
+    argumentos = (tabela_locais[:, 0], tabela_locais[:, 1], tipo_via_locais, chaves_positivos, caminho_ruas_gpkg)
+    with ProcessPoolExecutor(max_workers=processos or os.cpu_count(), initializer=inicializar_trabalhador,
+                             initargs=argumentos) as pool:
+        futuros = [pool.submit(gerar_bloco_tipo1, bloco, sementes[k]) for k, bloco in enumerate(blocos_tipo1)]
+        futuros += [pool.submit(gerar_bloco_tipo2, n, sementes[len(blocos_tipo1) + k]) for k, n in enumerate(blocos_tipo2)]
+        negativos = [futuro.result() for futuro in futuros]
+
+    df_final = pd.concat([positivos] + negativos, ignore_index=True)
+
+    # Embaralha o dataset final (com a última semente, para ser reprodutível)
+    ordem = np.random.default_rng(sementes[-1]).permutation(len(df_final))
+    df_final = df_final.iloc[ordem].reset_index(drop=True)
+
+    print(f"{n_positivos} positivos, {por_positivo_tipo1 * n_positivos} negativos tipo 1 e {n_tipo2} tipo 2 "
+          f"gerados em {time.perf_counter() - inicio:.1f} s.")
+    return df_final
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera as amostras negativas do dataset de treino")
+    parser.add_argument("--proporcao", type=float, default=200, help="Negativos por positivo (ex: 4, 100, 200)")
+    parser.add_argument("--fracao-tipo1", type=float, default=0.5, help="Fração dos negativos que é do tipo 1")
+    parser.add_argument("--positivos", default=str(caminho_sinistros),
+                        help="CSV de sinistros com chuva ou um dataset_final_para_modelo*.csv")
+    parser.add_argument("--saida", help="Arquivo de saída, .parquet ou .csv (padrão: dataset_final_para_modelo_1_<proporcao>.parquet)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--processos", type=int, default=None, help="Processos em paralelo (padrão: núcleos)")
+    args = parser.parse_args()
+
+    positivos = carregar_positivos(args.positivos)
+    df_final = gerar_dataset(positivos, args.proporcao, args.fracao_tipo1, args.semente, args.processos)
+
+    saida = Path(args.saida or raiz_projeto / f"dataset_final_para_modelo_1_{args.proporcao:g}.parquet")
+    inicio = time.perf_counter()
+    if saida.suffix == ".parquet":
+        salvar(df_final, saida)
+    else:
+        df_final.to_csv(saida, index=False, decimal=",")
+    print(f"Total de amostras: {len(df_final)} (salvo em {saida} em {time.perf_counter() - inicio:.1f} s)")
+    print(df_final["Sinistro"].value_counts())
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,6 @@ import pandas as pd
 from pathlib import Path
 import chardet
 import openpyxl
-from datetime import datetime, timedelta
 
 # Função para ler arquivos Excel e converter para CSV
 def converte_excel_para_csv(caminho_entrada, caminho_saida):
@@ -20,18 +19,6 @@ def converte_excel_para_csv(caminho_entrada, caminho_saida):
     df.to_csv(caminho_saida, index=False, encoding='utf-8-sig', sep=';')
     return df
 
-# Função para converter de UTC para horário de Bauru
-def converter_utc_para_bauru(valor):
-    try:
-        # Remove o " UTC" e faz parsing da hora (ex: "0300" -> 03:00)
-        hora_utc = datetime.strptime(valor.replace(" UTC", ""), "%H%M")
-        # Subtrai 3 horas para converter para UTC-3 (Bauru)
-        hora_bauru = hora_utc - timedelta(hours=3)
-        return hora_bauru.strftime("%H:%M")
-    except Exception as e:
-        print(f"Erro ao converter valor '{valor}': {e}")
-        return None
-
 # Chegar na raiz do projeto
 raiz_projeto = Path(__file__).parent.parent.parent.parent
 caminho_data_bruto = raiz_projeto / "data_bruto"
@@ -40,7 +27,9 @@ caminho_data = raiz_projeto / "data"
 # Lista de anos para processar
 anos = ['2022', '2023', '2024', '2025']
 
-# Processa cada arquivo
+lista_df = []
+
+# Processa cada arquivo (cada ano é gravado uma única vez e já fica em memória para a concatenação)
 for ano in anos:
 
  # Caminhos dos arquivos
@@ -54,30 +43,15 @@ for ano in anos:
     # Converte Excel para CSV
     df_chuva = converte_excel_para_csv(arquivo_entrada, arquivo_saida_csv)
 
-    # Salva dados processados
-    df_chuva.to_csv(arquivo_saida_csv, index=False, encoding='utf-8-sig', sep=';')
+    # Precipitação vazia conta como 0 e a data fica no formato brasileiro
+    df_chuva['PRECIPITAÇÃO TOTAL, HORÁRIO (mm)'] = df_chuva['PRECIPITAÇÃO TOTAL, HORÁRIO (mm)'].fillna(0.0)
+    df_chuva['Data'] = pd.to_datetime(df_chuva['Data']).dt.strftime('%d/%m/%Y')
+    df_chuva['Hora UTC'] = df_chuva['Hora UTC'].astype(str)
+    lista_df.append(df_chuva)
 
-chuva_2022 = caminho_data / "Chuva" / "chuva_bauru_2022.csv"
-chuva_2023 = caminho_data/ "Chuva" / "chuva_bauru_2023.csv"
-chuva_2024 = caminho_data / "Chuva" / "chuva_bauru_2024.csv"
-chuva_2025 = caminho_data / "Chuva" / "chuva_bauru_2025.csv"
 chuva_2022_2025 = caminho_data / "Chuva" / "chuva_bauru_2022-2025.csv"
 chuva_2022_2025_teste = caminho_data / "Chuva" / "chuva_bauru_2022-2025_teste.csv"
 
-lista_df = []
-
-# Concatenar os datasets
-chuva_files = [chuva_2022, chuva_2023 , chuva_2024 , chuva_2025]
-for f in chuva_files:
-    df = pd.read_csv(f, sep=";", # converte a coluna de precipitação diretamente para float
-        converters={
-            'PRECIPITAÇÃO TOTAL, HORÁRIO (mm)': 
-                lambda x: float(x.replace(',', '.')) if isinstance(x, str) and x.strip() else 0.0
-        },)
-    df['Data'] = pd.to_datetime(df['Data']).dt.strftime('%d/%m/%Y')  # força formato brasileiro
-    df['Hora UTC'] = df['Hora UTC'].astype(str)
-    lista_df.append(df)
-
 chuva = pd.concat(lista_df, ignore_index=True)
 
 chuva.to_csv(chuva_2022_2025_teste, index=False, encoding="utf-8-sig", sep=";")
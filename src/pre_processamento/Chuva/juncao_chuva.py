@@ -0,0 +1,242 @@
+# Junção temporal sinistros × chuva (gera data/Acidentes/sinistros_com_chuva_2022-2025.csv)
+#
+# Substitui o merge feito no insights.ipynb (data + hora cheia, linha a linha):
+# - A série horária do INMET é carregada uma vez e consolidada num único CSV (uma linha por estação e hora,
+#   já no horário de Brasília), ordenado por estação e data/hora
+# - Para cada leitura são calculados os acumulados das últimas horas (ex: mm nas últimas 1h e 3h)
+# - Cada sinistro recebe a última leitura da sua estação com até 'tolerancia' de diferença, em um único
+#   pd.merge_asof vetorizado
+#
+# Quando chega o arquivo de um novo ano do INMET, '--anexar' junta só esse arquivo à série consolidada e
+# recalcula só os sinistros que caem no período afetado.
+#
+# Para volumes estaduais, '--estacoes' recebe um CSV (codigo;latitude;longitude) e cada sinistro usa a
+# estação mais próxima (KD-tree). Sem ele, a série precisa ter uma única estação (caso de Bauru).
+#
+# Uso (na raiz do projeto):
+#   python -m src.pre_processamento.Chuva.juncao_chuva --inmet data_bruto/Chuva/INMET_SE_SP_A705_BAURU_*.xlsx
+#   python -m src.pre_processamento.Chuva.juncao_chuva --anexar data_bruto/Chuva/INMET_SE_SP_A705_BAURU_01-01-2026_A_31-12-2026.xlsx
+import argparse
+import re
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from src.pre_processamento.armazenamento import carregar
+
+# Chegar na raiz do projeto
+raiz_projeto = Path(__file__).parent.parent.parent.parent
+caminho_data = raiz_projeto / "data"
+caminho_serie = caminho_data / "Chuva" / "serie_inmet_horaria.csv"
+caminho_sinistros = caminho_data / "Acidentes" / "sinistros_2022-2025_bauru.csv"
+caminho_saida = caminho_data / "Acidentes" / "sinistros_com_chuva_2022-2025.csv"
+
+COLUNA_PRECIPITACAO = "PRECIPITAÇÃO TOTAL, HORÁRIO (mm)"
+
+# Diferença do horário de Brasília para o UTC (sem horário de verão desde 2019)
+FUSO_BRT = pd.Timedelta(hours=-3)
+
+# Janelas de acumulado (em horas) e tolerância padrão da junção: a leitura da hora cheia do sinistro
+JANELAS_PADRAO_H = (1, 3)
+TOLERANCIA_PADRAO_MIN = 59
+
+# Classificação da precipitação (mm/h), como no insights.ipynb: (limite superior, rótulo)
+FAIXAS_CHUVA = [(2.5, "Chuva fraca"), (10, "Chuva moderada"), (50, "Chuva forte")]
+
+
+# Função para ler um arquivo horário do INMET (xlsx, CSV bruto do portal ou chuva_bauru_<ano>.csv)
+# Retorna as colunas estacao, datetime_brt e precipitacao_mm
+def ler_inmet(caminho):
+    caminho = Path(caminho)
+    codigo = re.search(r"_(A\d{3})_", caminho.name)
+    estacao = codigo.group(1) if codigo else caminho.stem
+
+    if caminho.suffix.lower() in (".xlsx", ".xls"):
+        df = pd.read_excel(caminho, usecols=["Data", "Hora UTC", COLUNA_PRECIPITACAO], dtype=str)
+    else:
+        # O CSV bruto do INMET tem ~8 linhas de metadados antes do cabeçalho e vem em latin-1
+        try:
+            with open(caminho, encoding="utf-8-sig") as file:
+                linhas = [file.readline() for _ in range(20)]
+            encoding = "utf-8-sig"
+        except UnicodeDecodeError:
+            with open(caminho, encoding="latin-1") as file:
+                linhas = [file.readline() for _ in range(20)]
+            encoding = "latin-1"
+        cabecalho = next(i for i, linha in enumerate(linhas) if linha.upper().startswith("DATA"))
+        df = pd.read_csv(caminho, sep=";", skiprows=cabecalho, encoding=encoding, dtype=str)
+        df = df.rename(columns={"DATA (YYYY-MM-DD)": "Data", "Data Medicao": "Data", "HORA (UTC)": "Hora UTC"})
+        df = df[["Data", "Hora UTC", COLUNA_PRECIPITACAO]]
+
+    # Data vem como 2022-01-01, 2022/01/01 ou 01/01/2022; a hora como "0300 UTC", "0300" ou "03:00"
+    datas = df["Data"].str.slice(0, 10)
+    ano_primeiro = bool(re.match(r"\d{4}", str(datas.iloc[0]))) if len(datas) else True
+    datas = pd.to_datetime(datas, dayfirst=not ano_primeiro)
+    horas = pd.to_numeric(df["Hora UTC"].str.replace(" UTC", "").str.replace(":", "").str.zfill(4).str.slice(0, 2))
+
+    precipitacao = pd.to_numeric(df[COLUNA_PRECIPITACAO].str.replace(",", "."), errors="coerce")
+    return pd.DataFrame({
+        "estacao": estacao,
+        "datetime_brt": datas + pd.to_timedelta(horas, unit="h") + FUSO_BRT,
+        # O INMET usa valores negativos (-9999) para leituras ausentes
+        "precipitacao_mm": precipitacao.where(precipitacao >= 0),
+    })
+
+
+# Função para consolidar leituras: uma linha por estação e hora (a leitura mais nova vence), ordenadas
+def consolidar(series):
+    serie = pd.concat(series, ignore_index=True)
+    serie = serie.drop_duplicates(["estacao", "datetime_brt"], keep="last")
+    return serie.sort_values(["estacao", "datetime_brt"], ignore_index=True)
+
+
+# Função para calcular, para cada leitura, o total de chuva nas últimas 'janela' horas (inclusive a própria)
+# Leituras ausentes contam como 0 no acumulado; horas sem leitura simplesmente não somam nada
+def acumular(serie, janelas_h=JANELAS_PADRAO_H):
+    serie = serie.copy()
+    tempos = serie["datetime_brt"].to_numpy().astype("datetime64[ns]").view(np.int64)
+    acumulado = np.concatenate([[0.0], np.cumsum(serie["precipitacao_mm"].fillna(0).to_numpy())])
+
+    # Fronteiras de cada estação na série ordenada
+    estacoes = serie["estacao"].to_numpy()
+    inicios = np.flatnonzero(np.concatenate([[True], estacoes[1:] != estacoes[:-1]]))
+    fins = np.append(inicios[1:], len(serie))
+
+    for janela in janelas_h:
+        largura = pd.Timedelta(hours=janela).value
+        total = np.empty(len(serie))
+        for inicio, fim in zip(inicios, fins):
+            # Primeira leitura dentro da janela (t - janela, t] de cada leitura da estação
+            primeiros = inicio + np.searchsorted(tempos[inicio:fim], tempos[inicio:fim] - largura, side="right")
+            total[inicio:fim] = acumulado[inicio + 1:fim + 1] - acumulado[primeiros]
+        serie[f"chuva_{janela}h_mm"] = np.round(total, 2)
+    return serie
+
+
+# Função para montar a data/hora (horário de Brasília) de cada sinistro; hora desconhecida (99:99) vira NaT
+# Há poucas datas e horas distintas (no máximo 1.440 horas), então cada valor distinto é convertido uma vez
+def datas_sinistros(sinistros):
+    codigos_datas, datas = pd.factorize(sinistros["data_sinistro"].astype(str))
+    codigos_horas, horas = pd.factorize(sinistros["hora_sinistro"].astype(str).str.slice(0, 5))
+    datas = pd.to_datetime(datas, format="%d/%m/%Y", errors="coerce").to_numpy()
+    horas = pd.to_timedelta(horas.where(horas != "99:99") + ":00", errors="coerce").to_numpy()
+
+    resultado = datas[codigos_datas] + horas[codigos_horas]
+    resultado[(codigos_datas < 0) | (codigos_horas < 0)] = np.datetime64("NaT")
+    return pd.Series(resultado, index=sinistros.index)
+
+
+# Função para escolher a estação mais próxima de cada sinistro
+def estacao_mais_proxima(latitudes, longitudes, estacoes):
+    from scipy.spatial import cKDTree
+
+    # Distância aproximada em graus, corrigindo a longitude pela latitude média (suficiente entre estações)
+    escala = np.cos(np.radians(estacoes["latitude"].mean()))
+    arvore = cKDTree(np.column_stack([estacoes["latitude"], estacoes["longitude"] * escala]))
+    _, indices = arvore.query(np.column_stack([latitudes, np.asarray(longitudes) * escala]))
+    return estacoes["codigo"].to_numpy()[indices]
+
+
+# Função para classificar a precipitação (mm/h) nas faixas do insights.ipynb
+def classificar_chuva(precipitacao):
+    precipitacao = np.asarray(precipitacao, dtype=float)
+    condicoes = [np.isnan(precipitacao) | (precipitacao == 0)] + [precipitacao < limite for limite, _ in FAIXAS_CHUVA]
+    rotulos = ["Sem chuva"] + [rotulo for _, rotulo in FAIXAS_CHUVA]
+    return np.select(condicoes, rotulos, default="Chuva violenta")
+
+
+# Função para juntar a chuva aos sinistros com um único merge_asof
+# Cada sinistro recebe a última leitura da sua estação em até 'tolerancia_min' minutos antes dele
+def juntar_chuva(sinistros, serie, tolerancia_min=TOLERANCIA_PADRAO_MIN, estacoes=None):
+    colunas_chuva = ["precipitacao_mm"] + [col for col in serie.columns if col.startswith("chuva_")]
+
+    chaves = pd.DataFrame({"datetime_brt": datas_sinistros(sinistros), "linha": np.arange(len(sinistros))})
+    if estacoes is not None:
+        latitudes = pd.to_numeric(sinistros["latitude"].astype(str).str.replace(",", "."), errors="coerce")
+        longitudes = pd.to_numeric(sinistros["longitude"].astype(str).str.replace(",", "."), errors="coerce")
+        chaves["estacao"] = estacao_mais_proxima(latitudes.fillna(0), longitudes.fillna(0), estacoes)
+    elif serie["estacao"].nunique() > 1:
+        raise ValueError("A série tem mais de uma estação: informe o CSV de estações (--estacoes).")
+    else:
+        chaves["estacao"] = serie["estacao"].iloc[0] if len(serie) else None
+
+    # merge_asof exige as duas tabelas ordenadas pela data/hora; sinistros sem hora ficam sem leitura
+    com_hora = chaves.dropna(subset=["datetime_brt"]).sort_values("datetime_brt")
+    juncao = pd.merge_asof(
+        com_hora, serie.sort_values("datetime_brt")[["estacao", "datetime_brt"] + colunas_chuva],
+        on="datetime_brt", by="estacao", direction="backward", tolerance=pd.Timedelta(minutes=tolerancia_min),
+    )
+
+    resultado = sinistros.copy()
+    for col in colunas_chuva:
+        valores = np.full(len(sinistros), np.nan)
+        valores[juncao["linha"].to_numpy()] = juncao[col].to_numpy()
+        resultado[col] = valores
+    resultado["Chuva"] = classificar_chuva(resultado["precipitacao_mm"])
+    return resultado
+
+
+# Função para carregar a série consolidada salva
+def carregar_serie(caminho=caminho_serie):
+    return pd.read_csv(caminho, sep=";", encoding="utf-8-sig", parse_dates=["datetime_brt"], dtype={"estacao": str})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Junta a chuva horária do INMET aos sinistros")
+    origem = parser.add_mutually_exclusive_group()
+    origem.add_argument("--inmet", nargs="+", help="Arquivos do INMET para montar a série do zero")
+    origem.add_argument("--anexar", nargs="+", help="Arquivos novos do INMET para anexar à série consolidada")
+    parser.add_argument("--serie", default=str(caminho_serie), help="CSV da série horária consolidada")
+    parser.add_argument("--sinistros", default=str(caminho_sinistros))
+    parser.add_argument("--saida", default=str(caminho_saida))
+    parser.add_argument("--estacoes", help="CSV com codigo;latitude;longitude das estações (vários municípios)")
+    parser.add_argument("--tolerancia-min", type=int, default=TOLERANCIA_PADRAO_MIN,
+                        help="Diferença máxima entre o sinistro e a leitura usada (minutos)")
+    parser.add_argument("--janelas", type=int, nargs="+", default=list(JANELAS_PADRAO_H),
+                        help="Janelas de acumulado em horas (ex: 1 3 6)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    novas = [ler_inmet(caminho) for caminho in (args.inmet or args.anexar or [])]
+    if args.anexar and Path(args.serie).exists():
+        anterior = carregar_serie(args.serie)[["estacao", "datetime_brt", "precipitacao_mm"]]
+        serie = consolidar([anterior] + novas)
+    elif novas:
+        serie = consolidar(novas)
+    else:
+        serie = carregar_serie(args.serie)[["estacao", "datetime_brt", "precipitacao_mm"]]
+    serie = acumular(serie, args.janelas)
+    if novas:
+        serie.to_csv(args.serie, index=False, encoding="utf-8-sig", sep=";")
+    print(f"Série com {len(serie)} leituras de {serie['estacao'].nunique()} estação(ões) "
+          f"em {time.perf_counter() - inicio:.1f} s.")
+
+    estacoes = pd.read_csv(args.estacoes, sep=";", dtype={"codigo": str}) if args.estacoes else None
+
+    # Anexo: só os sinistros a partir da primeira leitura nova (mais as janelas) mudam de chuva
+    inicio = time.perf_counter()
+    if args.anexar and Path(args.saida).exists():
+        sinistros = pd.read_csv(args.saida, sep=";", encoding="utf-8-sig", low_memory=False)
+        limite = min(nova["datetime_brt"].min() for nova in novas)
+        afetados = (datas_sinistros(sinistros) >= limite).to_numpy()
+        resultado = juntar_chuva(sinistros[afetados], serie, args.tolerancia_min, estacoes)
+        for col in resultado.columns.difference(sinistros.columns):
+            sinistros[col] = np.nan
+        sinistros.loc[afetados, resultado.columns] = resultado
+        resultado = sinistros
+        print(f"{int(afetados.sum())} de {len(sinistros)} sinistros recalculados.")
+    else:
+        if Path(args.sinistros).suffix == ".parquet":
+            sinistros = carregar(args.sinistros)
+        else:
+            sinistros = pd.read_csv(args.sinistros, sep=";", encoding="utf-8-sig", low_memory=False)
+        resultado = juntar_chuva(sinistros, serie, args.tolerancia_min, estacoes)
+
+    resultado.to_csv(args.saida, index=False, sep=";", encoding="utf-8-sig")
+    print(f"Chuva junta a {len(resultado)} sinistros em {time.perf_counter() - inicio:.1f} s (salvo em {args.saida}).")
+    print(resultado["Chuva"].value_counts())
+
+
+if __name__ == "__main__":
+    main()
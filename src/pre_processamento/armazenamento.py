@@ -0,0 +1,228 @@
+# Camada de armazenamento colunar (Parquet) dos datasets do pipeline
+#
+# Os CSVs do projeto guardam números como texto com vírgula decimal ("-22,37045444699761") e sentinelas
+# como texto ("99:99", "NAO DISPONIVEL", -9999), e cada leitor precisa reconverter tudo. Aqui os datasets
+# são gravados em Parquet (zstd) já tipados:
+# - Texto numérico com vírgula decimal vira float; inteiros são reduzidos ao menor tipo que os comporta
+# - Sentinelas viram nulos de verdade (só nas colunas em que são sentinelas, nunca nas features do modelo)
+# - Colunas de texto com poucos valores distintos (tipo_via, cor_veiculo, ...) viram colunas de dicionário
+# - Datas ISO (AAAA-MM-DD) viram datas
+#
+# A leitura ('carregar') aceita projeção de colunas e filtros empurrados para o leitor do Parquet, que
+# descarta grupos de linhas pelas estatísticas de cada coluna sem materializá-los. Também lê os CSVs
+# antigos, com a mesma normalização, para que os scripts funcionem com os dois formatos.
+#
+# Os diretórios de partições mensais do backend (agregações, hotspots, mapa) são gravados pelas funções de
+# partições: cada mês é regravado só quando o hash do seu conteúdo muda, e o metadados.json, que o servidor
+# observa, é gravado por último.
+#
+# Uso (na raiz do projeto):
+#   python -m src.pre_processamento.armazenamento dataset_final_para_modelo_1_100.csv dataset_final_para_modelo_1_200.csv
+#   python -m src.pre_processamento.armazenamento dataset_final_para_modelo_1_100.csv --medir
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Textos que representam "sem informação" em qualquer coluna de texto
+SENTINELAS_TEXTO = {"NAO DISPONIVEL", "NAO INFORMADO", "NÃO INFORMADO"}
+
+# Sentinelas por coluna (valores preenchidos na limpeza para indicar ausência)
+# latitude/longitude ficam de fora: são features do modelo e o -9999 da limpeza entra no treino como está
+# (os índices espaciais do backend descartam o -9999 por conta própria)
+SENTINELAS_COLUNAS = {
+    "hora_sinistro": {"99:99"},
+    "ano_fab": {0, -1},
+    "ano_modelo": {0, -1},
+    "idade": {-1},
+    "ano_obito": {-1},
+    "mes_obito": {-1},
+    "dia_obito": {-1},
+    "data_obito": {"1900-01-01"},
+    "ano_mes_obito": {"1900/01"},
+}
+
+# Colunas sempre gravadas como dicionário; as demais de texto entram se tiverem poucos valores distintos
+CATEGORICAS = {"tipo_via", "cor_veiculo", "municipio", "Chuva", "tipo_vitima", "tipo_veiculo_vitima",
+               "gravidade_lesao", "faixa_etaria_demografica"}
+FRACAO_MAXIMA_DISTINTOS = 0.5
+
+# Linhas por grupo do Parquet: granularidade em que os filtros descartam dados pelas estatísticas
+LINHAS_POR_GRUPO = 100_000
+
+NUMERO_VIRGULA = re.compile(r"^-?\d+(,\d+)?$")
+DATA_ISO = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+# Função para tipar um DataFrame lido de CSV (números, sentinelas, datas e categorias)
+def normalizar(df):
+    df = df.copy()
+    for col in df.columns:
+        serie = df[col]
+        sentinelas = SENTINELAS_COLUNAS.get(col, set())
+
+        if serie.dtype == object or pd.api.types.is_string_dtype(serie):
+            valores = serie.dropna().astype(str)
+            amostra = valores.iloc[:1000]
+            # Texto com vírgula decimal: converte a coluna inteira para número
+            if len(amostra) and amostra.str.match(NUMERO_VIRGULA).all() and valores.str.match(NUMERO_VIRGULA).all():
+                serie = pd.to_numeric(serie.astype(str).str.replace(",", ".", regex=False), errors="coerce")
+            elif len(amostra) and amostra.str.match(DATA_ISO).all() and not sentinelas:
+                serie = pd.to_datetime(serie, format="%Y-%m-%d", errors="coerce")
+            else:
+                # Colunas mistas (ex: número do logradouro e "S/N") ficam como texto
+                serie = serie.where(serie.isna(), serie.astype(str))
+                serie = serie.mask(serie.isin(SENTINELAS_TEXTO | {s for s in sentinelas if isinstance(s, str)}))
+                distintos = serie.nunique()
+                if col in CATEGORICAS or distintos <= FRACAO_MAXIMA_DISTINTOS * max(len(serie), 1):
+                    serie = serie.astype("category")
+                df[col] = serie
+                continue
+
+        numericas = [s for s in sentinelas if not isinstance(s, str)]
+        if numericas:
+            serie = serie.mask(serie.isin(numericas))
+        # Inteiros no menor tipo possível; floats ficam em float64 (coordenadas)
+        if pd.api.types.is_integer_dtype(serie):
+            serie = pd.to_numeric(serie, downcast="integer")
+        df[col] = serie
+    return df
+
+
+# Função para gravar um DataFrame em Parquet tipado e comprimido
+def salvar(df, caminho, normalizado=False):
+    caminho = Path(caminho)
+    tabela = pa.Table.from_pandas(df if normalizado else normalizar(df), preserve_index=False)
+    pq.write_table(tabela, caminho, compression="zstd", row_group_size=LINHAS_POR_GRUPO)
+    return caminho
+
+
+# Função para detectar o separador de um CSV pela primeira linha
+def detectar_separador(caminho):
+    with open(caminho, encoding="utf-8-sig", errors="replace") as file:
+        primeira_linha = file.readline()
+    return max([",", ";", "\t"], key=primeira_linha.count)
+
+
+# Função para carregar um dataset (Parquet ou CSV) com projeção de colunas e filtros
+# filtros: lista de tuplas (coluna, operador, valor), no formato do pyarrow. Ex: [("Sinistro", "==", 1)]
+def carregar(caminho, colunas=None, filtros=None):
+    caminho = Path(caminho)
+    if caminho.suffix == ".parquet":
+        # split_blocks/self_destruct: a tabela Arrow é liberada coluna a coluna durante a conversão
+        return pq.read_table(caminho, columns=colunas, filters=filtros).to_pandas(split_blocks=True, self_destruct=True)
+
+    # CSV: mesma normalização do Parquet; o filtro é aplicado depois da leitura
+    df = normalizar(pd.read_csv(caminho, sep=detectar_separador(caminho), usecols=colunas,
+                                encoding="utf-8-sig", low_memory=False))
+    if filtros:
+        tabela = pa.Table.from_pandas(df, preserve_index=False)
+        df = tabela.filter(pq.filters_to_expression(filtros)).to_pandas()
+    return df
+
+
+# Função para o caminho Parquet equivalente a um CSV (mesmo nome, outra extensão)
+def caminho_parquet(caminho):
+    return Path(caminho).with_suffix(".parquet")
+
+
+# Função para medir tempo e memória de leitura de um dataset em um processo novo
+# 'leitura' é a expressão que carrega o DataFrame (ex: a leitura de CSV dos notebooks); o pico de memória
+# é o do processo inteiro, incluindo os imports
+def medir_leitura(leitura):
+    import subprocess
+    import sys
+
+    codigo = (
+        "import re, time, json, pandas as pd\n"
+        "from src.pre_processamento.armazenamento import carregar\n"
+        "inicio = time.perf_counter()\n"
+        f"df = {leitura}\n"
+        "print(json.dumps({'tempo_s': time.perf_counter() - inicio, 'linhas': len(df),"
+        " 'memoria_df_mb': df.memory_usage(deep=True).sum() / 2**20,"
+        " 'pico_mb': int(re.search(r'VmHWM:\\s+(\\d+)', open('/proc/self/status').read()).group(1)) / 1024}))\n"
+    )
+    saida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True,
+                           cwd=Path(__file__).parent.parent.parent)
+    return json.loads(saida.stdout)
+
+
+# PARTIÇÕES MENSAIS
+
+# Função para o hash do conteúdo de uma partição (define se ela precisa ser regravada)
+def hash_particao(tabela):
+    return hashlib.sha256(pd.util.hash_pandas_object(tabela, index=False).to_numpy().tobytes()).hexdigest()[:16]
+
+
+# Função para ler o metadados.json de um diretório de partições ({} se ainda não foi construído)
+def ler_metadados(diretorio):
+    caminho = Path(diretorio) / "metadados.json"
+    if not caminho.exists():
+        return {}
+    with open(caminho, encoding="utf-8") as file:
+        return json.load(file)
+
+
+# Função para gravar o metadados.json de um diretório de partições. Ele é gravado por último (e de forma
+# atômica): é ele que o servidor observa
+def gravar_metadados(diretorio, metadados):
+    caminho = Path(diretorio) / "metadados.json"
+    temporario = caminho.with_suffix(".tmp")
+    with open(temporario, "w", encoding="utf-8") as file:
+        json.dump(metadados, file, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+
+# Função para regravar só as partições mensais que mudaram desde a última construção
+# 'grupos' dá (ano_mes, tabela) e 'anteriores' o hash de cada mês na construção anterior; 'gravar(ano_mes,
+# tabela, arquivo)' grava um mês novo ou alterado ('forcar' regrava todos). Os meses que sumiram da fonte são
+# apagados. Devolve o hash de cada mês e a lista dos meses regravados
+def atualizar_particoes(diretorio, grupos, anteriores, gravar, forcar=False):
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    hashes, regravados = {}, []
+    for ano_mes, tabela in grupos:
+        hashes[ano_mes] = hash_particao(tabela)
+        arquivo = diretorio / f"{ano_mes}.parquet"
+        if forcar or anteriores.get(ano_mes) != hashes[ano_mes] or not arquivo.exists():
+            gravar(ano_mes, tabela, arquivo)
+            regravados.append(ano_mes)
+    # Meses que sumiram da fonte
+    for ano_mes in set(anteriores) - set(hashes):
+        (diretorio / f"{ano_mes}.parquet").unlink(missing_ok=True)
+    return hashes, regravados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Converte CSVs do pipeline para Parquet tipado")
+    parser.add_argument("csvs", nargs="+", help="CSVs a converter (o Parquet fica ao lado, com o mesmo nome)")
+    parser.add_argument("--medir", action="store_true", help="Compara tempo e memória de leitura CSV × Parquet")
+    args = parser.parse_args()
+
+    for csv in args.csvs:
+        destino = caminho_parquet(csv)
+        inicio = time.perf_counter()
+        salvar(carregar(csv), destino)
+        print(f"{csv} -> {destino.name} em {time.perf_counter() - inicio:.1f} s "
+              f"({Path(csv).stat().st_size / 2**20:.1f} MB -> {destino.stat().st_size / 2**20:.1f} MB)")
+
+        if args.medir:
+            for rotulo, leitura in [
+                ("CSV (read_csv)", f"pd.read_csv({str(csv)!r}, decimal=',')"),
+                ("Parquet", f"carregar({str(destino)!r})"),
+                ("Parquet, 3 colunas", f"carregar({str(destino)!r}, ['latitude', 'longitude', 'Sinistro'])"),
+                ("Parquet, Sinistro == 1", f"carregar({str(destino)!r}, filtros=[('Sinistro', '==', 1)])"),
+            ]:
+                m = medir_leitura(leitura)
+                print(f"  {rotulo:<24} {m['tempo_s']:>6.2f} s | {m['linhas']:>9} linhas | "
+                      f"DataFrame {m['memoria_df_mb']:>7.1f} MB | pico {m['pico_mb']:>7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
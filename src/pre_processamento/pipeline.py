@@ -0,0 +1,488 @@
+# Pipeline de pré-processamento incremental (um único ponto de entrada para os scripts de Acidentes e Chuva)
+#
+# As etapas são declaradas com as suas entradas, saídas e parâmetros, e as dependências saem dos caminhos
+# (uma etapa depende da que gera um arquivo de entrada seu). A cada execução:
+# - Cada etapa tem uma impressão digital: sha256 das entradas, dos parâmetros e do código-fonte usado.
+#   Se a impressão é a da última execução e as saídas estão intactas, a etapa é pulada
+# - O hash de um arquivo só é recalculado quando o tamanho ou a data de modificação mudam
+# - Etapas independentes (ex: leitura de cada planilha anual do INMET, limpeza de sinistros, pessoas e
+#   veículos) rodam em paralelo, cada uma em um processo novo
+# - O tempo e o pico de memória de cada etapa ficam registrados em data/.pipeline/
+#
+# Diferente de data_cleaning_acidentes.py, a limpeza não sobrescreve as próprias entradas: os recortes
+# do INFOSIGA ficam em data/Acidentes/bruto/ e os arquivos limpos em data/Acidentes/, com os nomes de sempre.
+#
+# Vários municípios (--municipios): os recortes dos arquivos estaduais continuam sendo uma passada só, que
+# grava um arquivo por município; as demais etapas são declaradas uma vez por município (com o prefixo
+# "<municipio>/" no nome) e rodam em paralelo, cada uma gravando nos caminhos do seu município (Bauru mantém
+# os de sempre; veja src/backend/municipios.py). Com mais de uma estação do INMET na série, '--estacoes' dá a
+# posição de cada uma e cada sinistro usa a mais próxima.
+#
+# Uso (na raiz do projeto):
+#   python -m src.pre_processamento.pipeline
+#   python -m src.pre_processamento.pipeline --proporcoes 100 200
+#   python -m src.pre_processamento.pipeline --listar
+#   python -m src.pre_processamento.pipeline --forcar juncao_chuva
+#   python -m src.pre_processamento.pipeline --municipios BAURU MARILIA JAU --estacoes data_bruto/Chuva/estacoes.csv
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+
+# Chegar na raiz do projeto
+raiz_projeto = Path(__file__).parent.parent.parent
+caminho_data_bruto = raiz_projeto / "data_bruto"
+caminho_data = raiz_projeto / "data"
+caminho_estado = caminho_data / ".pipeline" / "estado.json"
+caminho_historico = caminho_data / ".pipeline" / "execucoes.jsonl"
+
+# Extensões dos arquivos horários do INMET aceitos por juncao_chuva.ler_inmet
+EXTENSOES_INMET = {".xlsx", ".xls", ".csv"}
+
+
+class Etapa:
+    # Uma etapa do pipeline: 'funcao(entradas, saidas, **parametros)' lê 'entradas' e grava 'saidas'
+    # 'codigo' são os arquivos-fonte que, se mudarem, obrigam a etapa a rodar de novo (além do código da própria função)
+    def __init__(self, nome, funcao, entradas, saidas, parametros=None, codigo=()):
+        self.nome = nome
+        self.funcao = funcao
+        self.entradas = [Path(caminho) for caminho in entradas]
+        self.saidas = [Path(caminho) for caminho in saidas]
+        self.parametros = parametros or {}
+        self.codigo = [Path(caminho) for caminho in codigo]
+
+
+# ETAPAS
+# Cada função roda em um processo próprio, então os imports pesados ficam dentro delas
+
+# Função da etapa de recorte de sinistros ou pessoas dos municípios no arquivo estadual (uma saída por município,
+# em uma passada, só com as colunas usadas depois do recorte)
+def recortar_municipios(entradas, saidas, municipios, bom, dataset):
+    from src.pre_processamento.Acidentes.ingestao_infosiga import COLUNAS_RECORTE, SaidaIncremental, filtrar_municipios
+
+    filtrar_municipios(entradas[0], {municipio: SaidaIncremental(saida, bom)
+                                     for municipio, saida in zip(municipios, saidas)}, COLUNAS_RECORTE[dataset])
+
+
+# Função da etapa de recorte dos veículos pelos id_sinistro das pessoas de cada município (entradas[1:])
+def recortar_veiculos(entradas, saidas, municipios):
+    import pandas as pd
+    from src.pre_processamento.Acidentes.ingestao_infosiga import COLUNAS_RECORTE, SaidaIncremental, filtrar_ids
+
+    ids = {municipio: set(pd.read_csv(pessoas, sep=";", usecols=["id_sinistro"], dtype=str)["id_sinistro"])
+           for municipio, pessoas in zip(municipios, entradas[1:])}
+    filtrar_ids(entradas[0], {municipio: SaidaIncremental(saida, bom=False)
+                              for municipio, saida in zip(municipios, saidas)}, ids, COLUNAS_RECORTE["veiculos"])
+
+
+# Função da etapa de limpeza de um dataset de acidentes (sinistros, pessoas ou veículos)
+def limpar_acidentes(entradas, saidas, dataset):
+    import pandas as pd
+    from src.pre_processamento.Acidentes import data_cleaning_acidentes
+    from src.pre_processamento.armazenamento import salvar
+
+    limpar = getattr(data_cleaning_acidentes, f"limpar_{dataset}")
+    df = limpar(pd.read_csv(entradas[0], sep=";"))
+    df.to_csv(saidas[0], index=False, encoding="utf-8-sig", sep=";")
+    salvar(df, saidas[1])
+
+
+# Função da etapa de leitura de um arquivo do INMET para o formato da série (estacao, datetime_brt, precipitacao_mm)
+def ler_planilha_inmet(entradas, saidas):
+    from src.pre_processamento.Chuva.juncao_chuva import ler_inmet
+
+    ler_inmet(entradas[0]).to_parquet(saidas[0], index=False)
+
+
+# Função da etapa de consolidação da série horária com os acumulados
+def montar_serie_chuva(entradas, saidas, janelas_h):
+    import pandas as pd
+    from src.pre_processamento.Chuva.juncao_chuva import acumular, consolidar
+
+    serie = acumular(consolidar([pd.read_parquet(caminho) for caminho in entradas]), janelas_h)
+    serie.to_csv(saidas[0], index=False, encoding="utf-8-sig", sep=";")
+
+
+# Função da etapa de junção da chuva aos sinistros limpos (entradas: sinistros, série e, opcionalmente, as
+# estações codigo;latitude;longitude)
+def juntar_chuva_sinistros(entradas, saidas, tolerancia_min):
+    import pandas as pd
+    from src.pre_processamento.Chuva.juncao_chuva import carregar_serie, juntar_chuva
+
+    sinistros = pd.read_csv(entradas[0], sep=";", encoding="utf-8-sig", low_memory=False)
+    estacoes = pd.read_csv(entradas[2], sep=";", dtype={"codigo": str}) if len(entradas) > 2 else None
+    resultado = juntar_chuva(sinistros, carregar_serie(entradas[1]), tolerancia_min, estacoes)
+    resultado.to_csv(saidas[0], index=False, sep=";", encoding="utf-8-sig")
+
+
+# Função da etapa dos cubos de agregação dos gráficos (entradas: sinistros com chuva, pessoas limpas)
+# Os cubos são regravados só nos meses que mudaram; a saída declarada é o metadados.json
+def construir_agregacoes(entradas, saidas):
+    from src.backend.agregacoes import carregar_fontes_csv, construir_cubos
+
+    construir_cubos(*carregar_fontes_csv(entradas[0], entradas[1]), saidas[0].parent)
+
+
+# Função da etapa dos clusters do mapa por zoom (entrada: sinistros com chuva)
+# Só os meses com pontos novos ou alterados são reagrupados; a saída declarada é o metadados.json
+def construir_clusters_mapa(entradas, saidas):
+    from src.backend.clusters_mapa import construir_mapa
+    from src.pre_processamento.armazenamento import carregar
+
+    construir_mapa(carregar(entradas[0], colunas=["data_sinistro", "latitude", "longitude"]), saidas[0].parent)
+
+
+# Função da etapa da grade de tipo de via usada no enriquecimento das requisições (entrada: ruas)
+def construir_grade_tipo_via(entradas, saidas):
+    from src.backend.enriquecimento import construir_grade
+
+    construir_grade(entradas[0], saidas[0])
+
+
+# Função da etapa do limite do município usado no roteamento do servidor (entradas: ruas e, opcionalmente,
+# a malha municipal do IBGE)
+def construir_limite_municipio(entradas, saidas, municipio):
+    from src.backend.municipios import construir_limite
+
+    construir_limite(entradas[0], saidas[0], municipio, entradas[1] if len(entradas) > 1 else None)
+
+
+# Função da etapa de amostragem negativa (entradas: sinistros com chuva, ruas)
+def amostrar_negativos(entradas, saidas, proporcao, semente):
+    from src.pre_processamento.Amostragem.amostragem_negativa import carregar_positivos, gerar_dataset
+    from src.pre_processamento.armazenamento import salvar
+
+    salvar(gerar_dataset(carregar_positivos(entradas[0]), proporcao, semente=semente, caminho_ruas_gpkg=entradas[1]),
+           saidas[0])
+
+
+# Função para declarar as etapas do pipeline de um ou mais municípios
+# estacoes: CSV codigo;latitude;longitude das estações do INMET; malha: malha municipal do IBGE (limites)
+def montar_etapas(municipios=("BAURU",), proporcoes=(), janelas_h=(1, 3), tolerancia_min=59, semente=42,
+                  estacoes=None, malha=None):
+    from src.backend.municipios import caminhos_municipio
+    from src.pre_processamento.Acidentes.ingestao_infosiga import sufixo_municipio
+
+    if isinstance(municipios, str):
+        municipios = [municipios]
+    acidentes_bruto = caminho_data_bruto / "Acidentes"
+    acidentes = caminho_data / "Acidentes"
+    recortes = acidentes / "bruto"
+    codigo_limpeza = [Path(__file__).parent / "Acidentes" / "data_cleaning_acidentes.py",
+                      Path(__file__).parent / "armazenamento.py"]
+    codigo_ingestao = [Path(__file__).parent / "Acidentes" / "ingestao_infosiga.py"]
+    codigo_chuva = [Path(__file__).parent / "Chuva" / "juncao_chuva.py"]
+    arquivos = {municipio: {dataset: f"{dataset}_2022-2025_{sufixo_municipio(municipio)}"
+                            for dataset in ("sinistros", "pessoas", "veiculos")} for municipio in municipios}
+
+    # Recortes: uma passada por arquivo estadual, com uma saída por município
+    def recortes_de(dataset):
+        return [recortes / f"{arquivos[municipio][dataset]}.csv" for municipio in municipios]
+
+    etapas = [
+        Etapa("recorte_sinistros", recortar_municipios, [acidentes_bruto / "sinistros_2022-2025.csv"],
+              recortes_de("sinistros"), {"municipios": list(municipios), "bom": True, "dataset": "sinistros"},
+              codigo_ingestao),
+        Etapa("recorte_pessoas", recortar_municipios, [acidentes_bruto / "pessoas_2022-2025.csv"],
+              recortes_de("pessoas"), {"municipios": list(municipios), "bom": False, "dataset": "pessoas"},
+              codigo_ingestao),
+        Etapa("recorte_veiculos", recortar_veiculos, [acidentes_bruto / "veiculos_2022-2025.csv", *recortes_de("pessoas")],
+              recortes_de("veiculos"), {"municipios": list(municipios)}, codigo_ingestao),
+    ]
+
+    # Uma etapa por arquivo do INMET: um mês novo só relê a planilha que mudou
+    serie = caminho_data / "Chuva" / "serie_inmet_horaria.csv"
+    planilhas = sorted(caminho for caminho in (caminho_data_bruto / "Chuva").glob("INMET_*")
+                       if caminho.suffix.lower() in EXTENSOES_INMET)
+    leituras = [caminho_data / "Chuva" / "leituras" / f"{planilha.stem}.parquet" for planilha in planilhas]
+    for planilha, leitura in zip(planilhas, leituras):
+        etapas.append(Etapa(f"inmet:{planilha.stem}", ler_planilha_inmet, [planilha], [leitura], codigo=codigo_chuva))
+    # Sem planilhas em data_bruto, a série consolidada já existente é usada como entrada
+    if leituras:
+        etapas.append(Etapa("serie_chuva", montar_serie_chuva, leituras, [serie], {"janelas_h": list(janelas_h)},
+                            codigo_chuva))
+
+    # Etapas de cada município; com um só, os nomes ficam sem prefixo
+    for municipio in municipios:
+        sufixo = sufixo_municipio(municipio)
+        prefixo = f"{sufixo}/" if len(municipios) > 1 else ""
+        arquivo = arquivos[municipio]
+        caminhos = caminhos_municipio(municipio)
+        legado = municipio == "BAURU"
+
+        for dataset in ("sinistros", "pessoas", "veiculos"):
+            etapas.append(Etapa(f"{prefixo}limpeza_{dataset}", limpar_acidentes, [recortes / f"{arquivo[dataset]}.csv"],
+                                [acidentes / f"{arquivo[dataset]}.csv", acidentes / f"{arquivo[dataset]}.parquet"],
+                                {"dataset": dataset}, codigo_limpeza))
+
+        sinistros_com_chuva = acidentes / ("sinistros_com_chuva_2022-2025.csv" if legado
+                                           else f"sinistros_com_chuva_2022-2025_{sufixo}.csv")
+        etapas.append(Etapa(f"{prefixo}juncao_chuva", juntar_chuva_sinistros,
+                            [acidentes / f"{arquivo['sinistros']}.csv", serie] + ([Path(estacoes)] if estacoes else []),
+                            [sinistros_com_chuva], {"tolerancia_min": tolerancia_min}, codigo_chuva))
+
+        agregacoes = caminho_data / "agregacoes" if legado else caminho_data / "agregacoes" / sufixo
+        etapas.append(Etapa(f"{prefixo}agregacoes", construir_agregacoes,
+                            [sinistros_com_chuva, acidentes / f"{arquivo['pessoas']}.csv"],
+                            [agregacoes / "metadados.json"], codigo=[raiz_projeto / "src" / "backend" / "agregacoes.py"]))
+
+        mapa = caminho_data / "mapa" if legado else caminho_data / "mapa" / sufixo
+        etapas.append(Etapa(f"{prefixo}mapa", construir_clusters_mapa, [sinistros_com_chuva], [mapa / "metadados.json"],
+                            codigo=[raiz_projeto / "src" / "backend" / "clusters_mapa.py"]))
+
+        etapas.append(Etapa(f"{prefixo}tipo_via", construir_grade_tipo_via, [caminhos["ruas"]],
+                            [caminhos["grade_tipo_via"]],
+                            codigo=[raiz_projeto / "src" / "backend" / "enriquecimento.py"]))
+
+        etapas.append(Etapa(f"{prefixo}limite", construir_limite_municipio,
+                            [caminhos["ruas"]] + ([Path(malha)] if malha else []), [caminhos["limite"]],
+                            {"municipio": municipio}, [raiz_projeto / "src" / "backend" / "municipios.py"]))
+
+        for proporcao in proporcoes:
+            dataset_final = (f"dataset_final_para_modelo_1_{proporcao:g}.parquet" if legado
+                             else f"dataset_final_para_modelo_1_{proporcao:g}_{sufixo}.parquet")
+            etapas.append(Etapa(f"{prefixo}amostragem_1_{proporcao:g}", amostrar_negativos,
+                                [sinistros_com_chuva, caminhos["ruas"]], [raiz_projeto / dataset_final],
+                                {"proporcao": proporcao, "semente": semente},
+                                [Path(__file__).parent / "Amostragem" / "amostragem_negativa.py"]))
+    return etapas
+
+
+# EXECUÇÃO
+
+# Função para o caminho relativo à raiz (chave estável no estado, independente de onde o projeto está)
+def relativo(caminho):
+    try:
+        return Path(caminho).resolve().relative_to(raiz_projeto.resolve()).as_posix()
+    except ValueError:
+        return str(Path(caminho).resolve())
+
+
+# Função para o sha256 de um arquivo, reaproveitado do cache enquanto tamanho e data de modificação não mudam
+def hash_arquivo(caminho, cache):
+    info = os.stat(caminho)
+    chave = relativo(caminho)
+    anterior = cache.get(chave)
+    if anterior and anterior[0] == info.st_size and anterior[1] == info.st_mtime_ns:
+        return anterior[2]
+    with open(caminho, "rb") as file:
+        digest = hashlib.file_digest(file, "sha256").hexdigest()
+    cache[chave] = [info.st_size, info.st_mtime_ns, digest]
+    return digest
+
+
+# Função para a impressão digital de uma etapa (entradas, parâmetros, saídas declaradas e código)
+def impressao_etapa(etapa, cache):
+    conteudo = {
+        "funcao": inspect.getsource(etapa.funcao),
+        "parametros": etapa.parametros,
+        "entradas": [[relativo(caminho), hash_arquivo(caminho, cache)] for caminho in etapa.entradas],
+        "saidas": [relativo(caminho) for caminho in etapa.saidas],
+        "codigo": [[relativo(caminho), hash_arquivo(caminho, cache)] for caminho in etapa.codigo],
+    }
+    return hashlib.sha256(json.dumps(conteudo, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# Função para checar se as saídas de uma etapa continuam as da última execução
+def saidas_intactas(etapa, registro, cache):
+    return all(caminho.exists() and registro["saidas"].get(relativo(caminho)) == hash_arquivo(caminho, cache)
+               for caminho in etapa.saidas)
+
+
+# Função para o pico de memória (MB) do processo atual
+def pico_memoria_mb():
+    try:
+        with open("/proc/self/status") as file:
+            for linha in file:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Função executada no processo da etapa: roda a etapa e mede o tempo e o pico de memória do processo
+def executar_etapa(funcao, entradas, saidas, parametros):
+    for caminho in saidas:
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+    inicio = time.perf_counter()
+    funcao(entradas, saidas, **parametros)
+    return {"tempo_s": round(time.perf_counter() - inicio, 3), "pico_mb": round(pico_memoria_mb(), 1)}
+
+
+# Função para ler o estado da última execução
+def carregar_estado(caminho=caminho_estado):
+    if Path(caminho).exists():
+        with open(caminho, encoding="utf-8") as file:
+            return json.load(file)
+    return {"arquivos": {}, "etapas": {}}
+
+
+# Função para gravar o estado (arquivo temporário + rename, para não deixar um JSON pela metade)
+def salvar_estado(estado, caminho=caminho_estado):
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_suffix(".tmp")
+    with open(temporario, "w", encoding="utf-8") as file:
+        json.dump(estado, file, indent=1, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+# Função para as dependências de cada etapa: as etapas que geram algum dos seus arquivos de entrada
+def dependencias(etapas):
+    produtor = {relativo(saida): etapa.nome for etapa in etapas for saida in etapa.saidas}
+    return {
+        etapa.nome: {produtor[relativo(entrada)] for entrada in etapa.entradas if relativo(entrada) in produtor}
+        for etapa in etapas
+    }
+
+
+# Função para selecionar as etapas pedidas e tudo de que elas dependem
+def selecionar(etapas, nomes, deps):
+    if not nomes:
+        return etapas
+    desconhecidas = set(nomes) - {etapa.nome for etapa in etapas}
+    if desconhecidas:
+        raise ValueError(f"Etapas desconhecidas: {', '.join(sorted(desconhecidas))}")
+    escolhidas, pilha = set(), list(nomes)
+    while pilha:
+        nome = pilha.pop()
+        if nome not in escolhidas:
+            escolhidas.add(nome)
+            pilha.extend(deps[nome])
+    return [etapa for etapa in etapas if etapa.nome in escolhidas]
+
+
+# Função para executar o pipeline; retorna a situação de cada etapa (executada, atualizada, falhou, bloqueada)
+# 'forcar': nomes das etapas que rodam mesmo atualizadas (True força todas)
+def executar(etapas, processos=None, forcar=(), caminho=caminho_estado, historico=caminho_historico):
+    estado = carregar_estado(caminho)
+    cache = estado["arquivos"]
+    deps = dependencias(etapas)
+    pendentes = list(etapas)
+    situacao = {}
+    em_execucao = {}
+    processos = processos or os.cpu_count()
+
+    # Um processo novo por etapa (max_tasks_per_child=1): o pico de memória medido é só o da etapa
+    with ProcessPoolExecutor(max_workers=processos, max_tasks_per_child=1) as pool:
+        while pendentes or em_execucao:
+            mudou = True
+            while mudou:
+                mudou = False
+                for etapa in list(pendentes):
+                    situacao_deps = [situacao.get(dep) for dep in deps[etapa.nome]]
+                    if any(s in ("falhou", "bloqueada") for s in situacao_deps):
+                        situacao[etapa.nome] = "bloqueada"
+                    elif all(s in ("executada", "atualizada") for s in situacao_deps):
+                        faltando = [relativo(caminho) for caminho in etapa.entradas if not caminho.exists()]
+                        if faltando:
+                            situacao[etapa.nome] = "falhou"
+                            print(f"[{etapa.nome}] entradas ausentes: {', '.join(faltando)}")
+                        else:
+                            impressao = impressao_etapa(etapa, cache)
+                            registro = estado["etapas"].get(etapa.nome)
+                            forcada = forcar is True or etapa.nome in forcar
+                            if (not forcada and registro and registro["impressao"] == impressao
+                                    and saidas_intactas(etapa, registro, cache)):
+                                situacao[etapa.nome] = "atualizada"
+                            elif len(em_execucao) < processos:
+                                futuro = pool.submit(executar_etapa, etapa.funcao, etapa.entradas, etapa.saidas,
+                                                     etapa.parametros)
+                                em_execucao[futuro] = (etapa, impressao)
+                                print(f"[{etapa.nome}] iniciada")
+                            else:
+                                continue
+                    else:
+                        continue
+                    pendentes.remove(etapa)
+                    mudou = True
+
+            if not em_execucao:
+                continue
+            concluidos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                etapa, impressao = em_execucao.pop(futuro)
+                try:
+                    medidas = futuro.result()
+                except Exception:
+                    situacao[etapa.nome] = "falhou"
+                    print(f"[{etapa.nome}] falhou:\n{traceback.format_exc()}")
+                    continue
+                situacao[etapa.nome] = "executada"
+                registro = {
+                    "impressao": impressao,
+                    "saidas": {relativo(caminho): hash_arquivo(caminho, cache) for caminho in etapa.saidas},
+                    "executada_em": datetime.now().isoformat(timespec="seconds"),
+                    **medidas,
+                }
+                estado["etapas"][etapa.nome] = registro
+                # O estado é gravado a cada etapa: se o pipeline parar no meio, o que terminou não roda de novo
+                salvar_estado(estado, caminho)
+                with open(historico, "a", encoding="utf-8") as file:
+                    file.write(json.dumps({"etapa": etapa.nome, **registro}, ensure_ascii=False) + "\n")
+                print(f"[{etapa.nome}] concluída em {medidas['tempo_s']:.1f} s (pico {medidas['pico_mb']:.0f} MB)")
+
+    salvar_estado(estado, caminho)
+    return situacao
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Executa o pré-processamento, pulando as etapas já atualizadas")
+    parser.add_argument("etapas", nargs="*", help="Etapas a executar (com as suas dependências); padrão: todas")
+    parser.add_argument("--municipios", "--municipio", nargs="+", default=["BAURU"],
+                        help="Municípios processados (etapas de cada um com o prefixo '<municipio>/')")
+    parser.add_argument("--estacoes", help="CSV codigo;latitude;longitude das estações do INMET (várias estações)")
+    parser.add_argument("--malha", help="Malha municipal do IBGE para os limites (padrão: envoltória das ruas)")
+    parser.add_argument("--proporcoes", type=float, nargs="*", default=[],
+                        help="Gera também os datasets de treino 1:<proporcao> (ex: 100 200)")
+    parser.add_argument("--processos", type=int, default=None, help="Etapas em paralelo (padrão: núcleos)")
+    parser.add_argument("--forcar", nargs="*", default=None,
+                        help="Executa estas etapas mesmo se atualizadas (sem nomes: todas)")
+    parser.add_argument("--listar", action="store_true", help="Só lista as etapas, dependências e última execução")
+    args = parser.parse_args()
+
+    etapas = montar_etapas([municipio.strip().upper() for municipio in args.municipios], args.proporcoes,
+                           estacoes=args.estacoes, malha=args.malha)
+    deps = dependencias(etapas)
+    etapas = selecionar(etapas, args.etapas, deps)
+
+    largura = max(len(etapa.nome) for etapa in etapas) + 2
+    if args.listar:
+        registros = carregar_estado()["etapas"]
+        for etapa in etapas:
+            registro = registros.get(etapa.nome)
+            ultima = (f"{registro['executada_em']} | {registro['tempo_s']:.1f} s | pico {registro['pico_mb']:.0f} MB"
+                      if registro else "nunca executada")
+            print(f"{etapa.nome:<{largura}} {ultima}")
+            for dep in sorted(deps[etapa.nome]):
+                print(f"  <- {dep}")
+        return
+
+    forcar = True if args.forcar == [] else (args.forcar or ())
+    inicio = time.perf_counter()
+    situacao = executar(etapas, args.processos, forcar)
+    registros = carregar_estado()["etapas"]
+
+    print(f"\n{'Etapa':<{largura}} {'Situação':<11} {'Tempo':>9} {'Pico':>9}")
+    for etapa in etapas:
+        registro = registros.get(etapa.nome) if situacao[etapa.nome] == "executada" else None
+        tempo = f"{registro['tempo_s']:.1f} s" if registro else "-"
+        pico = f"{registro['pico_mb']:.0f} MB" if registro else "-"
+        print(f"{etapa.nome:<{largura}} {situacao[etapa.nome]:<11} {tempo:>9} {pico:>9}")
+    print(f"Pipeline concluído em {time.perf_counter() - inicio:.1f} s.")
+
+    if any(s in ("falhou", "bloqueada") for s in situacao.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,490 @@
+# Compactação offline da Random Forest (ex: modelo_risco_viario_RF.pkl)
+#
+# A floresta do notebook tem 400 árvores com max_depth=None: cada worker do uvicorn desserializa um objeto
+# grande e o custo da inferência cresce com o número de árvores e a profundidade. Aqui o modelo treinado passa
+# por etapas de compactação, cada uma só até onde o PR-AUC fica dentro da tolerância:
+# - Subconjunto de árvores: as árvores são ordenadas por agregação ordenada (a cada passo entra a árvore que
+#   mais reduz o erro quadrático da média) e fica o menor prefixo dentro da tolerância
+# - Poda por profundidade: os nós na profundidade d viram folhas com a probabilidade do próprio nó
+# - Poda de folhas: um nó cujas duas filhas são folhas com probabilidades a menos de 'eps' vira folha
+# - Precisão reduzida: limiares arredondados para float32 (para o lado que mantém a comparação com as entradas
+#   em float32) e probabilidades das folhas para float16. O Tree do Scikit-learn guarda tudo em float64, então o
+#   .pkl não diminui; quem encolhe são as tabelas compiladas, gravadas nesses tipos (feature em int8)
+# - Destilação (--destilar): uma floresta rasa ou um XGBoost treinado nas probabilidades do modelo original
+#   (cada linha entra como positiva com peso p e negativa com peso 1 - p), como alternativa às etapas acima
+#
+# O teste da divisão de src/treinamento/dados.py é dividido ao meio: a metade de seleção é usada pelas etapas,
+# a de avaliação só mede. A seleção, por sua vez, é dividida em ajuste (ordem das árvores e treino do aluno da
+# destilação) e conferência (onde cada etapa confere o PR-AUC), senão a ordem das árvores decorada na própria
+# seleção passa na conferência e cai na avaliação. A tolerância (queda absoluta de PR-AUC) é dividida
+# igualmente entre as etapas com perda. Para cada candidato, o relatório traz o tamanho do .pkl e das tabelas
+# compiladas, a memória e o tempo de carga do .pkl (num processo novo) e a latência por requisição. O menor
+# candidato dentro da tolerância é gravado como artefato versionado, com manifesto e as tabelas compiladas.
+#
+# Uso (na raiz do projeto):
+#   python -m src.treinamento.compactar src/model/modelo_risco_viario_RF.pkl --dados dataset_final_para_modelo_1_100.parquet
+#   python -m src.treinamento.compactar src/model/modelo_risco_viario_RF.pkl --tolerancia 0.01 --destilar xgboost \
+#       --registrar random_forest
+import argparse
+import copy
+import json
+import logging
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import average_precision_score
+from sklearn.tree._tree import Tree
+
+from src.backend.cubo_risco import hash_arquivo
+from src.backend.floresta_compilada import FlorestaCompilada, compilar_modelo
+from src.backend.registro_modelos import caminho_compilados
+from src.treinamento.dados import carregar_dados
+from src.treinamento.treinar import SEMENTE, caminho_manifesto, caminho_modelos, raiz_projeto, registrar
+
+TOLERANCIA_PADRAO = 0.005
+
+# Profundidades e diferenças entre folhas irmãs testadas nas podas (da menos para a mais agressiva)
+PROFUNDIDADES = [30, 25, 20, 16, 14, 12, 10, 8, 6]
+DIFERENCAS_FOLHAS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05]
+
+# Nó sem filhos e feature/limiar indefinidos nas árvores do Scikit-learn
+FOLHA = -1
+INDEFINIDO = -2
+
+
+# Função para o RSS atual do processo (MB)
+def rss_mb():
+    with open("/proc/self/status") as file:
+        for linha in file:
+            if linha.startswith("VmRSS:"):
+                return int(linha.split()[1]) / 1024
+    return float("nan")
+
+
+# Função para a probabilidade da classe positiva de um modelo (com os nomes das features, como no servidor)
+def prever(modelo, X, features):
+    return modelo.predict_proba(pd.DataFrame(X, columns=features))[:, 1]
+
+
+# Função para a probabilidade positiva de cada árvore em cada linha (linhas × árvores, float32)
+def probabilidades_arvores(modelo, X):
+    coluna = list(modelo.classes_).index(1)
+    P = np.empty((len(X), len(modelo.estimators_)), dtype=np.float32)
+    for j, arvore in enumerate(modelo.estimators_):
+        P[:, j] = arvore.predict_proba(X)[:, coluna]
+    return P
+
+
+# Função para ordenar as árvores por agregação ordenada: a cada passo entra a árvore que minimiza
+# sum(((S + P_t) / k - y)^2), onde S é a soma das já escolhidas. Expandindo o quadrado, só o termo
+# 2/k * (S/k - y) . P_t + |P_t|^2 / k^2 depende da candidata: um produto matriz-vetor por passo.
+def ordenar_arvores(P, y):
+    n_arvores = P.shape[1]
+    quadrados = (P.astype(np.float64) ** 2).sum(axis=0)
+    soma = np.zeros(len(y), dtype=np.float32)
+    restantes = np.ones(n_arvores, dtype=bool)
+    ordem = []
+    for k in range(1, n_arvores + 1):
+        residuo = (soma / k - y).astype(np.float32)
+        custo = 2.0 / k * (residuo @ P) + quadrados / k ** 2
+        custo[~restantes] = np.inf
+        escolhida = int(np.argmin(custo))
+        ordem.append(escolhida)
+        restantes[escolhida] = False
+        soma += P[:, escolhida]
+    return np.array(ordem)
+
+
+# Função para o menor prefixo da ordem cujo PR-AUC (média das árvores do prefixo) atinge 'minimo'
+def menor_prefixo(P, ordem, y, minimo):
+    soma = np.zeros(len(y), dtype=np.float64)
+    for k, arvore in enumerate(ordem, start=1):
+        soma += P[:, arvore]
+        if average_precision_score(y, soma / k) >= minimo:
+            return k
+    return len(ordem)
+
+
+# Função para a profundidade de cada nó de uma árvore (listas de nós por nível, da raiz para baixo)
+def niveis_arvore(esquerda, direita):
+    niveis = [np.array([0])]
+    while True:
+        internos = niveis[-1][esquerda[niveis[-1]] != FOLHA]
+        if len(internos) == 0:
+            return niveis
+        niveis.append(np.concatenate([esquerda[internos], direita[internos]]))
+
+
+# Função para montar uma árvore do Scikit-learn com as tabelas de nós e valores dadas
+def montar_arvore(arvore, nos, valores, profundidade):
+    nova = Tree(arvore.n_features, np.asarray(arvore.n_classes, dtype=np.intp), arvore.n_outputs)
+    nova.__setstate__({"max_depth": int(profundidade), "node_count": len(nos),
+                       "nodes": np.ascontiguousarray(nos), "values": np.ascontiguousarray(valores)})
+    return nova
+
+
+# Função para podar uma árvore: corte na 'profundidade' e/ou junção de folhas irmãs a menos de 'diferenca';
+# os nós que ficam inalcançáveis são removidos
+def podar_arvore(arvore, coluna, profundidade=None, diferenca=None):
+    estado = arvore.__getstate__()
+    nos, valores = estado["nodes"].copy(), estado["values"].copy()
+    esquerda, direita = nos["left_child"], nos["right_child"]
+    niveis = niveis_arvore(esquerda, direita)
+
+    if profundidade is not None:
+        for nivel in niveis[profundidade:]:
+            esquerda[nivel] = FOLHA
+            direita[nivel] = FOLHA
+    if diferenca is not None:
+        prob = valores[:, 0, coluna] / valores[:, 0, :].sum(axis=1)
+        # Do nível mais fundo para a raiz: uma junção pode transformar o pai em candidato no nível de cima
+        for nivel in reversed(niveis):
+            internos = nivel[esquerda[nivel] != FOLHA]
+            e, d = esquerda[internos], direita[internos]
+            juntar = internos[(esquerda[e] == FOLHA) & (esquerda[d] == FOLHA) & (np.abs(prob[e] - prob[d]) < diferenca)]
+            esquerda[juntar] = FOLHA
+            direita[juntar] = FOLHA
+
+    niveis = niveis_arvore(esquerda, direita)
+    manter = np.sort(np.concatenate(niveis))
+    novo_indice = np.full(len(nos), FOLHA, dtype=np.int64)
+    novo_indice[manter] = np.arange(len(manter))
+    nos, valores = nos[manter], valores[manter]
+    folha = nos["left_child"] == FOLHA
+    nos["left_child"] = np.where(folha, FOLHA, novo_indice[nos["left_child"]])
+    nos["right_child"] = np.where(folha, FOLHA, novo_indice[nos["right_child"]])
+    nos["feature"][folha] = INDEFINIDO
+    nos["threshold"][folha] = INDEFINIDO
+    return montar_arvore(arvore, nos, valores, len(niveis) - 1)
+
+
+# Função para reduzir a precisão de uma árvore: limiares representáveis em float32 (o maior float32 <= limiar,
+# que separa as entradas em float32 do mesmo jeito) e probabilidades representáveis em float16. Os valores
+# continuam em float64 no Tree (o .pkl fica do mesmo tamanho); é a compilação que os grava em float32/float16
+def reduzir_precisao_arvore(arvore, coluna):
+    estado = arvore.__getstate__()
+    nos, valores = estado["nodes"].copy(), estado["values"].copy()
+    internos = nos["left_child"] != FOLHA
+    limiar = nos["threshold"].astype(np.float32)
+    passou = internos & (limiar > nos["threshold"])
+    limiar[passou] = np.nextafter(limiar[passou], np.float32(-np.inf))
+    nos["threshold"] = np.where(internos, limiar.astype(np.float64), nos["threshold"])
+
+    prob = (valores[:, 0, coluna] / valores[:, 0, :].sum(axis=1)).astype(np.float16).astype(np.float64)
+    valores[:, 0, coluna] = prob
+    valores[:, 0, 1 - coluna] = 1.0 - prob
+    return montar_arvore(arvore, nos, valores, estado["max_depth"])
+
+
+# Função para uma cópia da floresta com as árvores (tree_) dadas
+def copiar_floresta(modelo, arvores):
+    nova = copy.copy(modelo)
+    nova.estimators_ = []
+    for arvore in arvores:
+        estimador = copy.copy(modelo.estimators_[0])
+        estimador.tree_ = arvore
+        nova.estimators_.append(estimador)
+    nova.n_estimators = len(arvores)
+    return nova
+
+
+# Função para destilar o modelo num aluno menor, treinado nas probabilidades do modelo em X
+def destilar(modelo, X, features, tipo, arvores, profundidade):
+    p = prever(modelo, X, features)
+    # Rótulos suaves: cada linha entra como positiva (peso p) e como negativa (peso 1 - p)
+    X_duplo = pd.DataFrame(np.vstack([X, X]), columns=features)
+    y_duplo = np.concatenate([np.ones(len(X), dtype=np.int8), np.zeros(len(X), dtype=np.int8)])
+    pesos = np.concatenate([p, 1.0 - p])
+    usar = pesos > 0
+    if tipo == "floresta":
+        from sklearn.ensemble import RandomForestClassifier
+
+        aluno = RandomForestClassifier(n_estimators=arvores, max_depth=profundidade, min_samples_leaf=5,
+                                       random_state=SEMENTE, n_jobs=-1)
+    else:
+        import xgboost as xgb
+
+        aluno = xgb.XGBClassifier(n_estimators=arvores, max_depth=profundidade, learning_rate=0.1,
+                                  random_state=SEMENTE, eval_metric="logloss", n_jobs=-1)
+    aluno.fit(X_duplo[usar], y_duplo[usar], sample_weight=pesos[usar])
+    return aluno
+
+
+class Compactacao:
+    def __init__(self, modelo, dados, tolerancia=TOLERANCIA_PADRAO, subconjunto=True, profundidade=True,
+                 folhas=True, precisao=True):
+        from sklearn.model_selection import train_test_split
+
+        if not hasattr(modelo, "estimators_") or not hasattr(modelo.estimators_[0], "tree_"):
+            raise ValueError("A compactação é para Random Forest do Scikit-learn.")
+        self.modelo = modelo
+        self.dados = dados
+        self.features = dados.features
+        if list(getattr(modelo, "feature_names_in_", self.features)) != list(self.features):
+            raise ValueError("As features do modelo não são as do dataset.")
+        self.coluna = list(modelo.classes_).index(1)
+        self.tolerancia = tolerancia
+        self.etapas = {"subconjunto": subconjunto, "profundidade": profundidade, "folhas": folhas}
+        self.precisao = precisao
+
+        teste = np.asarray(dados.teste)
+        selecao, self.avaliacao = train_test_split(teste, test_size=0.5, random_state=SEMENTE, stratify=dados.y[teste])
+        ajuste, conferencia = train_test_split(selecao, test_size=0.5, random_state=SEMENTE, stratify=dados.y[selecao])
+        self.X_ajuste, self.y_ajuste = dados.X[np.sort(ajuste)], dados.y[np.sort(ajuste)]
+        self.X_conferencia, self.y_conferencia = dados.X[np.sort(conferencia)], dados.y[np.sort(conferencia)]
+        self.X_avaliacao, self.y_avaliacao = dados.X[np.sort(self.avaliacao)], dados.y[np.sort(self.avaliacao)]
+        self.pr_auc_original = self.pr_auc(modelo)
+        self.candidatos = [{"nome": "original", "modelo": modelo, "precisao_reduzida": False, "tecnicas": {}}]
+
+    # PR-AUC mínimo depois da i-ésima etapa com perda (a tolerância é dividida igualmente entre elas)
+    def minimo(self, etapa):
+        ativas = [nome for nome, ativa in self.etapas.items() if ativa]
+        return self.pr_auc_original - self.tolerancia * (ativas.index(etapa) + 1) / len(ativas)
+
+    def pr_auc(self, modelo):
+        return average_precision_score(self.y_conferencia, prever(modelo, self.X_conferencia, self.features))
+
+    # Função para rodar as etapas em sequência; cada uma parte do resultado da anterior
+    def executar(self):
+        modelo, tecnicas = self.modelo, {}
+        arvores = [estimador.tree_ for estimador in modelo.estimators_]
+
+        if self.etapas["subconjunto"]:
+            inicio = time.perf_counter()
+            ordem = ordenar_arvores(probabilidades_arvores(modelo, self.X_ajuste), self.y_ajuste)
+            P = probabilidades_arvores(modelo, self.X_conferencia)
+            k = menor_prefixo(P, ordem, self.y_conferencia, self.minimo("subconjunto"))
+            del P
+            arvores = [arvores[i] for i in ordem[:k]]
+            modelo = copiar_floresta(self.modelo, arvores)
+            tecnicas["subconjunto"] = {"arvores": k, "de": len(self.modelo.estimators_)}
+            self.adicionar("subconjunto", modelo, tecnicas, inicio)
+
+        if self.etapas["profundidade"]:
+            inicio = time.perf_counter()
+            atual = max(arvore.max_depth for arvore in arvores)
+            escolhida = None
+            for profundidade in [p for p in PROFUNDIDADES if p < atual]:
+                podadas = [podar_arvore(arvore, self.coluna, profundidade=profundidade) for arvore in arvores]
+                candidato = copiar_floresta(self.modelo, podadas)
+                if self.pr_auc(candidato) < self.minimo("profundidade"):
+                    break
+                escolhida, arvores, modelo = profundidade, podadas, candidato
+            if escolhida is not None:
+                tecnicas["profundidade"] = {"max_depth": escolhida, "de": atual}
+                self.adicionar("profundidade", modelo, tecnicas, inicio)
+
+        if self.etapas["folhas"]:
+            inicio = time.perf_counter()
+            escolhida = None
+            for diferenca in DIFERENCAS_FOLHAS:
+                podadas = [podar_arvore(arvore, self.coluna, diferenca=diferenca) for arvore in arvores]
+                candidato = copiar_floresta(self.modelo, podadas)
+                if self.pr_auc(candidato) < self.minimo("folhas"):
+                    break
+                escolhida, melhores, modelo_folhas = diferenca, podadas, candidato
+            if escolhida is not None:
+                arvores, modelo = melhores, modelo_folhas
+                tecnicas["folhas"] = {"diferenca": escolhida}
+                self.adicionar("folhas", modelo, tecnicas, inicio)
+
+        if self.precisao:
+            inicio = time.perf_counter()
+            arvores = [reduzir_precisao_arvore(arvore, self.coluna) for arvore in arvores]
+            modelo = copiar_floresta(self.modelo, arvores)
+            tecnicas["precisao"] = {"limiar": "float32", "valor": "float16", "onde": "tabelas compiladas"}
+            self.adicionar("precisao_tabelas", modelo, tecnicas, inicio, precisao_reduzida=True)
+
+    # Função para treinar o aluno da destilação no ajuste (com as probabilidades do modelo original)
+    def destilar(self, tipo, arvores, profundidade):
+        inicio = time.perf_counter()
+        aluno = destilar(self.modelo, self.X_ajuste, self.features, tipo, arvores, profundidade)
+        self.adicionar(f"destilado_{tipo}", aluno,
+                       {"destilacao": {"aluno": tipo, "arvores": arvores, "max_depth": profundidade}}, inicio)
+
+    def adicionar(self, nome, modelo, tecnicas, inicio, precisao_reduzida=False):
+        candidato = {"nome": nome, "modelo": modelo, "tecnicas": copy.deepcopy(tecnicas),
+                     "precisao_reduzida": precisao_reduzida, "tempo_s": time.perf_counter() - inicio,
+                     "pr_auc_conferencia": self.pr_auc(modelo)}
+        self.candidatos.append(candidato)
+        logging.info(f"{nome}: PR-AUC {candidato['pr_auc_conferencia']:.4f} (original {self.pr_auc_original:.4f}) "
+                     f"em {candidato['tempo_s']:.1f} s.")
+
+    # Função para medir cada candidato: PR-AUC na avaliação, tamanhos, memória e carga do .pkl e latência
+    def medir(self, linhas_latencia=2_000):
+        original_avaliacao = average_precision_score(self.y_avaliacao, prever(self.modelo, self.X_avaliacao,
+                                                                              self.features))
+        self.candidatos[0]["pr_auc_conferencia"] = self.pr_auc_original
+        with tempfile.TemporaryDirectory() as pasta:
+            for candidato in self.candidatos:
+                modelo = candidato["modelo"]
+                caminho = Path(pasta) / f"{candidato['nome']}.pkl"
+                joblib.dump(modelo, caminho)
+                compilado = compilar_modelo(modelo)
+                if candidato["precisao_reduzida"]:
+                    compilado = compilado.reduzir_precisao()
+                compilado.salvar(Path(pasta) / candidato["nome"])
+                inicio = time.perf_counter()
+                compilado = FlorestaCompilada.carregar(Path(pasta) / candidato["nome"])[0]
+                carga_tabelas_s = time.perf_counter() - inicio
+
+                linhas = self.X_avaliacao[:linhas_latencia]
+                tempos = []
+                for linha in linhas:
+                    inicio = time.perf_counter()
+                    compilado.prever_proba(linha)
+                    tempos.append(time.perf_counter() - inicio)
+                inicio = time.perf_counter()
+                prever(modelo, linhas, self.features)
+                lote_us = (time.perf_counter() - inicio) / len(linhas) * 1e6
+
+                carga = json.loads(subprocess.run(
+                    [sys.executable, "-m", "src.treinamento.compactar", str(caminho), "--medir-carga"],
+                    capture_output=True, text=True, check=True, cwd=raiz_projeto).stdout.strip().splitlines()[-1])
+                pr_auc = average_precision_score(self.y_avaliacao, prever(modelo, self.X_avaliacao, self.features))
+                candidato.update(
+                    arvores=compilado.n_arvores,
+                    nos=int(len(compilado.feature)),
+                    profundidade=compilado.profundidade,
+                    pr_auc=pr_auc,
+                    queda_pr_auc=original_avaliacao - pr_auc,
+                    pkl_mb=caminho.stat().st_size / 1e6,
+                    tabelas_mb=compilado.tamanho_bytes / 1e6,
+                    carga_tabelas_s=carga_tabelas_s,
+                    latencia_p50_us=float(np.percentile(tempos, 50) * 1e6),
+                    latencia_p99_us=float(np.percentile(tempos, 99) * 1e6),
+                    lote_us=lote_us,
+                    **carga,
+                )
+
+    # Menor candidato (tabelas compiladas) dentro da tolerância na conferência; o original se nenhum couber
+    def escolher(self, nome=None):
+        if nome:
+            return next(candidato for candidato in self.candidatos if candidato["nome"] == nome)
+        dentro = [candidato for candidato in self.candidatos[1:]
+                  if candidato["pr_auc_conferencia"] >= self.pr_auc_original - self.tolerancia]
+        if not dentro:
+            return self.candidatos[0]
+        return min(dentro, key=lambda candidato: candidato["tabelas_mb"])
+
+
+# Função para gravar o candidato escolhido: .pkl versionado, manifesto e tabelas compiladas
+def salvar_compactado(candidato, compactacao, origem, destino=caminho_modelos):
+    modelo = candidato["modelo"]
+    versao = time.strftime("%Y%m%d-%H%M%S")
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    caminho = destino / f"{Path(origem).stem}_compacto_{versao}.pkl"
+    joblib.dump(modelo, caminho)
+    sha256 = hash_arquivo(caminho)
+    familia = "xgboost" if hasattr(modelo, "get_booster") else "random_forest"
+
+    manifesto = {
+        "versao": versao,
+        "familia": familia,
+        "model_features": compactacao.features,
+        "arquivo": caminho.name,
+        "sha256": sha256,
+        "precisao_reduzida": candidato["precisao_reduzida"],
+        "compactacao": {
+            "origem": Path(origem).name,
+            "origem_sha256": hash_arquivo(origem),
+            "candidato": candidato["nome"],
+            "tecnicas": candidato["tecnicas"],
+            "tolerancia": compactacao.tolerancia,
+            "pr_auc_original": compactacao.pr_auc_original,
+            "pr_auc": candidato["pr_auc_conferencia"],
+            "pr_auc_avaliacao": candidato["pr_auc"],
+            "dados": compactacao.dados.metadados["origem"],
+        },
+    }
+    with open(caminho_manifesto(caminho), "w", encoding="utf-8") as file:
+        json.dump(manifesto, file, ensure_ascii=False, indent=2)
+
+    # Tabelas compiladas já no formato do registro de modelos (o servidor não precisa compilar de novo)
+    compilado = compilar_modelo(modelo)
+    if candidato["precisao_reduzida"]:
+        compilado = compilado.reduzir_precisao()
+    compilado.salvar(caminho_compilados / caminho.stem, modelo_sha256=sha256, model_features=compactacao.features)
+    return caminho, familia
+
+
+# Função para medir (num processo novo) o tempo de joblib.load e a memória que o objeto ocupa
+def medir_carga(caminho):
+    import sklearn.ensemble  # noqa: F401 (os imports não entram na medida)
+
+    try:
+        import xgboost  # noqa: F401
+    except ImportError:
+        pass
+    antes = rss_mb()
+    inicio = time.perf_counter()
+    modelo = joblib.load(caminho)
+    carga_s = time.perf_counter() - inicio
+    rss = rss_mb() - antes
+    del modelo
+    return {"carga_pkl_s": carga_s, "rss_pkl_mb": rss}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Compactação offline da Random Forest")
+    parser.add_argument("modelo", help="Artefato .pkl da Random Forest")
+    parser.add_argument("--dados", default=str(raiz_projeto / "dataset_final_para_modelo_1_100.parquet"),
+                        help="Dataset com o qual o modelo foi treinado (a divisão de teste é a mesma)")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PADRAO, help="Queda máxima de PR-AUC")
+    parser.add_argument("--sem-subconjunto", action="store_true")
+    parser.add_argument("--sem-profundidade", action="store_true")
+    parser.add_argument("--sem-folhas", action="store_true")
+    parser.add_argument("--sem-precisao", action="store_true")
+    parser.add_argument("--destilar", choices=["floresta", "xgboost"], nargs="*", default=[],
+                        help="Também treina alunos destilados")
+    parser.add_argument("--destilar-arvores", type=int, default=100)
+    parser.add_argument("--destilar-profundidade", type=int, default=8)
+    parser.add_argument("--escolher", help="Grava este candidato em vez do menor dentro da tolerância")
+    parser.add_argument("--destino", default=str(caminho_modelos))
+    parser.add_argument("--registrar", metavar="NOME", help="Aponta o modelo NOME de modelos.json para o artefato")
+    parser.add_argument("--medir-carga", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir_carga:
+        print(json.dumps(medir_carga(args.modelo)))
+        return
+
+    modelo = joblib.load(args.modelo)
+    compactacao = Compactacao(modelo, carregar_dados(args.dados), args.tolerancia, not args.sem_subconjunto,
+                              not args.sem_profundidade, not args.sem_folhas, not args.sem_precisao)
+    compactacao.executar()
+    for tipo in args.destilar:
+        compactacao.destilar(tipo, args.destilar_arvores, args.destilar_profundidade)
+    compactacao.medir()
+    escolhido = compactacao.escolher(args.escolher)
+
+    print(f"\n{'candidato':<20} | {'árvores':>7} | {'nós':>9} | {'prof.':>5} | {'PR-AUC':>6} | {'queda':>6} | "
+          f"{'.pkl (MB)':>9} | {'RSS .pkl (MB)':>13} | {'carga .pkl':>10} | {'tabelas (MB)':>12} | "
+          f"{'1 linha p50/p99 (µs)':>20} | {'lote µs/linha':>13}")
+    for c in compactacao.candidatos:
+        print(f"{c['nome'] + (' *' if c is escolhido else ''):<20} | {c['arvores']:>7} | {c['nos']:>9} | "
+              f"{c['profundidade']:>5} | {c['pr_auc']:>6.4f} | {c['queda_pr_auc']:>+6.4f} | {c['pkl_mb']:>9.1f} | "
+              f"{c['rss_pkl_mb']:>13.1f} | {c['carga_pkl_s']:>8.3f} s | {c['tabelas_mb']:>12.1f} | "
+              f"{c['latencia_p50_us']:>9.0f} / {c['latencia_p99_us']:>8.0f} | {c['lote_us']:>13.1f}")
+    print(f"\nPR-AUC na avaliação ({len(compactacao.avaliacao)} linhas); tolerância de {args.tolerancia} "
+          f"na conferência.")
+
+    if escolhido is compactacao.candidatos[0]:
+        print("Nenhum candidato ficou dentro da tolerância; nada foi gravado.")
+        return
+    caminho, familia = salvar_compactado(escolhido, compactacao, args.modelo, args.destino)
+    if args.registrar:
+        registrar(caminho, args.registrar, familia)
+    print(f"Artefato: {caminho} ({escolhido['nome']}; manifesto {caminho_manifesto(caminho).name})"
+          + (f", registrado como '{args.registrar}'" if args.registrar else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# Armazenamento do dataset de treino em arrays tipados (cache do CSV/Parquet de dataset_final_para_modelo*)
+#
+# Os notebooks releem o CSV com vírgula decimal a cada execução. Aqui o dataset é lido uma vez (pela camada
+# de armazenamento, que já converte os números) e gravado em data/treino/<dataset>/:
+# - X.npy (float32, linhas contíguas, na ordem de 'features') e y.npy (int8)
+# - treino.npy / teste.npy: a divisão estratificada 70/30 dos notebooks (random_state=8), feita uma vez
+# - metadados.json: origem, sha256 da origem, features, linhas e positivos
+# As leituras seguintes abrem os arrays com mmap (sem conversão) e os processos da busca dividem as páginas.
+# O cache é refeito quando o sha256 da origem muda (o hash só é recalculado se o tamanho ou o mtime mudarem).
+#
+# Uso (na raiz do projeto):
+#   python -m src.treinamento.dados dataset_final_para_modelo_1_100.parquet
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+import numpy as np
+
+from src.backend.cubo_risco import hash_arquivo
+
+# Chegar na raiz do projeto
+raiz_projeto = Path(__file__).parent.parent.parent
+caminho_cache = raiz_projeto / "data" / "treino"
+
+# Colunas que não entram no modelo (alvo e data do sinistro), como nos notebooks
+ALVO = "Sinistro"
+COLUNAS_FORA = [ALVO, "data"]
+
+# Divisão treino/teste dos notebooks
+FRACAO_TESTE = 0.3
+SEMENTE_DIVISAO = 8
+
+ARRAYS = ["X", "y", "treino", "teste"]
+
+
+class DadosTreino:
+    def __init__(self, diretorio, X, y, treino, teste, metadados):
+        self.diretorio = Path(diretorio)
+        self.X = X
+        self.y = y
+        self.treino = treino
+        self.teste = teste
+        self.metadados = metadados
+
+    @property
+    def features(self):
+        return self.metadados["features"]
+
+    # Abre um cache já gravado (mmap por padrão)
+    @classmethod
+    def abrir(cls, diretorio, mmap=True):
+        diretorio = Path(diretorio)
+        with open(diretorio / "metadados.json", encoding="utf-8") as file:
+            metadados = json.load(file)
+        arrays = {nome: np.load(diretorio / f"{nome}.npy", mmap_mode="r" if mmap else None) for nome in ARRAYS}
+        return cls(diretorio, metadados=metadados, **arrays)
+
+
+# Função para o diretório do cache de um dataset
+def diretorio_dados(origem, cache=caminho_cache):
+    return Path(cache) / Path(origem).name.split(".")[0]
+
+
+# Função para converter o dataset de origem em arrays e gravar o cache
+def construir_cache(origem, diretorio, sha256):
+    from sklearn.model_selection import train_test_split
+    from src.pre_processamento.armazenamento import carregar
+
+    df = carregar(origem)
+    X = df.drop(columns=[col for col in COLUNAS_FORA if col in df.columns])
+    y = df[ALVO].to_numpy(dtype=np.int8)
+    treino, teste = train_test_split(np.arange(len(df)), test_size=FRACAO_TESTE, random_state=SEMENTE_DIVISAO,
+                                     stratify=y)
+
+    diretorio.mkdir(parents=True, exist_ok=True)
+    np.save(diretorio / "X.npy", np.ascontiguousarray(X.to_numpy(dtype=np.float32)))
+    np.save(diretorio / "y.npy", y)
+    np.save(diretorio / "treino.npy", np.sort(treino).astype(np.int32))
+    np.save(diretorio / "teste.npy", np.sort(teste).astype(np.int32))
+
+    origem = Path(origem)
+    metadados = {
+        "origem": str(origem),
+        "origem_sha256": sha256,
+        "origem_tamanho": origem.stat().st_size,
+        "origem_mtime": origem.stat().st_mtime,
+        "features": list(X.columns),
+        "linhas": int(len(y)),
+        "positivos": int(y.sum()),
+        "fracao_teste": FRACAO_TESTE,
+        "semente_divisao": SEMENTE_DIVISAO,
+    }
+    # metadados.json por último: um cache interrompido no meio não é aberto
+    with open(diretorio / "metadados.json", "w", encoding="utf-8") as file:
+        json.dump(metadados, file, ensure_ascii=False, indent=2)
+
+
+# Função para carregar o dataset de treino, construindo (ou refazendo) o cache se preciso
+def carregar_dados(origem, cache=caminho_cache):
+    origem = Path(origem)
+    diretorio = diretorio_dados(origem, cache)
+    inicio = time.perf_counter()
+
+    sha256 = None
+    if (diretorio / "metadados.json").exists():
+        dados = DadosTreino.abrir(diretorio)
+        estado = origem.stat()
+        metadados = dados.metadados
+        if (metadados["origem_tamanho"] == estado.st_size and metadados["origem_mtime"] == estado.st_mtime) \
+                or metadados["origem_sha256"] == (sha256 := hash_arquivo(origem)):
+            logging.info(f"Dataset de treino aberto do cache {diretorio} em {time.perf_counter() - inicio:.2f} s.")
+            return dados
+
+    construir_cache(origem, diretorio, sha256 or hash_arquivo(origem))
+    dados = DadosTreino.abrir(diretorio)
+    logging.info(f"Cache do dataset de treino gravado em {diretorio} ({dados.metadados['linhas']} linhas) "
+                 f"em {time.perf_counter() - inicio:.2f} s.")
+    return dados
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Grava o cache em arrays de um dataset de treino")
+    parser.add_argument("origens", nargs="+", help="dataset_final_para_modelo*.csv ou .parquet")
+    parser.add_argument("--cache", default=str(caminho_cache))
+    args = parser.parse_args()
+
+    for origem in args.origens:
+        dados = carregar_dados(origem, args.cache)
+        print(f"{origem}: {dados.metadados['linhas']} linhas, {dados.metadados['positivos']} positivos, "
+              f"{len(dados.features)} features -> {dados.diretorio}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+# Treinamento com orçamento de CPU (substitui o GridSearchCV de random_forest.ipynb e xgboost*.ipynb)
+#
+# Os notebooks avaliam a grade inteira (81 configurações × 3 dobras na Random Forest, cada uma com até 400
+# árvores) e o artefato vencedor é salvo à mão. Aqui:
+# - O dataset vem do cache em arrays de src/treinamento/dados.py (lido do CSV/Parquet uma vez só)
+# - Busca por halving sucessivo: todas as configurações da grade começam com poucas árvores, e a cada rodada
+#   só o melhor 1/eta (PR-AUC médio nas dobras) segue, com eta vezes mais árvores, até 'max_arvores'
+# - As árvores crescem com warm start: a Random Forest acrescenta árvores às que já tem (warm_start=True) e o
+#   XGBoost continua o booster (xgb_model=), em vez de refazer o ajuste a cada rodada
+# - Parada antecipada: uma configuração cujo PR-AUC não melhorou 'tolerancia' de uma rodada para a outra não
+#   ganha mais árvores nas rodadas seguintes (continua na disputa com o PR-AUC que já tem)
+# - Cada dobra roda num processo próprio, que mantém os modelos da dobra entre as rodadas
+# - Orçamento explícito de CPU: uma sonda de uma árvore por configuração mede a CPU por árvore de cada uma, e
+#   as rodadas são planejadas com o maior número de árvores que, com o ajuste final, cabe no orçamento. Antes
+#   de cada rodada o custo é conferido de novo com o que já foi medido; se não couber, a busca para ali e
+#   vence a melhor configuração até então
+# - O vencedor é reajustado no treino inteiro e avaliado no teste (a mesma divisão 70/30 dos notebooks). O
+#   artefato vai para src/model/ com versão no nome e um manifesto ao lado (features na ordem do modelo,
+#   parâmetros, dataset, métricas e histórico da busca), que o registro de modelos do servidor lê
+#
+# Uso (na raiz do projeto):
+#   python -m src.treinamento.treinar --dados dataset_final_para_modelo_1_100.parquet
+#   python -m src.treinamento.treinar --familia xgboost --orcamento-cpu-s 600 --registrar xgboost
+import argparse
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import time
+import traceback
+import warnings
+from pathlib import Path
+import joblib
+import numpy as np
+
+from src.backend.cubo_risco import hash_arquivo
+from src.treinamento.dados import DadosTreino, carregar_dados
+
+# Chegar na raiz do projeto
+raiz_projeto = Path(__file__).parent.parent.parent
+caminho_modelos = raiz_projeto / "src" / "model"
+
+SEMENTE = 8
+
+# Grades dos notebooks (random_forest.ipynb e xgboost3.ipynb); n_estimators é o recurso da busca.
+# No XGBoost, scale_pos_weight sai da proporção de negativos do dataset em vez de fixo em 100.
+FAMILIAS = {
+    "random_forest": {
+        "sigla": "RF",
+        "grade": {"max_depth": [10, 20, None], "min_samples_leaf": [2, 4, 6], "min_samples_split": [5, 10, 15]},
+        "limiar_alto": 0.5,
+        "limiar_medio": 0.3,
+        "veiculo_padrao": "tp_veiculo_nao_disponivel",
+    },
+    "xgboost": {
+        "sigla": "XGB",
+        "grade": {"max_depth": [5, 7], "learning_rate": [0.05, 0.1], "subsample": [0.8, 1.0],
+                  "colsample_bytree": [0.8, 1.0], "gamma": [0.5, 1]},
+        "limiar_alto": 0.5,
+        "limiar_medio": 0.2,
+        "veiculo_padrao": None,
+    },
+}
+
+
+# Função para criar o estimador de uma família com os parâmetros de uma configuração
+def criar_estimador(familia, parametros, proporcao_negativos, n_jobs=1):
+    if familia == "random_forest":
+        from sklearn.ensemble import RandomForestClassifier
+
+        return RandomForestClassifier(random_state=SEMENTE, class_weight="balanced", n_jobs=n_jobs, warm_start=True,
+                                      **parametros)
+    import xgboost as xgb
+
+    return xgb.XGBClassifier(random_state=SEMENTE, eval_metric="logloss", n_jobs=n_jobs,
+                             scale_pos_weight=proporcao_negativos, **parametros)
+
+
+# Função para o número de árvores (rodadas de boosting) de um estimador já ajustado
+def arvores_ajustadas(estimador):
+    from sklearn.exceptions import NotFittedError
+
+    if hasattr(estimador, "get_booster"):
+        try:
+            return estimador.get_booster().num_boosted_rounds()
+        except NotFittedError:
+            return 0
+    return len(getattr(estimador, "estimators_", []))
+
+
+# Função para levar um estimador até 'n_arvores' árvores, aproveitando as que ele já tem (warm start)
+def crescer(estimador, X, y, n_arvores):
+    atual = arvores_ajustadas(estimador)
+    if hasattr(estimador, "get_booster"):
+        estimador.set_params(n_estimators=n_arvores - atual)
+        estimador.fit(X, y, xgb_model=estimador.get_booster() if atual else None)
+    else:
+        estimador.set_params(n_estimators=n_arvores)
+        with warnings.catch_warnings():
+            # class_weight='balanced' com warm start: os dados são os mesmos em todas as rodadas
+            warnings.simplefilter("ignore", UserWarning)
+            estimador.fit(X, y)
+    return estimador
+
+
+# Função de cada processo de dobra: mantém os modelos da dobra e atende os pedidos do coordenador
+# Pedido: {"crescer": [(id, parametros, n_arvores)], "descartar": [id]}; None encerra
+def trabalhador_dobra(conexao, diretorio_dados, idx_treino, idx_validacao, familia, proporcao_negativos):
+    from sklearn.metrics import average_precision_score
+
+    try:
+        dados = DadosTreino.abrir(diretorio_dados)
+        X, y = dados.X[idx_treino], dados.y[idx_treino]
+        X_validacao, y_validacao = dados.X[idx_validacao], dados.y[idx_validacao]
+        estimadores = {}
+        while (pedido := conexao.recv()) is not None:
+            for id_config in pedido["descartar"]:
+                estimadores.pop(id_config, None)
+            resultados = []
+            for id_config, parametros, n_arvores in pedido["crescer"]:
+                inicio = time.process_time()
+                estimador = estimadores.get(id_config)
+                if estimador is None:
+                    estimador = criar_estimador(familia, parametros, proporcao_negativos)
+                estimadores[id_config] = crescer(estimador, X, y, n_arvores)
+                pr_auc = average_precision_score(y_validacao, estimador.predict_proba(X_validacao)[:, 1])
+                resultados.append((id_config, float(pr_auc), time.process_time() - inicio))
+            conexao.send(resultados)
+    except (EOFError, BrokenPipeError):
+        pass  # coordenador encerrado
+    except Exception:
+        conexao.send(traceback.format_exc())
+    finally:
+        conexao.close()
+
+
+# Função para o número de árvores de cada rodada do halving sucessivo (a última com 'max_arvores')
+# Rodadas suficientes para chegar a uma configuração cortando 1/eta por vez, mas sem começar abaixo de
+# 'min_arvores' (nesse caso são menos rodadas, e cada uma corta mais)
+def arvores_rodadas(n_configs, max_arvores, eta, min_arvores=1):
+    n_rodadas = math.ceil(math.log(n_configs, eta) - 1e-9) + 1 if n_configs > 1 else 1
+    n_rodadas = max(1, min(n_rodadas, math.floor(math.log(max_arvores / min_arvores, eta) + 1e-9) + 1))
+    return [max(1, round(max_arvores * eta ** (rodada - n_rodadas + 1))) for rodada in range(n_rodadas)]
+
+
+# Função para quantas configurações disputam cada rodada (todas na primeira, uma na última)
+def configs_rodadas(n_configs, n_rodadas):
+    if n_rodadas == 1:
+        return [n_configs]
+    return [max(1, math.ceil(n_configs / n_configs ** (rodada / (n_rodadas - 1)) - 1e-9)) for rodada in range(n_rodadas)]
+
+
+class BuscaHalving:
+    def __init__(self, dados, familia, grade=None, dobras=3, max_arvores=400, eta=3, orcamento_cpu_s=1800,
+                 tolerancia=0.002, min_arvores=10):
+        self.dados = dados
+        self.familia = familia
+        grade = grade or FAMILIAS[familia]["grade"]
+        self.configs = [dict(zip(grade, valores)) for valores in itertools.product(*grade.values())]
+        self.dobras = dobras
+        self.eta = eta
+        self.orcamento_cpu_s = orcamento_cpu_s
+        self.tolerancia = tolerancia
+        self.max_arvores = max_arvores
+        self.min_arvores = min_arvores
+        self.rodadas = arvores_rodadas(len(self.configs), max_arvores, eta, min_arvores)
+        y_treino = dados.y[dados.treino]
+        self.proporcao_negativos = float((len(y_treino) - y_treino.sum()) / max(y_treino.sum(), 1))
+
+        # Estado de cada configuração: árvores crescidas, melhor PR-AUC médio nas dobras e com quantas árvores ele
+        # saiu, CPU gasta e se parou de crescer
+        self.estado = [{"arvores": 0, "pr_auc": None, "arvores_melhor": 0, "cpu_s": 0.0, "estavel": False}
+                       for _ in self.configs]
+        self.historico = []
+        self.cpu_s = 0.0
+        self.interrompida = False
+
+    # CPU por árvore (somando as dobras) de uma configuração; sem medida, a média das já medidas
+    def cpu_por_arvore(self, id_config):
+        estado = self.estado[id_config]
+        if estado["arvores"]:
+            return estado["cpu_s"] / estado["arvores"]
+        medidas = [e["cpu_s"] / e["arvores"] for e in self.estado if e["arvores"]]
+        return float(np.mean(medidas)) if medidas else 0.0
+
+    # Estimativa de CPU do ajuste final (treino inteiro = dobras/(dobras-1) vezes o treino de uma dobra)
+    def custo_final(self, id_config, n_arvores=None):
+        n_arvores = n_arvores or self.rodadas[-1]
+        return self.cpu_por_arvore(id_config) / self.dobras * n_arvores * self.dobras / (self.dobras - 1)
+
+    # CPU prevista das rodadas e do ajuste final com 'max_arvores' árvores na última rodada. Quem segue para as
+    # rodadas seguintes ainda não é conhecido: conta a CPU por árvore média das configurações
+    def custo_previsto(self, max_arvores):
+        rodadas = arvores_rodadas(len(self.configs), max_arvores, self.eta, min(self.min_arvores, max_arvores))
+        media = float(np.mean([self.cpu_por_arvore(i) for i in range(len(self.configs))]))
+        total, anterior = 0.0, 1
+        for n_configs, n_arvores in zip(configs_rodadas(len(self.configs), len(rodadas)), rodadas):
+            total += n_configs * media * max(0, n_arvores - anterior)
+            anterior = n_arvores
+        return total + media * max_arvores / (self.dobras - 1)
+
+    # Função para ajustar as rodadas ao orçamento: o maior número de árvores na última rodada que cabe no que
+    # resta, pela CPU por árvore medida na sonda
+    def planejar(self):
+        restante = self.orcamento_cpu_s - self.cpu_s
+        menor, maior = 1, self.max_arvores
+        while menor < maior:
+            meio = (menor + maior + 1) // 2
+            if self.custo_previsto(meio) <= restante:
+                menor = meio
+            else:
+                maior = meio - 1
+        self.rodadas = arvores_rodadas(len(self.configs), menor, self.eta, min(self.min_arvores, menor))
+        if menor < self.max_arvores:
+            logging.warning(f"Orçamento de CPU: a última rodada terá {menor} árvores em vez de {self.max_arvores} "
+                            f"(previsão de {self.custo_previsto(self.max_arvores):.0f} s para {self.max_arvores}).")
+
+    # Função para pedir uma rodada a todas as dobras e juntar PR-AUC médio e CPU de cada configuração
+    def rodada(self, conexoes, crescer_ids, n_arvores, descartar):
+        pedido = {"crescer": [(i, self.configs[i], n_arvores) for i in crescer_ids], "descartar": descartar}
+        for conexao in conexoes:
+            conexao.send(pedido)
+        respostas = [conexao.recv() for conexao in conexoes]
+        erros = [resposta for resposta in respostas if isinstance(resposta, str)]
+        if erros:
+            raise RuntimeError(f"Falha num processo de dobra:\n{erros[0]}")
+
+        por_dobra = [{i: (pr_auc, cpu) for i, pr_auc, cpu in resposta} for resposta in respostas]
+        cpu_rodada = 0.0
+        for i in crescer_ids:
+            pr_auc = float(np.mean([dobra[i][0] for dobra in por_dobra]))
+            cpu = sum(dobra[i][1] for dobra in por_dobra)
+            estado = self.estado[i]
+            # Estável quando não supera o melhor PR-AUC em 'tolerancia'; uma queda não apaga o melhor já visto
+            if estado["pr_auc"] is not None and pr_auc - estado["pr_auc"] < self.tolerancia:
+                estado["estavel"] = True
+            if estado["pr_auc"] is None or pr_auc > estado["pr_auc"]:
+                estado.update(pr_auc=pr_auc, arvores_melhor=n_arvores)
+            estado.update(arvores=n_arvores, cpu_s=estado["cpu_s"] + cpu)
+            cpu_rodada += cpu
+        self.cpu_s += cpu_rodada
+        return cpu_rodada
+
+    # Função para distribuir as dobras entre processos e rodar o halving sucessivo; devolve o id do vencedor
+    def executar(self):
+        from sklearn.model_selection import StratifiedKFold
+
+        treino = np.asarray(self.dados.treino)
+        divisor = StratifiedKFold(n_splits=self.dobras, shuffle=True, random_state=SEMENTE)
+        # spawn: processos sem o estado do OpenMP do processo pai (XGBoost e Scikit-learn)
+        contexto = multiprocessing.get_context("spawn")
+        processos, conexoes = [], []
+        for idx_treino, idx_validacao in divisor.split(treino, self.dados.y[treino]):
+            local, remota = contexto.Pipe()
+            processo = contexto.Process(
+                target=trabalhador_dobra, daemon=True,
+                args=(remota, self.dados.diretorio, treino[idx_treino], treino[idx_validacao], self.familia,
+                      self.proporcao_negativos))
+            processo.start()
+            processos.append(processo)
+            conexoes.append(local)
+
+        vivos = list(range(len(self.configs)))
+        descartar = []
+        try:
+            # Sonda: uma árvore por configuração mede a CPU por árvore de cada uma (a árvore fica no modelo)
+            inicio = time.perf_counter()
+            cpu_sonda = self.rodada(conexoes, vivos, 1, [])
+            for estado in self.estado:
+                estado.update(pr_auc=None, arvores_melhor=0)
+            self.historico.append({"rodada": 0, "arvores": 1, "configuracoes": len(vivos), "ajustadas": len(vivos),
+                                   "cpu_s": round(cpu_sonda, 2), "tempo_s": round(time.perf_counter() - inicio, 2),
+                                   "melhor_pr_auc": None, "melhor": None})
+            self.planejar()
+
+            for rodada, n_arvores in enumerate(self.rodadas):
+                crescer_ids = [i for i in vivos if not self.estado[i]["estavel"] and self.estado[i]["arvores"] < n_arvores]
+                lider = max(vivos, key=lambda i: self.estado[i]["pr_auc"] or 0)
+                estimativa = sum(self.cpu_por_arvore(i) * (n_arvores - self.estado[i]["arvores"]) for i in crescer_ids)
+                if rodada and self.cpu_s + estimativa + self.custo_final(lider) > self.orcamento_cpu_s:
+                    self.interrompida = True
+                    logging.warning(f"Orçamento de CPU: busca encerrada antes da rodada {rodada + 1} "
+                                    f"(gasto {self.cpu_s:.0f} s, estimativa da rodada {estimativa:.0f} s).")
+                    break
+
+                inicio = time.perf_counter()
+                cpu_rodada = self.rodada(conexoes, crescer_ids, n_arvores, descartar)
+                vivos.sort(key=lambda i: self.estado[i]["pr_auc"], reverse=True)
+                self.historico.append({
+                    "rodada": rodada + 1,
+                    "arvores": n_arvores,
+                    "configuracoes": len(vivos),
+                    "ajustadas": len(crescer_ids),
+                    "cpu_s": round(cpu_rodada, 2),
+                    "tempo_s": round(time.perf_counter() - inicio, 2),
+                    "melhor_pr_auc": round(self.estado[vivos[0]]["pr_auc"], 5),
+                    "melhor": self.configs[vivos[0]],
+                })
+                logging.info(f"Rodada {rodada + 1}/{len(self.rodadas)}: {len(vivos)} configurações, {n_arvores} árvores, "
+                             f"{cpu_rodada:.1f} s de CPU, melhor PR-AUC {self.estado[vivos[0]]['pr_auc']:.4f}.")
+
+                if rodada < len(self.rodadas) - 1:
+                    mantidos = configs_rodadas(len(self.configs), len(self.rodadas))[rodada + 1]
+                    vivos, descartar = vivos[:mantidos], vivos[mantidos:]
+        finally:
+            for conexao in conexoes:
+                try:
+                    conexao.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+            for processo in processos:
+                processo.join(timeout=10)
+                if processo.is_alive():
+                    processo.terminate()
+
+        return max(vivos, key=lambda i: self.estado[i]["pr_auc"] or 0)
+
+
+# Função para reajustar o vencedor no treino inteiro e avaliá-lo no teste
+def ajustar_final(dados, familia, parametros, n_arvores, proporcao_negativos, n_jobs=-1):
+    import pandas as pd
+    from sklearn.metrics import average_precision_score, roc_auc_score
+
+    inicio, inicio_cpu = time.perf_counter(), time.process_time()
+    # DataFrame com os nomes das colunas: o artefato expõe as features (feature_names_in_ / booster)
+    X_treino = pd.DataFrame(dados.X[dados.treino], columns=dados.features)
+    estimador = criar_estimador(familia, {**parametros, "n_estimators": n_arvores}, proporcao_negativos, n_jobs)
+    if hasattr(estimador, "warm_start"):
+        estimador.set_params(warm_start=False)
+    estimador.fit(X_treino, dados.y[dados.treino])
+    tempo_ajuste_s, cpu_ajuste_s = time.perf_counter() - inicio, time.process_time() - inicio_cpu
+
+    riscos = estimador.predict_proba(pd.DataFrame(dados.X[dados.teste], columns=dados.features))[:, 1]
+    y_teste = dados.y[dados.teste]
+    metricas = {"pr_auc": float(average_precision_score(y_teste, riscos)),
+                "roc_auc": float(roc_auc_score(y_teste, riscos)),
+                "linhas_teste": int(len(y_teste)), "positivos_teste": int(y_teste.sum())}
+    return estimador, metricas, tempo_ajuste_s, cpu_ajuste_s
+
+
+# Função para o caminho do manifesto de um artefato (<artefato>.manifesto.json)
+def caminho_manifesto(caminho_artefato):
+    caminho_artefato = Path(caminho_artefato)
+    return caminho_artefato.with_name(f"{caminho_artefato.stem}.manifesto.json")
+
+
+# Função para gravar o artefato versionado e o manifesto; devolve o caminho do artefato
+def salvar_artefato(estimador, manifesto, destino=caminho_modelos):
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    sigla = FAMILIAS[manifesto["familia"]]["sigla"]
+    caminho = destino / f"modelo_risco_viario_{sigla}_{manifesto['versao']}.pkl"
+    joblib.dump(estimador, caminho)
+    manifesto = {**manifesto, "arquivo": caminho.name, "sha256": hash_arquivo(caminho)}
+    with open(caminho_manifesto(caminho), "w", encoding="utf-8") as file:
+        json.dump(manifesto, file, ensure_ascii=False, indent=2)
+    return caminho
+
+
+# Função para apontar um modelo de modelos.json para o artefato novo (mantém limiares e veículo já configurados)
+def registrar(caminho_artefato, nome, familia, caminho_config=caminho_modelos / "modelos.json"):
+    caminho_config = Path(caminho_config)
+    with open(caminho_config, encoding="utf-8") as file:
+        config = json.load(file)
+    padrao = FAMILIAS[familia]
+    anterior = config["modelos"].get(nome, {})
+    config["modelos"][nome] = {
+        "arquivo": Path(os.path.relpath(caminho_artefato, caminho_config.parent)).as_posix(),
+        "limiar_alto": anterior.get("limiar_alto", padrao["limiar_alto"]),
+        "limiar_medio": anterior.get("limiar_medio", padrao["limiar_medio"]),
+        "veiculo_padrao": anterior.get("veiculo_padrao", padrao["veiculo_padrao"]),
+    }
+    temporario = caminho_config.with_suffix(".tmp")
+    with open(temporario, "w", encoding="utf-8") as file:
+        json.dump(config, file, ensure_ascii=False, indent=2)
+        file.write("\n")
+    temporario.replace(caminho_config)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Treinamento com halving sucessivo e orçamento de CPU")
+    parser.add_argument("--dados", default=str(raiz_projeto / "dataset_final_para_modelo_1_100.parquet"))
+    parser.add_argument("--familia", choices=list(FAMILIAS), default="random_forest")
+    parser.add_argument("--grade", type=json.loads, help="Grade em JSON (padrão: a do notebook da família)")
+    parser.add_argument("--orcamento-cpu-s", type=float, default=1800, help="CPU total da busca e do ajuste final")
+    parser.add_argument("--max-arvores", type=int, default=400)
+    parser.add_argument("--min-arvores", type=int, default=10, help="Árvores da primeira rodada, no mínimo")
+    parser.add_argument("--eta", type=int, default=3, help="Fração (1/eta) das configurações que segue a cada rodada")
+    parser.add_argument("--dobras", type=int, default=3, help="Dobras da validação cruzada (um processo por dobra)")
+    parser.add_argument("--tolerancia", type=float, default=0.002,
+                        help="Ganho mínimo de PR-AUC entre rodadas para uma configuração continuar crescendo")
+    parser.add_argument("--destino", default=str(caminho_modelos))
+    parser.add_argument("--registrar", metavar="NOME", help="Aponta o modelo NOME de modelos.json para o artefato novo")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    dados = carregar_dados(args.dados)
+    tempo_dados_s = time.perf_counter() - inicio
+
+    busca = BuscaHalving(dados, args.familia, args.grade, args.dobras, args.max_arvores, args.eta,
+                         args.orcamento_cpu_s, args.tolerancia, args.min_arvores)
+    logging.info(f"{len(busca.configs)} configurações, rodadas com {busca.rodadas} árvores, {args.dobras} dobras.")
+    vencedor = busca.executar()
+    parametros, estado = busca.configs[vencedor], busca.estado[vencedor]
+
+    estimador, metricas, tempo_ajuste_s, cpu_ajuste_s = ajustar_final(
+        dados, args.familia, parametros, estado["arvores_melhor"], busca.proporcao_negativos)
+
+    import sklearn
+    import xgboost
+
+    manifesto = {
+        "versao": time.strftime("%Y%m%d-%H%M%S"),
+        "familia": args.familia,
+        "model_features": dados.features,
+        "parametros": parametros,
+        "n_estimators": estado["arvores_melhor"],
+        "dados": {chave: dados.metadados[chave] for chave in ("origem", "origem_sha256", "linhas", "positivos",
+                                                               "fracao_teste", "semente_divisao")},
+        "validacao": {"dobras": args.dobras, "pr_auc": estado["pr_auc"]},
+        "teste": metricas,
+        "busca": {"configuracoes": len(busca.configs), "eta": args.eta, "rodadas": busca.historico,
+                  "cpu_s": round(busca.cpu_s, 2), "orcamento_cpu_s": args.orcamento_cpu_s,
+                  "interrompida": busca.interrompida},
+        "ajuste_final": {"tempo_s": round(tempo_ajuste_s, 2), "cpu_s": round(cpu_ajuste_s, 2)},
+        "tempo_total_s": round(time.perf_counter() - inicio, 2),
+        "tempo_dados_s": round(tempo_dados_s, 2),
+        "bibliotecas": {"scikit-learn": sklearn.__version__, "xgboost": xgboost.__version__,
+                        "numpy": np.__version__},
+    }
+    caminho = salvar_artefato(estimador, manifesto, args.destino)
+    if args.registrar:
+        registrar(caminho, args.registrar, args.familia)
+
+    print(f"\n{'rodada':>6} | {'árvores':>7} | {'configs':>7} | {'ajustadas':>9} | {'CPU (s)':>8} | {'melhor PR-AUC':>13}")
+    for linha in busca.historico:
+        melhor = "sonda" if linha["melhor_pr_auc"] is None else f"{linha['melhor_pr_auc']:.4f}"
+        print(f"{linha['rodada']:>6} | {linha['arvores']:>7} | {linha['configuracoes']:>7} | {linha['ajustadas']:>9} | "
+              f"{linha['cpu_s']:>8.1f} | {melhor:>13}")
+    print(f"\nVencedor: {parametros} com {estado['arvores_melhor']} árvores (PR-AUC na validação {estado['pr_auc']:.4f})")
+    print(f"Teste: PR-AUC {metricas['pr_auc']:.4f}, ROC-AUC {metricas['roc_auc']:.4f}")
+    print(f"CPU: busca {busca.cpu_s:.0f} s + ajuste final {cpu_ajuste_s:.0f} s (orçamento {args.orcamento_cpu_s:.0f} s"
+          f"{', busca interrompida' if busca.interrompida else ''}); total {time.perf_counter() - inicio:.0f} s")
+    print(f"Artefato: {caminho} (manifesto {caminho_manifesto(caminho).name})"
+          + (f", registrado como '{args.registrar}'" if args.registrar else ""))
+
+
+if __name__ == "__main__":
+    main()